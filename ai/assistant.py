@@ -5,15 +5,51 @@ from datetime import datetime, timedelta
 import json
 import re
 
+from .backends import get_extraction_backend
+from .summary_cache import SummaryCache
+from .question_cache import QuestionCache
+from .conversation_memory import ConversationMemory
+from .prompt_profiler import prompt_profiler
+from .context_serializer import (
+    serialize_header, serialize_child, serialize_weights, serialize_feedings, serialize_stools,
+    serialize_medications, serialize_prescriptions, serialize_notes, serialize_chat_history,
+    serialize_reminders
+)
+from .feeding_reference import feeding_norms, format_feeding_norms
+from . import summary_engine
+
 logger = logging.getLogger(__name__)
 
 class MedicalAIAssistant:
     """AI ассистент для медицинских консультаций с памятью контекста и анализом данных"""
     
-    def __init__(self, api_key: str):
+    # Сводки, которые можно готовить заранее: тип -> метод генерации
+    SUMMARY_GENERATORS = {
+        'development': 'generate_development_summary',
+        'feeding': 'generate_feeding_summary',
+        'weight': 'generate_weight_summary',
+        'stool': 'generate_stool_summary'
+    }
+    # Сводки, для которых нужен запрос к LLM (остальные собираются по правилам)
+    LLM_SUMMARIES = ('development',)
+    # Сколько последних записей каждого вида попадает в контекст консультации (None - все активные)
+    CONSULT_CONTEXT_LIMITS = {
+        'weight': 5, 'feeding': 5, 'stool': 3, 'medication': 5,
+        'prescription': None, 'note': 5, 'chat': 10, 'reminder': None
+    }
+    
+    def __init__(self, api_key: str, summary_llm_budget: int = 24,
+                 question_cache_threshold: float = 0.85, question_cache_ttl_hours: int = 24,
+                 extraction_backend=None, conversation_max_messages: int = 10,
+                 conversation_max_chats: int = 200, conversation_idle_hours: float = 6):
         self.api_key = api_key
         openai.api_key = api_key
-        self.conversation_history = []
+        # История диалога хранится отдельно для каждого чата
+        self.conversation_memory = ConversationMemory(
+            max_messages=conversation_max_messages,
+            max_chats=conversation_max_chats,
+            idle_hours=conversation_idle_hours
+        )
         self.system_prompt = """Ты - опытный педиатр и семейный медицинский консультант, который помогает родителям отслеживать здоровье и развитие их ребенка.
 
 Твои основные задачи:
@@ -44,6 +80,21 @@ class MedicalAIAssistant:
             'last_updated': None
         }
         
+        # Бэкенд для коротких запросов извлечения данных (OpenAI или локальная модель)
+        self.extraction_backend = extraction_backend or get_extraction_backend()
+        
+        # Замеры токенов и времени сборки промптов по секциям
+        self.prompt_profiler = prompt_profiler
+        
+        # Готовые сводки с отметкой свежести
+        self.summary_cache = SummaryCache(daily_llm_budget=summary_llm_budget)
+        
+        # Ответы на недавние вопросы для повторяющихся формулировок
+        self.question_cache = QuestionCache(
+            threshold=question_cache_threshold,
+            ttl_hours=question_cache_ttl_hours
+        )
+        
     def update_data_cache(self, db_session):
         """
         Обновляет кэш данных из базы данных
@@ -51,28 +102,25 @@ class MedicalAIAssistant:
         Args:
             db_session: Сессия базы данных
         """
-        from database.models import Child, Weight, Feeding, Medication, Stool
+        from database.models import Weight, Feeding, Medication, Stool
+        from database.child_profile import child_profiles
         from datetime import datetime, timedelta
         
         try:
             # Получаем информацию о ребенке
-            child = db_session.query(Child).first()
+            child = child_profiles.get(db_session)
             if not child:
                 return
                 
             # Базовая информация о ребенке
-            age_days = (datetime.now().date() - child.birth_date).days
-            age_months = age_days // 30
-            age_years = age_days // 365
-            
             self.data_cache['child_info'] = {
                 'id': child.id,
                 'name': child.name,
                 'birth_date': child.birth_date.strftime('%d.%m.%Y'),
                 'gender': child.gender,
-                'age_days': age_days,
-                'age_months': age_months,
-                'age_years': age_years
+                'age_days': child.age_days,
+                'age_months': child.age_months,
+                'age_years': child.age_years
             }
             
             # История веса (за последние 6 месяцев)
@@ -142,142 +190,97 @@ class MedicalAIAssistant:
         except Exception as e:
             logger.error(f"Ошибка при обновлении кэша данных: {e}")
     
-    def get_response(self, text: str, db_session=None):
+    def get_response(self, text: str, db_session=None, chat_id: Optional[int] = None):
         """
         Получает ответ от AI с учетом контекста и данных из базы
         
         Args:
             text: Текст запроса пользователя
             db_session: Сессия базы данных
+            chat_id: ID чата, история которого учитывается и дополняется;
+                для внутренних запросов не указывается
             
         Returns:
             Ответ от AI
         """
         try:
-            # Добавляем запрос пользователя в историю
-            self.conversation_history.append({"role": "user", "content": text})
-            
             # Если есть доступ к базе данных, добавляем контекст из базы
-            context = ""
+            profile = self.prompt_profiler.start('consult')
             child = None
             if db_session:
-                # Импортируем модели для работы с БД
-                from database.models import Child, Weight, Feeding, Stool, Medication, Prescription, Note, ChatHistory
+                from database.child_profile import child_profiles
+                from database.recent_events import fetch_recent
                 
                 # Получаем данные о ребенке
-                child = db_session.query(Child).first()
+                with profile.section('child_info'):
+                    child = child_profiles.get(db_session)
+                    if child:
+                        # Базовая информация о ребенке
+                        profile.add(serialize_header())
+                        profile.add(serialize_child(child, child.age_str))
+                
                 if child:
-                    # Базовая информация о ребенке
-                    age_days = (datetime.now().date() - child.birth_date).days
-                    age_months = age_days // 30
-                    age_years = age_days // 365
-                    
-                    if age_years > 0:
-                        age_str = f"{age_years} лет"
-                        if age_years < 5:
-                            age_str += f" {age_months % 12} месяцев"
-                    else:
-                        age_str = f"{age_months} месяцев"
+                    today = datetime.now().date()
+                    # Вчерашний день берется целиком и выводится итогом, сегодняшние кормления - подробно
+                    since = datetime.combine(today - timedelta(days=1), datetime.min.time())
                     
-                    context += f"Информация о ребенке: {child.name}, {age_str}, {child.gender}.\n\n"
+                    # Последние записи всех таблиц одним запросом
+                    with profile.section('fetch'):
+                        recent = fetch_recent(db_session, child.id, self.CONSULT_CONTEXT_LIMITS, since={'feeding': since})
                     
                     # Получаем последние данные о весе
-                    weights = db_session.query(Weight).filter_by(child_id=child.id).order_by(Weight.timestamp.desc()).limit(5).all()
-                    if weights:
-                        context += "Последние записи о весе:\n"
-                        for weight in weights:
-                            context += f"- {weight.weight} кг ({weight.timestamp.strftime('%d.%m.%Y')})\n"
-                        context += "\n"
+                    with profile.section('weights'):
+                        profile.add(serialize_weights(recent['weight'], today))
                     
                     # Получаем последние данные о кормлениях
-                    feedings = db_session.query(Feeding).filter_by(child_id=child.id).order_by(Feeding.timestamp.desc()).limit(5).all()
-                    if feedings:
-                        context += "Последние записи о кормлениях:\n"
-                        for feeding in feedings:
-                            food_type = "грудное молоко"
-                            if feeding.food_type == 'formula':
-                                food_type = "смесь"
-                            elif feeding.food_type == 'food':
-                                food_type = "прикорм"
-                            context += f"- {feeding.amount} мл {food_type} ({feeding.timestamp.strftime('%d.%m.%Y %H:%M')})\n"
-                        context += "\n"
+                    with profile.section('feedings'):
+                        feedings = [f for f in recent['feeding'] if f.timestamp >= since]
+                        if feedings:
+                            profile.add(serialize_feedings(feedings, today))
+                        else:
+                            feedings = recent['feeding']
+                            profile.add(serialize_feedings(feedings, today, detail_days=len(feedings)))
                     
                     # Получаем последние данные о стуле
-                    stools = db_session.query(Stool).filter_by(child_id=child.id).order_by(Stool.timestamp.desc()).limit(3).all()
-                    if stools:
-                        context += "Последние записи о стуле:\n"
-                        for stool in stools:
-                            color_text = f", цвет: {stool.color}" if stool.color else ""
-                            context += f"- {stool.description}{color_text} ({stool.timestamp.strftime('%d.%m.%Y %H:%M')})\n"
-                        context += "\n"
+                    with profile.section('stools'):
+                        profile.add(serialize_stools(recent['stool'], today))
                     
                     # Получаем последние данные о лекарствах
-                    medications = db_session.query(Medication).filter_by(child_id=child.id).order_by(Medication.timestamp.desc()).limit(5).all()
-                    if medications:
-                        context += "Последние записи о приеме лекарств:\n"
-                        for medication in medications:
-                            dosage_text = f", {medication.dosage}" if medication.dosage else ""
-                            context += f"- {medication.medication_name}{dosage_text} ({medication.timestamp.strftime('%d.%m.%Y %H:%M')})\n"
-                        context += "\n"
+                    with profile.section('medications'):
+                        profile.add(serialize_medications(recent['medication'], today))
                     
                     # Получаем активные назначения
-                    prescriptions = db_session.query(Prescription).filter(
-                        Prescription.child_id == child.id,
-                        Prescription.is_active == 1
-                    ).order_by(Prescription.start_date.desc()).all()
-                    
-                    if prescriptions:
-                        context += "Активные назначения врачей:\n"
-                        for prescription in prescriptions:
-                            if prescription.full_text:
-                                context += f"- {prescription.medication_name}: {prescription.full_text}\n"
-                            else:
-                                end_date_text = f"до {prescription.end_date.strftime('%d.%m.%Y')}" if prescription.end_date else "бессрочно"
-                                context += f"- {prescription.medication_name}, {prescription.dosage}, {prescription.frequency}, с {prescription.start_date.strftime('%d.%m.%Y')} {end_date_text}\n"
-                        context += "\n"
+                    with profile.section('prescriptions'):
+                        profile.add(serialize_prescriptions(recent['prescription'], today))
                     
                     # Получаем заметки о ребенке
-                    notes = db_session.query(Note).filter_by(child_id=child.id).order_by(Note.timestamp.desc()).limit(5).all()
-                    if notes:
-                        context += "Важные заметки о ребенке:\n"
-                        for note in notes:
-                            context += f"- {note.title}: {note.content}\n"
-                        context += "\n"
+                    with profile.section('notes'):
+                        profile.add(serialize_notes(recent['note']))
                     
                     # Получаем последние диалоги из истории
-                    chat_history = db_session.query(ChatHistory).filter_by(child_id=child.id).order_by(ChatHistory.timestamp.desc()).limit(10).all()
-                    if chat_history:
-                        context += "Последние диалоги с ассистентом:\n"
-                        for chat in reversed(chat_history):  # Показываем в хронологическом порядке
-                            context += f"- Вопрос: {chat.user_message}\n  Ответ: {chat.assistant_response}\n\n"
+                    with profile.section('chat_history'):
+                        profile.add(serialize_chat_history(reversed(recent['chat'])))  # в хронологическом порядке
                     
                     # Получаем активные напоминания
-                    from database.models import Reminder
-                    active_reminders = db_session.query(Reminder).filter(
-                        Reminder.child_id == child.id,
-                        Reminder.status == 'active'
-                    ).order_by(Reminder.reminder_time).all()
-                    
-                    if active_reminders:
-                        context += "Активные напоминания:\n"
-                        for reminder in active_reminders[:5]:  # Показываем первые 5
-                            repeat_text = "однократно"
-                            if reminder.repeat_type == 'daily':
-                                repeat_text = "ежедневно"
-                            elif reminder.repeat_type == 'weekly':
-                                repeat_text = "еженедельно"
-                            elif reminder.repeat_type == 'monthly':
-                                repeat_text = "ежемесячно"
-                            context += f"- {reminder.description} в {reminder.reminder_time.strftime('%H:%M')} ({repeat_text})\n"
-                        context += "\n"
+                    with profile.section('reminders'):
+                        active_reminders = sorted(recent['reminder'], key=lambda r: r.reminder_time)
+                        profile.add(serialize_reminders(active_reminders[:5]))  # показываем первые 5
+            
+            context = profile.text()
             
             # Создаем сообщения для API
             messages = [
                 {"role": "system", "content": self.system_prompt + "\n\nКонтекст о ребенке:\n" + context if context else self.system_prompt}
             ]
             
-            # Добавляем историю разговора, но ограничиваем ее последними 10 сообщениями
-            messages.extend(self.conversation_history[-10:])
+            # Добавляем историю разговора этого чата и текущий вопрос
+            if chat_id is not None:
+                history = self.conversation_memory.get(chat_id)
+                profile.record('conversation', "".join(message['content'] for message in history))
+                messages.extend(history)
+            profile.record('question', text)
+            messages.append({"role": "user", "content": text})
+            profile.finish(messages)
             
             # Получаем ответ от API
             response = openai.ChatCompletion.create(
@@ -290,8 +293,9 @@ class MedicalAIAssistant:
             # Извлекаем ответ
             ai_response = response['choices'][0]['message']['content']
             
-            # Добавляем ответ в историю
-            self.conversation_history.append({"role": "assistant", "content": ai_response})
+            # Добавляем вопрос и ответ в историю чата
+            if chat_id is not None:
+                self.conversation_memory.add_turn(chat_id, text, ai_response)
             
             # Сохраняем диалог в базу данных, если есть доступ к базе и есть информация о ребенке
             if db_session and child:
@@ -314,6 +318,51 @@ class MedicalAIAssistant:
             logger.error(f"Ошибка при получении ответа от AI: {e}")
             return "Извините, произошла ошибка при обработке вашего запроса."
     
+    def _consult_models(self) -> tuple:
+        """Таблицы, данные которых попадают в контекст консультации"""
+        from database.models import Feeding, Stool, Weight, Medication, Prescription, Note, Reminder
+        
+        return (Feeding, Stool, Weight, Medication, Prescription, Note, Reminder)
+    
+    def consult(self, text: str, db_session, force_fresh: bool = False, chat_id: Optional[int] = None) -> Dict:
+        """
+        Отвечает на вопрос, переиспользуя ответ на почти такой же недавний вопрос
+        
+        Кэш ведется отдельно для каждого ребенка и сбрасывается при изменении его данных.
+        
+        Args:
+            text: Текст вопроса
+            db_session: Сессия базы данных
+            force_fresh: Не использовать кэш и получить новый ответ
+            chat_id: ID чата для истории диалога
+            
+        Returns:
+            Словарь с полями text, from_cache и entry_id (ID записи кэша или None)
+        """
+        from database.child_profile import child_profiles
+        from database.fingerprint import data_fingerprint
+        
+        child = child_profiles.get(db_session)
+        if not child:
+            return {'text': self.get_response(text, db_session, chat_id), 'from_cache': False, 'entry_id': None}
+        
+        fingerprint = data_fingerprint(db_session, child.id, self._consult_models())
+        if not force_fresh:
+            entry = self.question_cache.lookup(child.id, text, fingerprint)
+            if entry:
+                # Ответ из кэша тоже становится частью диалога, чтобы уточняющие вопросы имели контекст
+                if chat_id is not None:
+                    self.conversation_memory.add_turn(chat_id, text, entry['answer'])
+                return {'text': entry['answer'], 'from_cache': True, 'entry_id': entry['id']}
+        
+        answer = self.get_response(text, db_session, chat_id)
+        # Сообщение об ошибке не кэшируем
+        if answer.startswith("Извините, произошла ошибка"):
+            return {'text': answer, 'from_cache': False, 'entry_id': None}
+        
+        entry = self.question_cache.store(child.id, text, answer, fingerprint)
+        return {'text': answer, 'from_cache': False, 'entry_id': entry['id']}
+    
     def _format_context(self, context: Dict) -> str:
         """Форматирование базового контекста для AI"""
         parts = []
@@ -455,17 +504,45 @@ class MedicalAIAssistant:
         return {"response": response}
     
     def get_feeding_recommendations(self, child_age_months: int, weight_kg: float) -> str:
-        """Получить рекомендации по кормлению"""
-        prompt = f"""Дай рекомендации по кормлению для ребенка:
-        - Возраст: {child_age_months} месяцев
-        - Вес: {weight_kg} кг
+        """
+        Получить рекомендации по кормлению
         
-        Включи:
-        1. Рекомендуемое количество кормлений в день
-        2. Объем одного кормления
-        3. Общие советы по питанию для этого возраста"""
+        Нормы берутся из локальной справочной таблицы. LLM используется только для того,
+        чтобы пояснить исключения (например, вес вне обычного диапазона).
         
-        return self.get_response(prompt)
+        Args:
+            child_age_months: Возраст ребенка в месяцах
+            weight_kg: Вес ребенка в кг
+            
+        Returns:
+            Текст рекомендаций
+        """
+        norms = feeding_norms(child_age_months, weight_kg)
+        text = format_feeding_norms(norms)
+        if not norms['exceptions']:
+            return text
+        
+        return text + "\n\n⚠️ " + self._explain_feeding_exceptions(norms)
+    
+    def _explain_feeding_exceptions(self, norms: Dict) -> str:
+        """Короткое пояснение к отклонениям от справочных норм"""
+        exceptions = "; ".join(norms['exceptions'])
+        try:
+            # Запрос не проходит через get_response, чтобы не засорять историю диалога
+            response = openai.ChatCompletion.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {"role": "system", "content": self.system_prompt},
+                    {"role": "user", "content": f"""Ребенку {norms['age_months']:g} мес. Справочные нормы кормления к нему применимы не полностью: {exceptions}.
+В 2-3 предложениях объясни родителям, как это учесть при кормлении и когда стоит обратиться к педиатру."""}
+                ],
+                temperature=0.5,
+                max_tokens=250
+            )
+            return response['choices'][0]['message']['content']
+        except Exception as e:
+            logger.error(f"Ошибка при пояснении отклонений от норм кормления: {e}")
+            return f"Обратите внимание: {exceptions}. Обсудите режим кормления с педиатром."
     
     def generate_development_summary(self, db_session) -> str:
         """
@@ -478,98 +555,64 @@ class MedicalAIAssistant:
             Текстовая сводка о развитии ребенка
         """
         try:
-            # Импортируем модели для работы с БД
-            from database.models import Child, Weight, Feeding, Stool, Prescription, Note
+            from database.child_profile import child_profiles
+            from database.recent_events import fetch_recent
+            from database.rollups import feeding_totals, stool_totals, weight_range
+            
+            profile = self.prompt_profiler.start('development_summary')
             
             # Получаем данные о ребенке
-            child = db_session.query(Child).first()
+            child = child_profiles.get(db_session)
             if not child:
                 return "Нет данных о ребенке."
             
             # Базовая информация о ребенке
-            age_days = (datetime.now().date() - child.birth_date).days
-            age_months = age_days // 30
-            age_years = age_days // 365
-            
-            if age_years > 0:
-                age_str = f"{age_years} лет"
-                if age_years < 5:
-                    age_str += f" {age_months % 12} месяцев"
-            else:
-                age_str = f"{age_months} месяцев"
-            
-            context = f"Информация о ребенке: {child.name}, {age_str}, {child.gender}.\n\n"
-            
-            # Получаем последние данные о весе и анализируем динамику
-            weights = db_session.query(Weight).filter_by(child_id=child.id).order_by(Weight.timestamp).all()
-            if weights:
-                first_weight = weights[0].weight
-                last_weight = weights[-1].weight
-                weight_change = last_weight - first_weight
+            with profile.section('child_info'):
+                profile.add(serialize_header())
+                profile.add(serialize_child(child, child.age_str))
+            
+            # Получаем первое и последнее измерение веса и анализируем динамику
+            with profile.section('weights'):
+                weights = weight_range(db_session, child.id)
+                if weights:
+                    first_weight = weights['first_weight']
+                    last_weight = weights['last_weight']
+                    weight_change = last_weight - first_weight
                 
-                context += f"Вес: текущий - {last_weight} кг, начальный - {first_weight} кг.\n"
-                context += f"Изменение веса: {weight_change:.2f} кг.\n\n"
+                    profile.add(f"Вес, кг: {first_weight:g} → {last_weight:g} ({weight_change:+.2f})\n")
             
             # Получаем статистику по кормлениям
-            feedings = db_session.query(Feeding).filter_by(child_id=child.id).order_by(Feeding.timestamp.desc()).all()
-            if feedings:
-                # Группируем кормления по дням
-                feedings_by_day = {}
-                for feeding in feedings:
-                    day = feeding.timestamp.date()
-                    if day not in feedings_by_day:
-                        feedings_by_day[day] = []
-                    feedings_by_day[day].append(feeding)
-                
-                # Вычисляем среднее количество кормлений в день
-                avg_feedings_per_day = len(feedings) / len(feedings_by_day) if feedings_by_day else 0
-                
-                # Вычисляем среднее количество молока в день
-                total_amount = sum(feeding.amount for feeding in feedings)
-                avg_amount_per_day = total_amount / len(feedings_by_day) if feedings_by_day else 0
+            with profile.section('feedings'):
+                feedings = feeding_totals(db_session, child.id)
+                if feedings['days']:
+                    # Вычисляем среднее количество кормлений и молока в день
+                    avg_feedings_per_day = feedings['count'] / feedings['days']
+                    avg_amount_per_day = feedings['amount'] / feedings['days']
                 
-                context += f"Кормления: в среднем {avg_feedings_per_day:.1f} раз в день.\n"
-                context += f"Среднее количество молока: {avg_amount_per_day:.0f} мл в день.\n\n"
+                    profile.add(f"Кормления в день: {avg_feedings_per_day:.1f} раз, {avg_amount_per_day:.0f} мл\n")
             
             # Получаем статистику по стулу
-            stools = db_session.query(Stool).filter_by(child_id=child.id).order_by(Stool.timestamp.desc()).all()
-            if stools:
-                # Группируем стул по дням
-                stools_by_day = {}
-                for stool in stools:
-                    day = stool.timestamp.date()
-                    if day not in stools_by_day:
-                        stools_by_day[day] = []
-                    stools_by_day[day].append(stool)
+            with profile.section('stools'):
+                stools = stool_totals(db_session, child.id)
+                if stools['days']:
+                    # Вычисляем среднее количество стула в день
+                    avg_stools_per_day = stools['count'] / stools['days']
                 
-                # Вычисляем среднее количество стула в день
-                avg_stools_per_day = len(stools) / len(stools_by_day) if stools_by_day else 0
-                
-                context += f"Стул: в среднем {avg_stools_per_day:.1f} раз в день.\n\n"
+                    profile.add(f"Стул в день: {avg_stools_per_day:.1f} раз\n")
+            
+            # Назначения и последние заметки одним запросом
+            with profile.section('fetch'):
+                recent = fetch_recent(db_session, child.id, {'prescription': None, 'note': 5})
             
             # Получаем активные назначения
-            prescriptions = db_session.query(Prescription).filter(
-                Prescription.child_id == child.id,
-                Prescription.is_active == 1
-            ).order_by(Prescription.start_date.desc()).all()
-            
-            if prescriptions:
-                context += "Активные назначения врачей:\n"
-                for prescription in prescriptions:
-                    if prescription.full_text:
-                        context += f"- {prescription.medication_name}: {prescription.full_text}\n"
-                    else:
-                        end_date_text = f"до {prescription.end_date.strftime('%d.%m.%Y')}" if prescription.end_date else "бессрочно"
-                        context += f"- {prescription.medication_name}, {prescription.dosage}, {prescription.frequency}, с {prescription.start_date.strftime('%d.%m.%Y')} {end_date_text}\n"
-                context += "\n"
-                
+            with profile.section('prescriptions'):
+                profile.add(serialize_prescriptions(recent['prescription'], datetime.now().date()))
+            
             # Получаем заметки о ребенке
-            notes = db_session.query(Note).filter_by(child_id=child.id).order_by(Note.timestamp.desc()).limit(5).all()
-            if notes:
-                context += "Важные заметки о ребенке:\n"
-                for note in notes:
-                    context += f"- {note.title}: {note.content}\n"
-                context += "\n"
+            with profile.section('notes'):
+                profile.add(serialize_notes(recent['note']))
+            
+            context = profile.text()
             
             # Генерируем сводку с помощью OpenAI
             messages = [
@@ -581,6 +624,7 @@ class MedicalAIAssistant:
                 Просто дай прямую оценку состояния ребенка."""},
                 {"role": "user", "content": f"Данные о ребенке:\n\n{context}\n\nСоставь краткую сводку о развитии ребенка."}
             ]
+            profile.finish(messages)
             
             response = openai.ChatCompletion.create(
                 model="gpt-3.5-turbo",
@@ -596,91 +640,170 @@ class MedicalAIAssistant:
             logger.error(f"Ошибка при генерации сводки о развитии: {e}")
             return "Не удалось сгенерировать сводку о развитии ребенка из-за ошибки."
     
-    def generate_feeding_summary(self, db_session) -> str:
+    def _summary_models(self, kind: str) -> tuple:
+        """Таблицы, от данных которых зависит сводка"""
+        from database.models import Feeding, Stool, Weight, Prescription, Note
+        
+        return {
+            'development': (Feeding, Stool, Weight, Prescription, Note),
+            'feeding': (Feeding,),
+            'weight': (Weight,),
+            'stool': (Stool,)
+        }[kind]
+    
+    def get_summary(self, db_session, kind: str, generate: bool = True) -> Optional[Dict]:
         """
-        Генерирует сводку по кормлениям ребенка
+        Возвращает сводку из кэша, если данные не изменились, иначе генерирует ее
         
         Args:
             db_session: Сессия базы данных
+            kind: Тип сводки (development, feeding, weight, stool)
+            generate: Генерировать сводку, если в кэше нет актуальной
             
         Returns:
-            Текстовая сводка по кормлениям
+            Словарь с полями text и generated_at или None, если generate=False и кэш устарел
         """
-        try:
-            from database.models import Child, Feeding
-            
-            child = db_session.query(Child).first()
-            if not child:
-                return "Нет данных о ребенке."
-            
-            # Получаем данные о кормлениях за последнюю неделю
-            week_ago = datetime.now() - timedelta(days=7)
-            feedings = db_session.query(Feeding).filter(
-                Feeding.child_id == child.id,
-                Feeding.timestamp >= week_ago
-            ).order_by(Feeding.timestamp.desc()).all()
-            
-            if not feedings:
-                return "За последнюю неделю нет данных о кормлениях."
-            
-            # Подготавливаем данные для анализа
-            total_amount = sum(f.amount for f in feedings)
-            avg_amount = total_amount / len(feedings)
-            
-            # Группируем по дням
-            feedings_by_day = {}
-            for feeding in feedings:
-                day = feeding.timestamp.date()
-                if day not in feedings_by_day:
-                    feedings_by_day[day] = []
-                feedings_by_day[day].append(feeding)
-            
-            # Анализируем типы питания
-            food_types = {}
-            for feeding in feedings:
-                if feeding.food_type not in food_types:
-                    food_types[feeding.food_type] = 0
-                food_types[feeding.food_type] += feeding.amount
-            
-            # Формируем контекст для AI
-            context = f"""
-            Ребенок: {child.name}, возраст: {(datetime.now().date() - child.birth_date).days // 30} месяцев
-            
-            Данные о кормлениях за последнюю неделю:
-            - Всего кормлений: {len(feedings)}
-            - Общий объем: {total_amount} мл
-            - Средний объем за кормление: {avg_amount:.0f} мл
-            - Среднее количество кормлений в день: {len(feedings) / len(feedings_by_day):.1f}
-            
-            Типы питания:
-            """
-            
-            for food_type, amount in food_types.items():
-                percentage = (amount / total_amount) * 100
-                context += f"- {food_type}: {amount} мл ({percentage:.0f}%)\n"
+        from database.child_profile import child_profiles
+        from database.fingerprint import data_fingerprint
+        
+        child = child_profiles.get(db_session)
+        if not child:
+            return {'text': "Нет данных о ребенке.", 'generated_at': None}
+        
+        fingerprint = data_fingerprint(db_session, child.id, self._summary_models(kind))
+        entry = self.summary_cache.get(child.id, kind, fingerprint)
+        if entry or not generate:
+            return entry
+        
+        text = getattr(self, self.SUMMARY_GENERATORS[kind])(db_session)
+        # Сообщения об ошибках генерации не кэшируем
+        if text.startswith("Не удалось"):
+            return {'text': text, 'generated_at': None}
+        return self.summary_cache.put(child.id, kind, text, fingerprint)
+    
+    def prewarm_summaries(self, db_session, settle_minutes: int = 15) -> int:
+        """
+        Заранее обновляет устаревшие сводки, если данные не менялись settle_minutes минут
+        
+        Сводки, требующие LLM (LLM_SUMMARIES), расходуют дневной бюджет LLM-запросов кэша сводок.
+        
+        Args:
+            db_session: Сессия базы данных
+            settle_minutes: Сколько минут данные должны оставаться неизменными
             
-            # Генерируем сводку с помощью AI
-            messages = [
-                {"role": "system", "content": "Ты - опытный педиатр. Проанализируй данные о кормлениях ребенка и дай краткую сводку с рекомендациями."},
-                {"role": "user", "content": f"Проанализируй данные о кормлениях:\n{context}\n\nДай краткую сводку (3-4 предложения) о режиме питания ребенка."}
-            ]
+        Returns:
+            Количество обновленных сводок
+        """
+        from database.child_profile import child_profiles
+        from database.fingerprint import data_fingerprint, last_change_time
+        
+        child = child_profiles.get(db_session)
+        if not child:
+            return 0
+        
+        generated = 0
+        for kind, method_name in self.SUMMARY_GENERATORS.items():
+            models = self._summary_models(kind)
+            fingerprint = data_fingerprint(db_session, child.id, models)
+            if self.summary_cache.get(child.id, kind, fingerprint):
+                continue
+            
+            # Ждем, пока данные перестанут меняться
+            last_change = last_change_time(db_session, child.id, models)
+            if last_change and datetime.now() - last_change < timedelta(minutes=settle_minutes):
+                continue
+            
+            if kind in self.LLM_SUMMARIES and not self.summary_cache.take_llm_budget():
+                logger.info("Дневной бюджет LLM-запросов для подготовки сводок исчерпан")
+                continue
+            
+            text = getattr(self, method_name)(db_session)
+            if not text.startswith("Не удалось"):
+                self.summary_cache.put(child.id, kind, text, fingerprint)
+                generated += 1
+        
+        return generated
+    
+    def _summary_statistics(self, db_session, kind: str) -> Optional[Dict]:
+        """
+        Загружает данные за период и считает статистику для сводки
+        
+        Args:
+            db_session: Сессия базы данных
+            kind: Тип сводки (feeding, weight, stool)
             
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=300
+        Returns:
+            Словарь с ребенком (child), его возрастом в месяцах (age_months) и статистикой (stats)
+            или None, если ребенок не зарегистрирован
+        """
+        from database.models import Weight
+        from database.child_profile import child_profiles
+        from database.rollups import (
+            feeding_by_day, feeding_by_type, stool_totals, stool_distribution, weight_range
+        )
+        
+        child = child_profiles.get(db_session)
+        if not child:
+            return None
+        
+        age_months = child.age_months_exact
+        # Неделя полных дней плюс сегодняшний, чтобы первый день периода не был обрезан
+        week_ago = datetime.now().date() - timedelta(days=7)
+        result = {'child': child, 'age_months': age_months, 'weight_kg': None}
+        
+        if kind == 'feeding':
+            last_weight = db_session.query(Weight).filter_by(child_id=child.id).order_by(Weight.timestamp.desc()).first()
+            result['weight_kg'] = last_weight.weight if last_weight else None
+            result['stats'] = summary_engine.feeding_statistics(
+                feeding_by_day(db_session, child.id, since=week_ago),
+                feeding_by_type(db_session, child.id, since=week_ago)
             )
+        elif kind == 'weight':
+            recent_since = datetime.now().date() - timedelta(days=summary_engine.WEIGHT_GAIN_WINDOW_DAYS)
+            result['stats'] = summary_engine.weight_statistics(
+                weight_range(db_session, child.id),
+                weight_range(db_session, child.id, since=recent_since)
+            )
+        elif kind == 'stool':
+            result['stats'] = summary_engine.stool_statistics(
+                stool_totals(db_session, child.id, since=week_ago),
+                stool_distribution(db_session, child.id, 'color', since=week_ago),
+                stool_distribution(db_session, child.id, 'consistency', since=week_ago)
+            )
+        else:
+            raise ValueError(f"Неизвестный тип сводки: {kind}")
+        return result
+    
+    def _describe_summary(self, kind: str, data: Dict) -> str:
+        """Текст сводки по статистике, собранный по правилам"""
+        if kind == 'feeding':
+            return summary_engine.describe_feedings(data['stats'], data['age_months'], data['weight_kg'])
+        if kind == 'weight':
+            return summary_engine.describe_weight(data['stats'], data['age_months'])
+        return summary_engine.describe_stool(data['stats'])
+    
+    def generate_feeding_summary(self, db_session) -> str:
+        """
+        Генерирует сводку по кормлениям ребенка (без обращения к LLM)
+        
+        Args:
+            db_session: Сессия базы данных
             
-            return response['choices'][0]['message']['content']
-            
+        Returns:
+            Текстовая сводка по кормлениям
+        """
+        try:
+            data = self._summary_statistics(db_session, 'feeding')
+            if not data:
+                return "Нет данных о ребенке."
+            return self._describe_summary('feeding', data)
         except Exception as e:
             logger.error(f"Ошибка при генерации сводки по кормлениям: {e}")
             return "Не удалось сгенерировать сводку по кормлениям."
     
     def generate_weight_summary(self, db_session) -> str:
         """
-        Генерирует сводку о весе ребенка
+        Генерирует сводку о весе ребенка (без обращения к LLM)
         
         Args:
             db_session: Сессия базы данных
@@ -689,60 +812,17 @@ class MedicalAIAssistant:
             Текстовая сводка о весе
         """
         try:
-            from database.models import Child, Weight
-            
-            child = db_session.query(Child).first()
-            if not child:
+            data = self._summary_statistics(db_session, 'weight')
+            if not data:
                 return "Нет данных о ребенке."
-            
-            # Получаем последние данные о весе
-            weights = db_session.query(Weight).filter_by(child_id=child.id).order_by(Weight.timestamp.desc()).all()
-            if not weights:
-                return "Нет данных о весе ребенка."
-            
-            first_weight = weights[0].weight
-            last_weight = weights[-1].weight
-            weight_change = last_weight - first_weight
-            
-            # Определяем тенденцию изменения веса
-            trend = "стабильный"
-            if weight_change > 0.1:
-                trend = "увеличение"
-            elif weight_change < -0.1:
-                trend = "уменьшение"
-            
-            # Формируем контекст для AI
-            context = f"""
-            Ребенок: {child.name}, возраст: {(datetime.now().date() - child.birth_date).days // 30} месяцев
-            
-            Данные о весе:
-            - Начальный вес: {first_weight} кг
-            - Текущий вес: {last_weight} кг
-            - Изменение веса: {weight_change:.2f} кг ({trend})
-            """
-            
-            # Генерируем сводку с помощью AI
-            messages = [
-                {"role": "system", "content": "Ты - опытный педиатр. Проанализируй данные о весе ребенка и дай краткую сводку."},
-                {"role": "user", "content": f"Проанализируй данные о весе:\n{context}\n\nДай краткую сводку (3-4 предложения) о динамике веса ребенка."}
-            ]
-            
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=300
-            )
-            
-            return response['choices'][0]['message']['content']
-            
+            return self._describe_summary('weight', data)
         except Exception as e:
             logger.error(f"Ошибка при генерации сводки о весе: {e}")
             return "Не удалось сгенерировать сводку о весе."
     
     def generate_stool_summary(self, db_session) -> str:
         """
-        Генерирует сводку о пищеварении ребенка
+        Генерирует сводку о пищеварении ребенка (без обращения к LLM)
         
         Args:
             db_session: Сессия базы данных
@@ -751,92 +831,62 @@ class MedicalAIAssistant:
             Текстовая сводка о пищеварении
         """
         try:
-            from database.models import Child, Stool
-            
-            child = db_session.query(Child).first()
-            if not child:
+            data = self._summary_statistics(db_session, 'stool')
+            if not data:
                 return "Нет данных о ребенке."
+            return self._describe_summary('stool', data)
+        except Exception as e:
+            logger.error(f"Ошибка при генерации сводки о пищеварении: {e}")
+            return "Не удалось сгенерировать сводку о пищеварении."
+    
+    def explain_summary(self, db_session, kind: str) -> str:
+        """
+        Подробное пояснение сводки от AI (по запросу пользователя)
+        
+        Args:
+            db_session: Сессия базы данных
+            kind: Тип сводки (feeding, weight, stool)
             
-            # Получаем данные о стуле за последнюю неделю
-            week_ago = datetime.now() - timedelta(days=7)
-            stools = db_session.query(Stool).filter(
-                Stool.child_id == child.id,
-                Stool.timestamp >= week_ago
-            ).order_by(Stool.timestamp.desc()).all()
-            
-            if not stools:
-                return "За последнюю неделю нет данных о стуле."
-            
-            # Анализируем данные
-            total_stools = len(stools)
-            
-            # Группируем по дням
-            stools_by_day = {}
-            for stool in stools:
-                day = stool.timestamp.date()
-                if day not in stools_by_day:
-                    stools_by_day[day] = []
-                stools_by_day[day].append(stool)
-            
-            avg_per_day = total_stools / len(stools_by_day)
-            
-            # Анализируем цвета и консистенцию
-            colors = {}
-            consistencies = {}
-            
-            for stool in stools:
-                if stool.color:
-                    colors[stool.color] = colors.get(stool.color, 0) + 1
+        Returns:
+            Текст пояснения с рекомендациями
+        """
+        topics = {
+            'feeding': "кормлениях",
+            'weight': "весе",
+            'stool': "стуле"
+        }
+        try:
+            profile = self.prompt_profiler.start(f'{kind}_explain')
+            with profile.section('statistics'):
+                data = self._summary_statistics(db_session, kind)
+                if not data:
+                    return "Нет данных о ребенке."
+                if not data['stats']:
+                    return self._describe_summary(kind, data)
                 
-                # Анализируем описание для определения консистенции
-                desc_lower = stool.description.lower()
-                if 'жидк' in desc_lower:
-                    consistencies['жидкий'] = consistencies.get('жидкий', 0) + 1
-                elif 'тверд' in desc_lower:
-                    consistencies['твердый'] = consistencies.get('твердый', 0) + 1
-                elif 'кашеобразн' in desc_lower:
-                    consistencies['кашеобразный'] = consistencies.get('кашеобразный', 0) + 1
-                else:
-                    consistencies['нормальный'] = consistencies.get('нормальный', 0) + 1
-            
-            # Формируем контекст для AI
-            context = f"""
-            Ребенок: {child.name}, возраст: {(datetime.now().date() - child.birth_date).days // 30} месяцев
-            
-            Данные о стуле за последнюю неделю:
-            - Всего записей: {total_stools}
-            - В среднем в день: {avg_per_day:.1f} раз
-            
-            Цвета стула:
-            """
-            
-            for color, count in colors.items():
-                percentage = (count / total_stools) * 100
-                context += f"- {color}: {count} раз ({percentage:.0f}%)\n"
-            
-            context += "\nКонсистенция:"
-            for consistency, count in consistencies.items():
-                percentage = (count / total_stools) * 100
-                context += f"\n- {consistency}: {count} раз ({percentage:.0f}%)"
+                child = data['child']
+                profile.add(serialize_child(child, f"{data['age_months']:.0f} мес."))
+                profile.add(f"Статистика: {json.dumps(data['stats'], ensure_ascii=False, default=str)}\n")
+                profile.add(f"Сводка: {self._describe_summary(kind, data)}\n")
             
-            # Генерируем сводку с помощью AI
             messages = [
-                {"role": "system", "content": "Ты - опытный педиатр. Проанализируй данные о стуле ребенка и дай краткую оценку состояния пищеварения."},
-                {"role": "user", "content": f"Проанализируй данные о стуле:\n{context}\n\nДай краткую сводку (3-4 предложения) о состоянии пищеварения ребенка."}
+                {"role": "system", "content": "Ты - опытный педиатр. Родители уже видели краткую сводку, собранную по статистике."},
+                {"role": "user", "content": f"Данные о {topics[kind]} ребенка:\n{profile.text()}\nПодробно объясни сводку: что означают эти показатели для ребенка этого возраста, на что обратить внимание и что можно сделать."}
             ]
+            profile.finish(messages)
             
             response = openai.ChatCompletion.create(
                 model="gpt-3.5-turbo",
                 messages=messages,
                 temperature=0.7,
-                max_tokens=300
+                max_tokens=500
             )
             
             return response['choices'][0]['message']['content']
             
         except Exception as e:
-            logger.error(f"Ошибка при генерации сводки о пищеварении: {e}")
-            return "Не удалось сгенерировать сводку о пищеварении."
+            logger.error(f"Ошибка при подготовке пояснения к сводке ({kind}): {e}")
+            return "Не удалось подготовить пояснение. Попробуйте позже."
     
     def generate_prescription_reminders(self, db_session) -> str:
         """
@@ -849,9 +899,10 @@ class MedicalAIAssistant:
             Текст с предложениями по напоминаниям
         """
         try:
-            from database.models import Child, Prescription
+            from database.models import Prescription
+            from database.child_profile import child_profiles
             
-            child = db_session.query(Child).first()
+            child = child_profiles.get(db_session)
             if not child:
                 return "Нет данных о ребенке."
             
@@ -865,7 +916,7 @@ class MedicalAIAssistant:
                 return "Нет активных назначений для создания напоминаний."
             
             # Формируем контекст для AI
-            context = f"Ребенок: {child.name}, возраст: {(datetime.now().date() - child.birth_date).days // 30} месяцев\n\n"
+            context = f"Ребенок: {child.name}, возраст: {child.age_str}\n\n"
             context += "Активные назначения врачей:\n"
             
             for p in prescriptions:
@@ -908,9 +959,24 @@ class MedicalAIAssistant:
             logger.error(f"Ошибка при генерации напоминаний из назначений: {e}")
             return "Не удалось сгенерировать напоминания из назначений."
     
-    def clear_history(self):
-        """Очистить историю разговора"""
-        self.conversation_history = []
+    def clear_history(self, chat_id: Optional[int] = None):
+        """Очистить историю разговора чата (или всех чатов, если chat_id не указан)"""
+        self.conversation_memory.clear(chat_id)
+    
+    def _extraction_completion(self, messages: List[Dict], **params) -> str:
+        """
+        Выполняет короткий запрос извлечения данных через бэкенд извлечения
+        
+        Только для идемпотентных вызовов, которые не пишут ChatHistory.
+        
+        Args:
+            messages: Сообщения для API
+            **params: Параметры ChatCompletion (max_tokens, temperature и т.д.)
+            
+        Returns:
+            Текст ответа модели
+        """
+        return self.extraction_backend.complete(messages, **params)
     
     def parse_feeding(self, text: str) -> dict:
         """
@@ -941,17 +1007,14 @@ class MedicalAIAssistant:
             Верни только JSON без дополнительного текста.
             """
             
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
+            assistant_response = self._extraction_completion(
+                [
                     {"role": "system", "content": "Ты - помощник для распознавания записей о кормлении."},
                     {"role": "user", "content": prompt}
                 ],
                 max_tokens=300,
                 temperature=0.3
             )
-            
-            assistant_response = response['choices'][0]['message']['content']
             feeding_data = self._parse_json_response(assistant_response)
             
             if feeding_data and feeding_data.get('is_feeding', False):
@@ -1006,17 +1069,14 @@ class MedicalAIAssistant:
             Верни только JSON без дополнительного текста.
             """
             
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
+            assistant_response = self._extraction_completion(
+                [
                     {"role": "system", "content": "Ты - помощник для распознавания записей о весе."},
                     {"role": "user", "content": prompt}
                 ],
                 max_tokens=300,
                 temperature=0.3
             )
-            
-            assistant_response = response['choices'][0]['message']['content']
             weight_data = self._parse_json_response(assistant_response)
             
             if weight_data and weight_data.get('is_weight', False):
@@ -1071,17 +1131,14 @@ class MedicalAIAssistant:
             Верни только JSON без дополнительного текста.
             """
             
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
+            assistant_response = self._extraction_completion(
+                [
                     {"role": "system", "content": "Ты - помощник для распознавания записей о стуле ребенка. Отличай реальные записи о стуле от использования слов в переносном смысле."},
                     {"role": "user", "content": prompt}
                 ],
                 max_tokens=300,
                 temperature=0.3
             )
-            
-            assistant_response = response['choices'][0]['message']['content']
             stool_data = self._parse_json_response(assistant_response)
             
             if stool_data and stool_data.get('is_stool', False):
@@ -1146,9 +1203,8 @@ class MedicalAIAssistant:
             """
             
             # Запрос к OpenAI API (старый интерфейс)
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
+            assistant_response = self._extraction_completion(
+                [
                     {"role": "system", "content": "Ты - помощник для распознавания информации о приеме лекарств."},
                     {"role": "user", "content": prompt}
                 ],
@@ -1159,9 +1215,6 @@ class MedicalAIAssistant:
                 presence_penalty=0
             )
             
-            # Получаем ответ
-            assistant_response = response['choices'][0]['message']['content']
-            
             # Извлекаем JSON из ответа
             medication_data = self._extract_json(assistant_response)
             
@@ -1178,6 +1231,100 @@ class MedicalAIAssistant:
             logger.error(f"Ошибка при распознавании лекарства: {e}")
             return None
     
+    def extract_note_title(self, note_text: str) -> Optional[Dict]:
+        """
+        Разделяет текст заметки на заголовок и содержание
+        
+        Args:
+            note_text: Текст заметки
+            
+        Returns:
+            Словарь с полями title и content или None, если разделить не удалось
+        """
+        prompt = f"""Раздели следующий текст на заголовок и содержание заметки:
+
+{note_text}
+
+Верни ответ в формате JSON:
+{{
+  "title": "Заголовок заметки (короткий)",
+  "content": "Содержание заметки (полный текст)"
+}}"""
+        
+        try:
+            result = self._extraction_completion(
+                [
+                    {"role": "system", "content": "Ты - ассистент, который помогает создавать заметки."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                max_tokens=500
+            )
+            note_data = self._extract_json(result)
+            if not note_data or not note_data.get('title'):
+                return None
+            return {
+                'title': note_data['title'],
+                'content': note_data.get('content') or note_text
+            }
+        except Exception as e:
+            logger.error(f"Ошибка при выделении заголовка заметки: {e}")
+            return None
+    
+    def extract_prescription_medications(self, full_text: str) -> List[Dict]:
+        """
+        Извлекает из текста назначения список лекарств с дозировкой и частотой приема
+        
+        Args:
+            full_text: Полный текст назначения врача
+            
+        Returns:
+            Список словарей с полями name, dosage, frequency (пустой, если лекарства не найдены)
+        """
+        prompt = f"""Проанализируй следующее медицинское назначение и определи все лекарства/препараты с их дозировками и частотой приема:
+
+{full_text}
+
+Верни ответ в формате JSON:
+[
+  {{
+    "name": "Название лекарства",
+    "dosage": "Дозировка",
+    "frequency": "Частота приема (например: '2 раза в день', 'утром и вечером')"
+  }}
+]
+
+Включи все лекарства, которые упоминаются в тексте."""
+        
+        try:
+            result = self._extraction_completion(
+                [
+                    {"role": "system", "content": "Ты - медицинский ассистент, который анализирует назначения врачей."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                max_tokens=500
+            )
+            
+            # Находим начало и конец JSON-массива
+            start_idx = result.find('[')
+            end_idx = result.rfind(']') + 1
+            if start_idx < 0 or end_idx <= start_idx:
+                return []
+            
+            medications = []
+            for med in json.loads(result[start_idx:end_idx]):
+                if isinstance(med, dict) and med.get('name'):
+                    medications.append({
+                        'name': med['name'],
+                        'dosage': med.get('dosage') or "См. полный текст",
+                        'frequency': med.get('frequency') or "ежедневно"
+                    })
+            return medications
+        except Exception as e:
+            logger.error(f"Ошибка при извлечении лекарств из назначения: {e}")
+            return []
+    
     def parse_prescription_reminders_request(self, text: str) -> bool:
         """
         Определяет, является ли текст запросом на создание напоминаний из назначений
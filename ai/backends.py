@@ -0,0 +1,144 @@
+"""
+Бэкенды для коротких запросов извлечения и классификации
+
+По умолчанию запросы идут в OpenAI API. При EXTRACTION_BACKEND = 'local' используется
+локальная квантованная модель через llama.cpp (пакет llama-cpp-python), загруженная
+один раз на весь процесс. Консультации всегда выполняются через OpenAI.
+"""
+import logging
+import queue
+from abc import ABC, abstractmethod
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+import openai
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (
+    EXTRACTION_BACKEND, LOCAL_MODEL_PATH, LOCAL_MODEL_THREADS,
+    LOCAL_MODEL_CONTEXT, LOCAL_MODEL_MAX_BATCH
+)
+from .hedging import extraction_hedger
+
+logger = logging.getLogger(__name__)
+
+class CompletionBackend(ABC):
+    """Базовый класс бэкенда: принимает сообщения в формате ChatCompletion, возвращает текст ответа"""
+
+    name = 'base'
+
+    @abstractmethod
+    def complete(self, messages: List[Dict], **params) -> str:
+        """Выполняет запрос и возвращает текст ответа"""
+
+class OpenAIBackend(CompletionBackend):
+    """Запросы к OpenAI API с хеджированием (только идемпотентные вызовы)"""
+
+    name = 'openai'
+
+    def __init__(self, model: str = "gpt-3.5-turbo", hedger=extraction_hedger):
+        self.model = model
+        self.hedger = hedger
+
+    def complete(self, messages: List[Dict], **params) -> str:
+        response = self.hedger.call(
+            lambda: openai.ChatCompletion.create(model=self.model, messages=messages, **params)
+        )
+        return response['choices'][0]['message']['content']
+
+class LocalLlamaBackend(CompletionBackend):
+    """
+    Локальная модель llama.cpp, работающая на CPU
+
+    Модель загружается один раз и обслуживается одним рабочим потоком
+    (llama.cpp не допускает параллельных вызовов одной модели). Поток забирает
+    из очереди до max_batch накопившихся запросов и выполняет их подряд,
+    сгруппировав по системному промпту, чтобы общий префикс брался из кэша.
+    При ошибке локальной модели запрос передается резервному бэкенду.
+    """
+
+    name = 'local'
+
+    # Параметры ChatCompletion, которые понимает llama.cpp
+    SUPPORTED_PARAMS = ('max_tokens', 'temperature', 'top_p', 'frequency_penalty', 'presence_penalty')
+
+    def __init__(self, model_path: str, n_threads: Optional[int] = None, n_ctx: int = 2048,
+                 max_batch: int = 4, fallback: Optional[CompletionBackend] = None):
+        from llama_cpp import Llama, LlamaRAMCache
+
+        self.model_path = model_path
+        self.max_batch = max_batch
+        self.fallback = fallback
+        self._model = Llama(model_path=model_path, n_ctx=n_ctx, n_threads=n_threads, verbose=False)
+        self._model.set_cache(LlamaRAMCache())
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name='local-llm', daemon=True)
+        self._worker.start()
+        logger.info(f"Локальная модель извлечения загружена: {model_path}")
+
+    def _run(self):
+        """Рабочий поток: обрабатывает запросы пачками"""
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Запросы с одинаковым системным промптом идут подряд и переиспользуют его префикс
+            batch.sort(key=lambda item: item[0][0]['content'] if item[0] else '')
+            for messages, params, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    response = self._model.create_chat_completion(messages=messages, **params)
+                    future.set_result(response['choices'][0]['message']['content'])
+                except Exception as e:
+                    future.set_exception(e)
+
+    def complete(self, messages: List[Dict], **params) -> str:
+        future = Future()
+        local_params = {key: value for key, value in params.items() if key in self.SUPPORTED_PARAMS}
+        self._queue.put((messages, local_params, future))
+        try:
+            return future.result()
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            logger.error(f"Ошибка локальной модели, запрос передан в {self.fallback.name}: {e}")
+            return self.fallback.complete(messages, **params)
+
+_extraction_backend: Optional[CompletionBackend] = None
+_backend_lock = threading.Lock()
+
+def get_extraction_backend() -> CompletionBackend:
+    """
+    Возвращает общий для процесса бэкенд извлечения согласно EXTRACTION_BACKEND
+
+    Если локальная модель недоступна (нет llama-cpp-python или файла модели),
+    используется OpenAI.
+    """
+    global _extraction_backend
+    with _backend_lock:
+        if _extraction_backend is not None:
+            return _extraction_backend
+
+        remote = OpenAIBackend()
+        _extraction_backend = remote
+        if EXTRACTION_BACKEND == 'local':
+            try:
+                _extraction_backend = LocalLlamaBackend(
+                    LOCAL_MODEL_PATH,
+                    n_threads=LOCAL_MODEL_THREADS,
+                    n_ctx=LOCAL_MODEL_CONTEXT,
+                    max_batch=LOCAL_MODEL_MAX_BATCH,
+                    fallback=remote
+                )
+            except ImportError:
+                logger.warning("Пакет llama-cpp-python не установлен, извлечение данных выполняется через OpenAI")
+            except Exception as e:
+                logger.error(f"Не удалось загрузить локальную модель {LOCAL_MODEL_PATH}: {e}")
+        return _extraction_backend
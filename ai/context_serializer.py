@@ -0,0 +1,171 @@
+"""
+Компактное представление данных о ребенке для промптов
+
+Записи выводятся плотными строками, сгруппированными по дням, с относительными
+датами (сегодня, вчера) и временем без повторения даты; для каждого дня
+добавляется итог. Одна строка с текущей датой в начале контекста позволяет
+модели восстановить абсолютные даты.
+"""
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Iterable, List, Optional
+
+from .food_types import food_type_key
+
+# Короткие обозначения типов питания (ключи ai.food_types.FOOD_TYPE_LABELS)
+FOOD_TYPE_CODES = {
+    'breast_milk': 'г',
+    'formula': 'с',
+    'food': 'п'
+}
+
+REPEAT_TYPE_NAMES = {
+    'once': 'однократно',
+    'daily': 'ежедн.',
+    'weekly': 'еженед.',
+    'monthly': 'ежемес.'
+}
+
+def format_day(day: date, today: date) -> str:
+    """Относительная дата: сегодня, вчера, позавчера, иначе ДД.ММ (с годом, если он другой)"""
+    delta = (today - day).days
+    if delta == 0:
+        return "сегодня"
+    if delta == 1:
+        return "вчера"
+    if delta == 2:
+        return "позавчера"
+    if day.year != today.year:
+        return day.strftime('%d.%m.%Y')
+    return day.strftime('%d.%m')
+
+def food_type_code(value: Optional[str]) -> str:
+    """Короткое обозначение типа питания (английский ключ или русское название из базы)"""
+    key = food_type_key(value)
+    if key is None:
+        return ''
+    return FOOD_TYPE_CODES.get(key, key)
+
+def format_amount(value: float) -> str:
+    """Число без лишнего .0"""
+    return f"{value:g}"
+
+def _group_by_day(records: Iterable, today: date) -> "OrderedDict[str, List]":
+    """Группирует записи по дням в хронологическом порядке"""
+    groups = OrderedDict()
+    for record in sorted(records, key=lambda r: r.timestamp):
+        groups.setdefault(format_day(record.timestamp.date(), today), []).append(record)
+    return groups
+
+def serialize_header(now: Optional[datetime] = None) -> str:
+    """Строка с текущей датой и временем, относительно которых указаны даты"""
+    now = now or datetime.now()
+    return f"Сейчас: {now.strftime('%d.%m.%Y %H:%M')}\n"
+
+def serialize_child(child, age_str: str) -> str:
+    """Информация о ребенке одной строкой"""
+    return f"Ребенок: {child.name}, {age_str}, {child.gender}\n"
+
+def serialize_weights(weights: Iterable, today: date) -> str:
+    """Вес в виде ряда значений: дата вес → дата вес"""
+    weights = sorted(weights, key=lambda w: w.timestamp)
+    if not weights:
+        return ""
+    points = [f"{format_day(w.timestamp.date(), today)} {format_amount(w.weight)}" for w in weights]
+    return "Вес, кг: " + " → ".join(points) + "\n"
+
+def serialize_feedings(feedings: Iterable, today: date, detail_days: int = 1) -> str:
+    """
+    Кормления по дням с итогом дня
+
+    Последние detail_days дней с записями выводятся подробно (время, объем, тип),
+    более ранние - только итогом: количество кормлений и объем по типам.
+    """
+    groups = _group_by_day(feedings, today)
+    if not groups:
+        return ""
+    lines = ["Кормления (время объем_мл+тип; г=грудное, с=смесь, п=прикорм):"]
+    detailed = list(groups)[-detail_days:]
+    for day, records in groups.items():
+        total = sum(r.amount or 0 for r in records)
+        if day not in detailed:
+            by_type = OrderedDict()
+            for r in records:
+                code = food_type_code(r.food_type)
+                by_type[code] = by_type.get(code, 0) + (r.amount or 0)
+            types = " ".join(f"{format_amount(amount)}{code}" for code, amount in by_type.items())
+            lines.append(f"{day}: {len(records)} корм., {format_amount(total)} мл ({types})")
+            continue
+        items = ", ".join(
+            f"{r.timestamp.strftime('%H:%M')} {format_amount(r.amount)}{food_type_code(r.food_type)}"
+            for r in records
+        )
+        suffix = f" [{len(records)} корм., {format_amount(total)} мл]" if len(records) > 1 else ""
+        lines.append(f"{day}: {items}{suffix}")
+    return "\n".join(lines) + "\n"
+
+def serialize_stools(stools: Iterable, today: date) -> str:
+    """Стул по дням: время, описание и цвет"""
+    groups = _group_by_day(stools, today)
+    if not groups:
+        return ""
+    lines = ["Стул:"]
+    for day, records in groups.items():
+        items = ", ".join(
+            f"{r.timestamp.strftime('%H:%M')} {r.description}" + (f"/{r.color}" if r.color else "")
+            for r in records
+        )
+        lines.append(f"{day}: {items}")
+    return "\n".join(lines) + "\n"
+
+def serialize_medications(medications: Iterable, today: date) -> str:
+    """Прием лекарств по дням: время, название и дозировка"""
+    groups = _group_by_day(medications, today)
+    if not groups:
+        return ""
+    lines = ["Лекарства:"]
+    for day, records in groups.items():
+        items = ", ".join(
+            f"{r.timestamp.strftime('%H:%M')} {r.medication_name}" + (f" {r.dosage}" if r.dosage else "")
+            for r in records
+        )
+        lines.append(f"{day}: {items}")
+    return "\n".join(lines) + "\n"
+
+def serialize_prescriptions(prescriptions: Iterable, today: date) -> str:
+    """Активные назначения: полный текст или название, дозировка, частота и период"""
+    lines = []
+    for p in prescriptions:
+        if p.full_text:
+            lines.append(f"- {p.medication_name}: {p.full_text}")
+            continue
+        period = f"с {format_day(p.start_date, today)}"
+        period += f" до {format_day(p.end_date, today)}" if p.end_date else ", бессрочно"
+        lines.append(f"- {p.medication_name}; {p.dosage}; {p.frequency}; {period}")
+    if not lines:
+        return ""
+    return "Назначения врачей:\n" + "\n".join(lines) + "\n"
+
+def serialize_notes(notes: Iterable) -> str:
+    """Заметки: заголовок и текст"""
+    lines = [f"- {note.title}: {note.content}" for note in notes]
+    if not lines:
+        return ""
+    return "Заметки:\n" + "\n".join(lines) + "\n"
+
+def serialize_chat_history(chats: Iterable) -> str:
+    """Предыдущие вопросы и ответы в хронологическом порядке"""
+    lines = [f"В: {chat.user_message}\nО: {chat.assistant_response}" for chat in chats]
+    if not lines:
+        return ""
+    return "Прошлые диалоги:\n" + "\n".join(lines) + "\n"
+
+def serialize_reminders(reminders: Iterable) -> str:
+    """Активные напоминания одной строкой"""
+    items = [
+        f"{r.reminder_time.strftime('%H:%M')} {r.description} ({REPEAT_TYPE_NAMES.get(r.repeat_type, r.repeat_type)})"
+        for r in reminders
+    ]
+    if not items:
+        return ""
+    return "Напоминания: " + "; ".join(items) + "\n"
@@ -0,0 +1,86 @@
+"""
+Память диалогов с AI отдельно для каждого чата
+"""
+import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+class ConversationMemory:
+    """
+    Хранит последние сообщения диалога для каждого чата.
+
+    Для каждого чата ведется кольцевой буфер из max_messages сообщений.
+    Чаты упорядочены по времени последнего обращения: при превышении max_chats
+    вытесняется самый давний, а чаты без активности дольше idle_hours удаляются
+    при вызове evict_idle. Благодаря этому объем памяти не растет со временем.
+    """
+
+    def __init__(self, max_messages: int = 10, max_chats: int = 200, idle_hours: float = 6):
+        self.max_messages = max_messages
+        self.max_chats = max_chats
+        self.idle = timedelta(hours=idle_hours)
+        self._chats: "OrderedDict[int, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chat_id: int) -> List[Dict]:
+        """Возвращает сообщения диалога чата в формате ChatCompletion"""
+        with self._lock:
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                return []
+            return list(chat['messages'])
+
+    def add_turn(self, chat_id: int, user_text: str, assistant_text: str):
+        """Добавляет в историю чата вопрос пользователя и ответ ассистента"""
+        with self._lock:
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                chat = {'messages': deque(maxlen=self.max_messages), 'last_used': None}
+                self._chats[chat_id] = chat
+            chat['messages'].append({"role": "user", "content": user_text})
+            chat['messages'].append({"role": "assistant", "content": assistant_text})
+            chat['last_used'] = datetime.now()
+            self._chats.move_to_end(chat_id)
+
+            while len(self._chats) > self.max_chats:
+                evicted_id, _ = self._chats.popitem(last=False)
+                logger.debug(f"История диалога чата {evicted_id} вытеснена из памяти")
+
+    def clear(self, chat_id: int = None):
+        """Очищает историю чата (или всех чатов, если chat_id не указан)"""
+        with self._lock:
+            if chat_id is None:
+                self._chats.clear()
+            else:
+                self._chats.pop(chat_id, None)
+
+    def evict_idle(self) -> int:
+        """
+        Удаляет историю чатов, неактивных дольше idle_hours
+
+        Returns:
+            Количество удаленных чатов
+        """
+        threshold = datetime.now() - self.idle
+        evicted = 0
+        with self._lock:
+            # Чаты упорядочены по последнему обращению, поэтому неактивные находятся в начале
+            while self._chats:
+                chat_id, chat = next(iter(self._chats.items()))
+                if chat['last_used'] and chat['last_used'] >= threshold:
+                    break
+                del self._chats[chat_id]
+                evicted += 1
+        return evicted
+
+    def get_stats(self) -> Dict:
+        """Количество чатов и сообщений в памяти"""
+        with self._lock:
+            return {
+                'chats': len(self._chats),
+                'messages': sum(len(chat['messages']) for chat in self._chats.values())
+            }
@@ -0,0 +1,157 @@
+"""
+Справочные нормы кормления детей первого года жизни по возрасту и весу
+
+Таблицы рассчитаны заранее, значения между опорными точками получаются
+линейной интерполяцией, поэтому ответ не требует обращения к LLM.
+"""
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Опорные точки по возрасту (месяцы): количество кормлений в сутки и объем одного кормления (мл)
+# (возраст, кормлений мин, кормлений макс, объем мин, объем макс)
+FEEDING_TABLE = (
+    (0.0, 8, 10, 30, 60),
+    (0.5, 8, 9, 60, 90),
+    (1.0, 7, 8, 90, 120),
+    (2.0, 6, 7, 120, 150),
+    (3.0, 6, 7, 150, 180),
+    (4.0, 5, 6, 180, 210),
+    (6.0, 5, 5, 200, 220),
+    (9.0, 4, 5, 200, 240),
+    (12.0, 4, 4, 200, 240),
+)
+
+# Обычный диапазон веса по возрасту (кг), без учета пола
+# (возраст, нижняя граница, верхняя граница)
+WEIGHT_BANDS = (
+    (0.0, 2.5, 4.4),
+    (1.0, 3.4, 5.8),
+    (2.0, 4.3, 7.1),
+    (3.0, 5.0, 8.0),
+    (4.0, 5.6, 8.7),
+    (6.0, 6.4, 9.8),
+    (9.0, 7.1, 11.0),
+    (12.0, 7.7, 12.0),
+)
+
+# Объемный метод: доля массы тела, которую ребенок съедает за сутки
+# (возраст до, доля)
+DAILY_VOLUME_FRACTIONS = (
+    (2.0, 1 / 5),
+    (4.0, 1 / 6),
+    (6.0, 1 / 7),
+    (12.0, 1 / 8),
+)
+
+# Суточный объем не должен превышать этого значения (мл)
+MAX_DAILY_VOLUME = 1000
+
+AGE_ADVICE = (
+    (0.0, "Кормление по требованию, ночные кормления сохраняются."),
+    (2.0, "Режим постепенно становится регулярнее, интервал между кормлениями около 3 часов."),
+    (4.0, "Интервал между кормлениями 3,5–4 часа, ночной перерыв удлиняется."),
+    (6.0, "Время вводить прикорм: овощное пюре или каша, начиная с 1 чайной ложки."),
+    (9.0, "Прикорм заменяет 2–3 кормления, пища становится более густой и кусочковой."),
+    (12.0, "Ребенок переходит на общий стол, молоко или смесь остаются 1–2 раза в день."),
+)
+
+_FEEDING_AGES = [row[0] for row in FEEDING_TABLE]
+_WEIGHT_AGES = [row[0] for row in WEIGHT_BANDS]
+_ADVICE_AGES = [row[0] for row in AGE_ADVICE]
+
+def _interpolate(ages: Sequence[float], rows: Sequence[tuple], age: float) -> Tuple[float, ...]:
+    """Линейная интерполяция значений таблицы для заданного возраста"""
+    if age <= ages[0]:
+        return rows[0][1:]
+    if age >= ages[-1]:
+        return rows[-1][1:]
+
+    index = bisect_right(ages, age)
+    left, right = rows[index - 1], rows[index]
+    ratio = (age - left[0]) / (right[0] - left[0])
+    return tuple(a + (b - a) * ratio for a, b in zip(left[1:], right[1:]))
+
+def daily_volume_by_weight(age_months: float, weight_kg: float) -> int:
+    """
+    Суточный объем питания по объемному методу
+
+    Args:
+        age_months: Возраст в месяцах
+        weight_kg: Вес в килограммах
+
+    Returns:
+        Объем в мл
+    """
+    fraction = DAILY_VOLUME_FRACTIONS[-1][1]
+    for age_limit, value in DAILY_VOLUME_FRACTIONS:
+        if age_months < age_limit:
+            fraction = value
+            break
+    return int(min(MAX_DAILY_VOLUME, weight_kg * 1000 * fraction))
+
+def feeding_norms(age_months: float, weight_kg: Optional[float] = None) -> Dict:
+    """
+    Возвращает нормы кормления для возраста и веса
+
+    Args:
+        age_months: Возраст в месяцах (может быть дробным)
+        weight_kg: Вес в килограммах, если известен
+
+    Returns:
+        Словарь с нормами и списком исключений (exceptions), которые стоит пояснить отдельно
+    """
+    feedings_min, feedings_max, volume_min, volume_max = _interpolate(_FEEDING_AGES, FEEDING_TABLE, age_months)
+    norms = {
+        'age_months': age_months,
+        'feedings_per_day': (round(feedings_min), round(feedings_max)),
+        'volume_per_feeding': (int(round(volume_min, -1)), int(round(volume_max, -1))),
+        'advice': AGE_ADVICE[max(0, bisect_right(_ADVICE_AGES, age_months) - 1)][1],
+        'weight_kg': weight_kg,
+        'weight_band': None,
+        'daily_volume': None,
+        'exceptions': []
+    }
+
+    if age_months > FEEDING_TABLE[-1][0]:
+        norms['exceptions'].append(
+            f"возраст {age_months:g} мес. старше справочной таблицы (до {FEEDING_TABLE[-1][0]:g} мес.)"
+        )
+
+    if weight_kg:
+        weight_low, weight_high = _interpolate(_WEIGHT_AGES, WEIGHT_BANDS, age_months)
+        norms['weight_band'] = (round(weight_low, 1), round(weight_high, 1))
+        norms['daily_volume'] = daily_volume_by_weight(age_months, weight_kg)
+        if weight_kg < weight_low:
+            norms['exceptions'].append(
+                f"вес {weight_kg} кг ниже обычного диапазона для возраста ({weight_low:.1f}–{weight_high:.1f} кг)"
+            )
+        elif weight_kg > weight_high:
+            norms['exceptions'].append(
+                f"вес {weight_kg} кг выше обычного диапазона для возраста ({weight_low:.1f}–{weight_high:.1f} кг)"
+            )
+
+    return norms
+
+def feeding_norms_many(ages: Sequence[float], weights: Optional[Sequence[Optional[float]]] = None) -> List[Dict]:
+    """Нормы кормления для нескольких возрастов (например, для построения графика)"""
+    weights = weights or [None] * len(ages)
+    return [feeding_norms(age, weight) for age, weight in zip(ages, weights)]
+
+def format_feeding_norms(norms: Dict) -> str:
+    """Форматирует нормы кормления в текст для пользователя"""
+    feedings_min, feedings_max = norms['feedings_per_day']
+    volume_min, volume_max = norms['volume_per_feeding']
+    feedings = f"{feedings_min}" if feedings_min == feedings_max else f"{feedings_min}–{feedings_max}"
+
+    lines = [
+        f"🍼 Рекомендации по кормлению (возраст {norms['age_months']:g} мес.)",
+        "",
+        f"1. Кормлений в день: {feedings}",
+        f"2. Объем одного кормления: {volume_min}–{volume_max} мл"
+    ]
+    if norms['daily_volume']:
+        lines.append(f"   Суточный объем по весу {norms['weight_kg']} кг: около {norms['daily_volume']} мл")
+    lines.append(f"3. {norms['advice']}")
+    lines.append("")
+    lines.append("Это усредненные нормы, при грудном вскармливании ориентируйтесь на ребенка.")
+    return "\n".join(lines)
@@ -0,0 +1,58 @@
+"""
+Типы питания в записях о кормлении
+
+Кормления, распознанные из текста, сохраняются с английскими ключами
+(breast_milk, formula, food), а записанные кнопками - с русскими названиями
+("Грудное молоко", "Смесь", "Прикорм"). Для вывода пользователю и в промпты
+оба варианта приводятся к одному типу.
+"""
+from typing import Dict, Optional
+
+# Тип питания -> название для пользователя
+FOOD_TYPE_LABELS = {
+    'breast_milk': 'грудное молоко',
+    'formula': 'смесь',
+    'food': 'прикорм',
+}
+
+# Другие значения в базе -> тип питания
+FOOD_TYPE_ALIASES = {
+    'breast': 'breast_milk',
+    'грудное молоко': 'breast_milk',
+    'грудное': 'breast_milk',
+    'смесь': 'formula',
+    'solid': 'food',
+    'прикорм': 'food',
+}
+
+# Название для записей без типа питания
+UNKNOWN_FOOD_TYPE_LABEL = 'тип не указан'
+
+def food_type_key(value: Optional[str]) -> Optional[str]:
+    """
+    Тип питания по значению из базы
+
+    Returns:
+        Ключ FOOD_TYPE_LABELS, исходное значение для неизвестного типа или None, если тип не указан
+    """
+    if value is None or not value.strip():
+        return None
+    normalized = value.strip().lower()
+    if normalized in FOOD_TYPE_LABELS:
+        return normalized
+    return FOOD_TYPE_ALIASES.get(normalized, value.strip())
+
+def food_type_label(value: Optional[str]) -> str:
+    """Название типа питания для пользователя"""
+    key = food_type_key(value)
+    if key is None:
+        return UNKNOWN_FOOD_TYPE_LABEL
+    return FOOD_TYPE_LABELS.get(key, key)
+
+def merge_food_types(amounts: Dict[Optional[str], float]) -> Dict[str, float]:
+    """Объем по типам питания с объединенными вариантами одного типа (ключи - названия)"""
+    merged: Dict[str, float] = {}
+    for value, amount in amounts.items():
+        label = food_type_label(value)
+        merged[label] = merged.get(label, 0) + (amount or 0)
+    return merged
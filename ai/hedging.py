@@ -0,0 +1,138 @@
+"""
+Хеджирование запросов к LLM для коротких идемпотентных вызовов извлечения данных
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Optional
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (
+    LLM_HEDGING_ENABLED, LLM_HEDGE_PERCENTILE, LLM_HEDGE_BUDGET,
+    LLM_HEDGE_DEFAULT_DEADLINE, LLM_HEDGE_MIN_SAMPLES
+)
+
+logger = logging.getLogger(__name__)
+
+class HedgedRequester:
+    """
+    Выполняет запрос и, если он не ответил к дедлайну (перцентиль наблюдаемых задержек),
+    отправляет дублирующий запрос. Используется ответ, пришедший первым.
+
+    Применять только к идемпотентным вызовам извлечения (parse_feeding, parse_weight и т.п.).
+    Консультации, которые записывают ChatHistory, через хеджирование не проходят.
+    """
+
+    def __init__(self, enabled: bool = False, percentile: float = 95, budget: float = 0.1,
+                 default_deadline: float = 2.5, min_samples: int = 20,
+                 window_size: int = 200, max_workers: int = 8):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.budget = budget
+        self.default_deadline = default_deadline
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm-hedge')
+        self.stats = {
+            'requests': 0,
+            'hedges_fired': 0,
+            'hedges_won': 0,
+            'hedges_denied_by_budget': 0,
+            'errors': 0
+        }
+
+    def deadline(self) -> float:
+        """Текущий дедлайн в секундах, после которого отправляется дублирующий запрос"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.default_deadline
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return ordered[index]
+
+    def _record_latency(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def _take_budget(self) -> bool:
+        """Проверяет, не превышена ли доля хеджированных запросов"""
+        with self._lock:
+            if self.stats['hedges_fired'] >= max(1, self.budget * self.stats['requests']):
+                self.stats['hedges_denied_by_budget'] += 1
+                return False
+            self.stats['hedges_fired'] += 1
+            return True
+
+    def _timed(self, fn: Callable):
+        started = time.monotonic()
+        result = fn()
+        self._record_latency(time.monotonic() - started)
+        return result
+
+    def call(self, fn: Callable):
+        """
+        Выполняет вызов с хеджированием
+
+        Args:
+            fn: Функция без аргументов, выполняющая запрос к LLM
+
+        Returns:
+            Результат первого успешно завершившегося запроса
+        """
+        if not self.enabled:
+            return fn()
+
+        with self._lock:
+            self.stats['requests'] += 1
+
+        primary = self._executor.submit(self._timed, fn)
+        done, _ = wait([primary], timeout=self.deadline())
+        if done or not self._take_budget():
+            return primary.result()
+
+        logger.debug("Запрос извлечения не ответил к дедлайну, отправляем дублирующий запрос")
+        hedge = self._executor.submit(self._timed, fn)
+        pending = {primary, hedge}
+        last_error: Optional[BaseException] = None
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    last_error = future.exception()
+                    continue
+                if future is hedge:
+                    with self._lock:
+                        self.stats['hedges_won'] += 1
+                logger.info(
+                    f"Дублирующий запрос {'выиграл' if future is hedge else 'проиграл'}; "
+                    f"хеджей: {self.stats['hedges_fired']}, побед: {self.stats['hedges_won']}"
+                )
+                return future.result()
+
+        with self._lock:
+            self.stats['errors'] += 1
+        raise last_error
+
+    def get_stats(self) -> Dict:
+        """Метрики хеджирования: сколько раз хедж срабатывал и выигрывал"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['deadline'] = round(self.deadline(), 3)
+        stats['hedge_rate'] = stats['hedges_fired'] / stats['requests'] if stats['requests'] else 0
+        stats['hedge_win_rate'] = stats['hedges_won'] / stats['hedges_fired'] if stats['hedges_fired'] else 0
+        return stats
+
+# Общий экземпляр для всех вызовов извлечения, чтобы статистика и бюджет были едиными
+extraction_hedger = HedgedRequester(
+    enabled=LLM_HEDGING_ENABLED,
+    percentile=LLM_HEDGE_PERCENTILE,
+    budget=LLM_HEDGE_BUDGET,
+    default_deadline=LLM_HEDGE_DEFAULT_DEADLINE,
+    min_samples=LLM_HEDGE_MIN_SAMPLES
+)
@@ -0,0 +1,207 @@
+"""
+Профилирование сборки промптов: токены и время построения по секциям контекста
+"""
+import json
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # пакет не установлен или словарь недоступен
+    _encoding = None
+
+# Границы корзин гистограмм
+TOKEN_BUCKETS = (25, 50, 100, 200, 400, 800, 1600, 3200)
+MS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250)
+
+_CYRILLIC = re.compile(r'[а-яё]', re.IGNORECASE)
+
+def count_tokens(text: str) -> int:
+    """
+    Количество токенов в тексте
+
+    Если установлен tiktoken, считает точно (cl100k_base), иначе оценивает:
+    кириллица занимает примерно 1 токен на 2.5 символа, латиница и цифры - на 4.
+    """
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    cyrillic = len(_CYRILLIC.findall(text))
+    return int(round(cyrillic / 2.5 + (len(text) - cyrillic) / 4))
+
+def _bucket_label(value: float, buckets: tuple) -> str:
+    for bound in buckets:
+        if value <= bound:
+            return f"<={bound}"
+    return f">{buckets[-1]}"
+
+class _Section:
+    """Накопленный текст одной секции при сборке промпта"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.parts: List[str] = []
+
+    def add(self, text: str):
+        self.parts.append(text)
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+class PromptAssembly:
+    """
+    Сборка одного промпта.
+
+    Текст секций добавляется через add() внутри блока section(name);
+    время блока считается временем построения секции (включая запросы к БД).
+    """
+
+    def __init__(self, profiler: "PromptProfiler", prompt_name: str):
+        self.profiler = profiler
+        self.prompt_name = prompt_name
+        self._sections: List[_Section] = []
+        self._current: Optional[_Section] = None
+        self._measurements: Dict[str, Dict] = {}
+
+    @contextmanager
+    def section(self, name: str):
+        """Блок построения секции контекста"""
+        section = _Section(name)
+        previous, self._current = self._current, section
+        started = time.perf_counter()
+        try:
+            yield section
+        finally:
+            self._current = previous
+            self._sections.append(section)
+            self.record(name, section.text, time.perf_counter() - started)
+
+    def add(self, text: str):
+        """Добавляет текст в текущую секцию"""
+        if self._current is None:
+            raise RuntimeError("add() вызывается только внутри section()")
+        self._current.add(text)
+
+    def text(self) -> str:
+        """Собранный текст всех секций в порядке построения"""
+        return "".join(section.text for section in self._sections)
+
+    def record(self, name: str, text: str, seconds: float = 0.0):
+        """Учитывает секцию, построенную вне блока section() (системный промпт, история и т.п.)"""
+        measurement = self._measurements.setdefault(name, {'tokens': 0, 'seconds': 0.0})
+        measurement['tokens'] += count_tokens(text)
+        measurement['seconds'] += seconds
+
+    def finish(self, messages: Optional[List[Dict]] = None):
+        """
+        Завершает сборку и передает замеры в профилировщик
+
+        Args:
+            messages: Итоговые сообщения для API; токены, не отнесенные ни к одной
+                секции (инструкции, заголовки), учитываются как секция instructions
+        """
+        if messages is not None:
+            total = sum(count_tokens(message['content']) for message in messages)
+            accounted = sum(m['tokens'] for m in self._measurements.values())
+            self.record('instructions', '')
+            self._measurements['instructions']['tokens'] += max(0, total - accounted)
+        self.profiler.add(self.prompt_name, self._measurements)
+
+class PromptProfiler:
+    """Агрегирует замеры секций промптов в счетчики и гистограммы"""
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, Dict]] = {}
+        self._lock = threading.Lock()
+
+    def start(self, prompt_name: str) -> PromptAssembly:
+        """Начинает сборку промпта с указанным именем (consult, feeding_summary и т.д.)"""
+        return PromptAssembly(self, prompt_name)
+
+    def add(self, prompt_name: str, measurements: Dict[str, Dict]):
+        with self._lock:
+            prompt_stats = self._stats.setdefault(prompt_name, {})
+            for name, measurement in measurements.items():
+                ms = measurement['seconds'] * 1000
+                tokens = measurement['tokens']
+                stats = prompt_stats.setdefault(name, {
+                    'count': 0,
+                    'tokens_total': 0,
+                    'tokens_max': 0,
+                    'ms_total': 0.0,
+                    'ms_max': 0.0,
+                    'token_histogram': {},
+                    'ms_histogram': {}
+                })
+                stats['count'] += 1
+                stats['tokens_total'] += tokens
+                stats['tokens_max'] = max(stats['tokens_max'], tokens)
+                stats['ms_total'] += ms
+                stats['ms_max'] = max(stats['ms_max'], ms)
+                token_label = _bucket_label(tokens, TOKEN_BUCKETS)
+                ms_label = _bucket_label(ms, MS_BUCKETS)
+                stats['token_histogram'][token_label] = stats['token_histogram'].get(token_label, 0) + 1
+                stats['ms_histogram'][ms_label] = stats['ms_histogram'].get(ms_label, 0) + 1
+
+    def export(self) -> Dict:
+        """
+        Возвращает агрегированные замеры
+
+        Returns:
+            Словарь prompt -> section -> статистика (средние, максимумы, доля токенов промпта, гистограммы)
+        """
+        with self._lock:
+            snapshot = json.loads(json.dumps(self._stats))
+
+        for sections in snapshot.values():
+            prompt_tokens = sum(stats['tokens_total'] for stats in sections.values()) or 1
+            for stats in sections.values():
+                stats['tokens_mean'] = round(stats['tokens_total'] / stats['count'], 1)
+                stats['ms_mean'] = round(stats['ms_total'] / stats['count'], 2)
+                stats['ms_total'] = round(stats['ms_total'], 2)
+                stats['ms_max'] = round(stats['ms_max'], 2)
+                stats['token_share'] = round(stats['tokens_total'] / prompt_tokens, 3)
+        return {
+            'token_counter': 'tiktoken' if _encoding is not None else 'estimate',
+            'prompts': snapshot
+        }
+
+    def export_json(self, path: str):
+        """Сохраняет замеры в JSON-файл"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.export(), f, ensure_ascii=False, indent=2)
+
+    def format_report(self) -> str:
+        """Краткий текстовый отчет: секции каждого промпта по убыванию доли токенов"""
+        data = self.export()
+        if not data['prompts']:
+            return "Замеров промптов пока нет."
+
+        lines = []
+        for prompt_name, sections in sorted(data['prompts'].items()):
+            count = max(stats['count'] for stats in sections.values())
+            lines.append(f"{prompt_name} (сборок: {count})")
+            for name, stats in sorted(sections.items(), key=lambda item: -item[1]['token_share']):
+                lines.append(
+                    f"  {name}: {stats['tokens_mean']:.0f} ток. ({stats['token_share'] * 100:.0f}%), "
+                    f"макс. {stats['tokens_max']}, {stats['ms_mean']:.1f} мс"
+                )
+            lines.append("")
+        return "\n".join(lines).strip()
+
+    def reset(self):
+        """Сбрасывает накопленные замеры"""
+        with self._lock:
+            self._stats.clear()
+
+# Общий профилировщик процесса
+prompt_profiler = PromptProfiler()
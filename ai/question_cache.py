@@ -0,0 +1,166 @@
+"""
+Кэш ответов на похожие вопросы на основе косинусной близости символьных n-грамм
+
+Символьные n-граммы устойчивы к опечаткам и окончаниям, но почти не различают
+вопросы, отличающиеся одним словом или числом ("температура 38" и "температура
+40", "давать" и "не давать"). Поэтому ответ переиспользуется, только если
+дополнительно совпадают числа и отрицания вопроса, а близость по словам (основам
+слов) не ниже порога.
+"""
+import itertools
+import logging
+import math
+import re
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Слова-отрицания: вопросы с разными отрицаниями не считаются одинаковыми
+NEGATIONS = {'не', 'нет', 'нельзя', 'ни'}
+# Длина основы слова при сравнении по словам ("месяца" и "месяцев" совпадают)
+WORD_STEM_LENGTH = 5
+# Минимальная близость по словам (0..1)
+WORD_THRESHOLD = 0.8
+
+def normalize_question(text: str) -> str:
+    """Приводит вопрос к нормальной форме: нижний регистр, без пунктуации и лишних пробелов"""
+    text = text.lower().replace('ё', 'е')
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+def char_ngrams(text: str, n: int = 3) -> Counter:
+    """Строит частотный вектор символьных n-грамм с учетом границ слов"""
+    grams = Counter()
+    for word in text.split():
+        padded = f" {word} "
+        if len(padded) <= n:
+            grams[padded] += 1
+            continue
+        for i in range(len(padded) - n + 1):
+            grams[padded[i:i + n]] += 1
+    return grams
+
+def question_guard(text: str) -> tuple:
+    """Числа и отрицания нормализованного вопроса: у одинаковых вопросов они должны совпадать"""
+    words = text.split()
+    numbers = sorted(word for word in re.findall(r'\d+', text))
+    negations = sorted(word for word in words if word in NEGATIONS)
+    return tuple(numbers), tuple(negations)
+
+def word_stems(text: str) -> Counter:
+    """Частотный вектор основ слов нормализованного вопроса (без чисел)"""
+    return Counter(word[:WORD_STEM_LENGTH] for word in text.split() if not word.isdigit())
+
+def cosine_similarity(a: Counter, b: Counter) -> float:
+    """Косинусная близость двух частотных векторов"""
+    if not a or not b:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    dot = sum(count * b.get(gram, 0) for gram, count in a.items())
+    norm_a = math.sqrt(sum(count * count for count in a.values()))
+    norm_b = math.sqrt(sum(count * count for count in b.values()))
+    return dot / (norm_a * norm_b)
+
+class QuestionCache:
+    """
+    Хранит недавние ответы ассистента отдельно для каждого ребенка.
+
+    Ответ переиспользуется, если новый вопрос почти совпадает с уже заданным
+    (по символьным n-граммам и по словам, с теми же числами и отрицаниями)
+    и данные ребенка (отпечаток) с тех пор не изменились.
+    """
+
+    def __init__(self, threshold: float = 0.9, ttl_hours: int = 24, max_entries_per_child: int = 50,
+                 word_threshold: float = WORD_THRESHOLD):
+        self.threshold = threshold
+        self.word_threshold = word_threshold
+        self.ttl = timedelta(hours=ttl_hours)
+        self.max_entries_per_child = max_entries_per_child
+        self._entries: Dict[int, list] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _prune(self, child_id: int, fingerprint: Optional[str] = None):
+        """Удаляет устаревшие записи ребенка (вызывается под блокировкой)"""
+        now = datetime.now()
+        self._entries[child_id] = [
+            entry for entry in self._entries.get(child_id, [])
+            if now - entry['created_at'] <= self.ttl
+            and (fingerprint is None or entry['fingerprint'] == fingerprint)
+        ]
+
+    def lookup(self, child_id: int, question: str, fingerprint: str) -> Optional[Dict]:
+        """
+        Ищет ответ на почти такой же недавний вопрос
+
+        Args:
+            child_id: ID ребенка
+            question: Текст вопроса
+            fingerprint: Текущий отпечаток данных ребенка
+
+        Returns:
+            Запись кэша (question, answer, similarity, created_at) или None
+        """
+        normalized = normalize_question(question)
+        vector = char_ngrams(normalized)
+        guard = question_guard(normalized)
+        stems = word_stems(normalized)
+        with self._lock:
+            self._prune(child_id, fingerprint)
+            best, best_score = None, 0.0
+            for entry in self._entries[child_id]:
+                # Другие числа или отрицания - другой вопрос, даже если текст почти тот же
+                if entry['guard'] != guard:
+                    continue
+                if cosine_similarity(stems, entry['stems']) < self.word_threshold:
+                    continue
+                score = cosine_similarity(vector, entry['vector'])
+                if score > best_score:
+                    best, best_score = entry, score
+
+        if best is None or best_score < self.threshold:
+            return None
+
+        logger.info(f"Найден похожий вопрос в кэше (близость {best_score:.2f})")
+        return dict(best, similarity=best_score)
+
+    def store(self, child_id: int, question: str, answer: str, fingerprint: str) -> Dict:
+        """Сохраняет ответ на вопрос"""
+        normalized = normalize_question(question)
+        entry = {
+            'id': next(self._ids),
+            'question': question,
+            'vector': char_ngrams(normalized),
+            'guard': question_guard(normalized),
+            'stems': word_stems(normalized),
+            'answer': answer,
+            'fingerprint': fingerprint,
+            'created_at': datetime.now()
+        }
+        with self._lock:
+            self._prune(child_id, fingerprint)
+            entries = self._entries[child_id]
+            entries.append(entry)
+            del entries[:-self.max_entries_per_child]
+        return entry
+
+    def get_entry(self, entry_id: int) -> Optional[Dict]:
+        """Возвращает запись кэша по ID"""
+        with self._lock:
+            for entries in self._entries.values():
+                for entry in entries:
+                    if entry['id'] == entry_id:
+                        return entry
+        return None
+
+    def invalidate(self, child_id: Optional[int] = None):
+        """Удаляет ответы ребенка (или все ответы, если child_id не указан)"""
+        with self._lock:
+            if child_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(child_id, None)
@@ -4,17 +4,19 @@
 import logging
 import re
 from datetime import datetime, timedelta
-import openai
 from typing import Dict, Optional, Tuple
 import json
 
+from .backends import get_extraction_backend
+
 logger = logging.getLogger(__name__)
 
 class ReminderParser:
     """Класс для распознавания напоминаний из текста"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, extraction_backend=None):
         self.api_key = api_key
+        self.extraction_backend = extraction_backend or get_extraction_backend()
         
     def parse_reminder(self, text: str) -> Optional[Dict]:
         """
@@ -73,9 +75,8 @@ class ReminderParser:
             Верни только JSON массив без дополнительного текста. Если это не запрос на напоминание, верни пустой массив [].
             """
             
-            # Запрос к OpenAI API (старый интерфейс)
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
+            # Запрос через бэкенд извлечения (OpenAI или локальная модель)
+            assistant_response = self.extraction_backend.complete(
                 messages=[
                     {"role": "system", "content": "Ты - помощник для распознавания напоминаний из текста."},
                     {"role": "user", "content": prompt}
@@ -87,9 +88,6 @@ class ReminderParser:
                 presence_penalty=0
             )
             
-            # Получаем ответ
-            assistant_response = response['choices'][0]['message']['content']
-            
             # Извлекаем JSON из ответа
             reminder_data = self._extract_json(assistant_response)
             
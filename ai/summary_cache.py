@@ -0,0 +1,87 @@
+"""
+Кэш заранее подготовленных сводок о ребенке
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class SummaryCache:
+    """
+    Хранит готовые сводки с отметкой свежести и отпечатком данных,
+    на основе которых они построены. Также ведет дневной бюджет LLM-запросов
+    для фоновой подготовки сводок.
+    """
+
+    def __init__(self, daily_llm_budget: int = 24):
+        self.daily_llm_budget = daily_llm_budget
+        self._entries: Dict[tuple, Dict] = {}
+        self._lock = threading.Lock()
+        self._budget_day = None
+        self._budget_used = 0
+
+    def get(self, child_id: int, kind: str, fingerprint: Optional[str] = None) -> Optional[Dict]:
+        """
+        Возвращает сводку из кэша
+
+        Args:
+            child_id: ID ребенка
+            kind: Тип сводки (development, feeding, weight, stool, daily_report)
+            fingerprint: Текущий отпечаток данных; если не совпадает, сводка считается устаревшей
+
+        Returns:
+            Словарь с полями text, fingerprint, generated_at или None
+        """
+        with self._lock:
+            entry = self._entries.get((child_id, kind))
+        if entry is None:
+            return None
+        if fingerprint is not None and entry['fingerprint'] != fingerprint:
+            return None
+        return entry
+
+    def put(self, child_id: int, kind: str, text: str, fingerprint: str) -> Dict:
+        """Сохраняет сводку в кэш"""
+        entry = {
+            'text': text,
+            'fingerprint': fingerprint,
+            'generated_at': datetime.now()
+        }
+        with self._lock:
+            self._entries[(child_id, kind)] = entry
+        return entry
+
+    def invalidate(self, child_id: Optional[int] = None):
+        """Удаляет сводки ребенка (или все сводки, если child_id не указан)"""
+        with self._lock:
+            if child_id is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == child_id]:
+                    del self._entries[key]
+
+    def take_llm_budget(self) -> bool:
+        """
+        Резервирует один LLM-запрос из дневного бюджета фоновой подготовки
+
+        Returns:
+            True, если бюджет на сегодня еще не исчерпан
+        """
+        today = datetime.now().date()
+        with self._lock:
+            if self._budget_day != today:
+                self._budget_day = today
+                self._budget_used = 0
+            if self._budget_used >= self.daily_llm_budget:
+                return False
+            self._budget_used += 1
+            return True
+
+    def budget_left(self) -> int:
+        """Количество LLM-запросов, оставшихся в дневном бюджете"""
+        with self._lock:
+            if self._budget_day != datetime.now().date():
+                return self.daily_llm_budget
+            return max(0, self.daily_llm_budget - self._budget_used)
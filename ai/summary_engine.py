@@ -0,0 +1,335 @@
+"""
+Сводки по кормлениям, весу и стулу без обращения к LLM
+
+Статистика считается по суточным итогам за период (database/rollups.py), а текст сводки собирается из готовых
+формулировок по пороговым правилам: тенденции, отклонения от обычного для ребенка
+уровня и от возрастных норм, распределения цвета и консистенции стула.
+LLM используется только по запросу пользователя для подробного пояснения.
+"""
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from .feeding_reference import feeding_norms
+from .food_types import merge_food_types
+
+# Изменение среднего суточного объема (доля), начиная с которого говорим о тенденции
+FEEDING_TREND_THRESHOLD = 0.10
+# Отклонение объема за день от среднего за период (доля), которое отмечаем отдельно
+FEEDING_DAY_DEVIATION = 0.25
+# Допуск при сравнении с возрастными нормами (доля от границы диапазона)
+NORM_TOLERANCE = 0.10
+
+# Изменение веса (кг), меньше которого вес считается стабильным
+WEIGHT_STABLE_DELTA = 0.1
+# Минимальный период между измерениями (дни), по которому оцениваем прибавку за неделю
+WEIGHT_MIN_SPAN_DAYS = 3
+# Прибавка оценивается по измерениям за последние дни: нормы прибавки зависят от
+# возраста, а среднее за всю историю завышено быстрым ростом в первые месяцы
+WEIGHT_GAIN_WINDOW_DAYS = 42
+# Обычная прибавка веса, г в неделю: (возраст до, мес., минимум, максимум)
+WEIGHT_GAIN_NORMS = (
+    (3, 150, 250),
+    (6, 100, 150),
+    (9, 70, 100),
+    (12, 50, 80),
+)
+
+# Доля записей с жидким или твердым стулом, при которой стоит обратить внимание
+STOOL_LIQUID_SHARE = 0.5
+STOOL_HARD_SHARE = 0.3
+# Среднее количество раз в день, выше которого стул считается частым
+STOOL_FREQUENT_PER_DAY = 8
+# Цвета, о которых стоит сообщить педиатру (основа слова)
+STOOL_ALARM_COLORS = ('бел', 'сер', 'бесцвет', 'черн', 'красн', 'кров')
+
+def _complete_days(by_day: "OrderedDict[date, object]", today: date) -> List[date]:
+    """Дни с записями, кроме текущего незавершенного (если есть другие)"""
+    days = [day for day in by_day if day != today]
+    return days or list(by_day)
+
+def _share_text(distribution: Dict[str, int], total: float) -> str:
+    """Распределение в виде 'значение 60%, значение 40%' по убыванию"""
+    items = sorted(distribution.items(), key=lambda item: -item[1])
+    return ", ".join(f"{name} {value / total * 100:.0f}%" for name, value in items)
+
+def feeding_statistics(by_day: "OrderedDict[date, Dict]", food_types: Dict[Optional[str], float],
+                       today: Optional[date] = None) -> Optional[Dict]:
+    """
+    Статистика кормлений за период
+
+    Args:
+        by_day: Кормления по дням (database.rollups.feeding_by_day)
+        food_types: Объем по типам питания (database.rollups.feeding_by_type)
+        today: Текущая дата (незавершенный день не учитывается в суточных показателях)
+
+    Returns:
+        Словарь со статистикой или None, если записей нет
+    """
+    if not by_day:
+        return None
+    today = today or datetime.now().date()
+
+    days = _complete_days(by_day, today)
+    daily_amounts = [by_day[day]['amount'] for day in days]
+    daily_mean = sum(daily_amounts) / len(daily_amounts)
+    count = sum(day['count'] for day in by_day.values())
+    total_amount = sum(day['amount'] for day in by_day.values())
+
+    stats = {
+        'count': count,
+        'total_amount': total_amount,
+        'avg_amount': total_amount / count,
+        'days': len(days),
+        'feedings_per_day': sum(by_day[day]['count'] for day in days) / len(days),
+        'daily_mean': daily_mean,
+        # Варианты одного типа (formula и "Смесь") объединяются, ключи - названия для пользователя
+        'food_types': merge_food_types(food_types),
+        'trend': 0.0,
+        'deviations': []
+    }
+
+    # Тенденция: последние 3 дня против предыдущих
+    if len(days) >= 4:
+        recent = sum(daily_amounts[-3:]) / 3
+        earlier = sum(daily_amounts[:-3]) / len(daily_amounts[:-3])
+        if earlier:
+            stats['trend'] = (recent - earlier) / earlier
+
+    # Дни, заметно отличающиеся от среднего
+    if len(days) >= 3 and daily_mean:
+        for day, amount in zip(days, daily_amounts):
+            deviation = (amount - daily_mean) / daily_mean
+            if abs(deviation) >= FEEDING_DAY_DEVIATION:
+                stats['deviations'].append((day, amount, deviation))
+
+    return stats
+
+def describe_feedings(stats: Optional[Dict], age_months: float, weight_kg: Optional[float] = None,
+                      today: Optional[date] = None) -> str:
+    """
+    Текстовая сводка по кормлениям
+
+    Args:
+        stats: Результат feeding_statistics
+        age_months: Возраст ребенка в месяцах
+        weight_kg: Последний известный вес, если есть
+        today: Текущая дата
+
+    Returns:
+        Сводка из 3-4 предложений
+    """
+    if not stats:
+        return "За последнюю неделю нет данных о кормлениях."
+    today = today or datetime.now().date()
+
+    sentences = [
+        f"За {stats['days']} дн. в среднем {stats['feedings_per_day']:.1f} кормлений в день "
+        f"по {stats['avg_amount']:.0f} мл, всего около {stats['daily_mean']:.0f} мл в сутки."
+    ]
+
+    if stats['trend'] >= FEEDING_TREND_THRESHOLD:
+        sentences.append(f"За последние дни ребенок стал есть больше (+{stats['trend'] * 100:.0f}% к началу периода).")
+    elif stats['trend'] <= -FEEDING_TREND_THRESHOLD:
+        sentences.append(f"За последние дни объем питания снизился ({stats['trend'] * 100:.0f}% к началу периода).")
+    elif stats['days'] >= 4:
+        sentences.append("Объем питания по дням стабилен.")
+
+    if stats['deviations']:
+        day, amount, deviation = max(stats['deviations'], key=lambda item: abs(item[2]))
+        label = "вчера" if (today - day).days == 1 else day.strftime('%d.%m')
+        direction = "больше" if deviation > 0 else "меньше"
+        sentences.append(f"{label.capitalize()} ребенок съел {amount:g} мл - заметно {direction} обычного.")
+
+    if len(stats['food_types']) > 1 and stats['total_amount']:
+        sentences.append(f"Состав питания: {_share_text(stats['food_types'], stats['total_amount'])}.")
+
+    norms = feeding_norms(age_months, weight_kg)
+    low, high = norms['feedings_per_day']
+    volume_low, volume_high = norms['volume_per_feeding']
+    remarks = []
+    if stats['feedings_per_day'] < low * (1 - NORM_TOLERANCE):
+        remarks.append(f"кормлений меньше обычного для возраста ({low}-{high} в день)")
+    elif stats['feedings_per_day'] > high * (1 + NORM_TOLERANCE):
+        remarks.append(f"кормлений больше обычного для возраста ({low}-{high} в день)")
+    if stats['avg_amount'] < volume_low * (1 - NORM_TOLERANCE):
+        remarks.append(f"объем одного кормления ниже нормы ({volume_low}-{volume_high} мл)")
+    elif stats['avg_amount'] > volume_high * (1 + NORM_TOLERANCE):
+        remarks.append(f"объем одного кормления выше нормы ({volume_low}-{volume_high} мл)")
+    if norms['daily_volume'] and stats['daily_mean'] < norms['daily_volume'] * (1 - FEEDING_DAY_DEVIATION):
+        remarks.append(f"суточный объем меньше рассчитанного по весу (~{norms['daily_volume']} мл)")
+
+    if remarks:
+        sentences.append("Обратите внимание: " + "; ".join(remarks) + ".")
+    else:
+        sentences.append("Режим и объем кормлений соответствуют возрастным нормам.")
+
+    return " ".join(sentences)
+
+def _gain_per_week(weights: Optional[Dict]) -> Optional[float]:
+    """Средняя прибавка (г в неделю) между первым и последним измерением или None, если измерений мало"""
+    if not weights or weights['count'] < 2:
+        return None
+    span_days = (weights['last_time'] - weights['first_time']).total_seconds() / 86400
+    if span_days < WEIGHT_MIN_SPAN_DAYS:
+        return None
+    return (weights['last_weight'] - weights['first_weight']) * 1000 / span_days * 7
+
+def weight_statistics(weights: Optional[Dict], recent_weights: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    Статистика измерений веса
+
+    Args:
+        weights: Первое и последнее измерение за всю историю (database.rollups.weight_range)
+        recent_weights: Измерения за последние WEIGHT_GAIN_WINDOW_DAYS дней, по которым
+            оценивается прибавка за неделю
+
+    Returns:
+        Словарь со статистикой или None, если записей нет
+    """
+    if not weights:
+        return None
+
+    span_days = (weights['last_time'] - weights['first_time']).total_seconds() / 86400
+    change = weights['last_weight'] - weights['first_weight']
+    return {
+        'count': weights['count'],
+        'first_weight': weights['first_weight'],
+        'last_weight': weights['last_weight'],
+        'first_date': weights['first_time'].date(),
+        'last_date': weights['last_time'].date(),
+        'change': change,
+        'span_days': span_days,
+        'gain_per_week': _gain_per_week(recent_weights)
+    }
+
+def _weight_gain_norm(age_months: float) -> Optional[tuple]:
+    for age_limit, low, high in WEIGHT_GAIN_NORMS:
+        if age_months < age_limit:
+            return low, high
+    return None
+
+def describe_weight(stats: Optional[Dict], age_months: float) -> str:
+    """
+    Текстовая сводка о весе
+
+    Args:
+        stats: Результат weight_statistics
+        age_months: Возраст ребенка в месяцах
+
+    Returns:
+        Сводка из 2-4 предложений
+    """
+    if not stats:
+        return "Нет данных о весе ребенка."
+
+    if stats['count'] == 1:
+        sentences = [f"Записано одно измерение: {stats['last_weight']:g} кг ({stats['last_date'].strftime('%d.%m.%Y')})."]
+    else:
+        if abs(stats['change']) < WEIGHT_STABLE_DELTA:
+            trend = "вес стабилен"
+        elif stats['change'] > 0:
+            trend = "вес увеличивается"
+        else:
+            trend = "вес уменьшается"
+        sentences = [
+            f"С {stats['first_date'].strftime('%d.%m')} {trend}: {stats['first_weight']:g} → {stats['last_weight']:g} кг "
+            f"({stats['change'] * 1000:+.0f} г)."
+        ]
+
+    gain_norm = _weight_gain_norm(age_months)
+    if stats['gain_per_week'] is not None:
+        gain = round(stats['gain_per_week'])
+        sentence = f"Прибавка за последние {WEIGHT_GAIN_WINDOW_DAYS // 7} недель в среднем {gain:.0f} г в неделю"
+        if gain_norm:
+            low, high = gain_norm
+            if gain < low:
+                sentence += f", это меньше обычного для возраста ({low}-{high} г)"
+            elif gain > high:
+                sentence += f", это больше обычного для возраста ({low}-{high} г)"
+            else:
+                sentence += f", что соответствует норме ({low}-{high} г)"
+        sentences.append(sentence + ".")
+    elif stats['count'] > 1:
+        sentences.append("За последние недели измерений недостаточно, чтобы оценить прибавку за неделю.")
+
+    band = feeding_norms(age_months, stats['last_weight'])['weight_band']
+    if band:
+        low, high = band
+        if stats['last_weight'] < low:
+            sentences.append(f"Текущий вес ниже обычного диапазона для возраста ({low}-{high} кг) - стоит обсудить с педиатром.")
+        elif stats['last_weight'] > high:
+            sentences.append(f"Текущий вес выше обычного диапазона для возраста ({low}-{high} кг) - стоит обсудить с педиатром.")
+        else:
+            sentences.append(f"Текущий вес в обычном диапазоне для возраста ({low}-{high} кг).")
+
+    if stats['change'] < -WEIGHT_STABLE_DELTA:
+        sentences.append("Снижение веса - повод показать ребенка врачу.")
+
+    return " ".join(sentences)
+
+def stool_statistics(totals: Dict, colors: Dict[str, int], consistencies: Dict[str, int]) -> Optional[Dict]:
+    """
+    Статистика записей о стуле
+
+    Args:
+        totals: Количество записей и дней (database.rollups.stool_totals)
+        colors: Записи по цвету (database.rollups.stool_distribution)
+        consistencies: Записи по консистенции
+
+    Returns:
+        Словарь со статистикой или None, если записей нет
+    """
+    if not totals['count']:
+        return None
+
+    alarm_colors = {
+        color for color in colors
+        if any(marker in color.lower() for marker in STOOL_ALARM_COLORS)
+    }
+    return {
+        'count': totals['count'],
+        'days': totals['days'],
+        'per_day': totals['count'] / totals['days'],
+        'colors': colors,
+        'consistencies': consistencies,
+        'alarm_colors': sorted(alarm_colors)
+    }
+
+def describe_stool(stats: Optional[Dict]) -> str:
+    """
+    Текстовая сводка о пищеварении
+
+    Args:
+        stats: Результат stool_statistics
+
+    Returns:
+        Сводка из 2-4 предложений
+    """
+    if not stats:
+        return "За последнюю неделю нет данных о стуле."
+
+    total = stats['count']
+    sentences = [f"За {stats['days']} дн. записано {total} раз, в среднем {stats['per_day']:.1f} в день."]
+
+    consistencies = stats['consistencies']
+    sentences.append(f"Консистенция: {_share_text(consistencies, total)}.")
+    if stats['colors']:
+        sentences.append(f"Цвет: {_share_text(stats['colors'], total)}.")
+
+    remarks = []
+    if stats['alarm_colors']:
+        remarks.append(f"цвет ({', '.join(stats['alarm_colors'])}) стоит показать педиатру")
+    if consistencies.get('жидкий', 0) / total >= STOOL_LIQUID_SHARE:
+        remarks.append("преобладает жидкий стул, следите за тем, чтобы ребенок достаточно пил")
+    if consistencies.get('твердый', 0) / total >= STOOL_HARD_SHARE:
+        remarks.append("часто встречается твердый стул, возможна склонность к запорам")
+    if stats['per_day'] > STOOL_FREQUENT_PER_DAY:
+        remarks.append("стул чаще обычного")
+
+    if remarks:
+        sentences.append("Обратите внимание: " + "; ".join(remarks) + ".")
+    else:
+        sentences.append("Признаков нарушения пищеварения по записям не видно.")
+
+    return " ".join(sentences)
@@ -3,18 +3,27 @@ from aiogram.contrib.middlewares.logging import LoggingMiddleware
 from aiogram.types import ParseMode, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils import executor
 import logging
+import asyncio
 import openai
-from sqlalchemy.orm import Session
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 import sys
 import os
 import io
 import tempfile
 import json
+import html
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database.database import get_db, SessionLocal
-from database.models import Child, Reminder, Appointment, Feeding, Stool, Weight, Medication, Prescription, Note, ChatHistory, User
-from config import TELEGRAM_BOT_TOKEN, OPENAI_API_KEY, LOG_LEVEL, GOOGLE_SHEETS_ENABLED, GOOGLE_SHEETS_SPREADSHEET_ID
+from database.database import SessionLocal
+from database.async_database import session_scope, session_metrics
+from database.rollups import feeding_totals
+from database.child_profile import child_profiles
+from database.user_registry import user_registry
+from database.recent_events import fetch_recent
+from database.search import search_records, MATCH_START, MATCH_END
+from database.models import Child, Reminder, Appointment, Feeding, Stool, Weight, Medication, Prescription, Note, ChatHistory
+from config import TELEGRAM_BOT_TOKEN, OPENAI_API_KEY, LOG_LEVEL, GOOGLE_SHEETS_ENABLED, GOOGLE_SHEETS_SPREADSHEET_ID, SUMMARY_PREWARM_DAILY_LLM_BUDGET, QUESTION_CACHE_THRESHOLD, QUESTION_CACHE_TTL_HOURS, CONVERSATION_MEMORY_MAX_MESSAGES, CONVERSATION_MEMORY_MAX_CHATS, CONVERSATION_MEMORY_IDLE_HOURS, MESSAGE_COALESCE_WINDOW, MESSAGE_COALESCE_MAX_MESSAGES, SEARCH_PAGE_SIZE, BOT_ADMIN_IDS
 import re
 from datetime import datetime, timedelta
 from aiogram.dispatcher import FSMContext
@@ -36,14 +45,53 @@ openai.api_key = OPENAI_API_KEY
 
 # Import AI assistant
 from ai.assistant import MedicalAIAssistant
+from ai.food_types import food_type_key, food_type_label
 from ai.reminder_parser import ReminderParser
+from bot.coalescer import MessageCoalescer
+from bot.db_middleware import DbSessionMiddleware
+
+# Одна сессия БД на каждое обновление (передается обработчикам в аргументе db)
+dp.middleware.setup(DbSessionMiddleware())
 
 # Initialize AI assistant
-ai_assistant = MedicalAIAssistant(OPENAI_API_KEY)
+ai_assistant = MedicalAIAssistant(
+    OPENAI_API_KEY,
+    summary_llm_budget=SUMMARY_PREWARM_DAILY_LLM_BUDGET,
+    question_cache_threshold=QUESTION_CACHE_THRESHOLD,
+    question_cache_ttl_hours=QUESTION_CACHE_TTL_HOURS,
+    conversation_max_messages=CONVERSATION_MEMORY_MAX_MESSAGES,
+    conversation_max_chats=CONVERSATION_MEMORY_MAX_CHATS,
+    conversation_idle_hours=CONVERSATION_MEMORY_IDLE_HOURS
+)
 
 # Initialize reminder parser
 reminder_parser = ReminderParser(OPENAI_API_KEY)
 
+# Объединение сообщений, отправленных подряд
+message_coalescer = MessageCoalescer(window=MESSAGE_COALESCE_WINDOW, max_messages=MESSAGE_COALESCE_MAX_MESSAGES)
+
+async def run_blocking(func, *args):
+    """Выполняет блокирующий вызов (запрос к LLM) в пуле потоков, не останавливая цикл событий"""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, func, *args)
+
+async def run_with_session(func, *args, **kwargs):
+    """
+    Выполняет синхронную функцию, работающую с БД (сводки, консультации AI, выгрузка
+    в Google Sheets), в пуле потоков с собственной синхронной сессией
+
+    Args:
+        func: Функция, принимающая сессию первым аргументом
+        *args, **kwargs: Остальные аргументы функции
+    """
+    def call():
+        with SessionLocal() as db:
+            return func(db, *args, **kwargs)
+    return await run_blocking(call)
+
+# Значки типов питания в списке кормлений
+FOOD_TYPE_EMOJI = {'breast_milk': "🤱", 'formula': "🍼", 'food': "🥄"}
+
 # Define states
 class FeedingState(StatesGroup):
     waiting_for_amount = State()
@@ -87,60 +135,38 @@ class NotesState(StatesGroup):
     waiting_for_content = State()
     waiting_for_edit_content = State()
 
-async def save_user(user_data: types.User, db: Session):
-    """Сохраняет или обновляет информацию о пользователе в базе данных"""
+async def save_user(user_data: types.User, db: AsyncSession):
+    """
+    Отмечает активность пользователя и сохраняет его данные, если они изменились
+
+    Пока данные пользователя не меняются, обращения к базе нет: время активности
+    записывается пакетом задачей планировщика (database/user_registry.py).
+    """
     try:
-        # Проверяем, существует ли пользователь
-        user = db.query(User).filter_by(telegram_id=user_data.id).first()
-        
-        if not user:
-            # Создаем нового пользователя
-            user = User(
-                telegram_id=user_data.id,
-                username=user_data.username,
-                first_name=user_data.first_name,
-                last_name=user_data.last_name,
-                is_active=1
-            )
-            db.add(user)
-            logger.info(f"Добавлен новый пользователь: {user_data.id} ({user_data.username})")
-        else:
-            # Обновляем информацию о пользователе
-            user.username = user_data.username
-            user.first_name = user_data.first_name
-            user.last_name = user_data.last_name
-            user.updated_at = datetime.now()
-            user.is_active = 1
-            
-        db.commit()
+        await user_registry.atouch(db, user_data.id, user_data.username, user_data.first_name, user_data.last_name)
     except Exception as e:
         logger.error(f"Ошибка при сохранении пользователя: {e}")
-        db.rollback()
 
 @dp.message_handler(commands=['start'])
-async def start_cmd(message: types.Message):
+async def start_cmd(message: types.Message, db: AsyncSession):
     """Обработка команды /start"""
-    db: Session = next(get_db())
-    try:
-        # Сохраняем информацию о пользователе
-        await save_user(message.from_user, db)
+    # Сохраняем информацию о пользователе
+    await save_user(message.from_user, db)
         
-        # Проверяем, есть ли зарегистрированный ребенок
-        child = db.query(Child).first()
-        if child:
-            await show_main_menu(message)
-        else:
-            await message.reply(
-                f"👋 Привет, {message.from_user.first_name}!\n\n"
-                "Я - ваш семейный медицинский ассистент. "
-                "Я помогу вам отслеживать здоровье вашего ребенка.\n\n"
-                "Для начала давайте зарегистрируем ребенка.\n"
-                "Введите имя ребенка:",
-                reply_markup=types.ReplyKeyboardRemove()
-            )
-            await ChildRegistrationState.waiting_for_name.set()
-    finally:
-        db.close()
+    # Проверяем, есть ли зарегистрированный ребенок
+    child = await child_profiles.aget(db)
+    if child:
+        await show_main_menu(message)
+    else:
+        await message.reply(
+            f"👋 Привет, {message.from_user.first_name}!\n\n"
+            "Я - ваш семейный медицинский ассистент. "
+            "Я помогу вам отслеживать здоровье вашего ребенка.\n\n"
+            "Для начала давайте зарегистрируем ребенка.\n"
+            "Введите имя ребенка:",
+            reply_markup=types.ReplyKeyboardRemove()
+        )
+        await ChildRegistrationState.waiting_for_name.set()
 
 @dp.message_handler(commands=['help'])
 async def send_help(message: types.Message):
@@ -154,6 +180,7 @@ async def send_help(message: types.Message):
 /stats - Статистика и анализ развития
 /ai - Задать вопрос AI ассистенту
 /reset - Сбросить историю диалога с AI
+/search - Поиск по заметкам, диалогам с AI и назначениям
 /help - Эта справка
 
 🔸 *Основные функции:*
@@ -204,12 +231,11 @@ async def process_birth_date(message: types.Message, state: FSMContext):
         await message.reply("❌ Неверный формат даты. Пожалуйста, введите дату в формате ДД.ММ.ГГГГ")
 
 @dp.callback_query_handler(lambda c: c.data.startswith('gender_'), state=ChildRegistrationState.waiting_for_gender)
-async def process_gender(callback_query: types.CallbackQuery, state: FSMContext):
+async def process_gender(callback_query: types.CallbackQuery, state: FSMContext, db: AsyncSession):
     """Обработка выбора пола"""
     gender = 'Мальчик' if callback_query.data == 'gender_male' else 'Девочка'
     data = await state.get_data()
     
-    db: Session = next(get_db())
     try:
         child = Child(
             name=data['name'],
@@ -217,7 +243,7 @@ async def process_gender(callback_query: types.CallbackQuery, state: FSMContext)
             gender=gender
         )
         db.add(child)
-        db.commit()
+        await db.flush()
         
         await bot.send_message(
             callback_query.from_user.id,
@@ -232,8 +258,12 @@ async def process_gender(callback_query: types.CallbackQuery, state: FSMContext)
             "❌ Произошла ошибка при сохранении. Попробуйте позже."
         )
         await state.finish()
-    finally:
-        db.close()
+
+def format_summary_freshness(entry) -> str:
+    """Возвращает строку с временем подготовки сводки"""
+    if not entry or not entry.get('generated_at'):
+        return ""
+    return f"\n\n_Обновлено: {entry['generated_at'].strftime('%d.%m.%Y, %H:%M')}_"
 
 # Function to show reminders menu
 async def show_reminders_menu(message: types.Message):
@@ -250,11 +280,10 @@ async def show_reminders_menu(message: types.Message):
                        parse_mode=ParseMode.MARKDOWN)
 
 # Function to show all reminders
-async def show_reminders_list(callback_query: types.CallbackQuery):
+async def show_reminders_list(callback_query: types.CallbackQuery, db: AsyncSession):
     """Показать список всех напоминаний"""
-    db: Session = next(get_db())
     try:
-        child = db.query(Child).first()
+        child = await child_profiles.aget(db)
         if not child:
             await bot.send_message(
                 callback_query.from_user.id,
@@ -263,10 +292,10 @@ async def show_reminders_list(callback_query: types.CallbackQuery):
             return
         
         # Получаем все активные напоминания
-        reminders = db.query(Reminder).filter(
+        reminders = (await db.scalars(select(Reminder).filter(
             Reminder.child_id == child.id,
             Reminder.status == 'active'
-        ).order_by(Reminder.reminder_time).all()
+        ).order_by(Reminder.reminder_time))).all()
         
         if not reminders:
             # Создаем клавиатуру с кнопками
@@ -340,22 +369,19 @@ async def show_reminders_list(callback_query: types.CallbackQuery):
             callback_query.from_user.id,
             "❌ Произошла ошибка при загрузке напоминаний"
         )
-    finally:
-        db.close()
 
 # Function to view a specific reminder
 @dp.callback_query_handler(lambda c: c.data and c.data.startswith('reminder_view_'))
-async def view_reminder(callback_query: types.CallbackQuery):
+async def view_reminder(callback_query: types.CallbackQuery, db: AsyncSession):
     """Просмотр напоминания"""
     await bot.answer_callback_query(callback_query.id)
     
     # Получаем ID напоминания из callback_data
     reminder_id = int(callback_query.data.split('_')[2])
     
-    db: Session = next(get_db())
     try:
         # Получаем напоминание
-        reminder = db.query(Reminder).get(reminder_id)
+        reminder = await db.get(Reminder, reminder_id)
         if not reminder:
             await bot.send_message(
                 callback_query.from_user.id,
@@ -413,8 +439,6 @@ async def view_reminder(callback_query: types.CallbackQuery):
             callback_query.from_user.id,
             "❌ Произошла ошибка при загрузке напоминания"
         )
-    finally:
-        db.close()
 
 # Function to handle callback queries for reminders menu
 @dp.callback_query_handler(lambda c: c.data == 'reminders_menu')
@@ -425,10 +449,10 @@ async def process_reminders_menu_callback(callback_query: types.CallbackQuery):
 
 # Function to handle callback for reminders list
 @dp.callback_query_handler(lambda c: c.data == 'reminders_list')
-async def process_reminders_list_callback(callback_query: types.CallbackQuery):
+async def process_reminders_list_callback(callback_query: types.CallbackQuery, db: AsyncSession):
     """Обработка выбора списка напоминаний"""
     await bot.answer_callback_query(callback_query.id)
-    await show_reminders_list(callback_query)
+    await show_reminders_list(callback_query, db)
 
 # Function to handle callback for back to main menu
 @dp.callback_query_handler(lambda c: c.data == 'back_to_menu')
@@ -469,11 +493,10 @@ async def show_main_menu(message: types.Message):
 
 # Function to handle callback queries for main menu
 @dp.callback_query_handler(lambda c: c.data in ['feeding', 'stool', 'weight', 'reminders_menu', 'stats', 'prescriptions', 'spreadsheet', 'settings', 'notes'])
-async def process_main_menu(callback_query: types.CallbackQuery):
+async def process_main_menu(callback_query: types.CallbackQuery, db: AsyncSession):
     """Обработка выбора из главного меню"""
     action = callback_query.data
-    db: Session = next(get_db())
-    child = db.query(Child).first()
+    child = await child_profiles.aget(db)
     
     if action == 'reminders_menu':
         await bot.answer_callback_query(callback_query.id)
@@ -482,16 +505,19 @@ async def process_main_menu(callback_query: types.CallbackQuery):
         
     if action == 'stats':
         await bot.answer_callback_query(callback_query.id)
-        await bot.send_message(
-            callback_query.from_user.id,
-            "🔄 Анализирую данные о развитии ребенка..."
-        )
         try:
-            # Генерируем сводку о развитии с помощью ИИ
-            summary = ai_assistant.generate_development_summary(db)
+            # Берем заранее подготовленную сводку, если данные не менялись
+            entry = await run_with_session(ai_assistant.get_summary, 'development', generate=False)
+            if not entry:
+                await bot.send_message(
+                    callback_query.from_user.id,
+                    "🔄 Анализирую данные о развитии ребенка..."
+                )
+                # Генерируем сводку о развитии с помощью ИИ
+                entry = await run_with_session(ai_assistant.get_summary, 'development')
             
             # Форматируем ответ
-            response = f"📊 *Сводка о развитии ребенка*\n\n{summary}"
+            response = f"📊 *Сводка о развитии ребенка*\n\n{entry['text']}{format_summary_freshness(entry)}"
             
             # Добавляем кнопку возврата в меню
             keyboard = InlineKeyboardMarkup()
@@ -509,15 +535,13 @@ async def process_main_menu(callback_query: types.CallbackQuery):
                 callback_query.from_user.id,
                 "❌ Произошла ошибка при анализе данных. Пожалуйста, попробуйте позже."
             )
-        finally:
-            db.close()
         return
     
     if action == 'notes':
         await bot.answer_callback_query(callback_query.id)
         try:
             # Получаем список заметок
-            notes = db.query(Note).filter(Note.child_id == child.id).order_by(Note.timestamp.desc()).all()
+            notes = (await db.run_sync(fetch_recent, child.id, {'note': None}))['note']
             
             if not notes:
                 # Создаем inline клавиатуру
@@ -551,7 +575,7 @@ async def process_main_menu(callback_query: types.CallbackQuery):
             
             await bot.send_message(
                 callback_query.from_user.id,
-                "Список ваших заметок:",
+                "Список ваших заметок (поиск по тексту: /search слово):",
                 reply_markup=keyboard
             )
         except Exception as e:
@@ -560,23 +584,21 @@ async def process_main_menu(callback_query: types.CallbackQuery):
                 callback_query.from_user.id,
                 "❌ Произошла ошибка при загрузке заметок."
             )
-        finally:
-            db.close()
         return
         
     if action == 'feeding':
         await bot.answer_callback_query(callback_query.id)
         
         # Получаем последние 7 кормлений
-        last_feedings = db.query(Feeding).filter_by(child_id=child.id).order_by(Feeding.timestamp.desc()).limit(7).all()
+        last_feedings = (await db.run_sync(fetch_recent, child.id, {'feeding': 7}))['feeding']
         
         if last_feedings:
             # Формируем список кормлений
             feedings_text = "🍼 *Последние 7 кормлений:*\n\n"
             for feeding in last_feedings:
                 date_str = feeding.timestamp.strftime("%d.%m.%Y, %H:%M")
-                food_type_emoji = "🤱" if feeding.food_type == "Грудное молоко" else "🍼" if feeding.food_type == "Смесь" else "🥄"
-                feedings_text += f"{food_type_emoji} {date_str} - {feeding.amount} мл ({feeding.food_type})\n"
+                food_type_emoji = FOOD_TYPE_EMOJI.get(food_type_key(feeding.food_type), "🥄")
+                feedings_text += f"{food_type_emoji} {date_str} - {feeding.amount} мл ({food_type_label(feeding.food_type)})\n"
             
             # Генерируем AI сводку
             await bot.send_message(
@@ -585,26 +607,22 @@ async def process_main_menu(callback_query: types.CallbackQuery):
                 parse_mode=ParseMode.MARKDOWN
             )
             
-            # Отправляем сообщение о генерации сводки
-            await bot.send_message(
-                callback_query.from_user.id,
-                "🤖 Анализирую данные о кормлениях..."
-            )
-            
-            # Генерируем AI сводку по кормлениям
-            feeding_summary = ai_assistant.generate_feeding_summary(db)
+            # Сводка собирается по статистике без обращения к AI
+            entry = await run_with_session(ai_assistant.get_summary, 'feeding')
+            feeding_summary = entry['text'] + format_summary_freshness(entry)
             
             # Создаем клавиатуру
             keyboard = InlineKeyboardMarkup(row_width=2)
             keyboard.add(
                 InlineKeyboardButton("➕ Добавить кормление", callback_data='add_feeding'),
                 InlineKeyboardButton("📊 Статистика", callback_data='feeding_stats'),
+                InlineKeyboardButton("🤖 Подробнее от AI", callback_data='summary_explain_feeding'),
                 InlineKeyboardButton("🔙 Назад в меню", callback_data='back_to_menu')
             )
             
             await bot.send_message(
                 callback_query.from_user.id,
-                f"📊 *AI Анализ кормлений:*\n\n{feeding_summary}",
+                f"📊 *Анализ кормлений:*\n\n{feeding_summary}",
                 parse_mode=ParseMode.MARKDOWN,
                 reply_markup=keyboard
             )
@@ -622,14 +640,13 @@ async def process_main_menu(callback_query: types.CallbackQuery):
                 reply_markup=keyboard
             )
         
-        db.close()
         return
 
     elif action == 'stool':
         await bot.answer_callback_query(callback_query.id)
         
         # Получаем последние 7 записей о стуле
-        last_stools = db.query(Stool).filter_by(child_id=child.id).order_by(Stool.timestamp.desc()).limit(7).all()
+        last_stools = (await db.run_sync(fetch_recent, child.id, {'stool': 7}))['stool']
         
         if last_stools:
             # Формируем список записей о стуле
@@ -645,24 +662,21 @@ async def process_main_menu(callback_query: types.CallbackQuery):
                 parse_mode=ParseMode.MARKDOWN
             )
             
-            # Генерируем AI сводку
-            await bot.send_message(
-                callback_query.from_user.id,
-                "🤖 Анализирую данные о пищеварении..."
-            )
-            
-            stool_summary = ai_assistant.generate_stool_summary(db)
+            # Сводка собирается по статистике без обращения к AI
+            entry = await run_with_session(ai_assistant.get_summary, 'stool')
+            stool_summary = entry['text'] + format_summary_freshness(entry)
             
             # Создаем клавиатуру
             keyboard = InlineKeyboardMarkup(row_width=2)
             keyboard.add(
                 InlineKeyboardButton("➕ Добавить запись", callback_data='add_stool'),
+                InlineKeyboardButton("🤖 Подробнее от AI", callback_data='summary_explain_stool'),
                 InlineKeyboardButton("🔙 Назад в меню", callback_data='back_to_menu')
             )
             
             await bot.send_message(
                 callback_query.from_user.id,
-                f"📊 *AI Анализ пищеварения:*\n\n{stool_summary}",
+                f"📊 *Анализ пищеварения:*\n\n{stool_summary}",
                 parse_mode=ParseMode.MARKDOWN,
                 reply_markup=keyboard
             )
@@ -680,14 +694,13 @@ async def process_main_menu(callback_query: types.CallbackQuery):
                 reply_markup=keyboard
             )
         
-        db.close()
         return
 
     elif action == 'weight':
         await bot.answer_callback_query(callback_query.id)
         
         # Получаем последние 7 записей о весе
-        last_weights = db.query(Weight).filter_by(child_id=child.id).order_by(Weight.timestamp.desc()).limit(7).all()
+        last_weights = (await db.run_sync(fetch_recent, child.id, {'weight': 7}))['weight']
         
         if last_weights:
             # Формируем список измерений веса
@@ -720,25 +733,22 @@ async def process_main_menu(callback_query: types.CallbackQuery):
                 parse_mode=ParseMode.MARKDOWN
             )
             
-            # Генерируем AI сводку
-            await bot.send_message(
-                callback_query.from_user.id,
-                "🤖 Анализирую динамику веса..."
-            )
-            
-            weight_summary = ai_assistant.generate_weight_summary(db)
+            # Сводка собирается по статистике без обращения к AI
+            entry = await run_with_session(ai_assistant.get_summary, 'weight')
+            weight_summary = entry['text'] + format_summary_freshness(entry)
             
             # Создаем клавиатуру
             keyboard = InlineKeyboardMarkup(row_width=2)
             keyboard.add(
                 InlineKeyboardButton("➕ Добавить вес", callback_data='add_weight'),
                 InlineKeyboardButton("📊 График", callback_data='weight_chart'),
+                InlineKeyboardButton("🤖 Подробнее от AI", callback_data='summary_explain_weight'),
                 InlineKeyboardButton("🔙 Назад в меню", callback_data='back_to_menu')
             )
             
             await bot.send_message(
                 callback_query.from_user.id,
-                f"📊 *AI Анализ веса:*\n\n{weight_summary}",
+                f"📊 *Анализ веса:*\n\n{weight_summary}",
                 parse_mode=ParseMode.MARKDOWN,
                 reply_markup=keyboard
             )
@@ -756,7 +766,6 @@ async def process_main_menu(callback_query: types.CallbackQuery):
                 reply_markup=keyboard
             )
         
-        db.close()
         return
 
 
@@ -765,10 +774,7 @@ async def process_main_menu(callback_query: types.CallbackQuery):
         await bot.answer_callback_query(callback_query.id)
         try:
             # Получаем список назначений
-            prescriptions = db.query(Prescription).filter(
-                Prescription.child_id == child.id,
-                Prescription.is_active == 1
-            ).order_by(Prescription.start_date.desc()).all()
+            prescriptions = (await db.run_sync(fetch_recent, child.id, {'prescription': None}))['prescription']
             
             if not prescriptions:
                 # Создаем клавиатуру с кнопками
@@ -837,8 +843,6 @@ async def process_main_menu(callback_query: types.CallbackQuery):
                 callback_query.from_user.id,
                 "❌ Произошла ошибка при загрузке назначений."
             )
-        finally:
-            db.close()
         return
 
     elif action == 'spreadsheet':
@@ -882,7 +886,7 @@ async def process_main_menu(callback_query: types.CallbackQuery):
             )
             
             # Синхронизируем данные
-            success = sheets_manager.sync_all_data(db)
+            success = await run_with_session(sheets_manager.sync_all_data)
             
             # Создаем клавиатуру с кнопками
             keyboard = InlineKeyboardMarkup(row_width=2)
@@ -918,8 +922,6 @@ async def process_main_menu(callback_query: types.CallbackQuery):
                 callback_query.from_user.id,
                 "❌ Произошла ошибка при работе с Google Sheets."
             )
-        finally:
-            db.close()
         return
 
     elif action == 'settings':
@@ -948,17 +950,18 @@ async def menu_command(message: types.Message):
     await show_main_menu(message)
 
 @dp.message_handler(commands=['stats'])
-async def stats_command(message: types.Message):
+async def stats_command(message: types.Message, db: AsyncSession):
     """Команда для просмотра статистики"""
-    db: Session = next(get_db())
     try:
-        await message.reply("🔄 Анализирую данные о развитии ребенка...")
-        
-        # Генерируем сводку о развитии с помощью ИИ
-        summary = ai_assistant.generate_development_summary(db)
+        entry = await run_with_session(ai_assistant.get_summary, 'development', generate=False)
+        if not entry:
+            await message.reply("🔄 Анализирую данные о развитии ребенка...")
+            
+            # Генерируем сводку о развитии с помощью ИИ
+            entry = await run_with_session(ai_assistant.get_summary, 'development')
         
         # Форматируем ответ
-        response = f"📊 *Сводка о развитии ребенка*\n\n{summary}"
+        response = f"📊 *Сводка о развитии ребенка*\n\n{entry['text']}{format_summary_freshness(entry)}"
         
         # Добавляем кнопку возврата в меню
         keyboard = InlineKeyboardMarkup()
@@ -968,15 +971,12 @@ async def stats_command(message: types.Message):
     except Exception as e:
         logger.error(f"Ошибка при генерации сводки: {e}")
         await message.reply("❌ Произошла ошибка при анализе данных. Пожалуйста, попробуйте позже.")
-    finally:
-        db.close()
 
 @dp.callback_query_handler(lambda c: c.data == 'feeding')
-async def process_feeding(callback_query: types.CallbackQuery):
+async def process_feeding(callback_query: types.CallbackQuery, db: AsyncSession):
     await bot.answer_callback_query(callback_query.id)
-    db: Session = next(get_db())
-    child = db.query(Child).first()
-    last_feeding = db.query(Feeding).order_by(Feeding.timestamp.desc()).first()
+    child = await child_profiles.aget(db)
+    last_feeding = await db.scalar(select(Feeding).order_by(Feeding.timestamp.desc()).limit(1))
     if last_feeding:
         last_feeding_info = f"Последнее кормление: {last_feeding.amount} {last_feeding.food_type} в {last_feeding.timestamp}"
     else:
@@ -1004,7 +1004,7 @@ async def handle_feeding_amount(message: types.Message, state: FSMContext):
         await message.reply("❌ Пожалуйста, введите корректное количество в граммах.")
 
 @dp.callback_query_handler(lambda c: c.data.startswith('food_'), state=FeedingState.waiting_for_food_type)
-async def handle_food_type(callback_query: types.CallbackQuery, state: FSMContext):
+async def handle_food_type(callback_query: types.CallbackQuery, state: FSMContext, db: AsyncSession):
     """Обработка типа питания"""
     food_types = {
         'food_breast_milk': 'Грудное молоко',
@@ -1015,9 +1015,8 @@ async def handle_food_type(callback_query: types.CallbackQuery, state: FSMContex
     food_type = food_types.get(callback_query.data, 'Неизвестно')
     data = await state.get_data()
     
-    db: Session = next(get_db())
     try:
-        child = db.query(Child).first()
+        child = await child_profiles.aget(db)
         feeding = Feeding(
             child_id=child.id, 
             amount=data['amount'], 
@@ -1025,7 +1024,7 @@ async def handle_food_type(callback_query: types.CallbackQuery, state: FSMContex
             timestamp=datetime.now()
         )
         db.add(feeding)
-        db.commit()
+        await db.flush()
         
         # Форматируем дату и время
         date_str = feeding.timestamp.strftime("%d.%m.%Y, %H:%M")
@@ -1043,16 +1042,14 @@ async def handle_food_type(callback_query: types.CallbackQuery, state: FSMContex
             "❌ Ошибка при сохранении данных"
         )
     finally:
-        db.close()
         await state.finish()
 
 # Обработчик для стула
 @dp.message_handler(state=StoolState.waiting_for_description)
-async def handle_stool_description(message: types.Message, state: FSMContext):
+async def handle_stool_description(message: types.Message, state: FSMContext, db: AsyncSession):
     """Обработка описания стула"""
-    db: Session = next(get_db())
     try:
-        child = db.query(Child).first()
+        child = await child_profiles.aget(db)
         
         # Пытаемся определить цвет из описания
         description = message.text.strip()
@@ -1089,7 +1086,7 @@ async def handle_stool_description(message: types.Message, state: FSMContext):
             timestamp=datetime.now()
         )
         db.add(stool)
-        db.commit()
+        await db.flush()
         
         # Форматируем дату и время
         date_str = stool.timestamp.strftime("%d.%m.%Y, %H:%M")
@@ -1103,24 +1100,22 @@ async def handle_stool_description(message: types.Message, state: FSMContext):
         logger.error(f"Ошибка при сохранении данных о стуле: {e}")
         await message.reply("❌ Ошибка при сохранении данных")
     finally:
-        db.close()
         await state.finish()
 
 # Обработчик для веса
 @dp.message_handler(state=WeightState.waiting_for_weight)
-async def handle_weight_input(message: types.Message, state: FSMContext):
+async def handle_weight_input(message: types.Message, state: FSMContext, db: AsyncSession):
     """Обработка ввода веса"""
     try:
         weight = float(message.text.strip())
-        db: Session = next(get_db())
-        child = db.query(Child).first()
+        child = await child_profiles.aget(db)
         weight_record = Weight(
             child_id=child.id,
             weight=weight,
             timestamp=datetime.now()
         )
         db.add(weight_record)
-        db.commit()
+        await db.flush()
         
         # Форматируем дату и время
         date_str = weight_record.timestamp.strftime("%d.%m.%Y, %H:%M")
@@ -1136,7 +1131,6 @@ async def handle_weight_input(message: types.Message, state: FSMContext):
         logger.error(f"Ошибка при сохранении веса: {e}")
         await message.reply("❌ Ошибка при сохранении данных")
     finally:
-        db.close()
         await state.finish()
 
 # Обработчики для лекарств
@@ -1148,12 +1142,11 @@ async def handle_medication_name(message: types.Message, state: FSMContext):
     await MedicationState.waiting_for_dosage.set()
 
 @dp.message_handler(state=MedicationState.waiting_for_dosage)
-async def handle_medication_dosage(message: types.Message, state: FSMContext):
+async def handle_medication_dosage(message: types.Message, state: FSMContext, db: AsyncSession):
     """Обработка дозировки лекарства"""
     data = await state.get_data()
-    db: Session = next(get_db())
     try:
-        child = db.query(Child).first()
+        child = await child_profiles.aget(db)
         medication = Medication(
             child_id=child.id,
             medication_name=data['medication_name'],
@@ -1161,7 +1154,7 @@ async def handle_medication_dosage(message: types.Message, state: FSMContext):
             timestamp=datetime.now()
         )
         db.add(medication)
-        db.commit()
+        await db.flush()
         
         # Форматируем дату и время
         date_str = medication.timestamp.strftime("%d.%m.%Y, %H:%M")
@@ -1175,7 +1168,6 @@ async def handle_medication_dosage(message: types.Message, state: FSMContext):
         logger.error(f"Ошибка при сохранении лекарства: {e}")
         await message.reply("❌ Ошибка при сохранении данных")
     finally:
-        db.close()
         await state.finish()
 
 # Команда для AI консультации
@@ -1192,13 +1184,113 @@ async def ai_command(message: types.Message):
 @dp.message_handler(commands=['reset'])
 async def reset_ai_history(message: types.Message):
     """Сброс истории диалога с AI"""
-    ai_assistant.clear_history()
+    ai_assistant.clear_history(message.chat.id)
     await message.reply(
         "🔄 *История диалога с AI сброшена*\n\n"
         "Теперь AI не будет учитывать предыдущие сообщения в контексте.",
         parse_mode=ParseMode.MARKDOWN
     )
 
+async def ensure_admin(message: types.Message) -> bool:
+    """
+    Проверяет, что служебную команду вызвал администратор бота (BOT_ADMIN_IDS)
+
+    Returns:
+        True, если команду можно выполнить
+    """
+    if message.from_user.id in BOT_ADMIN_IDS:
+        return True
+    await message.reply("⛔ Команда доступна только администраторам бота.")
+    return False
+
+@dp.message_handler(commands=['prompt_profile'])
+async def prompt_profile_command(message: types.Message):
+    """Замеры токенов и времени сборки промптов по секциям контекста (только для администраторов)"""
+    if not await ensure_admin(message):
+        return
+    profiler = ai_assistant.prompt_profiler
+    await message.reply(f"📏 Токены промптов по секциям (в среднем на сборку):\n\n{profiler.format_report()}")
+    
+    # Полные данные с гистограммами - файлом
+    data = json.dumps(profiler.export(), ensure_ascii=False, indent=2).encode('utf-8')
+    await message.reply_document(types.InputFile(io.BytesIO(data), filename='prompt_profile.json'))
+
+@dp.message_handler(commands=['db_stats'])
+async def db_stats_command(message: types.Message):
+    """Статистика сессий базы данных: открытые, коммиты, откаты, время жизни (только для администраторов)"""
+    if not await ensure_admin(message):
+        return
+    await message.reply(f"🗄 Сессии базы данных:\n\n{session_metrics.format_report()}")
+
+SEARCH_KIND_LABELS = {
+    'note': '📝 Заметка',
+    'chat': '🤖 Диалог с AI',
+    'prescription': '📋 Назначение'
+}
+
+async def render_search_page(db: AsyncSession, query: str, page: int) -> tuple:
+    """Текст страницы результатов поиска (HTML) и клавиатура"""
+    keyboard = InlineKeyboardMarkup(row_width=2)
+    child = await child_profiles.aget(db)
+    if not child:
+        return "Сначала зарегистрируйте ребенка с помощью команды /start", keyboard
+    
+    hits, total = await db.run_sync(search_records, child.id, query, SEARCH_PAGE_SIZE, page * SEARCH_PAGE_SIZE)
+    if not hits:
+        return f"🔍 По запросу «{html.escape(query)}» ничего не найдено.", keyboard
+    
+    pages = (total + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+    lines = [f"🔍 «{html.escape(query)}»: найдено {total}, страница {page + 1} из {pages}\n"]
+    for hit in hits:
+        date_str = hit.timestamp.strftime("%d.%m.%Y") if hit.timestamp else ""
+        # Найденные слова выделяем жирным, остальной текст экранируем
+        snippet = html.escape(hit.snippet or "").replace(MATCH_START, "<b>").replace(MATCH_END, "</b>")
+        title = html.escape((hit.title or "")[:60])
+        lines.append(f"{SEARCH_KIND_LABELS[hit.kind]} · {date_str}\n<i>{title}</i>\n{snippet}\n")
+        if hit.kind == 'note':
+            keyboard.add(InlineKeyboardButton(f"📝 {(hit.title or '')[:40]}", callback_data=f"note_{hit.id}"))
+    
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("◀️ Назад", callback_data=f"search_page_{page - 1}"))
+    if page + 1 < pages:
+        navigation.append(InlineKeyboardButton("Вперед ▶️", callback_data=f"search_page_{page + 1}"))
+    if navigation:
+        keyboard.row(*navigation)
+    return "\n".join(lines), keyboard
+
+@dp.message_handler(commands=['search'])
+async def search_command(message: types.Message, state: FSMContext, db: AsyncSession):
+    """Полнотекстовый поиск по заметкам, диалогам с AI и назначениям"""
+    query = message.get_args().strip()
+    if not query:
+        await message.reply("🔍 Укажите, что искать, например: /search железо")
+        return
+    
+    # Запрос нужен для перелистывания страниц
+    await state.update_data(search_query=query)
+    text, keyboard = await render_search_page(db, query, 0)
+    await message.reply(text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
+
+@dp.callback_query_handler(lambda c: c.data and c.data.startswith('search_page_'))
+async def process_search_page(callback_query: types.CallbackQuery, state: FSMContext, db: AsyncSession):
+    """Перелистывание результатов поиска"""
+    await bot.answer_callback_query(callback_query.id)
+    query = (await state.get_data()).get('search_query')
+    if not query:
+        await bot.send_message(callback_query.from_user.id, "Результаты поиска устарели, повторите /search")
+        return
+    
+    page = int(callback_query.data.replace('search_page_', ''))
+    text, keyboard = await render_search_page(db, query, page)
+    await bot.edit_message_text(
+        text,
+        chat_id=callback_query.from_user.id,
+        message_id=callback_query.message.message_id,
+        parse_mode=ParseMode.HTML,
+        reply_markup=keyboard
+    )
+
 # Обработчик callback для AI консультации
 @dp.callback_query_handler(lambda c: c.data == 'ai_consult')
 async def process_ai_consult(callback_query: types.CallbackQuery):
@@ -1212,587 +1304,604 @@ async def process_ai_consult(callback_query: types.CallbackQuery):
         )
     )
 
+def format_consult_answer(result: dict) -> str:
+    """Текст ответа консультации с отметкой, если он взят из кэша"""
+    if result['from_cache']:
+        return "♻️ Вы недавно спрашивали почти то же самое, данные с тех пор не менялись. Ответ:\n\n" + result['text']
+    return result['text']
+
+def consult_answer_keyboard(result: dict) -> InlineKeyboardMarkup:
+    """Клавиатура под ответом консультации"""
+    keyboard = InlineKeyboardMarkup()
+    if result['from_cache']:
+        keyboard.add(InlineKeyboardButton("🔄 Получить новый ответ", callback_data=f"consult_fresh_{result['entry_id']}"))
+    keyboard.add(InlineKeyboardButton("🔙 Назад в меню", callback_data='back_to_menu'))
+    return keyboard
+
+# Обработчик запроса нового ответа вместо ответа из кэша
+@dp.callback_query_handler(lambda c: c.data and c.data.startswith('consult_fresh_'))
+async def process_consult_fresh(callback_query: types.CallbackQuery):
+    """Повторно задает вопрос AI, минуя кэш похожих вопросов"""
+    await bot.answer_callback_query(callback_query.id)
+    entry_id = int(callback_query.data.replace('consult_fresh_', ''))
+    entry = ai_assistant.question_cache.get_entry(entry_id)
+    if not entry:
+        await bot.send_message(
+            callback_query.from_user.id,
+            "Этот ответ уже устарел. Задайте вопрос заново, и я отвечу с учетом актуальных данных."
+        )
+        return
+    
+    try:
+        result = await run_with_session(
+            lambda db: ai_assistant.consult(
+                entry['question'], db, force_fresh=True, chat_id=callback_query.message.chat.id
+            )
+        )
+        await bot.send_message(
+            callback_query.from_user.id,
+            format_consult_answer(result),
+            reply_markup=consult_answer_keyboard(result)
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при получении ответа от AI: {e}")
+        await bot.send_message(callback_query.from_user.id, "❌ Произошла ошибка при обработке вашего запроса.")
+
+# Обработчик запроса подробного пояснения сводки от AI
+@dp.callback_query_handler(lambda c: c.data and c.data.startswith('summary_explain_'))
+async def process_summary_explain(callback_query: types.CallbackQuery):
+    """Подробно объясняет сводку по кормлениям, весу или стулу с помощью AI"""
+    await bot.answer_callback_query(callback_query.id)
+    kind = callback_query.data.replace('summary_explain_', '')
+    if kind not in ('feeding', 'weight', 'stool'):
+        return
+    
+    await bot.send_message(callback_query.from_user.id, "🤖 Готовлю подробное пояснение...")
+    explanation = await run_with_session(ai_assistant.explain_summary, kind)
+    
+    keyboard = InlineKeyboardMarkup()
+    keyboard.add(InlineKeyboardButton("🔙 Назад в меню", callback_data='back_to_menu'))
+    await bot.send_message(callback_query.from_user.id, explanation, reply_markup=keyboard)
+
 # Обработчик callback для статистики
 @dp.callback_query_handler(lambda c: c.data == 'stats')
-async def process_stats(callback_query: types.CallbackQuery):
+async def process_stats(callback_query: types.CallbackQuery, db: AsyncSession):
     """Показать статистику"""
     await bot.answer_callback_query(callback_query.id)
-    db: Session = next(get_db())
-    try:
-        child = db.query(Child).first()
-        if not child:
-            await bot.send_message(callback_query.from_user.id, "Сначала зарегистрируйте ребенка")
-            return
+    child = await child_profiles.aget(db)
+    if not child:
+        await bot.send_message(callback_query.from_user.id, "Сначала зарегистрируйте ребенка")
+        return
             
-        # Подсчет данных
-        feedings_today = db.query(Feeding).filter(
-            Feeding.child_id == child.id,
-            Feeding.timestamp >= datetime.now().replace(hour=0, minute=0, second=0)
-        ).count()
-        
-        total_ml_today = db.query(Feeding).filter(
-            Feeding.child_id == child.id,
-            Feeding.timestamp >= datetime.now().replace(hour=0, minute=0, second=0)
-        ).with_entities(func.sum(Feeding.amount)).scalar() or 0
-        
-        last_weight = db.query(Weight).filter_by(child_id=child.id).order_by(Weight.timestamp.desc()).first()
+    # Подсчет данных по суточным итогам
+    today_feedings = await db.run_sync(feeding_totals, child.id, since=datetime.now().date())
+    feedings_today = today_feedings['count']
+    total_ml_today = today_feedings['amount']
         
-        # Вычисление возраста
-        age_days = (datetime.now().date() - child.birth_date).days
-        age_months = age_days // 30
+    last_weight = await db.scalar(select(Weight).filter_by(child_id=child.id).order_by(Weight.timestamp.desc()).limit(1))
         
-        stats_text = f"""📊 *Статистика для {child.name}*
+    stats_text = f"""📊 *Статистика для {child.name}*
         
-👶 Возраст: {age_months} мес. ({age_days} дней)
+👶 Возраст: {child.age_months} мес. ({child.age_days} дней)
 🍼 Кормлений сегодня: {feedings_today}
 �� Всего молока сегодня: {total_ml_today} мл
 ⚖️ Последний вес: {last_weight.weight if last_weight else 'Не указан'} кг
         """
         
-        await bot.send_message(
-            callback_query.from_user.id,
-            stats_text,
-            parse_mode=ParseMode.MARKDOWN
+    await bot.send_message(
+        callback_query.from_user.id,
+        stats_text,
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+def make_note_title(note_text: str, max_length: int = 40) -> str:
+    """Заголовок заметки без обращения к AI: первое предложение или начало текста"""
+    title = re.split(r'[.!?\n]', note_text.strip(), 1)[0].strip() or "Новая заметка"
+    if len(title) > max_length:
+        title = title[:max_length].rstrip() + "…"
+    return title
+
+async def enrich_note(note_id: int, note_text: str, placeholder_title: str, reply: types.Message):
+    """Фоновое уточнение заголовка заметки с помощью AI и обновление подтверждения"""
+    try:
+        loop = asyncio.get_event_loop()
+        note_data = await loop.run_in_executor(None, ai_assistant.extract_note_title, note_text)
+        if not note_data:
+            return
+        
+        async with session_scope('enrich_note') as db:
+            note = await db.get(Note, note_id)
+            # Заметку могли удалить или переименовать, пока выполнялся запрос
+            if not note or note.title != placeholder_title:
+                return
+            note.title = note_data['title']
+        
+        await reply.edit_text(
+            f"✅ Заметка \"{note_data['title']}\" сохранена!",
+            reply_markup=get_main_keyboard()
         )
-    finally:
-        db.close()
+    except Exception as e:
+        logger.error(f"Ошибка при уточнении заголовка заметки: {e}")
 
 # Функция для обработки текста (общая для текстовых и голосовых сообщений)
-async def process_message_text(text: str, message: types.Message, state: FSMContext):
+async def process_message_text(text: str, message: types.Message, state: FSMContext, db: AsyncSession):
     """Обработка текста сообщения с AI с полным контекстом и распознаванием напоминаний"""
-    db: Session = next(get_db())
-    try:
-        # Проверяем, есть ли в сообщении команда для статистики
-        if text.lower().strip() in ['статистика', 'сводка', 'анализ', 'развитие']:
-            # Генерируем сводку о развитии ребенка
+    # Проверяем, есть ли в сообщении команда для статистики
+    if text.lower().strip() in ['статистика', 'сводка', 'анализ', 'развитие']:
+        message_coalescer.mark_committed()
+        # Берем подготовленную сводку или генерируем новую
+        entry = await run_with_session(ai_assistant.get_summary, 'development', generate=False)
+        if not entry:
             await message.reply("🔄 Анализирую данные о развитии ребенка...")
-            summary = ai_assistant.generate_development_summary(db)
+            entry = await run_with_session(ai_assistant.get_summary, 'development')
             
-            # Форматируем ответ
-            response = f"📊 *Сводка о развитии ребенка*\n\n{summary}"
-            await message.reply(response, parse_mode=ParseMode.MARKDOWN)
-            return
+        # Форматируем ответ
+        response = f"📊 *Сводка о развитии ребенка*\n\n{entry['text']}{format_summary_freshness(entry)}"
+        await message.reply(response, parse_mode=ParseMode.MARKDOWN)
+        return
         
-        # Получаем информацию о ребенке
-        child = db.query(Child).first()
-        if not child:
-            await message.reply("❌ Сначала зарегистрируйте ребенка")
-            return
+    # Получаем информацию о ребенке
+    child = await child_profiles.aget(db)
+    if not child:
+        await message.reply("❌ Сначала зарегистрируйте ребенка")
+        return
         
-        # Проверяем, является ли сообщение запросом на добавление заметки
-        if text.lower().startswith('добавь заметку') or text.lower().startswith('создай заметку'):
-            # Извлекаем заголовок и содержание заметки
-            note_text = text.split(' ', 2)[-1]  # Удаляем "добавь заметку" или "создай заметку"
+    # Проверяем, является ли сообщение запросом на добавление заметки
+    if text.lower().startswith('добавь заметку') or text.lower().startswith('создай заметку'):
+        message_coalescer.mark_committed()
+        # Извлекаем заголовок и содержание заметки
+        note_text = text.split(' ', 2)[-1]  # Удаляем "добавь заметку" или "создай заметку"
             
-            # Используем OpenAI для разделения на заголовок и содержание
-            try:
-                prompt = f"""Раздели следующий текст на заголовок и содержание заметки:
-
-{note_text}
-
-Верни ответ в формате JSON:
-{{
-  "title": "Заголовок заметки (короткий)",
-  "content": "Содержание заметки (полный текст)"
-}}"""
-
-                response = openai.ChatCompletion.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "Ты - ассистент, который помогает создавать заметки."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.3,
-                    max_tokens=500
-                )
-                
-                result = response['choices'][0]['message']['content'].strip()
-                
-                # Извлекаем JSON из ответа
-                try:
-                    # Находим начало и конец JSON
-                    start_idx = result.find('{')
-                    end_idx = result.rfind('}') + 1
-                    
-                    if start_idx >= 0 and end_idx > start_idx:
-                        json_str = result[start_idx:end_idx]
-                        note_data = json.loads(json_str)
-                        
-                        title = note_data.get('title', 'Новая заметка')
-                        content = note_data.get('content', note_text)
-                        
-                        # Создаем заметку
-                        note = Note(
-                            child_id=child.id,
-                            title=title,
-                            content=content,
-                            timestamp=datetime.now()
-                        )
-                        
-                        db.add(note)
-                        db.commit()
-                        
-                        await message.reply(
-                            f"✅ Заметка \"{title}\" успешно сохранена!",
-                            reply_markup=get_main_keyboard()
-                        )
-                        return
-                except Exception as e:
-                    logger.error(f"Ошибка при парсинге JSON с заметкой: {e}")
-            except Exception as e:
-                logger.error(f"Ошибка при создании заметки: {e}")
+        # Сохраняем заметку сразу с локальным заголовком, уточняем его в фоне
+        title = make_note_title(note_text)
+        note = Note(
+            child_id=child.id,
+            title=title,
+            content=note_text,
+            timestamp=datetime.now()
+        )
             
-            # Если не удалось разделить на заголовок и содержание, создаем заметку с дефолтным заголовком
-            note = Note(
-                child_id=child.id,
-                title="Новая заметка",
-                content=note_text,
-                timestamp=datetime.now()
-            )
+        db.add(note)
+        # Фиксируем сразу: фоновое уточнение заголовка читает заметку в своей сессии
+        await db.commit()
             
-            db.add(note)
-            db.commit()
+        reply = await message.reply(
+            f"✅ Заметка \"{title}\" сохранена!",
+            reply_markup=get_main_keyboard()
+        )
+        asyncio.get_event_loop().create_task(enrich_note(note.id, note_text, title, reply))
+        return
             
+    # Проверяем, является ли сообщение запросом на создание напоминаний из назначений
+    if ai_assistant.parse_prescription_reminders_request(text):
+        message_coalescer.mark_committed()
+        # Получаем активные назначения
+        prescriptions = (await db.scalars(select(Prescription).filter(
+            Prescription.child_id == child.id,
+            Prescription.is_active == 1
+        ))).all()
+            
+        if not prescriptions:
             await message.reply(
-                f"✅ Заметка успешно сохранена!",
-                reply_markup=get_main_keyboard()
+                "❌ У вас нет активных назначений для создания напоминаний"
             )
             return
             
-        # Проверяем, является ли сообщение запросом на создание напоминаний из назначений
-        if ai_assistant.parse_prescription_reminders_request(text):
-            # Получаем активные назначения
-            prescriptions = db.query(Prescription).filter(
-                Prescription.child_id == child.id,
-                Prescription.is_active == 1
-            ).all()
-            
-            if not prescriptions:
-                await message.reply(
-                    "❌ У вас нет активных назначений для создания напоминаний"
-                )
-                return
+        # Формируем сообщение с предложенными напоминаниями
+        message_text = "📋 *Предлагаемые напоминания из назначений*\n\n"
             
-            # Формируем сообщение с предложенными напоминаниями
-            message_text = "📋 *Предлагаемые напоминания из назначений*\n\n"
+        all_options = []
             
-            all_options = []
+        for prescription in prescriptions:
+            # Генерируем варианты напоминаний
+            options = generate_reminder_options(prescription)
+            if options:
+                message_text += f"*{prescription.medication_name}*:\n"
+                for i, option in enumerate(options, 1):
+                    message_text += (
+                        f"  {i}. {option['description']}\n"
+                        f"  ⏰ Время: {option['time']}\n"
+                        f"  🔄 Повторение: {option['repeat_text']}\n\n"
+                    )
+                all_options.extend(options)
             
-            for prescription in prescriptions:
-                # Генерируем варианты напоминаний
-                options = generate_reminder_options(prescription)
-                if options:
-                    message_text += f"*{prescription.medication_name}*:\n"
-                    for i, option in enumerate(options, 1):
-                        message_text += (
-                            f"  {i}. {option['description']}\n"
-                            f"  ⏰ Время: {option['time']}\n"
-                            f"  🔄 Повторение: {option['repeat_text']}\n\n"
-                        )
-                    all_options.extend(options)
+        if not all_options:
+            await message.reply(
+                "❌ Не удалось сгенерировать напоминания для ваших назначений"
+            )
+            return
             
-            if not all_options:
-                await message.reply(
-                    "❌ Не удалось сгенерировать напоминания для ваших назначений"
-                )
-                return
+        # Создаем клавиатуру с кнопками
+        keyboard = InlineKeyboardMarkup(row_width=1)
+        keyboard.add(
+            InlineKeyboardButton("✅ Добавить все напоминания", callback_data="add_all_prescription_reminders"),
+            InlineKeyboardButton("❌ Отмена", callback_data="back_to_menu")
+        )
             
-            # Создаем клавиатуру с кнопками
-            keyboard = InlineKeyboardMarkup(row_width=1)
-            keyboard.add(
-                InlineKeyboardButton("✅ Добавить все напоминания", callback_data="add_all_prescription_reminders"),
-                InlineKeyboardButton("❌ Отмена", callback_data="back_to_menu")
-            )
+        # Сохраняем варианты напоминаний в состоянии
+        await state.update_data(prescription_reminder_options=all_options)
             
-            # Сохраняем варианты напоминаний в состоянии
-            await state.update_data(prescription_reminder_options=all_options)
+        await message.reply(
+            message_text,
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=keyboard
+        )
+        return
             
-            await message.reply(
-                message_text,
-                parse_mode=ParseMode.MARKDOWN,
-                reply_markup=keyboard
+    # Проверяем, является ли сообщение записью о кормлении
+    feeding_data = await run_blocking(ai_assistant.parse_feeding, text)
+    if feeding_data:
+        message_coalescer.mark_committed()
+        try:
+            # Создаем запись о кормлении
+            feeding = Feeding(
+                child_id=child.id,
+                amount=feeding_data['amount'],
+                food_type=feeding_data['food_type'],
+                timestamp=datetime.now()
             )
-            return
-            
-        # Проверяем, является ли сообщение записью о кормлении
-        feeding_data = ai_assistant.parse_feeding(text)
-        if feeding_data:
-            try:
-                # Создаем запись о кормлении
-                feeding = Feeding(
-                    child_id=child.id,
-                    amount=feeding_data['amount'],
-                    food_type=feeding_data['food_type'],
-                    timestamp=datetime.now()
-                )
                 
-                db.add(feeding)
-                db.commit()
+            db.add(feeding)
+            await db.flush()
                 
-                # Определяем тип питания для сообщения
-                food_type_text = "грудное молоко"
-                if feeding_data['food_type'] == 'formula':
-                    food_type_text = "смесь"
-                elif feeding_data['food_type'] == 'food':
-                    food_type_text = "прикорм"
+            # Определяем тип питания для сообщения
+            food_type_text = food_type_label(feeding_data['food_type'])
                 
-                # Отправляем сообщение об успешном добавлении
-                await message.reply(
-                    f"✅ *Запись о кормлении добавлена*\n\n"
-                    f"🍼 Количество: {feeding_data['amount']} мл\n"
-                    f"🥛 Тип: {food_type_text}\n"
-                    f"🕒 Время: {datetime.now().strftime('%H:%M')}\n",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-                return
-            except Exception as e:
-                logger.error(f"Ошибка при добавлении записи о кормлении: {e}")
+            # Отправляем сообщение об успешном добавлении
+            await message.reply(
+                f"✅ *Запись о кормлении добавлена*\n\n"
+                f"🍼 Количество: {feeding_data['amount']} мл\n"
+                f"🥛 Тип: {food_type_text}\n"
+                f"🕒 Время: {datetime.now().strftime('%H:%M')}\n",
+                parse_mode=ParseMode.MARKDOWN
+            )
+            return
+        except Exception as e:
+            logger.error(f"Ошибка при добавлении записи о кормлении: {e}")
         
-        # Проверяем, является ли сообщение записью о стуле
-        stool_data = ai_assistant.parse_stool(text)
-        if stool_data:
-            try:
-                # Создаем запись о стуле
-                stool = Stool(
-                    child_id=child.id,
-                    description=stool_data['description'],
-                    color=stool_data['color'],
-                    timestamp=datetime.now()
-                )
+    # Проверяем, является ли сообщение записью о стуле
+    stool_data = await run_blocking(ai_assistant.parse_stool, text)
+    if stool_data:
+        message_coalescer.mark_committed()
+        try:
+            # Создаем запись о стуле
+            stool = Stool(
+                child_id=child.id,
+                description=stool_data['description'],
+                color=stool_data['color'],
+                timestamp=datetime.now()
+            )
                 
-                db.add(stool)
-                db.commit()
+            db.add(stool)
+            await db.flush()
                 
-                # Формируем сообщение о цвете
-                color_text = f"🎨 Цвет: {stool_data['color']}\n" if stool_data['color'] else ""
+            # Формируем сообщение о цвете
+            color_text = f"🎨 Цвет: {stool_data['color']}\n" if stool_data['color'] else ""
                 
-                # Добавляем кнопку возврата в меню
-                keyboard = InlineKeyboardMarkup()
-                keyboard.add(InlineKeyboardButton("🔙 Назад в меню", callback_data='back_to_menu'))
+            # Добавляем кнопку возврата в меню
+            keyboard = InlineKeyboardMarkup()
+            keyboard.add(InlineKeyboardButton("🔙 Назад в меню", callback_data='back_to_menu'))
                 
-                # Отправляем сообщение об успешном добавлении
-                await message.reply(
-                    f"✅ *Запись о стуле добавлена*\n\n"
-                    f"📝 Описание: {stool_data['description']}\n"
-                    f"{color_text}"
-                    f"🕒 Время: {datetime.now().strftime('%H:%M')}\n",
-                    parse_mode=ParseMode.MARKDOWN,
-                    reply_markup=keyboard
-                )
-                return
-            except Exception as e:
-                logger.error(f"Ошибка при добавлении записи о стуле: {e}")
+            # Отправляем сообщение об успешном добавлении
+            await message.reply(
+                f"✅ *Запись о стуле добавлена*\n\n"
+                f"📝 Описание: {stool_data['description']}\n"
+                f"{color_text}"
+                f"🕒 Время: {datetime.now().strftime('%H:%M')}\n",
+                parse_mode=ParseMode.MARKDOWN,
+                reply_markup=keyboard
+            )
+            return
+        except Exception as e:
+            logger.error(f"Ошибка при добавлении записи о стуле: {e}")
         
-        # Проверяем, является ли сообщение записью о приеме лекарства
-        medication_data = ai_assistant.parse_medication(text)
-        if medication_data:
-            try:
-                # Создаем запись о лекарстве
-                medication = Medication(
-                    child_id=child.id,
-                    medication_name=medication_data['medication_name'],
-                    dosage=medication_data['dosage'] or "",
-                    timestamp=datetime.now()
-                )
+    # Проверяем, является ли сообщение записью о приеме лекарства
+    medication_data = await run_blocking(ai_assistant.parse_medication, text)
+    if medication_data:
+        message_coalescer.mark_committed()
+        try:
+            # Создаем запись о лекарстве
+            medication = Medication(
+                child_id=child.id,
+                medication_name=medication_data['medication_name'],
+                dosage=medication_data['dosage'] or "",
+                timestamp=datetime.now()
+            )
                 
-                db.add(medication)
-                db.commit()
+            db.add(medication)
+            await db.flush()
                 
-                # Формируем сообщение о дозировке
-                dosage_text = f"💊 Дозировка: {medication_data['dosage']}\n" if medication_data['dosage'] else ""
+            # Формируем сообщение о дозировке
+            dosage_text = f"💊 Дозировка: {medication_data['dosage']}\n" if medication_data['dosage'] else ""
                 
-                # Отправляем сообщение об успешном добавлении
-                await message.reply(
-                    f"✅ *Запись о приеме лекарства добавлена*\n\n"
-                    f"💊 Лекарство: {medication_data['medication_name']}\n"
-                    f"{dosage_text}"
-                    f"🕒 Время: {datetime.now().strftime('%H:%M')}\n",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-                return
-            except Exception as e:
-                logger.error(f"Ошибка при добавлении записи о лекарстве: {e}")
+            # Отправляем сообщение об успешном добавлении
+            await message.reply(
+                f"✅ *Запись о приеме лекарства добавлена*\n\n"
+                f"💊 Лекарство: {medication_data['medication_name']}\n"
+                f"{dosage_text}"
+                f"🕒 Время: {datetime.now().strftime('%H:%M')}\n",
+                parse_mode=ParseMode.MARKDOWN
+            )
+            return
+        except Exception as e:
+            logger.error(f"Ошибка при добавлении записи о лекарстве: {e}")
         
-        # Проверяем, является ли сообщение запросом на создание напоминания
-        reminder_data = reminder_parser.parse_reminder(text)
-        if reminder_data:
-            try:
-                created_reminders = []
+    # Проверяем, является ли сообщение запросом на создание напоминания
+    reminder_data = await run_blocking(reminder_parser.parse_reminder, text)
+    if reminder_data:
+        message_coalescer.mark_committed()
+        try:
+            created_reminders = []
                 
-                # Обрабатываем каждое напоминание
-                for reminder_info in reminder_data:
-                    # Парсим дату и время
-                    reminder_time_str = f"{reminder_info['date']} {reminder_info['time']}"
-                    reminder_time = datetime.strptime(reminder_time_str, "%d.%m.%Y %H:%M")
+            # Обрабатываем каждое напоминание
+            for reminder_info in reminder_data:
+                # Парсим дату и время
+                reminder_time_str = f"{reminder_info['date']} {reminder_info['time']}"
+                reminder_time = datetime.strptime(reminder_time_str, "%d.%m.%Y %H:%M")
                     
-                    # Для повторяющихся напоминаний корректируем время
-                    if reminder_info['repeat_type'] != 'once':
-                        # Если время уже прошло сегодня, устанавливаем на завтра
-                        if reminder_time <= datetime.now():
-                            reminder_time = reminder_time + timedelta(days=1)
-                    else:
-                        # Для однократных напоминаний проверяем, что время в будущем
-                        if reminder_time <= datetime.now():
-                            await message.reply(f"❌ Время напоминания '{reminder_info['description']}' должно быть в будущем.")
-                            continue
+                # Для повторяющихся напоминаний корректируем время
+                if reminder_info['repeat_type'] != 'once':
+                    # Если время уже прошло сегодня, устанавливаем на завтра
+                    if reminder_time <= datetime.now():
+                        reminder_time = reminder_time + timedelta(days=1)
+                else:
+                    # Для однократных напоминаний проверяем, что время в будущем
+                    if reminder_time <= datetime.now():
+                        await message.reply(f"❌ Время напоминания '{reminder_info['description']}' должно быть в будущем.")
+                        continue
                     
-                    # Создаем напоминание
-                    reminder = Reminder(
-                        child_id=child.id,
-                        description=reminder_info['description'],
-                        reminder_time=reminder_time,
-                        status='active',
-                        repeat_type=reminder_info['repeat_type'],
-                        repeat_interval=reminder_info['repeat_interval']
-                    )
+                # Создаем напоминание
+                reminder = Reminder(
+                    child_id=child.id,
+                    description=reminder_info['description'],
+                    reminder_time=reminder_time,
+                    status='active',
+                    repeat_type=reminder_info['repeat_type'],
+                    repeat_interval=reminder_info['repeat_interval']
+                )
                     
-                    db.add(reminder)
-                    created_reminders.append((reminder, reminder_info))
+                db.add(reminder)
+                created_reminders.append((reminder, reminder_info))
                 
-                if created_reminders:
-                    db.commit()
+            if created_reminders:
+                await db.flush()
                     
-                    # Формируем сообщение об успехе
-                    success_messages = []
-                    for reminder, reminder_info in created_reminders:
-                        repeat_text = "однократное"
-                        if reminder_info['repeat_type'] == 'daily':
-                            repeat_text = f"каждые {reminder_info['repeat_interval']} день(дней)"
-                        elif reminder_info['repeat_type'] == 'weekly':
-                            repeat_text = f"каждые {reminder_info['repeat_interval']} неделю(недель)"
-                        elif reminder_info['repeat_type'] == 'monthly':
-                            repeat_text = f"каждые {reminder_info['repeat_interval']} месяц(ев)"
-                        elif reminder_info['repeat_type'] == 'hourly':
-                            repeat_text = f"каждые {reminder_info['repeat_interval']} час(ов)"
+                # Формируем сообщение об успехе
+                success_messages = []
+                for reminder, reminder_info in created_reminders:
+                    repeat_text = "однократное"
+                    if reminder_info['repeat_type'] == 'daily':
+                        repeat_text = f"каждые {reminder_info['repeat_interval']} день(дней)"
+                    elif reminder_info['repeat_type'] == 'weekly':
+                        repeat_text = f"каждые {reminder_info['repeat_interval']} неделю(недель)"
+                    elif reminder_info['repeat_type'] == 'monthly':
+                        repeat_text = f"каждые {reminder_info['repeat_interval']} месяц(ев)"
+                    elif reminder_info['repeat_type'] == 'hourly':
+                        repeat_text = f"каждые {reminder_info['repeat_interval']} час(ов)"
                         
-                        success_messages.append(
-                            f"📝 {reminder_info['description']}\n"
-                            f"⏰ Время: {reminder.reminder_time.strftime('%d.%m.%Y, %H:%M')}\n"
-                            f"🔄 Повторение: {repeat_text}"
-                        )
-                    
-                    # Добавляем кнопку возврата в меню
-                    keyboard = InlineKeyboardMarkup()
-                    keyboard.add(InlineKeyboardButton("🔙 Назад в меню", callback_data='back_to_menu'))
+                    success_messages.append(
+                        f"📝 {reminder_info['description']}\n"
+                        f"⏰ Время: {reminder.reminder_time.strftime('%d.%m.%Y, %H:%M')}\n"
+                        f"🔄 Повторение: {repeat_text}"
+                    )
                     
-                    if len(created_reminders) == 1:
-                        await message.reply(
-                            f"✅ Напоминание создано!\n\n{success_messages[0]}",
-                            reply_markup=keyboard
-                        )
-                    else:
-                        await message.reply(
-                            f"✅ Создано напоминаний: {len(created_reminders)}\n\n" + "\n\n".join(success_messages),
-                            reply_markup=keyboard
-                        )
-                    return
-                
-            except Exception as e:
-                logger.error(f"Ошибка при создании напоминания: {e}")
-                await message.reply("❌ Произошла ошибка при создании напоминания.")
-                return
-        
-        # Если ничего не подошло, считаем сообщение запросом к AI ассистенту
-        with SessionLocal() as db:
-            try:
-                # Получаем ответ от AI ассистента
-                response = ai_assistant.get_response(text, db)
-                
                 # Добавляем кнопку возврата в меню
                 keyboard = InlineKeyboardMarkup()
                 keyboard.add(InlineKeyboardButton("🔙 Назад в меню", callback_data='back_to_menu'))
+                    
+                if len(created_reminders) == 1:
+                    await message.reply(
+                        f"✅ Напоминание создано!\n\n{success_messages[0]}",
+                        reply_markup=keyboard
+                    )
+                else:
+                    await message.reply(
+                        f"✅ Создано напоминаний: {len(created_reminders)}\n\n" + "\n\n".join(success_messages),
+                        reply_markup=keyboard
+                    )
+                return
                 
-                await message.reply(response, reply_markup=keyboard)
-            except Exception as e:
-                logger.error(f"Ошибка при получении ответа от AI: {e}")
-                await message.reply("❌ Произошла ошибка при обработке вашего запроса.")
+        except Exception as e:
+            logger.error(f"Ошибка при создании напоминания: {e}")
+            await message.reply("❌ Произошла ошибка при создании напоминания.")
+            return
         
-        # Проверяем, является ли сообщение записью о весе
-        weight_data = ai_assistant.parse_weight(text)
-        if weight_data:
-            try:
-                # Создаем запись о весе
-                weight = Weight(
-                    child_id=child.id,
-                    weight=weight_data['weight'],
-                    timestamp=datetime.now()
-                )
+    # Если ничего не подошло, считаем сообщение запросом к AI ассистенту
+    message_coalescer.mark_committed()
+    try:
+        # Получаем ответ от AI ассистента (или из кэша похожих вопросов)
+        result = await run_with_session(
+            lambda db: ai_assistant.consult(text, db, chat_id=message.chat.id)
+        )
+        await message.reply(format_consult_answer(result), reply_markup=consult_answer_keyboard(result))
+    except Exception as e:
+        logger.error(f"Ошибка при получении ответа от AI: {e}")
+        await message.reply("❌ Произошла ошибка при обработке вашего запроса.")
+        
+    # Проверяем, является ли сообщение записью о весе
+    weight_data = await run_blocking(ai_assistant.parse_weight, text)
+    if weight_data:
+        message_coalescer.mark_committed()
+        try:
+            # Создаем запись о весе
+            weight = Weight(
+                child_id=child.id,
+                weight=weight_data['weight'],
+                timestamp=datetime.now()
+            )
                 
-                db.add(weight)
-                db.commit()
+            db.add(weight)
+            await db.flush()
                 
-                # Добавляем кнопку возврата в меню
-                keyboard = InlineKeyboardMarkup()
-                keyboard.add(InlineKeyboardButton("🔙 Назад в меню", callback_data='back_to_menu'))
+            # Добавляем кнопку возврата в меню
+            keyboard = InlineKeyboardMarkup()
+            keyboard.add(InlineKeyboardButton("🔙 Назад в меню", callback_data='back_to_menu'))
                 
-                # Отправляем сообщение об успешном добавлении
-                await message.reply(
-                    f"✅ *Запись о весе добавлена*\n\n"
-                    f"⚖️ Вес: {weight_data['weight']} кг\n"
-                    f"📅 Дата: {datetime.now().strftime('%d.%m.%Y, %H:%M')}\n",
-                    parse_mode=ParseMode.MARKDOWN,
-                    reply_markup=keyboard
-                )
-                return
-            except Exception as e:
-                logger.error(f"Ошибка при добавлении записи о весе: {e}")
+            # Отправляем сообщение об успешном добавлении
+            await message.reply(
+                f"✅ *Запись о весе добавлена*\n\n"
+                f"⚖️ Вес: {weight_data['weight']} кг\n"
+                f"📅 Дата: {datetime.now().strftime('%d.%m.%Y, %H:%M')}\n",
+                parse_mode=ParseMode.MARKDOWN,
+                reply_markup=keyboard
+            )
+            return
+        except Exception as e:
+            logger.error(f"Ошибка при добавлении записи о весе: {e}")
         
-        # Проверяем, является ли сообщение записью о стуле
-        stool_data = ai_assistant.parse_stool(text)
-        if stool_data:
-            try:
-                # Создаем запись о стуле
-                stool = Stool(
-                    child_id=child.id,
-                    description=stool_data['description'],
-                    color=stool_data['color'],
-                    timestamp=datetime.now()
-                )
+    # Проверяем, является ли сообщение записью о стуле
+    stool_data = await run_blocking(ai_assistant.parse_stool, text)
+    if stool_data:
+        message_coalescer.mark_committed()
+        try:
+            # Создаем запись о стуле
+            stool = Stool(
+                child_id=child.id,
+                description=stool_data['description'],
+                color=stool_data['color'],
+                timestamp=datetime.now()
+            )
                 
-                db.add(stool)
-                db.commit()
+            db.add(stool)
+            await db.flush()
                 
-                # Формируем сообщение о цвете
-                color_text = f"🎨 Цвет: {stool_data['color']}\n" if stool_data['color'] else ""
+            # Формируем сообщение о цвете
+            color_text = f"🎨 Цвет: {stool_data['color']}\n" if stool_data['color'] else ""
                 
-                # Добавляем кнопку возврата в меню
-                keyboard = InlineKeyboardMarkup()
-                keyboard.add(InlineKeyboardButton("🔙 Назад в меню", callback_data='back_to_menu'))
+            # Добавляем кнопку возврата в меню
+            keyboard = InlineKeyboardMarkup()
+            keyboard.add(InlineKeyboardButton("🔙 Назад в меню", callback_data='back_to_menu'))
                 
-                # Отправляем сообщение об успешном добавлении
-                await message.reply(
-                    f"✅ *Запись о стуле добавлена*\n\n"
-                    f"📝 Описание: {stool_data['description']}\n"
-                    f"{color_text}"
-                    f"🕒 Время: {datetime.now().strftime('%H:%M')}\n",
-                    parse_mode=ParseMode.MARKDOWN,
-                    reply_markup=keyboard
-                )
-                return
-            except Exception as e:
-                logger.error(f"Ошибка при добавлении записи о стуле: {e}")
+            # Отправляем сообщение об успешном добавлении
+            await message.reply(
+                f"✅ *Запись о стуле добавлена*\n\n"
+                f"📝 Описание: {stool_data['description']}\n"
+                f"{color_text}"
+                f"🕒 Время: {datetime.now().strftime('%H:%M')}\n",
+                parse_mode=ParseMode.MARKDOWN,
+                reply_markup=keyboard
+            )
+            return
+        except Exception as e:
+            logger.error(f"Ошибка при добавлении записи о стуле: {e}")
         
-        # Проверяем, является ли сообщение записью о приеме лекарства
-        medication_data = ai_assistant.parse_medication(text)
-        if medication_data:
-            try:
-                # Создаем запись о лекарстве
-                medication = Medication(
-                    child_id=child.id,
-                    medication_name=medication_data['medication_name'],
-                    dosage=medication_data['dosage'] or "",
-                    timestamp=datetime.now()
-                )
+    # Проверяем, является ли сообщение записью о приеме лекарства
+    medication_data = await run_blocking(ai_assistant.parse_medication, text)
+    if medication_data:
+        message_coalescer.mark_committed()
+        try:
+            # Создаем запись о лекарстве
+            medication = Medication(
+                child_id=child.id,
+                medication_name=medication_data['medication_name'],
+                dosage=medication_data['dosage'] or "",
+                timestamp=datetime.now()
+            )
                 
-                db.add(medication)
-                db.commit()
+            db.add(medication)
+            await db.flush()
                 
-                # Формируем сообщение о дозировке
-                dosage_text = f"💊 Дозировка: {medication_data['dosage']}\n" if medication_data['dosage'] else ""
+            # Формируем сообщение о дозировке
+            dosage_text = f"💊 Дозировка: {medication_data['dosage']}\n" if medication_data['dosage'] else ""
                 
-                # Отправляем сообщение об успешном добавлении
-                await message.reply(
-                    f"✅ *Запись о приеме лекарства добавлена*\n\n"
-                    f"💊 Лекарство: {medication_data['medication_name']}\n"
-                    f"{dosage_text}"
-                    f"🕒 Время: {datetime.now().strftime('%H:%M')}\n",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-                return
-            except Exception as e:
-                logger.error(f"Ошибка при добавлении записи о лекарстве: {e}")
+            # Отправляем сообщение об успешном добавлении
+            await message.reply(
+                f"✅ *Запись о приеме лекарства добавлена*\n\n"
+                f"💊 Лекарство: {medication_data['medication_name']}\n"
+                f"{dosage_text}"
+                f"🕒 Время: {datetime.now().strftime('%H:%M')}\n",
+                parse_mode=ParseMode.MARKDOWN
+            )
+            return
+        except Exception as e:
+            logger.error(f"Ошибка при добавлении записи о лекарстве: {e}")
         
-        # Проверяем, является ли сообщение запросом на создание напоминания
-        reminder_data = reminder_parser.parse_reminder(text)
-        if reminder_data:
-            try:
-                created_reminders = []
+    # Проверяем, является ли сообщение запросом на создание напоминания
+    reminder_data = await run_blocking(reminder_parser.parse_reminder, text)
+    if reminder_data:
+        message_coalescer.mark_committed()
+        try:
+            created_reminders = []
                 
-                # Обрабатываем каждое напоминание
-                for reminder_info in reminder_data:
-                    # Парсим дату и время
-                    reminder_time_str = f"{reminder_info['date']} {reminder_info['time']}"
-                    reminder_time = datetime.strptime(reminder_time_str, "%d.%m.%Y %H:%M")
+            # Обрабатываем каждое напоминание
+            for reminder_info in reminder_data:
+                # Парсим дату и время
+                reminder_time_str = f"{reminder_info['date']} {reminder_info['time']}"
+                reminder_time = datetime.strptime(reminder_time_str, "%d.%m.%Y %H:%M")
                     
-                    # Для повторяющихся напоминаний корректируем время
-                    if reminder_info['repeat_type'] != 'once':
-                        # Если время уже прошло сегодня, устанавливаем на завтра
-                        if reminder_time <= datetime.now():
-                            reminder_time = reminder_time + timedelta(days=1)
-                    else:
-                        # Для однократных напоминаний проверяем, что время в будущем
-                        if reminder_time <= datetime.now():
-                            await message.reply(f"❌ Время напоминания '{reminder_info['description']}' должно быть в будущем.")
-                            continue
+                # Для повторяющихся напоминаний корректируем время
+                if reminder_info['repeat_type'] != 'once':
+                    # Если время уже прошло сегодня, устанавливаем на завтра
+                    if reminder_time <= datetime.now():
+                        reminder_time = reminder_time + timedelta(days=1)
+                else:
+                    # Для однократных напоминаний проверяем, что время в будущем
+                    if reminder_time <= datetime.now():
+                        await message.reply(f"❌ Время напоминания '{reminder_info['description']}' должно быть в будущем.")
+                        continue
                     
-                    # Создаем напоминание
-                    reminder = Reminder(
-                        child_id=child.id,
-                        description=reminder_info['description'],
-                        reminder_time=reminder_time,
-                        status='active',
-                        repeat_type=reminder_info['repeat_type'],
-                        repeat_interval=reminder_info['repeat_interval']
-                    )
+                # Создаем напоминание
+                reminder = Reminder(
+                    child_id=child.id,
+                    description=reminder_info['description'],
+                    reminder_time=reminder_time,
+                    status='active',
+                    repeat_type=reminder_info['repeat_type'],
+                    repeat_interval=reminder_info['repeat_interval']
+                )
                     
-                    db.add(reminder)
-                    created_reminders.append((reminder, reminder_info))
+                db.add(reminder)
+                created_reminders.append((reminder, reminder_info))
                 
-                if created_reminders:
-                    db.commit()
+            if created_reminders:
+                await db.flush()
                     
-                    # Формируем сообщение об успехе
-                    success_messages = []
-                    for reminder, reminder_info in created_reminders:
-                        repeat_text = "однократное"
-                        if reminder_info['repeat_type'] == 'daily':
-                            repeat_text = f"каждые {reminder_info['repeat_interval']} день(дней)"
-                        elif reminder_info['repeat_type'] == 'weekly':
-                            repeat_text = f"каждые {reminder_info['repeat_interval']} неделю(недель)"
-                        elif reminder_info['repeat_type'] == 'monthly':
-                            repeat_text = f"каждые {reminder_info['repeat_interval']} месяц(ев)"
-                        elif reminder_info['repeat_type'] == 'hourly':
-                            repeat_text = f"каждые {reminder_info['repeat_interval']} час(ов)"
+                # Формируем сообщение об успехе
+                success_messages = []
+                for reminder, reminder_info in created_reminders:
+                    repeat_text = "однократное"
+                    if reminder_info['repeat_type'] == 'daily':
+                        repeat_text = f"каждые {reminder_info['repeat_interval']} день(дней)"
+                    elif reminder_info['repeat_type'] == 'weekly':
+                        repeat_text = f"каждые {reminder_info['repeat_interval']} неделю(недель)"
+                    elif reminder_info['repeat_type'] == 'monthly':
+                        repeat_text = f"каждые {reminder_info['repeat_interval']} месяц(ев)"
+                    elif reminder_info['repeat_type'] == 'hourly':
+                        repeat_text = f"каждые {reminder_info['repeat_interval']} час(ов)"
                         
-                        success_messages.append(
-                            f"📝 {reminder_info['description']}\n"
-                            f"⏰ Время: {reminder.reminder_time.strftime('%d.%m.%Y, %H:%M')}\n"
-                            f"🔄 Повторение: {repeat_text}"
-                        )
+                    success_messages.append(
+                        f"📝 {reminder_info['description']}\n"
+                        f"⏰ Время: {reminder.reminder_time.strftime('%d.%m.%Y, %H:%M')}\n"
+                        f"🔄 Повторение: {repeat_text}"
+                    )
                     
-                    # Добавляем кнопку возврата в меню
-                    keyboard = InlineKeyboardMarkup()
-                    keyboard.add(InlineKeyboardButton("🔙 Назад в меню", callback_data='back_to_menu'))
+                # Добавляем кнопку возврата в меню
+                keyboard = InlineKeyboardMarkup()
+                keyboard.add(InlineKeyboardButton("🔙 Назад в меню", callback_data='back_to_menu'))
                     
-                    if len(created_reminders) == 1:
-                        await message.reply(
-                            f"✅ Напоминание создано!\n\n{success_messages[0]}",
-                            reply_markup=keyboard
-                        )
-                    else:
-                        await message.reply(
-                            f"✅ Создано напоминаний: {len(created_reminders)}\n\n" + "\n\n".join(success_messages),
-                            reply_markup=keyboard
-                        )
-                    return
-                
-            except Exception as e:
-                logger.error(f"Ошибка при создании напоминания: {e}")
-                await message.reply("❌ Произошла ошибка при создании напоминания.")
+                if len(created_reminders) == 1:
+                    await message.reply(
+                        f"✅ Напоминание создано!\n\n{success_messages[0]}",
+                        reply_markup=keyboard
+                    )
+                else:
+                    await message.reply(
+                        f"✅ Создано напоминаний: {len(created_reminders)}\n\n" + "\n\n".join(success_messages),
+                        reply_markup=keyboard
+                    )
                 return
-    finally:
-        db.close()
+                
+        except Exception as e:
+            logger.error(f"Ошибка при создании напоминания: {e}")
+            await message.reply("❌ Произошла ошибка при создании напоминания.")
+            return
 
 # Обработчик текстовых сообщений
 @dp.message_handler(content_types=types.ContentType.TEXT)
-async def handle_text_message(message: types.Message, state: FSMContext):
+async def handle_text_message(message: types.Message, state: FSMContext, db: AsyncSession):
     """Обработка текстовых сообщений"""
     # Сохраняем пользователя
-    db: Session = next(get_db())
-    try:
-        await save_user(message.from_user, db)
-    finally:
-        db.close()
+    await save_user(message.from_user, db)
     
     # Получаем текущее состояние
     current_state = await state.get_state()
@@ -1801,12 +1910,16 @@ async def handle_text_message(message: types.Message, state: FSMContext):
     if current_state:
         return
     
-    # Обрабатываем текст
-    await process_message_text(message.text, message, state)
+    # Обрабатываем текст; сообщения, отправленные подряд, объединяются
+    await message_coalescer.submit(
+        message.chat.id,
+        message.text,
+        lambda text: process_message_text(text, message, state, db)
+    )
 
 # Обработчик голосовых сообщений
 @dp.message_handler(content_types=types.ContentType.VOICE)
-async def handle_voice_message(message: types.Message, state: FSMContext):
+async def handle_voice_message(message: types.Message, state: FSMContext, db: AsyncSession):
     """Обработка голосовых сообщений"""
     current_state = await state.get_state()
     if current_state is not None:
@@ -1833,7 +1946,11 @@ async def handle_voice_message(message: types.Message, state: FSMContext):
             
             if text:
                 await message.reply(f"🎤 Распознанный текст: {text}")
-                await process_message_text(text, message, state)
+                await message_coalescer.submit(
+                    message.chat.id,
+                    text,
+                    lambda merged_text: process_message_text(merged_text, message, state, db)
+                )
             else:
                 await message.reply("❌ Не удалось распознать текст в голосовом сообщении.")
     except Exception as e:
@@ -1870,14 +1987,13 @@ async def process_clear_child_data(callback_query: types.CallbackQuery):
 
 # Обработчик подтверждения очистки данных
 @dp.callback_query_handler(lambda c: c.data == 'confirm_clear_data')
-async def confirm_clear_data(callback_query: types.CallbackQuery):
+async def confirm_clear_data(callback_query: types.CallbackQuery, db: AsyncSession):
     """Подтверждение очистки данных ребенка"""
     await bot.answer_callback_query(callback_query.id)
     
-    db: Session = next(get_db())
     try:
         # Получаем ребенка
-        child = db.query(Child).first()
+        child = await child_profiles.aget(db)
         if not child:
             await bot.send_message(
                 callback_query.from_user.id,
@@ -1889,15 +2005,15 @@ async def confirm_clear_data(callback_query: types.CallbackQuery):
         child_name = child.name
         
         # Удаляем все связанные данные
-        db.query(Feeding).filter(Feeding.child_id == child.id).delete()
-        db.query(Stool).filter(Stool.child_id == child.id).delete()
-        db.query(Weight).filter(Weight.child_id == child.id).delete()
-        db.query(Medication).filter(Medication.child_id == child.id).delete()
-        db.query(Reminder).filter(Reminder.child_id == child.id).delete()
-        db.query(Prescription).filter(Prescription.child_id == child.id).delete()
+        await db.execute(delete(Feeding).where(Feeding.child_id == child.id))
+        await db.execute(delete(Stool).where(Stool.child_id == child.id))
+        await db.execute(delete(Weight).where(Weight.child_id == child.id))
+        await db.execute(delete(Medication).where(Medication.child_id == child.id))
+        await db.execute(delete(Reminder).where(Reminder.child_id == child.id))
+        await db.execute(delete(Prescription).where(Prescription.child_id == child.id))
         
-        # Фиксируем изменения
-        db.commit()
+        # Выполняем удаление (коммит - после обработки обновления)
+        await db.flush()
         
         # Отправляем сообщение об успешной очистке
         await bot.send_message(
@@ -1910,7 +2026,7 @@ async def confirm_clear_data(callback_query: types.CallbackQuery):
         )
         
         # Возвращаемся в настройки
-        await process_main_menu(callback_query)
+        await process_main_menu(callback_query, db)
         
     except Exception as e:
         logger.error(f"Ошибка при очистке данных ребенка: {e}")
@@ -1918,8 +2034,6 @@ async def confirm_clear_data(callback_query: types.CallbackQuery):
             callback_query.from_user.id,
             "❌ Произошла ошибка при очистке данных."
         )
-    finally:
-        db.close()
 
 # Обработчик для кнопки добавления назначения
 @dp.callback_query_handler(lambda c: c.data == 'add_prescription')
@@ -1934,84 +2048,220 @@ async def add_prescription_start(callback_query: types.CallbackQuery):
     )
     await PrescriptionState.waiting_for_full_text.set()
 
-# Обработчик полного текста назначения
-@dp.message_handler(state=PrescriptionState.waiting_for_full_text)
-async def handle_prescription_full_text(message: types.Message, state: FSMContext):
-    """Обработка полного текста назначения"""
-    full_text = message.text
-    await state.update_data(full_text=full_text)
+# Лекарства, распознанные в назначениях, хранятся в хранилище FSM пользователя
+# (в bucket: он не сбрасывается при завершении ввода назначения) для последних назначений
+PRESCRIPTION_MEDICATIONS_KEPT = 20
+
+# Лекарства, если распознать их не удалось: назначение целиком одной записью
+DEFAULT_PRESCRIPTION_MEDICATIONS = [{"name": "Назначение", "dosage": "См. полный текст", "frequency": "ежедневно"}]
+
+async def remember_prescription_medications(user_id: int, prescription_id: int, medications: list):
+    """Сохраняет распознанные лекарства назначения в хранилище пользователя"""
+    bucket = await dp.storage.get_bucket(user=user_id)
+    stored = dict(bucket.get('prescription_medications', {}))
+    stored.pop(prescription_id, None)
+    stored[prescription_id] = medications
+    # Старые назначения вытесняются (для них остается основное лекарство из базы)
+    for old_id in list(stored)[:-PRESCRIPTION_MEDICATIONS_KEPT]:
+        del stored[old_id]
+    await dp.storage.update_bucket(user=user_id, prescription_medications=stored)
+
+async def get_prescription_medications(user_id: int, prescription_id: int):
+    """Распознанные лекарства назначения или None, если их нет в хранилище"""
+    bucket = await dp.storage.get_bucket(user=user_id)
+    return bucket.get('prescription_medications', {}).get(prescription_id)
+
+# Итоговые сообщения о назначениях, ожидающие распознавания лекарств: ID назначения -> сообщение
+prescription_confirmations = {}
+
+def format_prescription_medications(medications: list) -> str:
+    """Нумерованный список лекарств назначения"""
+    meds_text = ""
+    for i, med in enumerate(medications, 1):
+        dosage_text = f" - {med.get('dosage', '')}" if med.get('dosage') else ""
+        frequency_text = f", {med.get('frequency', 'ежедневно')}" if med.get('frequency') else ""
+        meds_text += f"{i}. *{med['name']}*{dosage_text}{frequency_text}\n"
+    return meds_text
+
+def build_prescription_summary(prescription: Prescription, medications: list = None):
+    """
+    Сообщение о добавленном назначении и клавиатура к нему
     
-    # Используем OpenAI для извлечения списка лекарств
-    try:
-        prompt = f"""Проанализируй следующее медицинское назначение и определи все лекарства/препараты с их дозировками:
+    Args:
+        prescription: Назначение
+        medications: Распознанные лекарства или None, если распознавание еще идет
+        
+    Returns:
+        Кортеж (текст, клавиатура)
+    """
+    end_date_text = f"до {prescription.end_date.strftime('%d.%m.%Y')}" if prescription.end_date else "бессрочно"
+    
+    if medications is None:
+        meds_text = "⏳ Лекарства распознаются, сообщение обновится автоматически.\n"
+    else:
+        meds_text = format_prescription_medications(medications)
+    
+    success_message = f"""✅ *Назначение добавлено!*
 
-{full_text}
+📋 *Список лекарств:*
+{meds_text}
+📅 Период: с {prescription.start_date.strftime('%d.%m.%Y')} {end_date_text}
 
-Верни ответ в формате JSON:
-[
-  {{
-    "name": "Название лекарства",
-    "dosage": "Дозировка"
-  }}
-]
+📄 *Полный текст назначения:*
+{prescription.full_text}
+"""
+    
+    keyboard = InlineKeyboardMarkup(row_width=1)
+    
+    # Кнопки напоминаний появляются, когда известны лекарства и частота приема
+    if medications is not None:
+        keyboard.add(
+            InlineKeyboardButton("➕ Создать напоминания для всех", callback_data=f"create_reminders_for_{prescription.id}")
+        )
+        for i, med in enumerate(medications):
+            keyboard.add(
+                InlineKeyboardButton(f"➕ Напоминания для {med['name']}", callback_data=f"create_reminders_for_med_{prescription.id}_{i}")
+            )
+    
+    keyboard.add(
+        InlineKeyboardButton("📋 К назначениям", callback_data="prescriptions"),
+        InlineKeyboardButton("🔙 В меню", callback_data="back_to_menu")
+    )
+    return success_message, keyboard
 
-Включи все лекарства, которые упоминаются в тексте."""
+async def update_prescription(prescription_id: int, **fields):
+    """Обновляет поля сохраненного назначения (из фоновой задачи, в отдельной сессии)"""
+    async with session_scope('update_prescription') as db:
+        prescription = await db.get(Prescription, prescription_id)
+        if prescription:
+            for name, value in fields.items():
+                setattr(prescription, name, value)
 
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "Ты - медицинский ассистент, который анализирует назначения врачей."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=500
+async def enrich_prescription(prescription_id: int, full_text: str, ack: types.Message, user_id: int):
+    """
+    Фоновое распознавание лекарств и частоты приема в назначении
+    
+    Args:
+        prescription_id: ID назначения
+        full_text: Текст назначения
+        ack: Сообщение о сохранении назначения, которое обновляется по готовности
+        user_id: ID пользователя, добавившего назначение (ключ хранилища FSM)
+    """
+    recognized = True
+    try:
+        loop = asyncio.get_event_loop()
+        medications = await loop.run_in_executor(None, ai_assistant.extract_prescription_medications, full_text)
+    except Exception as e:
+        logger.error(f"Ошибка при распознавании лекарств в назначении: {e}")
+        medications = None
+        recognized = False
+    if not medications:
+        # Если не удалось извлечь лекарства, используем весь текст как название
+        medications = [dict(med) for med in DEFAULT_PRESCRIPTION_MEDICATIONS]
+    
+    await remember_prescription_medications(user_id, prescription_id, medications)
+    
+    try:
+        main_medication = medications[0]
+        await update_prescription(
+            prescription_id,
+            medication_name=main_medication["name"],
+            dosage=main_medication["dosage"],
+            frequency=main_medication["frequency"]
         )
-        
-        result = response['choices'][0]['message']['content'].strip()
-        
-        # Извлекаем JSON из ответа
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении назначения {prescription_id}: {e}")
+    
+    if recognized:
+        found_text = f"💊 *Найдены следующие лекарства:*\n\n{format_prescription_medications(medications)}"
+    else:
+        found_text = "⚠️ Не удалось распознать лекарства, назначение сохранено полным текстом.\n"
+    try:
+        await ack.edit_text(
+            f"✅ *Назначение сохранено*\n\n{found_text}\n"
+            f"📅 Введите дату начала приема в формате ДД.ММ.ГГГГ (или 'сегодня'):",
+            parse_mode=ParseMode.MARKDOWN
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении сообщения о назначении: {e}")
+    
+    # Если пользователь уже завершил ввод дат, обновляем и итоговое сообщение
+    confirmation = prescription_confirmations.pop(prescription_id, None)
+    if confirmation:
         try:
-            # Находим начало и конец JSON
-            start_idx = result.find('[')
-            end_idx = result.rfind(']') + 1
-            
-            if start_idx >= 0 and end_idx > start_idx:
-                json_str = result[start_idx:end_idx]
-                medications = json.loads(json_str)
-                
-                # Проверяем, что получили список словарей с нужными ключами
-                valid_medications = []
-                for med in medications:
-                    if isinstance(med, dict) and 'name' in med:
-                        valid_medications.append(med)
-                
-                if valid_medications:
-                    await state.update_data(medications=valid_medications)
-                    
-                    # Формируем сообщение с найденными лекарствами
-                    meds_text = "\n".join([f"• {med['name']} - {med.get('dosage', 'дозировка не указана')}" for med in valid_medications])
-                    await message.reply(
-                        f"💊 *Найдены следующие лекарства:*\n\n{meds_text}\n\n"
-                        f"📅 Введите дату начала приема в формате ДД.ММ.ГГГГ (или 'сегодня'):",
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                    await PrescriptionState.waiting_for_start_date.set()
-                    return
+            await edit_prescription_confirmation(prescription_id, confirmation, medications)
         except Exception as e:
-            logger.error(f"Ошибка при парсинге JSON с лекарствами: {e}")
+            logger.error(f"Ошибка при обновлении итогового сообщения о назначении: {e}")
+
+async def edit_prescription_confirmation(prescription_id: int, confirmation: types.Message, medications: list,
+                                         db: AsyncSession = None):
+    """
+    Дополняет итоговое сообщение о назначении распознанными лекарствами
+    
+    Args:
+        prescription_id: ID назначения
+        confirmation: Итоговое сообщение
+        medications: Распознанные лекарства
+        db: Сессия обработчика; из фоновой задачи вызывается без нее и открывает свою
+    """
+    if db is None:
+        async with session_scope('edit_prescription_confirmation') as session:
+            prescription = await session.get(Prescription, prescription_id)
+    else:
+        prescription = await db.get(Prescription, prescription_id)
+    if not prescription:
+        return
+    text, keyboard = build_prescription_summary(prescription, medications)
+    await confirmation.edit_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=keyboard)
+
+# Обработчик полного текста назначения
+@dp.message_handler(state=PrescriptionState.waiting_for_full_text)
+async def handle_prescription_full_text(message: types.Message, state: FSMContext, db: AsyncSession):
+    """Обработка полного текста назначения"""
+    full_text = message.text
+    
+    try:
+        child = await child_profiles.aget(db)
+        if not child:
+            await message.reply("❌ Сначала зарегистрируйте ребенка")
+            await state.finish()
+            return
+        
+        # Сохраняем назначение сразу; лекарства и частота приема распознаются в фоне
+        prescription = Prescription(
+            child_id=child.id,
+            medication_name="Назначение",
+            dosage="См. полный текст",
+            frequency="ежедневно",
+            doctor_name=None,  # Не запрашиваем имя врача
+            start_date=datetime.now().date(),
+            end_date=None,
+            notes=None,
+            full_text=full_text,
+            is_active=1,  # Активно по умолчанию
+        )
+        db.add(prescription)
+        # Фиксируем сразу: фоновое распознавание лекарств обновляет назначение в своей сессии
+        await db.commit()
+        prescription_id = prescription.id
     except Exception as e:
-        logger.error(f"Ошибка при извлечении лекарств: {e}")
+        logger.error(f"Ошибка при сохранении назначения: {e}")
+        await message.reply("❌ Произошла ошибка при сохранении назначения.")
+        await state.finish()
+        return
     
-    # Если не удалось извлечь лекарства, используем весь текст как название
-    await state.update_data(medications=[{"name": "Назначение", "dosage": "См. полный текст"}])
-    await message.reply(
-        "📅 Введите дату начала приема в формате ДД.ММ.ГГГГ (или 'сегодня'):"
+    await state.update_data(full_text=full_text, prescription_id=prescription_id)
+    ack = await message.reply(
+        "✅ *Назначение сохранено*\n\n⏳ Распознаю лекарства...\n\n"
+        "📅 Введите дату начала приема в формате ДД.ММ.ГГГГ (или 'сегодня'):",
+        parse_mode=ParseMode.MARKDOWN
     )
     await PrescriptionState.waiting_for_start_date.set()
+    asyncio.get_event_loop().create_task(enrich_prescription(prescription_id, full_text, ack, message.from_user.id))
 
 # Обработчик даты начала для назначения
 @dp.message_handler(state=PrescriptionState.waiting_for_start_date)
-async def handle_prescription_start_date(message: types.Message, state: FSMContext):
+async def handle_prescription_start_date(message: types.Message, state: FSMContext, db: AsyncSession):
     """Обработка даты начала для назначения"""
     try:
         if message.text.lower() == 'сегодня':
@@ -2020,6 +2270,11 @@ async def handle_prescription_start_date(message: types.Message, state: FSMConte
             start_date = datetime.strptime(message.text, "%d.%m.%Y").date()
         
         await state.update_data(start_date=start_date)
+        data = await state.get_data()
+        prescription = await db.get(Prescription, data['prescription_id'])
+        if prescription:
+            prescription.start_date = start_date
+        
         await message.reply(
             "📅 Введите дату окончания приема в формате ДД.ММ.ГГГГ (или '-' если бессрочно):"
         )
@@ -2031,180 +2286,65 @@ async def handle_prescription_start_date(message: types.Message, state: FSMConte
 
 # Обработчик даты окончания для назначения
 @dp.message_handler(state=PrescriptionState.waiting_for_end_date)
-async def handle_prescription_end_date(message: types.Message, state: FSMContext):
+async def handle_prescription_end_date(message: types.Message, state: FSMContext, db: AsyncSession):
     """Обработка даты окончания и сохранение назначения"""
     try:
         end_date = None
         if message.text != '-':
             end_date = datetime.strptime(message.text, "%d.%m.%Y").date()
-        
-        await state.update_data(end_date=end_date)
-        data = await state.get_data()
-        
-        db: Session = next(get_db())
-        try:
-            # Получаем информацию о ребенке
-            child = db.query(Child).first()
-            if not child:
-                await message.reply("❌ Сначала зарегистрируйте ребенка")
-                await state.finish()
-                return
-            
-            # Используем OpenAI для извлечения частоты приема для каждого лекарства
-            medications = data.get('medications', [])
-            if not medications:
-                medications = [{"name": "Назначение", "dosage": "См. полный текст"}]
-            
-            try:
-                prompt = f"""Проанализируй следующее медицинское назначение и определи частоту приема для каждого лекарства:
-
-{data['full_text']}
-
-Лекарства:
-{", ".join([med["name"] for med in medications])}
-
-Верни ответ в формате JSON:
-[
-  {{
-    "name": "Название лекарства",
-    "frequency": "Частота приема (например: '2 раза в день', 'утром и вечером')"
-  }}
-]"""
-
-                response = openai.ChatCompletion.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "Ты - медицинский ассистент, который анализирует назначения врачей."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.3,
-                    max_tokens=500
-                )
-                
-                result = response['choices'][0]['message']['content'].strip()
-                
-                # Извлекаем JSON из ответа
-                try:
-                    # Находим начало и конец JSON
-                    start_idx = result.find('[')
-                    end_idx = result.rfind(']') + 1
-                    
-                    if start_idx >= 0 and end_idx > start_idx:
-                        json_str = result[start_idx:end_idx]
-                        frequencies = json.loads(json_str)
-                        
-                        # Добавляем частоту к каждому лекарству
-                        for med in medications:
-                            for freq in frequencies:
-                                if med["name"].lower() in freq["name"].lower() or freq["name"].lower() in med["name"].lower():
-                                    med["frequency"] = freq.get("frequency", "ежедневно")
-                                    break
-                            if "frequency" not in med:
-                                med["frequency"] = "ежедневно"
-                except Exception as e:
-                    logger.error(f"Ошибка при парсинге JSON с частотами: {e}")
-                    # Устанавливаем частоту по умолчанию
-                    for med in medications:
-                        if "frequency" not in med:
-                            med["frequency"] = "ежедневно"
-            except Exception as e:
-                logger.error(f"Ошибка при извлечении частоты приема: {e}")
-                # Устанавливаем частоту по умолчанию
-                for med in medications:
-                    if "frequency" not in med:
-                        med["frequency"] = "ежедневно"
-            
-            # Создаем основное назначение
-            main_medication = medications[0] if medications else {"name": "Назначение", "dosage": "См. полный текст", "frequency": "ежедневно"}
-            
-            prescription = Prescription(
-                child_id=child.id,
-                medication_name=main_medication["name"],
-                dosage=main_medication.get("dosage", "См. полный текст"),
-                frequency=main_medication.get("frequency", "ежедневно"),
-                doctor_name=None,  # Не запрашиваем имя врача
-                start_date=data['start_date'],
-                end_date=data['end_date'],
-                notes=None,
-                full_text=data['full_text'],
-                is_active=1,  # Активно по умолчанию
-            )
-            
-            db.add(prescription)
-            db.commit()
-            
-            # Формируем сообщение об успешном добавлении
-            end_date_text = f"до {data['end_date'].strftime('%d.%m.%Y')}" if data['end_date'] else "бессрочно"
-            
-            # Формируем список лекарств
-            meds_text = ""
-            for i, med in enumerate(medications, 1):
-                dosage_text = f" - {med.get('dosage', '')}" if med.get('dosage') else ""
-                frequency_text = f", {med.get('frequency', 'ежедневно')}" if med.get('frequency') else ""
-                meds_text += f"{i}. *{med['name']}*{dosage_text}{frequency_text}\n"
-            
-            success_message = f"""✅ *Назначение добавлено!*
-
-📋 *Список лекарств:*
-{meds_text}
-📅 Период: с {data['start_date'].strftime('%d.%m.%Y')} {end_date_text}
-
-📄 *Полный текст назначения:*
-{data['full_text']}
-"""
-            
-            # Создаем клавиатуру с кнопками для каждого лекарства
-            keyboard = InlineKeyboardMarkup(row_width=1)
-            
-            # Добавляем кнопку для создания напоминаний для всех лекарств
-            keyboard.add(
-                InlineKeyboardButton("➕ Создать напоминания для всех", callback_data=f"create_reminders_for_{prescription.id}")
-            )
-            
-            # Добавляем кнопки для создания напоминаний для каждого лекарства
-            for i, med in enumerate(medications):
-                keyboard.add(
-                    InlineKeyboardButton(f"➕ Напоминания для {med['name']}", callback_data=f"create_reminders_for_med_{prescription.id}_{i}")
-                )
-            
-            # Добавляем навигационные кнопки
-            keyboard.add(
-                InlineKeyboardButton("📋 К назначениям", callback_data="prescriptions"),
-                InlineKeyboardButton("🔙 В меню", callback_data="back_to_menu")
-            )
-            
-            # Сохраняем список лекарств в базе данных или в кэше для использования при создании напоминаний
-            await state.update_data(prescription_id=prescription.id, medications=medications)
-            
-            await message.reply(
-                success_message,
-                parse_mode=ParseMode.MARKDOWN,
-                reply_markup=keyboard
-            )
-        except Exception as e:
-            logger.error(f"Ошибка при сохранении назначения: {e}")
-            await message.reply("❌ Произошла ошибка при сохранении назначения.")
-        finally:
-            db.close()
-            await state.finish()
     except ValueError:
         await message.reply(
             "❌ Неверный формат даты. Пожалуйста, используйте формат ДД.ММ.ГГГГ или символ '-'."
         )
+        return
+    
+    data = await state.get_data()
+    prescription_id = data['prescription_id']
+    
+    try:
+        prescription = await db.get(Prescription, prescription_id)
+        if not prescription:
+            await message.reply("❌ Назначение не найдено")
+            return
+        
+        prescription.end_date = end_date
+        await db.flush()
+        
+        # Лекарства могут быть еще не распознаны - тогда сообщение обновится по готовности
+        medications = await get_prescription_medications(message.from_user.id, prescription_id)
+        success_message, keyboard = build_prescription_summary(prescription, medications)
+        confirmation = await message.reply(
+            success_message,
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=keyboard
+        )
+        
+        if medications is None:
+            # Распознавание могло завершиться, пока отправлялось сообщение
+            medications = await get_prescription_medications(message.from_user.id, prescription_id)
+            if medications is not None:
+                await edit_prescription_confirmation(prescription_id, confirmation, medications, db)
+            else:
+                prescription_confirmations[prescription_id] = confirmation
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении назначения: {e}")
+        await message.reply("❌ Произошла ошибка при сохранении назначения.")
+    finally:
+        await state.finish()
 
 # Обработчик для кнопки создания напоминаний из назначения
-@dp.callback_query_handler(lambda c: c.data and c.data.startswith('create_reminders_for_'))
-async def create_reminders_for_prescription(callback_query: types.CallbackQuery):
+@dp.callback_query_handler(lambda c: c.data and c.data.startswith('create_reminders_for_')
+                           and not c.data.startswith('create_reminders_for_med_'))
+async def create_reminders_for_prescription(callback_query: types.CallbackQuery, db: AsyncSession):
     """Создание напоминаний на основе назначения"""
     await bot.answer_callback_query(callback_query.id)
     
     # Получаем ID назначения из callback_data
     prescription_id = int(callback_query.data.split('_')[-1])
     
-    db: Session = next(get_db())
     try:
         # Получаем назначение
-        prescription = db.query(Prescription).get(prescription_id)
+        prescription = await db.get(Prescription, prescription_id)
         if not prescription:
             await bot.send_message(
                 callback_query.from_user.id,
@@ -2258,12 +2398,10 @@ async def create_reminders_for_prescription(callback_query: types.CallbackQuery)
             callback_query.from_user.id,
             "❌ Произошла ошибка при создании напоминаний"
         )
-    finally:
-        db.close()
 
 # Обработчик для добавления одного напоминания из предложенных
 @dp.callback_query_handler(lambda c: c.data and c.data.startswith('add_reminder_option_'))
-async def add_reminder_option(callback_query: types.CallbackQuery):
+async def add_reminder_option(callback_query: types.CallbackQuery, db: AsyncSession):
     """Добавление одного напоминания из предложенных"""
     await bot.answer_callback_query(callback_query.id)
     
@@ -2272,10 +2410,9 @@ async def add_reminder_option(callback_query: types.CallbackQuery):
     prescription_id = int(parts[-2])
     option_index = int(parts[-1])
     
-    db: Session = next(get_db())
     try:
         # Получаем назначение
-        prescription = db.query(Prescription).get(prescription_id)
+        prescription = await db.get(Prescription, prescription_id)
         if not prescription:
             await bot.send_message(
                 callback_query.from_user.id,
@@ -2297,7 +2434,7 @@ async def add_reminder_option(callback_query: types.CallbackQuery):
         selected_option = reminder_options[option_index]
         
         # Создаем напоминание
-        reminder = create_reminder_from_option(db, prescription.child_id, selected_option)
+        reminder = await create_reminder_from_option(db, prescription.child_id, selected_option)
         
         if reminder:
             await bot.send_message(
@@ -2311,7 +2448,7 @@ async def add_reminder_option(callback_query: types.CallbackQuery):
             )
         
         # Возвращаемся к списку назначений
-        await process_main_menu(callback_query)
+        await process_main_menu(callback_query, db)
         
     except Exception as e:
         logger.error(f"Ошибка при добавлении напоминания: {e}")
@@ -2319,22 +2456,19 @@ async def add_reminder_option(callback_query: types.CallbackQuery):
             callback_query.from_user.id,
             "❌ Произошла ошибка при добавлении напоминания"
         )
-    finally:
-        db.close()
 
 # Обработчик для добавления всех напоминаний
 @dp.callback_query_handler(lambda c: c.data and c.data.startswith('add_all_reminders_'))
-async def add_all_reminders(callback_query: types.CallbackQuery):
+async def add_all_reminders(callback_query: types.CallbackQuery, db: AsyncSession):
     """Добавление всех предложенных напоминаний"""
     await bot.answer_callback_query(callback_query.id)
     
     # Получаем ID назначения из callback_data
     prescription_id = int(callback_query.data.split('_')[-1])
     
-    db: Session = next(get_db())
     try:
         # Получаем назначение
-        prescription = db.query(Prescription).get(prescription_id)
+        prescription = await db.get(Prescription, prescription_id)
         if not prescription:
             await bot.send_message(
                 callback_query.from_user.id,
@@ -2355,7 +2489,7 @@ async def add_all_reminders(callback_query: types.CallbackQuery):
         # Добавляем все напоминания
         added_count = 0
         for option in reminder_options:
-            if create_reminder_from_option(db, prescription.child_id, option):
+            if await create_reminder_from_option(db, prescription.child_id, option):
                 added_count += 1
         
         await bot.send_message(
@@ -2364,7 +2498,7 @@ async def add_all_reminders(callback_query: types.CallbackQuery):
         )
         
         # Возвращаемся к списку назначений
-        await process_main_menu(callback_query)
+        await process_main_menu(callback_query, db)
         
     except Exception as e:
         logger.error(f"Ошибка при добавлении напоминаний: {e}")
@@ -2372,8 +2506,6 @@ async def add_all_reminders(callback_query: types.CallbackQuery):
             callback_query.from_user.id,
             "❌ Произошла ошибка при добавлении напоминаний"
         )
-    finally:
-        db.close()
 
 def generate_reminder_options(prescription):
     """
@@ -2584,7 +2716,7 @@ def generate_reminder_options(prescription):
             'repeat_text': 'ежедневно'
         }]
 
-def create_reminder_from_option(db, child_id, option):
+async def create_reminder_from_option(db, child_id, option):
     """
     Создает напоминание из варианта
     
@@ -2623,20 +2755,17 @@ def create_reminder_from_option(db, child_id, option):
         )
         
         db.add(reminder)
-        db.commit()
+        await db.flush()
         
         return reminder
     except Exception as e:
         logger.error(f"Ошибка при создании напоминания: {e}")
-        db.rollback()
         return None
 
-# Импорт функции sum для статистики
-from sqlalchemy import func
 
 # Обработчик для добавления всех напоминаний из назначений
 @dp.callback_query_handler(lambda c: c.data == 'add_all_prescription_reminders')
-async def add_all_prescription_reminders(callback_query: types.CallbackQuery, state: FSMContext):
+async def add_all_prescription_reminders(callback_query: types.CallbackQuery, state: FSMContext, db: AsyncSession):
     """Добавление всех предложенных напоминаний из назначений"""
     await bot.answer_callback_query(callback_query.id)
     
@@ -2651,10 +2780,9 @@ async def add_all_prescription_reminders(callback_query: types.CallbackQuery, st
         )
         return
     
-    db: Session = next(get_db())
     try:
         # Получаем информацию о ребенке
-        child = db.query(Child).first()
+        child = await child_profiles.aget(db)
         if not child:
             await bot.send_message(
                 callback_query.from_user.id,
@@ -2665,7 +2793,7 @@ async def add_all_prescription_reminders(callback_query: types.CallbackQuery, st
         # Добавляем все напоминания
         added_count = 0
         for option in options:
-            if create_reminder_from_option(db, child.id, option):
+            if await create_reminder_from_option(db, child.id, option):
                 added_count += 1
         
         await bot.send_message(
@@ -2685,19 +2813,16 @@ async def add_all_prescription_reminders(callback_query: types.CallbackQuery, st
             callback_query.from_user.id,
             "❌ Произошла ошибка при добавлении напоминаний"
         )
-    finally:
-        db.close()
 
 # Обработчик для кнопки создания напоминаний из всех назначений
 @dp.callback_query_handler(lambda c: c.data == 'create_all_prescription_reminders')
-async def create_all_prescription_reminders_handler(callback_query: types.CallbackQuery):
+async def create_all_prescription_reminders_handler(callback_query: types.CallbackQuery, db: AsyncSession):
     """Создание напоминаний на основе всех активных назначений"""
     await bot.answer_callback_query(callback_query.id)
     
-    db: Session = next(get_db())
     try:
         # Получаем информацию о ребенке
-        child = db.query(Child).first()
+        child = await child_profiles.aget(db)
         if not child:
             await bot.send_message(
                 callback_query.from_user.id,
@@ -2706,10 +2831,10 @@ async def create_all_prescription_reminders_handler(callback_query: types.Callba
             return
         
         # Получаем все активные назначения
-        prescriptions = db.query(Prescription).filter(
+        prescriptions = (await db.scalars(select(Prescription).filter(
             Prescription.child_id == child.id,
             Prescription.is_active == 1
-        ).all()
+        ))).all()
         
         if not prescriptions:
             await bot.send_message(
@@ -2766,12 +2891,10 @@ async def create_all_prescription_reminders_handler(callback_query: types.Callba
             callback_query.from_user.id,
             "❌ Произошла ошибка при создании напоминаний"
         )
-    finally:
-        db.close()
 
 # Обработчик для кнопки создания напоминаний для конкретного лекарства
 @dp.callback_query_handler(lambda c: c.data and c.data.startswith('create_reminders_for_med_'))
-async def create_reminders_for_medication(callback_query: types.CallbackQuery, state: FSMContext):
+async def create_reminders_for_medication(callback_query: types.CallbackQuery, state: FSMContext, db: AsyncSession):
     """Создание напоминаний на основе конкретного лекарства из назначения"""
     await bot.answer_callback_query(callback_query.id)
     
@@ -2780,10 +2903,9 @@ async def create_reminders_for_medication(callback_query: types.CallbackQuery, s
     prescription_id = int(parts[-2])
     medication_index = int(parts[-1])
     
-    db: Session = next(get_db())
     try:
         # Получаем назначение
-        prescription = db.query(Prescription).get(prescription_id)
+        prescription = await db.get(Prescription, prescription_id)
         if not prescription:
             await bot.send_message(
                 callback_query.from_user.id,
@@ -2791,9 +2913,18 @@ async def create_reminders_for_medication(callback_query: types.CallbackQuery, s
             )
             return
         
-        # Получаем данные о лекарствах из состояния
-        user_data = await dp.storage.get_data(user=callback_query.from_user.id)
-        medications = user_data.get('medications', [])
+        # Получаем данные о лекарствах, распознанных в назначении (или из состояния)
+        medications = await get_prescription_medications(callback_query.from_user.id, prescription_id)
+        if not medications:
+            user_data = await dp.storage.get_data(user=callback_query.from_user.id)
+            medications = user_data.get('medications', [])
+        if not medications:
+            # Лекарства давнего назначения уже вытеснены из хранилища - берем основное из базы
+            medications = [{
+                'name': prescription.medication_name,
+                'dosage': prescription.dosage,
+                'frequency': prescription.frequency
+            }]
         
         if not medications or medication_index >= len(medications):
             await bot.send_message(
@@ -2855,7 +2986,7 @@ async def create_reminders_for_medication(callback_query: types.CallbackQuery, s
         )
         
         # Сохраняем варианты напоминаний в состоянии
-        await state.update_data(med_reminder_options=reminder_options)
+        await state.update_data(med_reminder_options=reminder_options, medications=medications)
         
         await bot.send_message(
             callback_query.from_user.id,
@@ -2869,12 +3000,10 @@ async def create_reminders_for_medication(callback_query: types.CallbackQuery, s
             callback_query.from_user.id,
             "❌ Произошла ошибка при создании напоминаний"
         )
-    finally:
-        db.close()
 
 # Обработчик для добавления одного напоминания для лекарства
 @dp.callback_query_handler(lambda c: c.data and c.data.startswith('add_med_reminder_'))
-async def add_med_reminder(callback_query: types.CallbackQuery, state: FSMContext):
+async def add_med_reminder(callback_query: types.CallbackQuery, state: FSMContext, db: AsyncSession):
     """Добавление одного напоминания для лекарства"""
     await bot.answer_callback_query(callback_query.id)
     
@@ -2896,10 +3025,9 @@ async def add_med_reminder(callback_query: types.CallbackQuery, state: FSMContex
         )
         return
     
-    db: Session = next(get_db())
     try:
         # Получаем информацию о ребенке
-        child = db.query(Child).first()
+        child = await child_profiles.aget(db)
         if not child:
             await bot.send_message(
                 callback_query.from_user.id,
@@ -2911,7 +3039,7 @@ async def add_med_reminder(callback_query: types.CallbackQuery, state: FSMContex
         selected_option = reminder_options[option_index]
         
         # Создаем напоминание
-        reminder = create_reminder_from_option(db, child.id, selected_option)
+        reminder = await create_reminder_from_option(db, child.id, selected_option)
         
         if reminder:
             await bot.send_message(
@@ -2925,7 +3053,7 @@ async def add_med_reminder(callback_query: types.CallbackQuery, state: FSMContex
             )
         
         # Возвращаемся к списку назначений
-        await process_main_menu(callback_query)
+        await process_main_menu(callback_query, db)
         
     except Exception as e:
         logger.error(f"Ошибка при добавлении напоминания: {e}")
@@ -2933,12 +3061,10 @@ async def add_med_reminder(callback_query: types.CallbackQuery, state: FSMContex
             callback_query.from_user.id,
             "❌ Произошла ошибка при добавлении напоминания"
         )
-    finally:
-        db.close()
 
 # Обработчик для добавления всех напоминаний для лекарства
 @dp.callback_query_handler(lambda c: c.data and c.data.startswith('add_all_med_reminders_'))
-async def add_all_med_reminders(callback_query: types.CallbackQuery, state: FSMContext):
+async def add_all_med_reminders(callback_query: types.CallbackQuery, state: FSMContext, db: AsyncSession):
     """Добавление всех предложенных напоминаний для лекарства"""
     await bot.answer_callback_query(callback_query.id)
     
@@ -2958,10 +3084,9 @@ async def add_all_med_reminders(callback_query: types.CallbackQuery, state: FSMC
         )
         return
     
-    db: Session = next(get_db())
     try:
         # Получаем информацию о ребенке
-        child = db.query(Child).first()
+        child = await child_profiles.aget(db)
         if not child:
             await bot.send_message(
                 callback_query.from_user.id,
@@ -2972,7 +3097,7 @@ async def add_all_med_reminders(callback_query: types.CallbackQuery, state: FSMC
         # Добавляем все напоминания
         added_count = 0
         for option in reminder_options:
-            if create_reminder_from_option(db, child.id, option):
+            if await create_reminder_from_option(db, child.id, option):
                 added_count += 1
         
         await bot.send_message(
@@ -2981,7 +3106,7 @@ async def add_all_med_reminders(callback_query: types.CallbackQuery, state: FSMC
         )
         
         # Возвращаемся к списку назначений
-        await process_main_menu(callback_query)
+        await process_main_menu(callback_query, db)
         
     except Exception as e:
         logger.error(f"Ошибка при добавлении напоминаний: {e}")
@@ -2989,24 +3114,21 @@ async def add_all_med_reminders(callback_query: types.CallbackQuery, state: FSMC
             callback_query.from_user.id,
             "❌ Произошла ошибка при добавлении напоминаний"
         )
-    finally:
-        db.close()
 
 # Обработчик для кнопки "Назад в меню"
 @dp.message_handler(lambda message: message.text == "🔙 Назад в меню", state="*")
-async def back_to_menu(message: types.Message, state: FSMContext):
+async def back_to_menu(message: types.Message, state: FSMContext, db: AsyncSession):
     current_state = await state.get_state()
     if current_state:
         await state.finish()
     
-    with SessionLocal() as db:
-        child = db.query(Child).first()
-        if not child:
-            await message.answer(
-                "Похоже, информация о ребенке отсутствует. Давайте начнем с регистрации."
-            )
-            await ChildRegistrationState.waiting_for_name.set()
-            return
+    child = await child_profiles.aget(db)
+    if not child:
+        await message.answer(
+            "Похоже, информация о ребенке отсутствует. Давайте начнем с регистрации."
+        )
+        await ChildRegistrationState.waiting_for_name.set()
+        return
         
     await show_main_menu(message)
 
@@ -3031,9 +3153,9 @@ async def add_note_start(message: types.Message):
 
 # Обработчик для ввода заголовка заметки
 @dp.message_handler(state=NotesState.waiting_for_title)
-async def process_note_title(message: types.Message, state: FSMContext):
+async def process_note_title(message: types.Message, state: FSMContext, db: AsyncSession):
     if message.text == "🔙 Назад в меню":
-        await back_to_menu(message, state)
+        await back_to_menu(message, state, db)
         return
     
     async with state.proxy() as data:
@@ -3050,31 +3172,30 @@ async def process_note_title(message: types.Message, state: FSMContext):
 
 # Обработчик для ввода содержания заметки
 @dp.message_handler(state=NotesState.waiting_for_content)
-async def process_note_content(message: types.Message, state: FSMContext):
+async def process_note_content(message: types.Message, state: FSMContext, db: AsyncSession):
     if message.text == "🔙 Назад в меню":
-        await back_to_menu(message, state)
+        await back_to_menu(message, state, db)
         return
     
     async with state.proxy() as data:
         title = data['note_title']
         content = message.text
     
-    with SessionLocal() as db:
-        child = db.query(Child).first()
-        if not child:
-            await message.answer("Информация о ребенке отсутствует. Пожалуйста, зарегистрируйте ребенка.")
-            await state.finish()
-            return
+    child = await child_profiles.aget(db)
+    if not child:
+        await message.answer("Информация о ребенке отсутствует. Пожалуйста, зарегистрируйте ребенка.")
+        await state.finish()
+        return
         
-        note = Note(
-            child_id=child.id,
-            title=title,
-            content=content,
-            timestamp=datetime.now()
-        )
+    note = Note(
+        child_id=child.id,
+        title=title,
+        content=content,
+        timestamp=datetime.now()
+    )
         
-        db.add(note)
-        db.commit()
+    db.add(note)
+    await db.flush()
     
     await state.finish()
     
@@ -3089,146 +3210,141 @@ async def process_note_content(message: types.Message, state: FSMContext):
 
 # Обработчик для кнопки "Список заметок"
 @dp.message_handler(lambda message: message.text == "📋 Список заметок")
-async def list_notes(message: types.Message):
-    with SessionLocal() as db:
-        child = db.query(Child).first()
-        if not child:
-            await message.answer("Информация о ребенке отсутствует. Пожалуйста, зарегистрируйте ребенка.")
-            return
+async def list_notes(message: types.Message, db: AsyncSession):
+    child = await child_profiles.aget(db)
+    if not child:
+        await message.answer("Информация о ребенке отсутствует. Пожалуйста, зарегистрируйте ребенка.")
+        return
         
-        notes = db.query(Note).filter(Note.child_id == child.id).order_by(Note.timestamp.desc()).all()
+    notes = (await db.scalars(select(Note).filter(Note.child_id == child.id).order_by(Note.timestamp.desc()))).all()
         
-        if not notes:
-            keyboard = types.ReplyKeyboardMarkup(resize_keyboard=True)
-            keyboard.row(types.KeyboardButton("📝 Добавить заметку"))
-            keyboard = add_back_button(keyboard)
+    if not notes:
+        keyboard = types.ReplyKeyboardMarkup(resize_keyboard=True)
+        keyboard.row(types.KeyboardButton("📝 Добавить заметку"))
+        keyboard = add_back_button(keyboard)
             
-            await message.answer(
-                "У вас пока нет сохраненных заметок.",
-                reply_markup=keyboard
-            )
-            return
-        
-        keyboard = types.InlineKeyboardMarkup(row_width=1)
-        for note in notes:
-            date_str = note.timestamp.strftime("%d.%m.%Y, %H:%M")
-            keyboard.add(types.InlineKeyboardButton(
-                text=f"{note.title} ({date_str})",
-                callback_data=f"note_{note.id}"
-            ))
-        
-        reply_keyboard = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        reply_keyboard.row(types.KeyboardButton("📝 Добавить заметку"))
-        reply_keyboard = add_back_button(reply_keyboard)
-        
         await message.answer(
-            "Список ваших заметок:",
+            "У вас пока нет сохраненных заметок.",
             reply_markup=keyboard
         )
-        await message.answer(
-            "Выберите действие:",
-            reply_markup=reply_keyboard
-        )
+        return
+        
+    keyboard = types.InlineKeyboardMarkup(row_width=1)
+    for note in notes:
+        date_str = note.timestamp.strftime("%d.%m.%Y, %H:%M")
+        keyboard.add(types.InlineKeyboardButton(
+            text=f"{note.title} ({date_str})",
+            callback_data=f"note_{note.id}"
+        ))
+        
+    reply_keyboard = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    reply_keyboard.row(types.KeyboardButton("📝 Добавить заметку"))
+    reply_keyboard = add_back_button(reply_keyboard)
+        
+    await message.answer(
+        "Список ваших заметок:",
+        reply_markup=keyboard
+    )
+    await message.answer(
+        "Выберите действие:",
+        reply_markup=reply_keyboard
+    )
 
 # Обработчик для выбора заметки из списка
 @dp.callback_query_handler(lambda c: c.data.startswith('note_'))
-async def show_note(callback_query: types.CallbackQuery):
+async def show_note(callback_query: types.CallbackQuery, db: AsyncSession):
     note_id = int(callback_query.data.split('_')[1])
     
-    with SessionLocal() as db:
-        note = db.query(Note).filter(Note.id == note_id).first()
+    note = await db.scalar(select(Note).filter(Note.id == note_id).limit(1))
         
-        if not note:
-            await callback_query.answer("Заметка не найдена.")
-            return
+    if not note:
+        await callback_query.answer("Заметка не найдена.")
+        return
         
-        date_str = note.timestamp.strftime("%d.%m.%Y, %H:%M")
+    date_str = note.timestamp.strftime("%d.%m.%Y, %H:%M")
         
-        keyboard = types.InlineKeyboardMarkup(row_width=2)
-        keyboard.add(
-            types.InlineKeyboardButton("✏️ Редактировать", callback_data=f"edit_note_{note.id}"),
-            types.InlineKeyboardButton("🗑️ Удалить", callback_data=f"delete_note_{note.id}")
-        )
+    keyboard = types.InlineKeyboardMarkup(row_width=2)
+    keyboard.add(
+        types.InlineKeyboardButton("✏️ Редактировать", callback_data=f"edit_note_{note.id}"),
+        types.InlineKeyboardButton("🗑️ Удалить", callback_data=f"delete_note_{note.id}")
+    )
         
-        await callback_query.message.answer(
-            f"📝 <b>{note.title}</b>\n"
-            f"📅 {date_str}\n\n"
-            f"{note.content}",
-            reply_markup=keyboard,
-            parse_mode="HTML"
-        )
+    await callback_query.message.answer(
+        f"📝 <b>{note.title}</b>\n"
+        f"📅 {date_str}\n\n"
+        f"{note.content}",
+        reply_markup=keyboard,
+        parse_mode="HTML"
+    )
         
-        await callback_query.answer()
+    await callback_query.answer()
 
 # Обработчик для удаления заметки
 @dp.callback_query_handler(lambda c: c.data.startswith('delete_note_'))
-async def delete_note(callback_query: types.CallbackQuery):
+async def delete_note(callback_query: types.CallbackQuery, db: AsyncSession):
     note_id = int(callback_query.data.split('_')[2])
     
-    with SessionLocal() as db:
-        note = db.query(Note).filter(Note.id == note_id).first()
+    note = await db.scalar(select(Note).filter(Note.id == note_id).limit(1))
         
-        if not note:
-            await callback_query.answer("Заметка не найдена.")
-            return
+    if not note:
+        await callback_query.answer("Заметка не найдена.")
+        return
         
-        title = note.title
-        db.delete(note)
-        db.commit()
+    title = note.title
+    await db.delete(note)
+    await db.flush()
         
-        await callback_query.message.answer(f"✅ Заметка \"{title}\" успешно удалена!")
-        await callback_query.answer()
+    await callback_query.message.answer(f"✅ Заметка \"{title}\" успешно удалена!")
+    await callback_query.answer()
 
 # Обработчик для редактирования заметки
 @dp.callback_query_handler(lambda c: c.data.startswith('edit_note_'))
-async def edit_note_start(callback_query: types.CallbackQuery, state: FSMContext):
+async def edit_note_start(callback_query: types.CallbackQuery, state: FSMContext, db: AsyncSession):
     note_id = int(callback_query.data.split('_')[2])
     
-    with SessionLocal() as db:
-        note = db.query(Note).filter(Note.id == note_id).first()
+    note = await db.scalar(select(Note).filter(Note.id == note_id).limit(1))
         
-        if not note:
-            await callback_query.answer("Заметка не найдена.")
-            return
+    if not note:
+        await callback_query.answer("Заметка не найдена.")
+        return
         
-        async with state.proxy() as data:
-            data['note_id'] = note.id
-            data['note_title'] = note.title
+    async with state.proxy() as data:
+        data['note_id'] = note.id
+        data['note_title'] = note.title
         
-        keyboard = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        keyboard = add_back_button(keyboard)
+    keyboard = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    keyboard = add_back_button(keyboard)
         
-        await NotesState.waiting_for_edit_content.set()
-        await callback_query.message.answer(
-            f"Редактирование заметки \"{note.title}\"\n\n"
-            f"Текущий текст:\n{note.content}\n\n"
-            f"Введите новый текст заметки:",
-            reply_markup=keyboard
-        )
+    await NotesState.waiting_for_edit_content.set()
+    await callback_query.message.answer(
+        f"Редактирование заметки \"{note.title}\"\n\n"
+        f"Текущий текст:\n{note.content}\n\n"
+        f"Введите новый текст заметки:",
+        reply_markup=keyboard
+    )
         
-        await callback_query.answer()
+    await callback_query.answer()
 
 # Обработчик для ввода нового содержания заметки
 @dp.message_handler(state=NotesState.waiting_for_edit_content)
-async def process_edit_note_content(message: types.Message, state: FSMContext):
+async def process_edit_note_content(message: types.Message, state: FSMContext, db: AsyncSession):
     if message.text == "🔙 Назад в меню":
-        await back_to_menu(message, state)
+        await back_to_menu(message, state, db)
         return
     
     async with state.proxy() as data:
         note_id = data['note_id']
         title = data['note_title']
     
-    with SessionLocal() as db:
-        note = db.query(Note).filter(Note.id == note_id).first()
+    note = await db.scalar(select(Note).filter(Note.id == note_id).limit(1))
         
-        if not note:
-            await message.answer("Заметка не найдена.")
-            await state.finish()
-            return
+    if not note:
+        await message.answer("Заметка не найдена.")
+        await state.finish()
+        return
         
-        note.content = message.text
-        db.commit()
+    note.content = message.text
+    await db.flush()
     
     await state.finish()
     
@@ -3314,19 +3430,18 @@ async def process_add_feeding(callback_query: types.CallbackQuery):
 
 # Обработчик для создания напоминаний из назначений с помощью AI
 @dp.callback_query_handler(lambda c: c.data == 'create_reminders_from_prescriptions')
-async def create_reminders_from_prescriptions(callback_query: types.CallbackQuery):
+async def create_reminders_from_prescriptions(callback_query: types.CallbackQuery, db: AsyncSession):
     """Создание напоминаний на основе назначений с помощью AI"""
     await bot.answer_callback_query(callback_query.id)
     
-    db: Session = next(get_db())
     try:
-        child = db.query(Child).first()
+        child = await child_profiles.aget(db)
         
         # Получаем активные назначения
-        prescriptions = db.query(Prescription).filter(
+        prescriptions = (await db.scalars(select(Prescription).filter(
             Prescription.child_id == child.id,
             Prescription.is_active == 1
-        ).all()
+        ))).all()
         
         if not prescriptions:
             await bot.send_message(
@@ -3342,7 +3457,7 @@ async def create_reminders_from_prescriptions(callback_query: types.CallbackQuer
         )
         
         # Генерируем предложения по напоминаниям с помощью AI
-        reminders_suggestions = ai_assistant.generate_prescription_reminders(db)
+        reminders_suggestions = await run_with_session(ai_assistant.generate_prescription_reminders)
         
         # Добавляем кнопки для управления
         keyboard = InlineKeyboardMarkup(row_width=1)
@@ -3364,8 +3479,6 @@ async def create_reminders_from_prescriptions(callback_query: types.CallbackQuer
             callback_query.from_user.id,
             "❌ Произошла ошибка при создании напоминаний."
         )
-    finally:
-        db.close()
 
 # Обработчик для кнопки добавления записи о стуле
 @dp.callback_query_handler(lambda c: c.data == 'add_stool')
@@ -3390,5 +3503,7 @@ async def process_add_weight(callback_query: types.CallbackQuery):
     await WeightState.waiting_for_weight.set()
 
 if __name__ == '__main__':
+    from database.migrations import run_migrations
+    run_migrations()
     logger.info("Запуск бота...")
     executor.start_polling(dp, skip_updates=True) 
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""
+Объединение быстрых последовательных сообщений одного чата перед обработкой
+"""
+import asyncio
+import contextvars
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_current_unit: contextvars.ContextVar = contextvars.ContextVar('coalesced_unit', default=None)
+
+class _Unit:
+    """Группа сообщений чата, обрабатываемых как одно"""
+
+    def __init__(self, texts: list):
+        self.texts = texts
+        self.task: Optional[asyncio.Task] = None
+        self.committed = False
+        self.superseded = False
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.texts)
+
+class MessageCoalescer:
+    """
+    Склеивает сообщения, отправленные одно за другим ("поели 80", "смесь", "и срыгнули немного").
+
+    Первое сообщение обрабатывается сразу, без задержки. Если до того, как обработка
+    дошла до точки фиксации (mark_committed - запись в БД или ответ пользователю),
+    приходит следующее сообщение того же чата, обработка отменяется и запускается
+    заново для объединенного текста. Пока сообщения продолжают приходить чаще, чем
+    раз в window секунд, обработка объединенного текста откладывается на window.
+    """
+
+    def __init__(self, window: float = 1.5, max_messages: int = 5):
+        self.window = window
+        self.max_messages = max_messages
+        self._units: Dict[int, _Unit] = {}
+        self.stats = {'messages': 0, 'merged': 0, 'cancelled': 0}
+
+    async def submit(self, chat_id: int, text: str, process: Callable[[str], Awaitable]):
+        """
+        Обрабатывает сообщение чата с учетом предыдущих, еще не зафиксированных
+
+        Args:
+            chat_id: ID чата
+            text: Текст сообщения
+            process: Корутина-обработчик, принимающая итоговый текст
+        """
+        self.stats['messages'] += 1
+        previous = self._units.get(chat_id)
+        texts, delay = [text], 0.0
+
+        if (self.window > 0 and previous and not previous.committed and not previous.task.done()
+                and len(previous.texts) < self.max_messages):
+            # Предыдущая обработка еще ничего не записала - отменяем и объединяем
+            previous.superseded = True
+            previous.task.cancel()
+            texts = previous.texts + [text]
+            delay = self.window
+            self.stats['merged'] += 1
+            self.stats['cancelled'] += 1
+            logger.info(f"Сообщения чата {chat_id} объединены ({len(texts)} шт.)")
+
+        unit = _Unit(texts)
+        unit.task = asyncio.get_event_loop().create_task(self._run(unit, delay, process))
+        self._units[chat_id] = unit
+
+        try:
+            await unit.task
+        except asyncio.CancelledError:
+            # Обработку заменило объединенное сообщение; отмену самого обработчика пробрасываем
+            if not unit.superseded:
+                raise
+        finally:
+            if self._units.get(chat_id) is unit and unit.task.done():
+                del self._units[chat_id]
+
+    async def _run(self, unit: _Unit, delay: float, process: Callable[[str], Awaitable]):
+        _current_unit.set(unit)
+        if delay:
+            await asyncio.sleep(delay)
+        await process(unit.text)
+
+    @staticmethod
+    def mark_committed():
+        """
+        Отмечает, что обработка текущего сообщения начала изменять данные или отвечать,
+        и больше не может быть отменена ради объединения
+        """
+        unit = _current_unit.get()
+        if unit is not None:
+            unit.committed = True
@@ -0,0 +1,78 @@
+"""
+Одна сессия базы данных на каждое обновление Telegram
+"""
+import contextvars
+import inspect
+import logging
+from typing import Optional
+
+from aiogram import types
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.async_database import AsyncSessionLocal, finish_session, session_metrics
+
+logger = logging.getLogger(__name__)
+
+class _UpdateSession:
+    """Сессия, открытая для текущего обновления, и признак ошибки обработчика"""
+
+    def __init__(self):
+        self.session = None
+        self.started = 0.0
+        self.failed = False
+
+_current: contextvars.ContextVar = contextvars.ContextVar('update_session', default=None)
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Передает обработчикам сообщений и callback-запросов сессию БД в аргументе db.
+
+    Сессия создается при первом обработчике обновления, которому она нужна (есть
+    аргумент db), и общая для всех его обработчиков. После обработки обновления изменения фиксируются одним коммитом
+    (или откатываются, если обработчик завершился исключением), а сессия
+    закрывается в любом случае. Обработчики сами не коммитят: для получения ID
+    новых записей и раннего обнаружения ошибок достаточно flush().
+    """
+
+    async def on_pre_process_update(self, update: types.Update, data: dict):
+        _current.set(_UpdateSession())
+
+    @staticmethod
+    def _handler_wants_session() -> bool:
+        handler = current_handler.get(None)
+        return handler is None or 'db' in inspect.signature(handler).parameters
+
+    def _session(self):
+        current = _current.get()
+        if current is None:
+            # Обработчик вызван не из цикла обработки обновлений
+            current = _UpdateSession()
+            _current.set(current)
+        if current.session is None:
+            current.session = AsyncSessionLocal()
+            current.started = session_metrics.opened()
+        return current.session
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        if self._handler_wants_session():
+            data['db'] = self._session()
+
+    async def on_process_callback_query(self, callback_query: types.CallbackQuery, data: dict):
+        if self._handler_wants_session():
+            data['db'] = self._session()
+
+    async def on_pre_process_error(self, update: types.Update, error: Exception, data: dict):
+        current: Optional[_UpdateSession] = _current.get()
+        if current is not None:
+            current.failed = True
+
+    async def on_post_process_update(self, update: types.Update, results: list, data: dict):
+        current: Optional[_UpdateSession] = _current.get()
+        if current is None or current.session is None:
+            return
+        session, current.session = current.session, None
+        await finish_session(session, current.started, current.failed, f"update {update.update_id}")
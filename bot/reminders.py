@@ -7,13 +7,13 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ParseMode
 from datetime import datetime, timedelta
 import logging
 import re
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database.database import get_db
-from database.models import Reminder, Child
+from database.models import Reminder
+from database.child_profile import child_profiles
 from bot.bot import bot, dp, ReminderState
 
 logger = logging.getLogger(__name__)
@@ -88,7 +88,7 @@ async def process_reminder_time(message: types.Message, state: FSMContext):
 
 # Обработчик типа повторения
 @dp.callback_query_handler(lambda c: c.data.startswith('repeat_'), state=ReminderState.waiting_for_repeat_type)
-async def process_reminder_repeat_type(callback_query: types.CallbackQuery, state: FSMContext):
+async def process_reminder_repeat_type(callback_query: types.CallbackQuery, state: FSMContext, db: AsyncSession):
     """Обработка типа повторения"""
     repeat_type = callback_query.data.split('_')[1]  # once или daily
     await state.update_data(repeat_type=repeat_type)
@@ -104,11 +104,11 @@ async def process_reminder_repeat_type(callback_query: types.CallbackQuery, stat
     else:
         # Если каждый день, устанавливаем интервал 1 и создаем напоминание
         await state.update_data(repeat_interval=1)
-        await create_reminder(callback_query, state)
+        await create_reminder(callback_query, state, db)
 
 # Обработчик даты для однократного напоминания
 @dp.message_handler(state=ReminderState.waiting_for_date)
-async def process_reminder_date(message: types.Message, state: FSMContext):
+async def process_reminder_date(message: types.Message, state: FSMContext, db: AsyncSession):
     """Обработка даты для однократного напоминания"""
     date_str = message.text.strip()
     
@@ -135,7 +135,7 @@ async def process_reminder_date(message: types.Message, state: FSMContext):
         await state.update_data(repeat_interval=1)
         
         # Создаем напоминание
-        await create_reminder(message, state)
+        await create_reminder(message, state, db)
         
     except ValueError:
         await message.reply(
@@ -145,7 +145,7 @@ async def process_reminder_date(message: types.Message, state: FSMContext):
 
 # Обработчик интервала повторения
 @dp.message_handler(state=ReminderState.waiting_for_repeat_interval)
-async def process_reminder_interval(message: types.Message, state: FSMContext):
+async def process_reminder_interval(message: types.Message, state: FSMContext, db: AsyncSession):
     """Обработка интервала повторения"""
     try:
         interval = int(message.text.strip())
@@ -154,12 +154,12 @@ async def process_reminder_interval(message: types.Message, state: FSMContext):
             return
             
         await state.update_data(repeat_interval=interval)
-        await create_reminder(message, state)
+        await create_reminder(message, state, db)
     except ValueError:
         await message.reply("❌ Введите целое число. Попробуйте еще раз:")
 
 # Функция создания напоминания
-async def create_reminder(message_or_callback, state: FSMContext):
+async def create_reminder(message_or_callback, state: FSMContext, db: AsyncSession):
     """Создание напоминания в базе данных"""
     user_id = message_or_callback.from_user.id if isinstance(message_or_callback, types.Message) else message_or_callback.from_user.id
     
@@ -169,10 +169,9 @@ async def create_reminder(message_or_callback, state: FSMContext):
     repeat_type = data.get('repeat_type', 'once')
     repeat_interval = data.get('repeat_interval', 1)
     
-    db: Session = next(get_db())
     try:
         # Получаем ребенка
-        child = db.query(Child).first()
+        child = await child_profiles.aget(db)
         if not child:
             await bot.send_message(user_id, "❌ Сначала зарегистрируйте ребенка")
             await state.finish()
@@ -189,7 +188,7 @@ async def create_reminder(message_or_callback, state: FSMContext):
         )
         
         db.add(reminder)
-        db.commit()
+        await db.flush()
         
         # Формируем сообщение об успехе
         repeat_text = "однократное"
@@ -229,18 +228,16 @@ async def create_reminder(message_or_callback, state: FSMContext):
             "❌ Произошла ошибка при создании напоминания. Попробуйте позже."
         )
     finally:
-        db.close()
         await state.finish()
 
 # Обработчик для отметки напоминания как выполненного
 @dp.callback_query_handler(lambda c: c.data.startswith('reminder_complete_'))
-async def complete_reminder(callback_query: types.CallbackQuery):
+async def complete_reminder(callback_query: types.CallbackQuery, db: AsyncSession):
     """Отметка напоминания как выполненного"""
     reminder_id = int(callback_query.data.split('_')[2])
     
-    db: Session = next(get_db())
     try:
-        reminder = db.query(Reminder).get(reminder_id)
+        reminder = await db.get(Reminder, reminder_id)
         if not reminder:
             await bot.answer_callback_query(callback_query.id, "❌ Напоминание не найдено")
             return
@@ -334,12 +331,12 @@ async def complete_reminder(callback_query: types.CallbackQuery):
                 )
                 db.add(new_reminder)
         
-        db.commit()
+        await db.flush()
         
         await bot.answer_callback_query(callback_query.id, "✅ Напоминание отмечено как выполненное")
         
         # Показываем обновленный список
-        await show_reminders_list(callback_query)
+        await show_reminders_list(callback_query, db)
         
     except Exception as e:
         logger.error(f"Ошибка при обновлении напоминания: {e}")
@@ -347,18 +344,15 @@ async def complete_reminder(callback_query: types.CallbackQuery):
             callback_query.id,
             "❌ Произошла ошибка при обновлении напоминания"
         )
-    finally:
-        db.close()
 
 # Обработчик для пропуска напоминания
 @dp.callback_query_handler(lambda c: c.data.startswith('reminder_skip_'))
-async def skip_reminder(callback_query: types.CallbackQuery):
+async def skip_reminder(callback_query: types.CallbackQuery, db: AsyncSession):
     """Пропуск напоминания"""
     reminder_id = int(callback_query.data.split('_')[2])
     
-    db: Session = next(get_db())
     try:
-        reminder = db.query(Reminder).get(reminder_id)
+        reminder = await db.get(Reminder, reminder_id)
         if not reminder:
             await bot.answer_callback_query(callback_query.id, "❌ Напоминание не найдено")
             return
@@ -395,12 +389,12 @@ async def skip_reminder(callback_query: types.CallbackQuery):
                 )
                 db.add(new_reminder)
         
-        db.commit()
+        await db.flush()
         
         await bot.answer_callback_query(callback_query.id, "⏭️ Напоминание пропущено")
         
         # Показываем обновленный список
-        await show_reminders_list(callback_query)
+        await show_reminders_list(callback_query, db)
         
     except Exception as e:
         logger.error(f"Ошибка при пропуске напоминания: {e}")
@@ -408,8 +402,6 @@ async def skip_reminder(callback_query: types.CallbackQuery):
             callback_query.id,
             "❌ Произошла ошибка при пропуске напоминания"
         )
-    finally:
-        db.close()
 
 # Обработчик для удаления напоминания
 @dp.callback_query_handler(lambda c: c.data.startswith('reminder_delete_') and not c.data.startswith('reminder_delete_confirm_'))
@@ -434,25 +426,24 @@ async def delete_reminder(callback_query: types.CallbackQuery):
 
 # Обработчик подтверждения удаления
 @dp.callback_query_handler(lambda c: c.data.startswith('reminder_delete_confirm_'))
-async def confirm_delete_reminder(callback_query: types.CallbackQuery):
+async def confirm_delete_reminder(callback_query: types.CallbackQuery, db: AsyncSession):
     """Подтверждение удаления напоминания"""
     reminder_id = int(callback_query.data.split('_')[3])
     
-    db: Session = next(get_db())
     try:
-        reminder = db.query(Reminder).get(reminder_id)
+        reminder = await db.get(Reminder, reminder_id)
         if not reminder:
             await bot.answer_callback_query(callback_query.id, "❌ Напоминание не найдено")
             return
             
         # Удаляем напоминание
-        db.delete(reminder)
-        db.commit()
+        await db.delete(reminder)
+        await db.flush()
         
         await bot.answer_callback_query(callback_query.id, "✅ Напоминание удалено")
         
         # Показываем обновленный список
-        await show_reminders_list(callback_query)
+        await show_reminders_list(callback_query, db)
         
     except Exception as e:
         logger.error(f"Ошибка при удалении напоминания: {e}")
@@ -460,8 +451,6 @@ async def confirm_delete_reminder(callback_query: types.CallbackQuery):
             callback_query.id,
             "❌ Произошла ошибка при удалении напоминания"
         )
-    finally:
-        db.close()
 
 # Обработчик для редактирования напоминания
 @dp.callback_query_handler(lambda c: c.data.startswith('reminder_edit_'))
@@ -6,12 +6,11 @@ from aiogram.dispatcher import FSMContext
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ParseMode
 from datetime import datetime, timedelta
 import logging
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database.database import get_db
 from database.models import Reminder
 from bot.bot import bot, dp, ReminderState
 
@@ -19,16 +18,15 @@ logger = logging.getLogger(__name__)
 
 # Обработчики для редактирования описания напоминания
 @dp.callback_query_handler(lambda c: c.data.startswith('edit_description_'))
-async def edit_description_start(callback_query: types.CallbackQuery, state: FSMContext):
+async def edit_description_start(callback_query: types.CallbackQuery, state: FSMContext, db: AsyncSession):
     """Начало редактирования описания"""
     reminder_id = int(callback_query.data.split('_')[2])
     
     # Сохраняем ID напоминания в состоянии
     await state.update_data(reminder_id=reminder_id)
     
-    db: Session = next(get_db())
     try:
-        reminder = db.query(Reminder).get(reminder_id)
+        reminder = await db.get(Reminder, reminder_id)
         if not reminder:
             await bot.answer_callback_query(callback_query.id, "❌ Напоминание не найдено")
             return
@@ -49,11 +47,9 @@ async def edit_description_start(callback_query: types.CallbackQuery, state: FSM
             callback_query.id,
             "❌ Произошла ошибка при редактировании"
         )
-    finally:
-        db.close()
 
 @dp.message_handler(state=ReminderState.waiting_for_new_description)
-async def process_new_description(message: types.Message, state: FSMContext):
+async def process_new_description(message: types.Message, state: FSMContext, db: AsyncSession):
     """Обработка нового описания"""
     new_description = message.text.strip()
     if len(new_description) < 3:
@@ -63,9 +59,8 @@ async def process_new_description(message: types.Message, state: FSMContext):
     data = await state.get_data()
     reminder_id = data.get('reminder_id')
     
-    db: Session = next(get_db())
     try:
-        reminder = db.query(Reminder).get(reminder_id)
+        reminder = await db.get(Reminder, reminder_id)
         if not reminder:
             await message.reply("❌ Напоминание не найдено")
             await state.finish()
@@ -74,7 +69,7 @@ async def process_new_description(message: types.Message, state: FSMContext):
         # Обновляем описание
         old_description = reminder.description
         reminder.description = new_description
-        db.commit()
+        await db.flush()
         
         await message.reply(
             f"✅ Описание обновлено!\n\n"
@@ -83,27 +78,25 @@ async def process_new_description(message: types.Message, state: FSMContext):
         )
         
         # Показываем обновленное напоминание
-        await show_reminder_after_edit(message, reminder_id)
+        await show_reminder_after_edit(message, reminder_id, db)
         
     except Exception as e:
         logger.error(f"Ошибка при обновлении описания: {e}")
         await message.reply("❌ Произошла ошибка при обновлении описания")
     finally:
-        db.close()
         await state.finish()
 
 # Обработчики для редактирования времени напоминания
 @dp.callback_query_handler(lambda c: c.data.startswith('edit_time_'))
-async def edit_time_start(callback_query: types.CallbackQuery, state: FSMContext):
+async def edit_time_start(callback_query: types.CallbackQuery, state: FSMContext, db: AsyncSession):
     """Начало редактирования времени"""
     reminder_id = int(callback_query.data.split('_')[2])
     
     # Сохраняем ID напоминания в состоянии
     await state.update_data(reminder_id=reminder_id)
     
-    db: Session = next(get_db())
     try:
-        reminder = db.query(Reminder).get(reminder_id)
+        reminder = await db.get(Reminder, reminder_id)
         if not reminder:
             await bot.answer_callback_query(callback_query.id, "❌ Напоминание не найдено")
             return
@@ -127,11 +120,9 @@ async def edit_time_start(callback_query: types.CallbackQuery, state: FSMContext
             callback_query.id,
             "❌ Произошла ошибка при редактировании"
         )
-    finally:
-        db.close()
 
 @dp.message_handler(state=ReminderState.waiting_for_new_time)
-async def process_new_time(message: types.Message, state: FSMContext):
+async def process_new_time(message: types.Message, state: FSMContext, db: AsyncSession):
     """Обработка нового времени"""
     time_str = message.text.strip()
     
@@ -160,9 +151,8 @@ async def process_new_time(message: types.Message, state: FSMContext):
     data = await state.get_data()
     reminder_id = data.get('reminder_id')
     
-    db: Session = next(get_db())
     try:
-        reminder = db.query(Reminder).get(reminder_id)
+        reminder = await db.get(Reminder, reminder_id)
         if not reminder:
             await message.reply("❌ Напоминание не найдено")
             await state.finish()
@@ -171,7 +161,7 @@ async def process_new_time(message: types.Message, state: FSMContext):
         # Обновляем время
         old_time = reminder.reminder_time
         reminder.reminder_time = new_time
-        db.commit()
+        await db.flush()
         
         await message.reply(
             f"✅ Время обновлено!\n\n"
@@ -180,13 +170,12 @@ async def process_new_time(message: types.Message, state: FSMContext):
         )
         
         # Показываем обновленное напоминание
-        await show_reminder_after_edit(message, reminder_id)
+        await show_reminder_after_edit(message, reminder_id, db)
         
     except Exception as e:
         logger.error(f"Ошибка при обновлении времени: {e}")
         await message.reply("❌ Произошла ошибка при обновлении времени")
     finally:
-        db.close()
         await state.finish()
 
 # Обработчики для редактирования типа повторения
@@ -218,16 +207,15 @@ async def edit_repeat_type_start(callback_query: types.CallbackQuery, state: FSM
     await ReminderState.waiting_for_new_repeat_type.set()
 
 @dp.callback_query_handler(lambda c: c.data.startswith('new_repeat_'), state=ReminderState.waiting_for_new_repeat_type)
-async def process_new_repeat_type(callback_query: types.CallbackQuery, state: FSMContext):
+async def process_new_repeat_type(callback_query: types.CallbackQuery, state: FSMContext, db: AsyncSession):
     """Обработка нового типа повторения"""
     new_repeat_type = callback_query.data.split('_')[2]  # once, daily, weekly, monthly
     
     data = await state.get_data()
     reminder_id = data.get('reminder_id')
     
-    db: Session = next(get_db())
     try:
-        reminder = db.query(Reminder).get(reminder_id)
+        reminder = await db.get(Reminder, reminder_id)
         if not reminder:
             await bot.answer_callback_query(callback_query.id, "❌ Напоминание не найдено")
             await state.finish()
@@ -237,7 +225,7 @@ async def process_new_repeat_type(callback_query: types.CallbackQuery, state: FS
         if new_repeat_type == 'once':
             old_repeat_type = reminder.repeat_type
             reminder.repeat_type = new_repeat_type
-            db.commit()
+            await db.flush()
             
             await bot.send_message(
                 callback_query.from_user.id,
@@ -245,7 +233,7 @@ async def process_new_repeat_type(callback_query: types.CallbackQuery, state: FS
             )
             
             # Показываем обновленное напоминание
-            await show_reminder_after_edit(callback_query.message, reminder_id)
+            await show_reminder_after_edit(callback_query.message, reminder_id, db)
             await state.finish()
         else:
             # Сохраняем новый тип повторения в состоянии
@@ -266,11 +254,9 @@ async def process_new_repeat_type(callback_query: types.CallbackQuery, state: FS
             "❌ Произошла ошибка при обновлении типа повторения"
         )
         await state.finish()
-    finally:
-        db.close()
 
 @dp.message_handler(state=ReminderState.waiting_for_new_repeat_interval)
-async def process_new_repeat_interval(message: types.Message, state: FSMContext):
+async def process_new_repeat_interval(message: types.Message, state: FSMContext, db: AsyncSession):
     """Обработка нового интервала повторения"""
     try:
         new_interval = int(message.text.strip())
@@ -282,9 +268,8 @@ async def process_new_repeat_interval(message: types.Message, state: FSMContext)
         reminder_id = data.get('reminder_id')
         new_repeat_type = data.get('new_repeat_type')
         
-        db: Session = next(get_db())
         try:
-            reminder = db.query(Reminder).get(reminder_id)
+            reminder = await db.get(Reminder, reminder_id)
             if not reminder:
                 await message.reply("❌ Напоминание не найдено")
                 await state.finish()
@@ -296,7 +281,7 @@ async def process_new_repeat_interval(message: types.Message, state: FSMContext)
             
             reminder.repeat_type = new_repeat_type
             reminder.repeat_interval = new_interval
-            db.commit()
+            await db.flush()
             
             # Формируем текст типа повторения
             repeat_text = {
@@ -313,29 +298,27 @@ async def process_new_repeat_interval(message: types.Message, state: FSMContext)
             )
             
             # Показываем обновленное напоминание
-            await show_reminder_after_edit(message, reminder_id)
+            await show_reminder_after_edit(message, reminder_id, db)
             
         except Exception as e:
             logger.error(f"Ошибка при обновлении интервала повторения: {e}")
             await message.reply("❌ Произошла ошибка при обновлении интервала повторения")
         finally:
-            db.close()
             await state.finish()
     except ValueError:
         await message.reply("❌ Введите целое число. Попробуйте еще раз:")
 
 # Обработчик для редактирования интервала повторения
 @dp.callback_query_handler(lambda c: c.data.startswith('edit_repeat_interval_'))
-async def edit_repeat_interval_start(callback_query: types.CallbackQuery, state: FSMContext):
+async def edit_repeat_interval_start(callback_query: types.CallbackQuery, state: FSMContext, db: AsyncSession):
     """Начало редактирования интервала повторения"""
     reminder_id = int(callback_query.data.split('_')[3])
     
     # Сохраняем ID напоминания в состоянии
     await state.update_data(reminder_id=reminder_id)
     
-    db: Session = next(get_db())
     try:
-        reminder = db.query(Reminder).get(reminder_id)
+        reminder = await db.get(Reminder, reminder_id)
         if not reminder:
             await bot.answer_callback_query(callback_query.id, "❌ Напоминание не найдено")
             return
@@ -371,15 +354,12 @@ async def edit_repeat_interval_start(callback_query: types.CallbackQuery, state:
             callback_query.id,
             "❌ Произошла ошибка при редактировании"
         )
-    finally:
-        db.close()
 
 # Вспомогательная функция для показа напоминания после редактирования
-async def show_reminder_after_edit(message, reminder_id):
+async def show_reminder_after_edit(message, reminder_id, db: AsyncSession):
     """Показать напоминание после редактирования"""
-    db: Session = next(get_db())
     try:
-        reminder = db.query(Reminder).get(reminder_id)
+        reminder = await db.get(Reminder, reminder_id)
         if not reminder:
             await message.reply("❌ Напоминание не найдено")
             return
@@ -433,8 +413,6 @@ async def show_reminder_after_edit(message, reminder_id):
     except Exception as e:
         logger.error(f"Ошибка при показе напоминания: {e}")
         await message.reply("❌ Произошла ошибка при показе напоминания")
-    finally:
-        db.close()
 
 # Импорт для обеспечения работы обработчиков
 from bot.reminders import show_reminders_list 
\ No newline at end of file
@@ -16,7 +16,8 @@ DATABASE_URL = 'sqlite:///family_assistant.db'
 LOG_LEVEL = 'INFO'
 
 # Bot Configuration
-BOT_ADMIN_IDS = []  # Добавьте ID администраторов при необходимости
+# ID администраторов через запятую; только им доступны служебные команды (/prompt_profile, /db_stats)
+BOT_ADMIN_IDS = [int(x) for x in os.getenv('BOT_ADMIN_IDS', '').split(',') if x.strip()]
 
 # Application Configuration
 APP_NAME = f"Медицинский ассистент - {CHILD_NAME}"
@@ -25,4 +26,69 @@ APP_VERSION = "1.0.0"
 # Google Sheets API
 GOOGLE_SHEETS_CREDENTIALS = 'credentials.json'
 GOOGLE_SHEETS_SPREADSHEET_ID = None  # Установите ID таблицы при необходимости
-GOOGLE_SHEETS_ENABLED = False 
\ No newline at end of file
+GOOGLE_SHEETS_ENABLED = False
+
+# Хеджирование запросов извлечения данных (parse_feeding, parse_weight и т.п.)
+LLM_HEDGING_ENABLED = False
+LLM_HEDGE_PERCENTILE = 95  # перцентиль задержки, после которого отправляется дублирующий запрос
+LLM_HEDGE_BUDGET = 0.1  # максимальная доля запросов, для которых допускается дублирование
+LLM_HEDGE_DEFAULT_DEADLINE = 2.5  # дедлайн в секундах, пока не накоплена статистика задержек
+LLM_HEDGE_MIN_SAMPLES = 20
+
+# Фоновая подготовка сводок
+SUMMARY_PREWARM_INTERVAL_MINUTES = 10  # как часто проверять, нужно ли обновить сводки
+SUMMARY_PREWARM_SETTLE_MINUTES = 15  # сколько минут данные должны не меняться перед обновлением
+SUMMARY_PREWARM_DAILY_LLM_BUDGET = 24  # максимум LLM-запросов в день на фоновую подготовку
+
+# Кэш ответов на похожие вопросы
+QUESTION_CACHE_THRESHOLD = 0.9  # минимальная близость вопросов (0..1), чтобы переиспользовать ответ; числа и отрицания должны совпадать
+QUESTION_CACHE_TTL_HOURS = 24  # сколько часов хранится ответ
+
+# Бэкенд для извлечения данных из сообщений: 'openai' или 'local' (llama.cpp, нужен пакет llama-cpp-python)
+EXTRACTION_BACKEND = os.getenv('EXTRACTION_BACKEND', 'openai')
+LOCAL_MODEL_PATH = os.getenv('LOCAL_MODEL_PATH', 'models/qwen2.5-1.5b-instruct-q4_k_m.gguf')
+LOCAL_MODEL_THREADS = None  # число потоков CPU (None - по количеству ядер)
+LOCAL_MODEL_CONTEXT = 2048
+LOCAL_MODEL_MAX_BATCH = 4  # сколько накопившихся запросов обрабатывать за один проход
+
+# История диалогов с AI (хранится в памяти отдельно для каждого чата)
+CONVERSATION_MEMORY_MAX_MESSAGES = 10  # сколько последних сообщений чата передавать в контекст
+CONVERSATION_MEMORY_MAX_CHATS = 200  # сколько чатов держать в памяти одновременно
+CONVERSATION_MEMORY_IDLE_HOURS = 6  # через сколько часов неактивности история чата удаляется
+
+# Объединение сообщений, отправленных подряд ("поели 80", "смесь", "и срыгнули немного")
+MESSAGE_COALESCE_WINDOW = 1.5  # секунд между сообщениями, при которых они считаются одной записью (0 - отключить)
+MESSAGE_COALESCE_MAX_MESSAGES = 5  # максимум сообщений в одной объединенной записи
+
+# Настройки соединения SQLite (можно переопределить переменными окружения)
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')  # WAL: чтение не блокируется записью
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')  # NORMAL: без fsync на каждый коммит в режиме WAL
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))  # сколько ждать занятую базу вместо ошибки
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(64 * 1024 * 1024)))  # байт файла, читаемых через mmap (0 - отключить)
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', '16384'))  # размер кэша страниц на соединение
+SQLITE_TEMP_STORE = os.getenv('SQLITE_TEMP_STORE', 'MEMORY')  # временные таблицы и индексы в памяти
+
+# Сессии базы данных
+DB_SESSION_SLOW_SECONDS = 10  # сессия, открытая дольше, отмечается в логе и в статистике
+
+# Архив истории диалогов с AI (таблица chat_history_archive)
+CHAT_HISTORY_HOT_DAYS = int(os.getenv('CHAT_HISTORY_HOT_DAYS', '60'))  # диалоги старше переносятся в сжатый архив
+# После переноса сжимать файл базы (VACUUM). VACUUM переписывает всю базу под монопольной блокировкой,
+# записи бота и планировщика в это время ждут, поэтому по умолчанию выключено
+CHAT_HISTORY_ARCHIVE_VACUUM = os.getenv('CHAT_HISTORY_ARCHIVE_VACUUM', 'false').lower() == 'true'
+CHAT_HISTORY_VACUUM_MIN_FREE_SHARE = 0.25  # и только если свободные страницы занимают не меньше этой доли файла
+
+# Резервные копии базы (database/backup.py)
+BACKUP_ENABLED = os.getenv('BACKUP_ENABLED', 'true').lower() == 'true'
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')  # каталог для снимков (лучше на другом диске)
+BACKUP_HOUR = int(os.getenv('BACKUP_HOUR', '4'))  # ежедневный снимок в этот час
+BACKUP_KEEP_DAILY = int(os.getenv('BACKUP_KEEP_DAILY', '7'))  # сколько последних ежедневных снимков хранить
+BACKUP_KEEP_WEEKLY = int(os.getenv('BACKUP_KEEP_WEEKLY', '8'))  # и по одному снимку за столько последних недель
+BACKUP_PAGES_PER_STEP = 256  # страниц базы, копируемых за один шаг
+BACKUP_STEP_SLEEP_SECONDS = 0.01  # пауза между шагами копирования
+
+# Пользователи бота (database/user_registry.py)
+USER_LAST_SEEN_FLUSH_MINUTES = 5  # как часто записывать в базу время последней активности пользователей
+
+# Полнотекстовый поиск (/search)
+SEARCH_PAGE_SIZE = 5  # результатов на странице
@@ -1,8 +1,18 @@
 from .database import get_db, engine, SessionLocal
+from .async_database import async_engine, AsyncSessionLocal
 from .models import Base, Child, Feeding, Stool, Weight, Medication, Appointment, Reminder
+from .child_profile import child_profiles, ChildProfile
+from .user_registry import user_registry
+from .rollups import (
+    rebuild_rollups, feeding_totals, feeding_by_day, feeding_by_type,
+    stool_totals, stool_distribution, weight_range
+)
+from .chat_archive import archive_chat_history, get_chat_turns
 
 __all__ = [
-    'get_db', 'engine', 'SessionLocal', 'Base',
+    'get_db', 'engine', 'SessionLocal', 'async_engine', 'AsyncSessionLocal', 'Base',
     'Child', 'Feeding', 'Stool', 'Weight', 
-    'Medication', 'Appointment', 'Reminder'
+    'Medication', 'Appointment', 'Reminder',
+    'child_profiles', 'ChildProfile', 'user_registry', 'rebuild_rollups', 'feeding_totals', 'feeding_by_day', 'feeding_by_type',
+    'stool_totals', 'stool_distribution', 'weight_range', 'archive_chat_history', 'get_chat_turns'
 ] 
\ No newline at end of file
@@ -0,0 +1,180 @@
+"""
+Асинхронный доступ к базе данных для обработчиков бота и задач планировщика
+"""
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DB_SESSION_SLOW_SECONDS
+from .database import DATABASE_URL, apply_sqlite_pragmas
+
+logger = logging.getLogger(__name__)
+
+# Та же база, что и у синхронного движка, через драйвер aiosqlite
+ASYNC_DATABASE_URL = DATABASE_URL.replace('sqlite://', 'sqlite+aiosqlite://', 1)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+
+if async_engine.dialect.name == 'sqlite':
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection)
+
+# expire_on_commit=False: объекты остаются доступными после commit без повторной
+# (асинхронной) загрузки атрибутов
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False
+)
+
+# Границы корзин гистограммы времени жизни сессий, мс
+LIFETIME_BUCKETS = (10, 50, 100, 500, 1000, 5000, 30000)
+
+class SessionMetrics:
+    """Счетчики сессий БД: открытые, завершенные коммитом или откатом, время жизни"""
+
+    def __init__(self, slow_seconds: float = 10):
+        self.slow_seconds = slow_seconds
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Сбрасывает накопленные счетчики (кроме количества открытых сейчас сессий)"""
+        with self._lock:
+            active = getattr(self, '_stats', {}).get('active', 0)
+            self._stats = {
+                'opened': 0,
+                'closed': 0,
+                'active': active,
+                'active_max': active,
+                'committed': 0,
+                'rolled_back': 0,
+                'commit_errors': 0,
+                'slow': 0,
+                'ms_total': 0.0,
+                'ms_max': 0.0,
+                'ms_histogram': {}
+            }
+
+    def opened(self) -> float:
+        """
+        Учитывает открытие сессии
+
+        Returns:
+            Момент открытия для передачи в closed()
+        """
+        with self._lock:
+            self._stats['opened'] += 1
+            self._stats['active'] += 1
+            self._stats['active_max'] = max(self._stats['active_max'], self._stats['active'])
+        return time.perf_counter()
+
+    def closed(self, started: float, outcome: str, name: str = 'session'):
+        """
+        Учитывает закрытие сессии
+
+        Args:
+            started: Значение, возвращенное opened()
+            outcome: 'committed', 'rolled_back' или 'commit_errors'
+            name: Кто пользовался сессией (для лога медленных сессий)
+        """
+        seconds = time.perf_counter() - started
+        ms = seconds * 1000
+        label = next((f"<={bound}" for bound in LIFETIME_BUCKETS if ms <= bound), f">{LIFETIME_BUCKETS[-1]}")
+        with self._lock:
+            stats = self._stats
+            stats['closed'] += 1
+            stats['active'] -= 1
+            stats[outcome] += 1
+            stats['ms_total'] += ms
+            stats['ms_max'] = max(stats['ms_max'], ms)
+            stats['ms_histogram'][label] = stats['ms_histogram'].get(label, 0) + 1
+            if seconds > self.slow_seconds:
+                stats['slow'] += 1
+        if seconds > self.slow_seconds:
+            logger.warning(f"Сессия БД ({name}) была открыта {seconds:.1f} с")
+
+    def get_stats(self) -> Dict:
+        """Текущие значения счетчиков и среднее время жизни сессии"""
+        with self._lock:
+            stats = dict(self._stats, ms_histogram=dict(self._stats['ms_histogram']))
+        stats['ms_mean'] = round(stats['ms_total'] / stats['closed'], 2) if stats['closed'] else 0.0
+        stats['ms_total'] = round(stats['ms_total'], 2)
+        stats['ms_max'] = round(stats['ms_max'], 2)
+        return stats
+
+    def format_report(self) -> str:
+        """Краткий текстовый отчет для команды бота"""
+        stats = self.get_stats()
+        histogram = ", ".join(
+            f"{label} мс: {stats['ms_histogram'][label]}"
+            for label in [f"<={bound}" for bound in LIFETIME_BUCKETS] + [f">{LIFETIME_BUCKETS[-1]}"]
+            if label in stats['ms_histogram']
+        )
+        return (
+            f"Открыто: {stats['opened']}, закрыто: {stats['closed']}, "
+            f"открыто сейчас: {stats['active']} (макс. {stats['active_max']})\n"
+            f"Коммитов: {stats['committed']}, откатов: {stats['rolled_back']}, "
+            f"ошибок коммита: {stats['commit_errors']}\n"
+            f"Время жизни: в среднем {stats['ms_mean']:.1f} мс, макс. {stats['ms_max']:.1f} мс, "
+            f"дольше {self.slow_seconds:g} с: {stats['slow']}\n"
+            f"Распределение: {histogram or 'нет данных'}"
+        )
+
+# Общие счетчики процесса
+session_metrics = SessionMetrics(DB_SESSION_SLOW_SECONDS)
+
+async def finish_session(session: AsyncSession, started: float, failed: bool = False, name: str = 'session'):
+    """
+    Завершает единицу работы: коммит (или откат, если была ошибка) и закрытие сессии
+
+    Args:
+        session: Асинхронная сессия
+        started: Значение, возвращенное session_metrics.opened()
+        failed: Работа завершилась исключением - изменения откатываются
+        name: Кто пользовался сессией (для лога)
+    """
+    outcome = 'rolled_back'
+    try:
+        if not failed:
+            try:
+                await session.commit()
+                outcome = 'committed'
+            except Exception as e:
+                outcome = 'commit_errors'
+                logger.error(f"Ошибка при сохранении изменений ({name}): {e}")
+                await session.rollback()
+        else:
+            await session.rollback()
+    finally:
+        await session.close()
+        session_metrics.closed(started, outcome, name)
+
+@asynccontextmanager
+async def session_scope(name: str = 'session'):
+    """
+    Сессия для работы вне обработчиков бота (задачи планировщика, фоновая обработка)
+
+    Изменения фиксируются одним коммитом при выходе из блока, при исключении
+    откатываются; сессия закрывается в любом случае.
+
+    Args:
+        name: Кто пользуется сессией (для лога медленных сессий)
+    """
+    session = AsyncSessionLocal()
+    started = session_metrics.opened()
+    failed = False
+    try:
+        yield session
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        await finish_session(session, started, failed, name)
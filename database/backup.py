@@ -0,0 +1,307 @@
+"""
+Резервные копии базы SQLite
+
+Снимок делается через online backup API SQLite в отдельном потоке: база
+копируется шагами по BACKUP_PAGES_PER_STEP страниц с паузой между шагами.
+В режиме WAL копирование идет внутри одной транзакции чтения: снимок
+согласован на момент ее начала, а обработчики и планировщик продолжают
+читать и писать (записи уходят в WAL). В других режимах журнала база не
+заблокирована между шагами, а если она изменилась во время копирования,
+SQLite начинает копирование заново.
+
+Снимок проверяется (PRAGMA integrity_check), сжимается gzip и сохраняется
+в BACKUP_DIR вместе с файлом контрольной суммы SHA-256 (формат sha256sum).
+Хранятся BACKUP_KEEP_DAILY последних снимков и самый новый снимок каждой из
+BACKUP_KEEP_WEEKLY последних недель.
+
+Запуск вручную:
+    python -m database.backup create            # сделать снимок
+    python -m database.backup list              # список снимков
+    python -m database.backup restore <снимок>  # восстановить базу (бот должен быть остановлен)
+"""
+import argparse
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (
+    BACKUP_DIR, BACKUP_KEEP_DAILY, BACKUP_KEEP_WEEKLY,
+    BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP_SECONDS
+)
+from database.database import engine
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SUFFIX = '.db.gz'
+CHECKSUM_SUFFIX = '.sha256'
+TIME_FORMAT = '%Y%m%d-%H%M%S'
+
+class BackupError(Exception):
+    """Снимок поврежден или не может быть создан"""
+
+def database_path() -> Optional[str]:
+    """Путь к файлу базы (None, если база не SQLite)"""
+    if engine.dialect.name != 'sqlite' or not engine.url.database:
+        return None
+    return os.path.abspath(engine.url.database)
+
+def _snapshot_name(db_path: str, moment: datetime) -> str:
+    base = os.path.splitext(os.path.basename(db_path))[0]
+    return f"{base}-{moment.strftime(TIME_FORMAT)}{SNAPSHOT_SUFFIX}"
+
+def _snapshot_time(file_name: str) -> Optional[datetime]:
+    stamp = file_name[:-len(SNAPSHOT_SUFFIX)].rsplit('-', 2)[-2:]
+    try:
+        return datetime.strptime('-'.join(stamp), TIME_FORMAT)
+    except ValueError:
+        return None
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _check_integrity(path: str):
+    connection = sqlite3.connect(path)
+    try:
+        result = connection.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        connection.close()
+    if result != 'ok':
+        raise BackupError(f"Проверка целостности {path} не пройдена: {result}")
+
+def _copy_database(db_path: str, target: str) -> int:
+    """Копирует базу шагами через backup API, возвращает число шагов"""
+    steps = [0]
+
+    def progress(status, remaining, total):
+        steps[0] += 1
+
+    source = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    destination = sqlite3.connect(target)
+    try:
+        wal = source.execute("PRAGMA journal_mode").fetchone()[0].lower() == 'wal'
+        if wal:
+            # Открытая транзакция чтения фиксирует снимок базы на все время копирования:
+            # записи других соединений идут в WAL и не заставляют начинать копирование заново
+            source.execute("BEGIN")
+            source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        source.backup(destination, pages=BACKUP_PAGES_PER_STEP, progress=progress,
+                      sleep=BACKUP_STEP_SLEEP_SECONDS)
+        if wal:
+            source.execute("COMMIT")
+    finally:
+        destination.close()
+        source.close()
+    return steps[0]
+
+def create_backup(backup_dir: str = BACKUP_DIR, now: Optional[datetime] = None) -> Optional[Dict]:
+    """
+    Делает сжатый снимок базы и удаляет устаревшие снимки
+
+    Выполняется синхронно, поэтому из бота и планировщика вызывается в пуле потоков.
+
+    Args:
+        backup_dir: Каталог для снимков
+        now: Время снимка (для проверки)
+
+    Returns:
+        Путь к снимку, размеры, контрольная сумма и длительность; None, если база не SQLite
+    """
+    db_path = database_path()
+    if db_path is None:
+        logger.warning("Резервное копирование поддерживается только для SQLite")
+        return None
+
+    started = time.perf_counter()
+    os.makedirs(backup_dir, exist_ok=True)
+    snapshot = os.path.join(backup_dir, _snapshot_name(db_path, now or datetime.now()))
+    raw_copy = snapshot[:-len('.gz')] + '.tmp'
+    compressed = snapshot + '.tmp'
+    try:
+        steps = _copy_database(db_path, raw_copy)
+        _check_integrity(raw_copy)
+        with open(raw_copy, 'rb') as src, gzip.open(compressed, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        checksum = _sha256(compressed)
+        # Снимок появляется под своим именем только целиком
+        os.replace(compressed, snapshot)
+        with open(snapshot + CHECKSUM_SUFFIX, 'w') as f:
+            f.write(f"{checksum}  {os.path.basename(snapshot)}\n")
+        result = {
+            'path': snapshot,
+            'raw_bytes': os.path.getsize(raw_copy),
+            'compressed_bytes': os.path.getsize(snapshot),
+            'sha256': checksum,
+            'steps': steps,
+            'seconds': round(time.perf_counter() - started, 2)
+        }
+    finally:
+        for path in (raw_copy, compressed):
+            if os.path.exists(path):
+                os.remove(path)
+
+    result['removed'] = rotate_backups(backup_dir)
+    logger.info(
+        f"Создана резервная копия {snapshot}: {result['raw_bytes']} → {result['compressed_bytes']} байт "
+        f"за {result['seconds']} с ({steps} шагов), удалено старых: {len(result['removed'])}"
+    )
+    return result
+
+def list_backups(backup_dir: str = BACKUP_DIR) -> List[Dict]:
+    """
+    Снимки в каталоге от новых к старым
+
+    Returns:
+        Список словарей с путем, временем и размером снимка
+    """
+    if not os.path.isdir(backup_dir):
+        return []
+    snapshots = []
+    for file_name in os.listdir(backup_dir):
+        if not file_name.endswith(SNAPSHOT_SUFFIX):
+            continue
+        moment = _snapshot_time(file_name)
+        if moment is None:
+            continue
+        path = os.path.join(backup_dir, file_name)
+        snapshots.append({'path': path, 'time': moment, 'size': os.path.getsize(path)})
+    snapshots.sort(key=lambda snapshot: snapshot['time'], reverse=True)
+    return snapshots
+
+def rotate_backups(backup_dir: str = BACKUP_DIR, keep_daily: int = BACKUP_KEEP_DAILY,
+                   keep_weekly: int = BACKUP_KEEP_WEEKLY) -> List[str]:
+    """
+    Удаляет снимки, не попадающие в политику хранения
+
+    Сохраняются keep_daily последних снимков и самый новый снимок каждой из
+    keep_weekly последних недель (по календарным неделям).
+
+    Returns:
+        Пути удаленных снимков
+    """
+    snapshots = list_backups(backup_dir)
+    keep = {snapshot['path'] for snapshot in snapshots[:keep_daily]}
+    weeks = []
+    for snapshot in snapshots:
+        week = snapshot['time'].isocalendar()[:2]
+        if week not in weeks:
+            weeks.append(week)
+            if len(weeks) > keep_weekly:
+                break
+            keep.add(snapshot['path'])
+
+    removed = []
+    for snapshot in snapshots:
+        if snapshot['path'] in keep:
+            continue
+        for path in (snapshot['path'], snapshot['path'] + CHECKSUM_SUFFIX):
+            if os.path.exists(path):
+                os.remove(path)
+        removed.append(snapshot['path'])
+    return removed
+
+def verify_backup(snapshot: str) -> str:
+    """
+    Проверяет контрольную сумму снимка
+
+    Returns:
+        Контрольная сумма SHA-256
+
+    Raises:
+        BackupError: Файл контрольной суммы отсутствует или не совпадает
+    """
+    checksum_path = snapshot + CHECKSUM_SUFFIX
+    if not os.path.exists(checksum_path):
+        raise BackupError(f"Нет файла контрольной суммы {checksum_path}")
+    with open(checksum_path) as f:
+        expected = f.read().split()[0]
+    actual = _sha256(snapshot)
+    if actual != expected:
+        raise BackupError(f"Контрольная сумма {snapshot} не совпадает: {actual} вместо {expected}")
+    return actual
+
+def restore_backup(snapshot: str, db_path: Optional[str] = None) -> str:
+    """
+    Восстанавливает базу из снимка
+
+    Снимок проверяется по контрольной сумме и PRAGMA integrity_check до того, как
+    текущая база будет заменена; текущая база сохраняется рядом с суффиксом
+    .before-restore-<время>. Бот на время восстановления должен быть остановлен.
+
+    Args:
+        snapshot: Путь к снимку (.db.gz)
+        db_path: Куда восстановить (по умолчанию - файл базы из DATABASE_URL)
+
+    Returns:
+        Путь, под которым сохранена прежняя база ('' - базы не было)
+    """
+    db_path = db_path or database_path()
+    if db_path is None:
+        raise BackupError("Восстановление поддерживается только для SQLite")
+    verify_backup(snapshot)
+
+    restored = db_path + '.restore.tmp'
+    try:
+        with gzip.open(snapshot, 'rb') as src, open(restored, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        _check_integrity(restored)
+
+        previous = ''
+        if os.path.exists(db_path):
+            # Прежняя база сохраняется вместе с журналом WAL, в котором могут быть последние записи
+            previous = f"{db_path}.before-restore-{datetime.now().strftime(TIME_FORMAT)}"
+            os.replace(db_path, previous)
+            if os.path.exists(db_path + '-wal'):
+                os.replace(db_path + '-wal', previous + '-wal')
+        if os.path.exists(db_path + '-shm'):
+            os.remove(db_path + '-shm')
+        os.replace(restored, db_path)
+    finally:
+        if os.path.exists(restored):
+            os.remove(restored)
+
+    logger.info(f"База {db_path} восстановлена из {snapshot}")
+    return previous
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Резервные копии базы SQLite")
+    parser.add_argument('--dir', default=BACKUP_DIR, help="каталог снимков")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('create', help="сделать снимок")
+    commands.add_parser('list', help="список снимков")
+    restore = commands.add_parser('restore', help="восстановить базу из снимка (бот должен быть остановлен)")
+    restore.add_argument('snapshot', help="путь к снимку или его имя в каталоге снимков")
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'create':
+            backup = create_backup(args.dir)
+            if backup:
+                print(f"{backup['path']} ({backup['compressed_bytes']} байт, sha256 {backup['sha256']})")
+        elif args.command == 'list':
+            for backup in list_backups(args.dir):
+                print(f"{backup['time']:%Y-%m-%d %H:%M:%S}  {backup['size']:>12}  {backup['path']}")
+        else:
+            snapshot = args.snapshot
+            if not os.path.exists(snapshot):
+                snapshot = os.path.join(args.dir, snapshot)
+            previous = restore_backup(snapshot)
+            print(f"База восстановлена из {snapshot}")
+            if previous:
+                print(f"Прежняя база сохранена как {previous}")
+    except BackupError as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
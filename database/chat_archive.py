@@ -0,0 +1,253 @@
+"""
+Архив истории диалогов с AI
+
+Консультация читает только последние диалоги, поэтому в chat_history остаются
+диалоги за CHAT_HISTORY_HOT_DAYS дней. Более старые переносятся в таблицу
+chat_history_archive: диалоги ребенка за месяц сериализуются в JSON и сжимаются
+одним блоком (zstd, если установлен пакет zstandard, иначе zlib). Перенос месяца
+и удаление его строк из chat_history выполняются в одной транзакции.
+
+Для редких обращений к старым диалогам get_chat_turns() возвращает диалоги за
+период из обеих таблиц в хронологическом порядке; распаковываются только
+блоки месяцев, попадающих в период.
+
+Запуск вручную:
+    python -m database.chat_archive            # перенести старые диалоги
+    python -m database.chat_archive --days 30  # с другим сроком хранения
+"""
+import argparse
+import json
+import logging
+import sys
+import os
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, select
+
+from config import CHAT_HISTORY_HOT_DAYS
+from database.models import ChatHistory, ChatHistoryArchive
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # пакет не установлен - используем zlib
+    zstandard = None
+
+# Уровни сжатия: блоки пишутся раз в сутки, поэтому выбираем плотное сжатие
+ZSTD_LEVEL = 19
+ZLIB_LEVEL = 9
+
+def _compress(raw: bytes) -> tuple:
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return 'zlib', zlib.compress(raw, ZLIB_LEVEL)
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Блок архива сжат zstd, установите пакет zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Неизвестный формат блока архива: {codec}")
+
+class ArchivedTurn:
+    """Диалог из архива с теми же полями, что и ChatHistory"""
+
+    __slots__ = ('id', 'child_id', 'user_message', 'assistant_response', 'timestamp')
+
+    def __init__(self, turn_id: int, child_id: int, user_message: str, assistant_response: str,
+                 timestamp: datetime):
+        self.id = turn_id
+        self.child_id = child_id
+        self.user_message = user_message
+        self.assistant_response = assistant_response
+        self.timestamp = timestamp
+
+def _unpack(block: ChatHistoryArchive) -> List[ArchivedTurn]:
+    turns = json.loads(_decompress(block.codec, block.data).decode('utf-8'))
+    return [
+        ArchivedTurn(turn_id, block.child_id, user_message, assistant_response, datetime.fromisoformat(timestamp))
+        for turn_id, timestamp, user_message, assistant_response in turns
+    ]
+
+def _pack(block: ChatHistoryArchive, turns: List[ArchivedTurn]):
+    turns = sorted(turns, key=lambda turn: (turn.timestamp, turn.id))
+    raw = json.dumps(
+        [[turn.id, turn.timestamp.isoformat(), turn.user_message, turn.assistant_response] for turn in turns],
+        ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+    block.codec, block.data = _compress(raw)
+    block.raw_size = len(raw)
+    block.turns = len(turns)
+    block.first_timestamp = turns[0].timestamp
+    block.last_timestamp = turns[-1].timestamp
+
+def _month_bounds(moment: datetime) -> tuple:
+    start = datetime(moment.year, moment.month, 1)
+    end = datetime(moment.year + moment.month // 12, moment.month % 12 + 1, 1)
+    return start, end
+
+def archive_chat_history(db_session, hot_days: int = CHAT_HISTORY_HOT_DAYS,
+                         now: Optional[datetime] = None) -> Dict:
+    """
+    Переносит диалоги старше hot_days дней в сжатый архив
+
+    Обрабатывает по одному месяцу одного ребенка; каждый месяц фиксируется
+    отдельным коммитом, поэтому прерванный перенос можно просто запустить снова.
+
+    Args:
+        db_session: Сессия базы данных
+        hot_days: Сколько дней диалоги хранятся в chat_history
+        now: Текущее время (для проверки)
+
+    Returns:
+        Количество перенесенных диалогов, затронутых блоков и байт до и после сжатия
+    """
+    cutoff = (now or datetime.now()) - timedelta(days=hot_days)
+    result = {'turns': 0, 'blocks': 0, 'raw_bytes': 0, 'compressed_bytes': 0}
+
+    while True:
+        oldest = db_session.execute(
+            select(ChatHistory.child_id, ChatHistory.timestamp)
+            .where(ChatHistory.timestamp < cutoff)
+            .order_by(ChatHistory.timestamp)
+            .limit(1)
+        ).first()
+        if oldest is None:
+            break
+        child_id = oldest.child_id
+        month_start, month_end = _month_bounds(oldest.timestamp)
+        period_end = min(month_end, cutoff)
+
+        rows = db_session.scalars(select(ChatHistory).where(
+            ChatHistory.child_id == child_id,
+            ChatHistory.timestamp >= month_start,
+            ChatHistory.timestamp < period_end
+        )).all()
+        turns = [
+            ArchivedTurn(row.id, row.child_id, row.user_message, row.assistant_response, row.timestamp)
+            for row in rows
+        ]
+
+        month = month_start.strftime('%Y-%m')
+        block = db_session.scalar(select(ChatHistoryArchive).where(
+            ChatHistoryArchive.child_id == child_id,
+            ChatHistoryArchive.month == month
+        ))
+        if block is None:
+            block = ChatHistoryArchive(child_id=child_id, month=month)
+            db_session.add(block)
+        else:
+            # Месяц уже частично в архиве (срок хранения сдвинулся) - дополняем блок
+            turns += _unpack(block)
+        _pack(block, turns)
+
+        db_session.execute(delete(ChatHistory).where(ChatHistory.id.in_([row.id for row in rows])))
+        db_session.commit()
+
+        result['turns'] += len(rows)
+        result['blocks'] += 1
+        result['raw_bytes'] += block.raw_size
+        result['compressed_bytes'] += len(block.data)
+        logger.info(f"Диалоги за {month} перенесены в архив: {len(rows)} шт., блок {block.turns} шт., "
+                    f"{block.raw_size} → {len(block.data)} байт ({block.codec})")
+
+    return result
+
+def get_chat_turns(db_session, child_id: int, since: Optional[datetime] = None,
+                   until: Optional[datetime] = None, limit: Optional[int] = None) -> List:
+    """
+    Диалоги ребенка за период из архива и chat_history в хронологическом порядке
+
+    Args:
+        db_session: Сессия базы данных
+        child_id: ID ребенка
+        since: Начало периода (включительно)
+        until: Конец периода (не включается)
+        limit: Вернуть только последние limit диалогов
+
+    Returns:
+        Список ArchivedTurn и ChatHistory (поля id, user_message, assistant_response, timestamp)
+    """
+    blocks = select(ChatHistoryArchive).where(ChatHistoryArchive.child_id == child_id)
+    hot = select(ChatHistory).where(ChatHistory.child_id == child_id)
+    if since is not None:
+        blocks = blocks.where(ChatHistoryArchive.last_timestamp >= since)
+        hot = hot.where(ChatHistory.timestamp >= since)
+    if until is not None:
+        blocks = blocks.where(ChatHistoryArchive.first_timestamp < until)
+        hot = hot.where(ChatHistory.timestamp < until)
+
+    turns = []
+    for block in db_session.scalars(blocks.order_by(ChatHistoryArchive.month)):
+        turns.extend(
+            turn for turn in _unpack(block)
+            if (since is None or turn.timestamp >= since) and (until is None or turn.timestamp < until)
+        )
+    turns.extend(db_session.scalars(hot.order_by(ChatHistory.timestamp)))
+    turns.sort(key=lambda turn: (turn.timestamp, turn.id))
+    return turns[-limit:] if limit else turns
+
+def get_archived_turns(db_session, child_id: int) -> List[ArchivedTurn]:
+    """
+    Все диалоги ребенка из архива (без chat_history) от новых к старым
+
+    Args:
+        db_session: Сессия базы данных
+        child_id: ID ребенка
+
+    Returns:
+        Список ArchivedTurn
+    """
+    turns = []
+    blocks = select(ChatHistoryArchive).where(ChatHistoryArchive.child_id == child_id)
+    for block in db_session.scalars(blocks.order_by(ChatHistoryArchive.month.desc())):
+        turns.extend(reversed(_unpack(block)))
+    return turns
+
+def free_page_share(engine) -> float:
+    """Доля свободных страниц в файле базы SQLite (PRAGMA freelist_count / page_count)"""
+    if engine.dialect.name != 'sqlite':
+        return 0.0
+    with engine.connect() as connection:
+        free_pages = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+        total_pages = connection.exec_driver_sql("PRAGMA page_count").scalar()
+    return free_pages / total_pages if total_pages else 0.0
+
+def vacuum(engine):
+    """
+    Сжимает файл базы SQLite после удаления строк
+
+    Без VACUUM SQLite оставляет освободившиеся страницы в файле и переиспользует их,
+    но размер файла не уменьшается.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.exec_driver_sql("VACUUM")
+
+if __name__ == "__main__":
+    from database.database import SessionLocal, engine
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Перенос старых диалогов с AI в сжатый архив")
+    parser.add_argument('--days', type=int, default=CHAT_HISTORY_HOT_DAYS,
+                        help="сколько дней диалоги хранятся в chat_history")
+    parser.add_argument('--no-vacuum', action='store_true', help="не сжимать файл базы после переноса")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        stats = archive_chat_history(db, args.days)
+    finally:
+        db.close()
+    if stats['turns'] and not args.no_vacuum:
+        vacuum(engine)
+    print(f"Перенесено диалогов: {stats['turns']}, блоков: {stats['blocks']}, "
+          f"{stats['raw_bytes']} → {stats['compressed_bytes']} байт")
@@ -0,0 +1,188 @@
+"""
+Кэш профиля ребенка на весь процесс
+
+Почти каждый обработчик, метод ассистента и задача планировщика начинаются с
+загрузки ребенка. Профиль (имя, дата рождения, пол и вычисленный возраст)
+загружается один раз и хранится в памяти процесса. Кэш сбрасывается после
+изменения, добавления или удаления ребенка в любой сессии (регистрация,
+редактирование, очистка данных). Возраст пересчитывается при первом обращении
+после полуночи без запроса к базе.
+"""
+import logging
+import threading
+from datetime import date, datetime
+from itertools import chain
+from typing import Dict, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from .models import Child
+
+logger = logging.getLogger(__name__)
+
+def format_age(age_days: int) -> str:
+    """Возраст строкой: "N месяцев" до года, "N лет M месяцев" до пяти лет, затем "N лет\""""
+    age_months = age_days // 30
+    age_years = age_days // 365
+    if age_years > 0:
+        age_str = f"{age_years} лет"
+        if age_years < 5:
+            age_str += f" {age_months % 12} месяцев"
+        return age_str
+    return f"{age_months} месяцев"
+
+class ChildProfile:
+    """
+    Неизменяемый снимок данных ребенка с вычисленным возрастом
+
+    Содержит те же поля, что и модель Child (id, name, birth_date, gender),
+    поэтому используется вместо нее там, где данные ребенка только читаются.
+    """
+
+    __slots__ = ('id', 'name', 'birth_date', 'gender', 'age_days', 'age_months',
+                 'age_years', 'age_months_exact', 'age_str', 'computed_on')
+
+    def __init__(self, child_id: int, name: str, birth_date: date, gender: str,
+                 today: Optional[date] = None):
+        today = today or datetime.now().date()
+        values = {
+            'id': child_id,
+            'name': name,
+            'birth_date': birth_date,
+            'gender': gender,
+            'age_days': (today - birth_date).days,
+            'computed_on': today
+        }
+        values['age_months'] = values['age_days'] // 30
+        values['age_years'] = values['age_days'] // 365
+        # Дробный возраст для сравнения с возрастными нормами
+        values['age_months_exact'] = values['age_days'] / 30.4
+        values['age_str'] = format_age(values['age_days'])
+        for name_, value in values.items():
+            object.__setattr__(self, name_, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ChildProfile нельзя изменить, измените модель Child")
+
+    def for_today(self, today: Optional[date] = None) -> "ChildProfile":
+        """Профиль с возрастом на сегодня (тот же объект, если дата не сменилась)"""
+        today = today or datetime.now().date()
+        if self.computed_on == today:
+            return self
+        return ChildProfile(self.id, self.name, self.birth_date, self.gender, today)
+
+    def __repr__(self):
+        return f"ChildProfile(id={self.id}, name={self.name!r}, age_days={self.age_days})"
+
+# Отметка "не загружено" (None в кэше означает, что ребенок не зарегистрирован)
+_MISSING = object()
+
+class ChildProfileCache:
+    """Профили детей по ID и ID первого зарегистрированного ребенка"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._first_id = _MISSING
+        self._profiles: Dict[int, Optional[ChildProfile]] = {}
+        self._generation = 0
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def _cached(self, child_id) -> object:
+        with self._lock:
+            if child_id is None:
+                child_id = self._first_id
+                if child_id is _MISSING:
+                    return _MISSING
+                if child_id is None:
+                    # Ребенок еще не зарегистрирован
+                    self.stats['hits'] += 1
+                    return None
+            profile = self._profiles.get(child_id, _MISSING)
+            if profile is _MISSING:
+                return _MISSING
+            self.stats['hits'] += 1
+            if profile is not None and profile.computed_on != datetime.now().date():
+                # Наступили новые сутки - пересчитываем возраст
+                profile = self._profiles[child_id] = profile.for_today()
+            return profile
+
+    def _load(self, db_session, child_id: Optional[int]) -> Optional[ChildProfile]:
+        generation = self._generation
+        query = select(Child.id, Child.name, Child.birth_date, Child.gender)
+        if child_id is None:
+            query = query.order_by(Child.id).limit(1)
+        else:
+            query = query.where(Child.id == child_id)
+        row = db_session.execute(query).first()
+        profile = ChildProfile(*row) if row else None
+        with self._lock:
+            self.stats['misses'] += 1
+            # Пока шел запрос, кэш сбросили, или сессия сама изменила ребенка и еще не
+            # зафиксировала изменения: такие данные другим сессиям не отдаем
+            if generation != self._generation or db_session.info.get('child_changed'):
+                return profile
+            if child_id is None:
+                self._first_id = profile.id if profile else None
+            if profile is not None:
+                self._profiles[profile.id] = profile
+            elif child_id is not None:
+                self._profiles[child_id] = None
+        return profile
+
+    def get(self, db_session, child_id: Optional[int] = None) -> Optional[ChildProfile]:
+        """
+        Возвращает профиль ребенка из кэша или загружает его
+
+        Args:
+            db_session: Сессия базы данных (синхронная)
+            child_id: ID ребенка (None - первый зарегистрированный ребенок)
+
+        Returns:
+            Профиль или None, если ребенок не найден
+        """
+        profile = self._cached(child_id)
+        if profile is not _MISSING:
+            return profile
+        return self._load(db_session, child_id)
+
+    async def aget(self, db, child_id: Optional[int] = None) -> Optional[ChildProfile]:
+        """То же, что get, для AsyncSession (запрос выполняется только при промахе)"""
+        profile = self._cached(child_id)
+        if profile is not _MISSING:
+            return profile
+        return await db.run_sync(self._load, child_id)
+
+    def invalidate(self):
+        """Сбрасывает все профили"""
+        with self._lock:
+            self._first_id = _MISSING
+            self._profiles.clear()
+            self._generation += 1
+            self.stats['invalidations'] += 1
+
+# Общий кэш процесса
+child_profiles = ChildProfileCache()
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_after_flush(session, flush_context):
+    # Сбрасываем сразу, чтобы эта же сессия прочитала новые данные, и еще раз после
+    # коммита или отката: между flush и коммитом кэш могла заполнить другая сессия
+    if any(isinstance(obj, Child) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info['child_changed'] = True
+        child_profiles.invalidate()
+
+@event.listens_for(Session, "do_orm_execute")
+def _invalidate_after_bulk(orm_execute_state):
+    if not (orm_execute_state.is_delete or orm_execute_state.is_update):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is Child:
+        orm_execute_state.session.info['child_changed'] = True
+        child_profiles.invalidate()
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _invalidate_after_transaction(session):
+    if session.info.pop('child_changed', False):
+        child_profiles.invalidate()
@@ -1,14 +1,53 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
-from .models import Base
+import logging
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (
+    SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KB, SQLITE_TEMP_STORE
+)
+
+logger = logging.getLogger(__name__)
 
 DATABASE_URL = 'sqlite:///./family_assistant.db'
 
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+def apply_sqlite_pragmas(dbapi_connection):
+    """
+    Настраивает соединение SQLite
+    
+    WAL позволяет читать базу во время записи, а synchronous=NORMAL в режиме WAL
+    не вызывает fsync на каждый коммит (данные не теряют целостность, при сбое питания
+    могут пропасть только последние транзакции). busy_timeout заставляет конкурирующий
+    коммит подождать вместо ошибки "database is locked".
+    
+    Args:
+        dbapi_connection: Соединение sqlite3
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        journal_mode = cursor.fetchone()[0]
+        if journal_mode.lower() != SQLITE_JOURNAL_MODE.lower():
+            logger.warning(f"Не удалось включить режим журнала {SQLITE_JOURNAL_MODE}, используется {journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}")
+        # Отрицательное значение cache_size задает размер кэша в килобайтах
+        cursor.execute(f"PRAGMA cache_size={-int(SQLITE_CACHE_SIZE_KB)}")
+        cursor.execute(f"PRAGMA temp_store={SQLITE_TEMP_STORE}")
+    finally:
+        cursor.close()
+
+if engine.dialect.name == 'sqlite':
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection)
 
 # Dependency to get DB session
 def get_db():
@@ -16,4 +55,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close() 
@@ -0,0 +1,108 @@
+"""
+Отпечатки данных ребенка для инвалидации кэшей
+
+Количество записей и максимальный ID не меняются при редактировании записей,
+поэтому в отпечаток входит и счетчик изменений таблицы в этом процессе. Счетчик
+увеличивается при сохранении (flush) новых, измененных и удаленных объектов и
+при массовых UPDATE/DELETE через ORM, а также еще раз после коммита или отката:
+между flush и коммитом отпечаток могла вычислить другая сессия по старым данным.
+"""
+import threading
+from collections import defaultdict
+from datetime import datetime
+from itertools import chain
+from typing import Dict, Iterable, Optional
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+# Ключ в session.info: таблицы, измененные сессией, но еще не зафиксированные
+_CHANGED_KEY = 'fingerprint_changed_tables'
+
+_lock = threading.Lock()
+_modifications: Dict[str, int] = defaultdict(int)
+
+def _bump(tables: Iterable[str]):
+    with _lock:
+        for table in tables:
+            _modifications[table] += 1
+
+def modification_count(table: str) -> int:
+    """Сколько раз таблица изменялась через сессии этого процесса"""
+    with _lock:
+        return _modifications[table]
+
+def _change_column(model):
+    """Колонка, по которой определяется время последнего изменения таблицы"""
+    return getattr(model, 'timestamp', None) or getattr(model, 'created_at')
+
+def data_fingerprint(db_session, child_id: int, models: Iterable) -> str:
+    """
+    Вычисляет отпечаток данных ребенка по набору таблиц
+
+    Отпечаток меняется при добавлении и удалении записей (количество и максимальный ID)
+    и при любом изменении таблицы через сессии этого процесса (счетчик изменений).
+    В отпечаток входит текущая дата, так как возраст ребенка в сводках меняется каждый день.
+
+    Args:
+        db_session: Сессия базы данных
+        child_id: ID ребенка
+        models: Модели, данные которых учитываются
+
+    Returns:
+        Строка-отпечаток
+    """
+    parts = [datetime.now().date().isoformat()]
+    for model in models:
+        count, max_id = db_session.query(func.count(model.id), func.max(model.id)).filter(
+            model.child_id == child_id
+        ).one()
+        table = model.__tablename__
+        parts.append(f"{table}:{count}:{max_id or 0}:{modification_count(table)}")
+    return "|".join(parts)
+
+def last_change_time(db_session, child_id: int, models: Iterable) -> Optional[datetime]:
+    """
+    Возвращает время последней записи среди указанных таблиц
+
+    Args:
+        db_session: Сессия базы данных
+        child_id: ID ребенка
+        models: Модели, данные которых учитываются
+
+    Returns:
+        Время последней записи или None, если записей нет
+    """
+    latest = None
+    for model in models:
+        column = _change_column(model)
+        value = db_session.query(func.max(column)).filter(model.child_id == child_id).scalar()
+        if value is not None and (latest is None or value > latest):
+            latest = value
+    return latest
+
+@event.listens_for(Session, "after_flush")
+def _count_flushed_changes(session, flush_context):
+    tables = {
+        obj.__table__.name for obj in chain(session.new, session.dirty, session.deleted)
+        if hasattr(obj, '__table__')
+    }
+    if tables:
+        session.info.setdefault(_CHANGED_KEY, set()).update(tables)
+        _bump(tables)
+
+@event.listens_for(Session, "do_orm_execute")
+def _count_bulk_changes(orm_execute_state):
+    if not (orm_execute_state.is_delete or orm_execute_state.is_update):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None:
+        table = mapper.local_table.name
+        orm_execute_state.session.info.setdefault(_CHANGED_KEY, set()).add(table)
+        _bump([table])
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _count_after_transaction(session):
+    tables = session.info.pop(_CHANGED_KEY, None)
+    if tables:
+        _bump(tables)
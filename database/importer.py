@@ -0,0 +1,268 @@
+"""
+Импорт истории кормлений, веса, стула и лекарств из CSV и JSON
+
+Записи из бумажных дневников и других приложений загружаются без разбора через
+LLM: файл читается построчно, строки проверяются локально и вставляются
+пачками (executemany) по IMPORT_CHUNK_SIZE строк, каждая пачка - в своей
+транзакции. Суточные итоги (database/rollups.py) при такой вставке не
+обновляются по записям, поэтому после импорта они пересчитываются для ребенка
+целиком.
+
+Форматы:
+    CSV с заголовком - timestamp и поля записи (amount, food_type; weight;
+        description, color; medication_name, dosage)
+    JSON Lines (.jsonl) - по объекту на строку с теми же ключами
+    JSON (.json) - массив объектов (читается целиком)
+
+Вид записи задается параметром --kind или колонкой kind в каждой строке.
+Время - ISO (2024-03-01 08:30) или ДД.ММ.ГГГГ ЧЧ:ММ. Строка считается дублем,
+если в базе есть запись того же вида с тем же временем и теми же полями; каждая
+сохраненная запись поглощает одну такую строку. Поэтому повторный импорт того же
+файла не создает дублей, а разные записи с одним временем (два лекарства в
+08:00) и даже одинаковые строки (три кормления по 120 мл за день без указания
+времени) при первом импорте сохраняются все.
+
+Запуск:
+    python -m database.importer feedings.csv --kind feeding
+    python -m database.importer export.jsonl --child-id 1
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select
+
+from database.database import engine
+from database.models import Child, Feeding, Weight, Stool, Medication
+from database.rollups import rebuild_rollups
+
+logger = logging.getLogger(__name__)
+
+# Строк в одной пачке (одна транзакция)
+IMPORT_CHUNK_SIZE = 5000
+# Сколько ошибок проверки показывать в отчете
+MAX_REPORTED_ERRORS = 20
+
+TIME_FORMATS = ('%d.%m.%Y %H:%M', '%d.%m.%Y %H:%M:%S', '%d.%m.%Y')
+
+class ImportRowError(ValueError):
+    """Строка файла не прошла проверку"""
+
+def parse_timestamp(value) -> datetime:
+    """Время записи из ISO или ДД.ММ.ГГГГ ЧЧ:ММ"""
+    value = str(value or '').strip()
+    if not value:
+        raise ImportRowError("не указано время")
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for time_format in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, time_format)
+        except ValueError:
+            continue
+    raise ImportRowError(f"не удалось разобрать время '{value}'")
+
+def _number(value, name: str, low: float, high: float) -> float:
+    try:
+        number = float(str(value).replace(',', '.'))
+    except (TypeError, ValueError):
+        raise ImportRowError(f"{name}: '{value}' не число")
+    if not low < number <= high:
+        raise ImportRowError(f"{name}: {number:g} вне диапазона ({low:g}, {high:g}]")
+    return number
+
+def _text(value, name: str, required: bool = True) -> Optional[str]:
+    value = str(value).strip() if value is not None else ''
+    if not value:
+        if required:
+            raise ImportRowError(f"не указано поле {name}")
+        return None
+    return value
+
+def _feeding(row: Dict) -> Dict:
+    return {
+        'amount': _number(row.get('amount'), 'amount', 0, 2000),
+        'food_type': _text(row.get('food_type'), 'food_type', required=False)
+    }
+
+def _weight(row: Dict) -> Dict:
+    return {'weight': _number(row.get('weight'), 'weight', 0, 150)}
+
+def _stool(row: Dict) -> Dict:
+    return {
+        'description': _text(row.get('description'), 'description'),
+        'color': _text(row.get('color'), 'color', required=False)
+    }
+
+def _medication(row: Dict) -> Dict:
+    return {
+        'medication_name': _text(row.get('medication_name'), 'medication_name'),
+        'dosage': _text(row.get('dosage'), 'dosage', required=False)
+    }
+
+# Вид записи -> (модель, проверка полей строки)
+KINDS = {
+    'feeding': (Feeding, _feeding),
+    'weight': (Weight, _weight),
+    'stool': (Stool, _stool),
+    'medication': (Medication, _medication),
+}
+
+def read_rows(path: str) -> Iterator[Tuple[int, Dict]]:
+    """
+    Читает строки файла по одной
+
+    Returns:
+        Пары (номер строки, словарь полей); для строки JSON Lines, которую не удалось
+        разобрать, вместо словаря - ImportRowError
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if extension == '.csv':
+            # Номер строки с учетом заголовка
+            for number, row in enumerate(csv.DictReader(f), 2):
+                yield number, row
+        elif extension in ('.jsonl', '.ndjson'):
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield number, json.loads(line)
+                except ValueError as e:
+                    yield number, ImportRowError(f"некорректный JSON: {e}")
+        elif extension == '.json':
+            for number, row in enumerate(json.load(f), 1):
+                yield number, row
+        else:
+            raise ValueError(f"Неподдерживаемый формат файла: {extension} (нужен .csv, .jsonl или .json)")
+
+def _dedup_key(record: Dict) -> tuple:
+    """Ключ поиска дублей: время и все поля записи"""
+    return tuple(record[field] for field in sorted(record))
+
+def _existing_keys(connection, model, child_id: int, fields: List[str]) -> Counter:
+    columns = [getattr(model, field) for field in sorted(fields)]
+    return Counter(tuple(row) for row in connection.execute(select(*columns).where(model.child_id == child_id)))
+
+def import_records(rows: Iterable[Tuple[int, Dict]], child_id: int, kind: Optional[str] = None,
+                   chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict:
+    """
+    Проверяет и вставляет записи пачками, затем пересчитывает суточные итоги
+
+    Args:
+        rows: Пары (номер строки, словарь полей), например из read_rows()
+        child_id: ID ребенка
+        kind: Вид записей (feeding, weight, stool, medication), если в строках нет колонки kind
+        chunk_size: Строк в одной транзакции
+
+    Returns:
+        Количество вставленных строк по видам, пропущенные дубли, ошибки и скорость
+    """
+    if kind is not None and kind not in KINDS:
+        raise ValueError(f"Неизвестный вид записей: {kind}")
+
+    started = time.perf_counter()
+    pending: Dict[str, List[Dict]] = {name: [] for name in KINDS}
+    # Вид записи -> сколько сохраненных записей с каждым ключом еще не сопоставлено строкам файла
+    existing: Dict[str, Counter] = {}
+    result = {'read': 0, 'inserted': {}, 'duplicates': 0, 'errors': [], 'error_count': 0}
+
+    def flush(name: str):
+        batch = pending[name]
+        if not batch:
+            return
+        with engine.begin() as connection:
+            connection.execute(insert(KINDS[name][0].__table__), batch)
+        result['inserted'][name] = result['inserted'].get(name, 0) + len(batch)
+        pending[name] = []
+
+    def process(number: int, row):
+        result['read'] += 1
+        try:
+            if isinstance(row, ImportRowError):
+                raise row
+            if not isinstance(row, dict):
+                raise ImportRowError("строка должна быть объектом с полями записи")
+            name = row.get('kind') or kind or ''
+            if not isinstance(name, str) or name.strip() not in KINDS:
+                raise ImportRowError(f"неизвестный вид записи '{name}'")
+            name = name.strip()
+            model, validate = KINDS[name]
+            record = validate(row)
+            record['timestamp'] = parse_timestamp(row.get('timestamp'))
+        except ImportRowError as e:
+            result['error_count'] += 1
+            if len(result['errors']) < MAX_REPORTED_ERRORS:
+                result['errors'].append(f"строка {number}: {e}")
+            return
+
+        if name not in existing:
+            with engine.connect() as connection:
+                existing[name] = _existing_keys(connection, model, child_id, list(record))
+        key = _dedup_key(record)
+        if existing[name][key] > 0:
+            existing[name][key] -= 1
+            result['duplicates'] += 1
+            return
+
+        record['child_id'] = child_id
+        pending[name].append(record)
+        if len(pending[name]) >= chunk_size:
+            flush(name)
+
+    try:
+        for number, row in rows:
+            process(number, row)
+        for name in KINDS:
+            flush(name)
+    finally:
+        # Уже зафиксированные пачки остаются в базе и при ошибке импорта,
+        # поэтому суточные итоги пересчитываются в любом случае
+        if result['inserted']:
+            with engine.begin() as connection:
+                rebuild_rollups(connection, child_id)
+
+    result['seconds'] = time.perf_counter() - started
+    total = sum(result['inserted'].values())
+    result['rows_per_second'] = round(total / result['seconds']) if result['seconds'] else total
+    return result
+
+def default_child_id() -> Optional[int]:
+    """ID первого зарегистрированного ребенка"""
+    with engine.connect() as connection:
+        return connection.execute(select(Child.id).order_by(Child.id).limit(1)).scalar()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Импорт кормлений, веса, стула и лекарств из CSV/JSON")
+    parser.add_argument('path', help="файл .csv, .jsonl или .json")
+    parser.add_argument('--kind', choices=sorted(KINDS), help="вид записей, если в файле нет колонки kind")
+    parser.add_argument('--child-id', type=int, help="ID ребенка (по умолчанию первый зарегистрированный)")
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help="строк в одной транзакции")
+    args = parser.parse_args()
+
+    child_id = args.child_id or default_child_id()
+    if child_id is None:
+        print("Ребенок не зарегистрирован: сначала выполните /start в боте")
+        sys.exit(1)
+
+    stats = import_records(read_rows(args.path), child_id, args.kind, args.chunk_size)
+    inserted = ", ".join(f"{name}: {count}" for name, count in stats['inserted'].items()) or "0"
+    print(f"Прочитано строк: {stats['read']}, добавлено: {inserted}, дублей пропущено: {stats['duplicates']}, "
+          f"ошибок: {stats['error_count']}")
+    print(f"{stats['seconds']:.2f} с, {stats['rows_per_second']} строк/с")
+    for error in stats['errors']:
+        print(f"  {error}")
+    if stats['error_count'] > len(stats['errors']):
+        print(f"  ... и еще {stats['error_count'] - len(stats['errors'])}")
@@ -1,213 +1,390 @@
 """
 Миграции для базы данных
+
+Каждая миграция имеет номер и применяется один раз: номер последней примененной
+миграции хранится в таблице schema_version (одна строка). При запуске, если база
+уже в актуальном состоянии, выполняется только чтение этой строки.
+
+Миграции идемпотентны: перед изменением они проверяют текущую схему, поэтому
+базы, созданные до появления schema_version, доводятся до актуального состояния
+без ошибок. Каждая миграция вместе с записью нового номера выполняется в одной
+транзакции. Изменения схемы описываются через MigrationOps, который строит DDL
+средствами SQLAlchemy для диалекта текущей базы.
+
+Запуск вручную:
+    python -m database.migrations            # применить миграции
+    python -m database.migrations --dry-run  # показать план без изменений
 """
-import sqlite3
+import argparse
 import logging
 import sys
 import os
+from typing import Callable, List, NamedTuple, Optional
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config import DATABASE_URL
+from sqlalchemy import (
+    Column, DateTime, Integer, MetaData, String, Table, create_engine, event, inspect, text
+)
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import AddConstraint, CreateIndex, CreateTable, ForeignKeyConstraint
+
+from database.database import DATABASE_URL, apply_sqlite_pragmas
+from database.models import Base
+from database.rollups import rebuild_rollups
+from database.search import search_index_ddl
 
 logger = logging.getLogger(__name__)
 
-def run_migrations():
-    """Запуск миграций для базы данных"""
-    # Извлекаем путь к файлу базы данных из DATABASE_URL
-    db_path = DATABASE_URL.replace('sqlite:///', '')
-    
-    # Проверяем существование базы данных
-    if not os.path.exists(db_path):
-        logger.warning(f"База данных {db_path} не существует. Миграции не требуются.")
+# Таблица с номером схемы. Не входит в модели: ее ведут только миграции
+schema_version_table = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, nullable=False),
+    Column('applied_at', DateTime, nullable=False, server_default=text('CURRENT_TIMESTAMP'))
+)
+
+# Индексы для выборок по ребенку с сортировкой по времени и для проверки напоминаний
+INDEXES = (
+    ('ix_feedings_child_timestamp', 'feedings', ('child_id', 'timestamp')),
+    ('ix_stools_child_timestamp', 'stools', ('child_id', 'timestamp')),
+    ('ix_weights_child_timestamp', 'weights', ('child_id', 'timestamp')),
+    ('ix_medications_child_timestamp', 'medications', ('child_id', 'timestamp')),
+    ('ix_notes_child_timestamp', 'notes', ('child_id', 'timestamp')),
+    ('ix_chat_history_child_timestamp', 'chat_history', ('child_id', 'timestamp')),
+    ('ix_reminders_status_time', 'reminders', ('status', 'reminder_time')),
+)
+
+# Типичные запросы приложения и индекс, который они должны использовать
+INDEXED_QUERIES = (
+    ("SELECT * FROM feedings WHERE child_id = 1 ORDER BY timestamp DESC LIMIT 5",
+     'ix_feedings_child_timestamp'),
+    ("SELECT * FROM feedings WHERE child_id = 1 AND timestamp >= '2024-01-01' ORDER BY timestamp DESC",
+     'ix_feedings_child_timestamp'),
+    ("SELECT * FROM stools WHERE child_id = 1 AND timestamp >= '2024-01-01'",
+     'ix_stools_child_timestamp'),
+    ("SELECT * FROM weights WHERE child_id = 1 ORDER BY timestamp DESC LIMIT 3",
+     'ix_weights_child_timestamp'),
+    ("SELECT * FROM medications WHERE child_id = 1 ORDER BY timestamp DESC LIMIT 5",
+     'ix_medications_child_timestamp'),
+    ("SELECT * FROM notes WHERE child_id = 1 ORDER BY timestamp DESC LIMIT 3",
+     'ix_notes_child_timestamp'),
+    ("SELECT * FROM chat_history WHERE child_id = 1 ORDER BY timestamp DESC LIMIT 3",
+     'ix_chat_history_child_timestamp'),
+    ("SELECT count(id), max(id) FROM feedings WHERE child_id = 1",
+     'ix_feedings_child_timestamp'),
+    ("SELECT * FROM reminders WHERE status = 'active' AND reminder_time <= '2024-01-01 10:00' "
+     "AND reminder_time > '2024-01-01 09:59'",
+     'ix_reminders_status_time'),
+)
+
+class MigrationOps:
+    """
+    Операции над схемой для миграций
+
+    Проверки читают схему через инспектор SQLAlchemy, изменения компилируются
+    в DDL для диалекта соединения. В режиме dry_run изменения не выполняются,
+    а только записываются в план; созданные "на бумаге" таблицы учитываются
+    последующими проверками.
+    """
+
+    def __init__(self, connection, dry_run: bool = False):
+        self.connection = connection
+        self.dialect = connection.dialect
+        self.dry_run = dry_run
+        self.statements: List[str] = []
+        self._planned_tables = {}
+
+    @property
+    def _inspector(self):
+        # Инспектор кэширует схему, поэтому после изменений нужен новый
+        return inspect(self.connection)
+
+    def execute(self, statement):
+        """Выполняет DDL (или записывает его в план в режиме dry_run)"""
+        sql = statement if isinstance(statement, str) else str(statement.compile(dialect=self.dialect))
+        self.statements.append(sql.strip())
+        if not self.dry_run:
+            self.connection.exec_driver_sql(sql)
+
+    def has_table(self, table_name: str) -> bool:
+        return table_name in self._planned_tables or self._inspector.has_table(table_name)
+
+    def columns(self, table_name: str) -> set:
+        if table_name in self._planned_tables:
+            return {column.name for column in self._planned_tables[table_name].columns}
+        return {column['name'] for column in self._inspector.get_columns(table_name)}
+
+    def indexes(self, table_name: str) -> set:
+        if table_name in self._planned_tables:
+            return {index.name for index in self._planned_tables[table_name].indexes}
+        return {index['name'] for index in self._inspector.get_indexes(table_name)}
+
+    def foreign_keys(self, table_name: str) -> list:
+        if table_name in self._planned_tables:
+            return list(self._planned_tables[table_name].foreign_key_constraints)
+        return self._inspector.get_foreign_keys(table_name)
+
+    def create_table(self, table: Table):
+        """Создает таблицу по описанию модели вместе с ее индексами, если таблицы нет"""
+        if self.has_table(table.name):
+            return
+        logger.info(f"Миграция: создание таблицы {table.name}")
+        self.execute(CreateTable(table))
+        for index in table.indexes:
+            self.execute(CreateIndex(index))
+        if self.dry_run:
+            self._planned_tables[table.name] = table
+
+    def add_column(self, table_name: str, column: Column) -> bool:
+        """Добавляет колонку, если ее нет. Возвращает True, если колонка добавлена"""
+        if not self.has_table(table_name) or column.name in self.columns(table_name):
+            return False
+        logger.info(f"Миграция: добавление колонки {column.name} в таблицу {table_name}")
+        column_type = column.type.compile(dialect=self.dialect)
+        sql = f"ALTER TABLE {table_name} ADD COLUMN {column.name} {column_type}"
+        if column.server_default is not None:
+            sql += f" DEFAULT {column.server_default.arg}"
+        self.execute(sql)
+        return True
+
+    def run(self, description: str, func: Callable):
+        """Выполняет шаг миграции, который не выражается DDL (перенос и пересчет данных)"""
+        self.statements.append(f"-- {description}")
+        if not self.dry_run:
+            func(self.connection)
+
+    def create_index(self, index_name: str, table_name: str, columns: tuple):
+        """Создает индекс, если его нет"""
+        if not self.has_table(table_name) or index_name in self.indexes(table_name):
+            return
+        logger.info(f"Миграция: создание индекса {index_name}")
+        self.execute(f"CREATE INDEX {index_name} ON {table_name} ({', '.join(columns)})")
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[MigrationOps], None]
+
+def _create_base_tables(ops: MigrationOps):
+    """Таблицы моделей. Новая база создается сразу в актуальном виде"""
+    for table in Base.metadata.sorted_tables:
+        ops.create_table(table)
+
+def _add_missing_columns(ops: MigrationOps):
+    """Колонки, добавленные в модели после первых версий бота"""
+    ops.add_column('reminders', Column('repeat_type', String, server_default=text("'once'")))
+    ops.add_column('reminders', Column('repeat_interval', Integer, server_default=text('1')))
+    # SQLite не добавляет колонку со значением по умолчанию CURRENT_TIMESTAMP,
+    # поэтому время существующих напоминаний заполняем отдельно
+    for column_name in ('created_at', 'updated_at'):
+        if ops.add_column('reminders', Column(column_name, DateTime)):
+            ops.execute(f"UPDATE reminders SET {column_name} = CURRENT_TIMESTAMP WHERE {column_name} IS NULL")
+    ops.add_column('stools', Column('color', String))
+    ops.add_column('prescriptions', Column('full_text', String))
+
+def _add_appointments_foreign_key(ops: MigrationOps):
+    """
+    Внешний ключ appointments.child_id -> children.id
+
+    Ранние версии создавали appointments без внешнего ключа. В SQLite его нельзя
+    добавить через ALTER TABLE, поэтому таблица пересоздается с переносом данных.
+    """
+    if not ops.has_table('appointments') or ops.foreign_keys('appointments'):
         return
-    
-    conn = None
+    logger.info("Миграция: добавление внешнего ключа в таблицу appointments")
+    if ops.dialect.name != 'sqlite':
+        ops.execute(AddConstraint(ForeignKeyConstraint(
+            ['child_id'], ['children.id'], table=Base.metadata.tables['appointments']
+        )))
+        return
+    ops.execute("ALTER TABLE appointments RENAME TO appointments_old")
+    ops.execute(CreateTable(Base.metadata.tables['appointments']))
+    # Колонки перечисляем явно: в старой таблице порядок колонок мог отличаться
+    ops.execute(
+        "INSERT INTO appointments (id, child_id, description, timestamp) "
+        "SELECT id, child_id, description, timestamp FROM appointments_old"
+    )
+    ops.execute("DROP TABLE appointments_old")
+
+def _create_indexes(ops: MigrationOps):
+    """Составные индексы (child_id, timestamp) и индекс напоминаний (status, reminder_time)"""
+    for index_name, table, columns in INDEXES:
+        ops.create_index(index_name, table, columns)
+
+def _create_daily_rollups(ops: MigrationOps):
+    """Таблицы суточных итогов и их заполнение по уже накопленным записям"""
+    for table_name in ('feeding_daily', 'stool_daily', 'weight_daily', 'medication_daily'):
+        ops.create_table(Base.metadata.tables[table_name])
+    ops.run("пересчет суточных итогов по записям", rebuild_rollups)
+
+def _create_chat_history_archive(ops: MigrationOps):
+    """Таблица сжатых блоков старых диалогов с AI"""
+    ops.create_table(Base.metadata.tables['chat_history_archive'])
+
+def _create_search_index(ops: MigrationOps):
+    """Полнотекстовый индекс FTS5 по заметкам, диалогам и назначениям (только SQLite)"""
+    if ops.dialect.name != 'sqlite':
+        logger.warning("Полнотекстовый поиск поддерживается только для SQLite, индекс не создан")
+        return
+    for statement in search_index_ddl():
+        ops.execute(statement)
+
+# Список миграций. Номера только растут; примененные миграции не меняются
+MIGRATIONS = (
+    Migration(1, "таблицы моделей", _create_base_tables),
+    Migration(2, "недостающие колонки reminders, stools, prescriptions", _add_missing_columns),
+    Migration(3, "внешний ключ appointments.child_id", _add_appointments_foreign_key),
+    Migration(4, "составные индексы по ребенку и времени", _create_indexes),
+    Migration(5, "суточные итоги кормлений, стула, веса и лекарств", _create_daily_rollups),
+    Migration(6, "архив истории диалогов", _create_chat_history_archive),
+    Migration(7, "полнотекстовый поиск по заметкам, диалогам и назначениям", _create_search_index),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+def create_migration_engine(url: str = DATABASE_URL):
+    """
+    Движок для применения миграций
+
+    Драйвер sqlite3 не начинает транзакцию перед DDL, поэтому для SQLite
+    транзакцию открываем сами: тогда миграция и запись ее номера фиксируются
+    или откатываются вместе.
+    """
+    engine = create_engine(url)
+    if engine.dialect.name == 'sqlite':
+        @event.listens_for(engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            apply_sqlite_pragmas(dbapi_connection)
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine, "begin")
+        def _on_begin(connection):
+            connection.exec_driver_sql("BEGIN")
+    return engine
+
+def get_schema_version(connection) -> int:
+    """
+    Номер последней примененной миграции (0 - база без учета версий или пустая)
+
+    Args:
+        connection: Соединение SQLAlchemy
+    """
+    try:
+        version = connection.execute(schema_version_table.select().with_only_columns(
+            schema_version_table.c.version
+        )).scalar()
+    except DBAPIError:
+        # Таблицы schema_version еще нет
+        connection.rollback()
+        return 0
+    return version or 0
+
+def _set_schema_version(connection, version: int):
+    schema_version_table.create(connection, checkfirst=True)
+    connection.execute(schema_version_table.delete())
+    connection.execute(schema_version_table.insert().values(version=version))
+
+def check_query_plans(connection) -> list:
+    """
+    Проверяет с помощью EXPLAIN QUERY PLAN, что типичные запросы используют индексы
+
+    Args:
+        connection: Соединение SQLAlchemy с базой SQLite
+
+    Returns:
+        Список запросов, план которых не использует ожидаемый индекс, с их планом
+    """
+    problems = []
+    for query, index_name in INDEXED_QUERIES:
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {query}").fetchall()
+        plan = " | ".join(row[-1] for row in rows)
+        if index_name not in plan or 'TEMP B-TREE' in plan:
+            problems.append((query, plan))
+    return problems
+
+def plan_migrations(engine=None) -> List[dict]:
+    """
+    План миграций без изменения базы
+
+    Args:
+        engine: Движок SQLAlchemy (по умолчанию - движок для DATABASE_URL)
+
+    Returns:
+        Список непримененных миграций: номер, описание и SQL, который будет выполнен
+    """
+    return run_migrations(engine, dry_run=True)
+
+def run_migrations(engine=None, dry_run: bool = False) -> Optional[List[dict]]:
+    """
+    Применяет миграции, которые еще не применены к базе
+
+    Args:
+        engine: Движок SQLAlchemy (по умолчанию - движок для DATABASE_URL)
+        dry_run: Только составить план, ничего не меняя
+
+    Returns:
+        Список примененных (или запланированных) миграций: номер, описание и SQL
+    """
+    own_engine = engine is None
+    engine = engine or create_migration_engine()
+    applied = []
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        migrations_applied = False
-        
-        # Проверяем наличие колонок в таблице reminders
-        cursor.execute("PRAGMA table_info(reminders)")
-        reminder_columns = [column[1] for column in cursor.fetchall()]
-        
-        # Миграция 1: Добавление колонки repeat_type
-        if 'repeat_type' not in reminder_columns:
-            logger.info("Применение миграции: добавление колонки repeat_type в таблицу reminders")
-            cursor.execute("ALTER TABLE reminders ADD COLUMN repeat_type TEXT DEFAULT 'once'")
-            migrations_applied = True
-        
-        # Миграция 2: Добавление колонки repeat_interval
-        if 'repeat_interval' not in reminder_columns:
-            logger.info("Применение миграции: добавление колонки repeat_interval в таблицу reminders")
-            cursor.execute("ALTER TABLE reminders ADD COLUMN repeat_interval INTEGER DEFAULT 1")
-            migrations_applied = True
-        
-        # Миграция 3: Добавление колонки created_at
-        if 'created_at' not in reminder_columns:
-            logger.info("Применение миграции: добавление колонки created_at в таблицу reminders")
-            cursor.execute("ALTER TABLE reminders ADD COLUMN created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
-            migrations_applied = True
-        
-        # Миграция 4: Добавление колонки updated_at
-        if 'updated_at' not in reminder_columns:
-            logger.info("Применение миграции: добавление колонки updated_at в таблицу reminders")
-            cursor.execute("ALTER TABLE reminders ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
-            migrations_applied = True
-        
-        # Проверяем наличие колонки color в таблице stools
-        cursor.execute("PRAGMA table_info(stools)")
-        stool_columns = [column[1] for column in cursor.fetchall()]
-        
-        # Миграция 5: Добавление колонки color в таблицу stools
-        if 'color' not in stool_columns:
-            logger.info("Применение миграции: добавление колонки color в таблицу stools")
-            cursor.execute("ALTER TABLE stools ADD COLUMN color TEXT")
-            migrations_applied = True
-        
-        # Проверяем наличие таблицы prescriptions
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='prescriptions'")
-        table_exists = cursor.fetchone()
-        
-        # Миграция 6: Создание таблицы prescriptions, если её нет
-        if not table_exists:
-            logger.info("Применение миграции: создание таблицы prescriptions")
-            cursor.execute("""
-                CREATE TABLE prescriptions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    child_id INTEGER NOT NULL,
-                    doctor_name TEXT,
-                    medication_name TEXT NOT NULL,
-                    dosage TEXT NOT NULL,
-                    frequency TEXT NOT NULL,
-                    start_date DATE NOT NULL,
-                    end_date DATE,
-                    notes TEXT,
-                    full_text TEXT,
-                    is_active INTEGER DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (child_id) REFERENCES children (id)
-                )
-            """)
-            migrations_applied = True
-        else:
-            # Проверяем наличие колонки full_text в таблице prescriptions
-            cursor.execute("PRAGMA table_info(prescriptions)")
-            prescription_columns = [column[1] for column in cursor.fetchall()]
-            
-            # Миграция 7: Добавление колонки full_text в таблицу prescriptions
-            if 'full_text' not in prescription_columns:
-                logger.info("Применение миграции: добавление колонки full_text в таблицу prescriptions")
-                cursor.execute("ALTER TABLE prescriptions ADD COLUMN full_text TEXT")
-                migrations_applied = True
-        
-        # Проверяем, есть ли foreign key для appointments
-        cursor.execute("PRAGMA foreign_key_list(appointments)")
-        has_fk = cursor.fetchone()
-        
-        # Миграция 8: Обновление таблицы appointments, если нет foreign key
-        if not has_fk:
-            logger.info("Применение миграции: обновление таблицы appointments")
-            # В SQLite нет прямого ALTER TABLE для добавления FOREIGN KEY
-            # Поэтому создаем новую таблицу и переносим данные
-            cursor.execute("""
-                CREATE TABLE appointments_new (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    child_id INTEGER NOT NULL,
-                    description TEXT NOT NULL,
-                    timestamp TIMESTAMP NOT NULL,
-                    FOREIGN KEY (child_id) REFERENCES children (id)
-                )
-            """)
-            
-            # Копируем данные
-            cursor.execute("INSERT INTO appointments_new SELECT * FROM appointments")
-            
-            # Удаляем старую таблицу и переименовываем новую
-            cursor.execute("DROP TABLE appointments")
-            cursor.execute("ALTER TABLE appointments_new RENAME TO appointments")
-            
-            migrations_applied = True
-        
-        # Проверяем наличие таблицы notes
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='notes'")
-        notes_table_exists = cursor.fetchone()
-        
-        # Миграция 9: Создание таблицы notes, если её нет
-        if not notes_table_exists:
-            logger.info("Применение миграции: создание таблицы notes")
-            cursor.execute("""
-                CREATE TABLE notes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    child_id INTEGER NOT NULL,
-                    title TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (child_id) REFERENCES children (id)
-                )
-            """)
-            migrations_applied = True
-        
-        # Проверяем наличие таблицы chat_history
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='chat_history'")
-        chat_history_table_exists = cursor.fetchone()
-        
-        # Миграция 10: Создание таблицы chat_history, если её нет
-        if not chat_history_table_exists:
-            logger.info("Применение миграции: создание таблицы chat_history")
-            cursor.execute("""
-                CREATE TABLE chat_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    child_id INTEGER NOT NULL,
-                    user_message TEXT NOT NULL,
-                    assistant_response TEXT NOT NULL,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (child_id) REFERENCES children (id)
-                )
-            """)
-            migrations_applied = True
-        
-        # Проверяем наличие таблицы users
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='users'")
-        users_table_exists = cursor.fetchone()
-        
-        # Миграция 11: Создание таблицы users, если её нет
-        if not users_table_exists:
-            logger.info("Применение миграции: создание таблицы users")
-            cursor.execute("""
-                CREATE TABLE users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    telegram_id INTEGER UNIQUE NOT NULL,
-                    username TEXT,
-                    first_name TEXT,
-                    last_name TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    is_active INTEGER DEFAULT 1
-                )
-            """)
-            migrations_applied = True
-        
-        # Сохраняем изменения
-        conn.commit()
-        
-        if migrations_applied:
-            logger.info("Миграции успешно применены")
-        else:
-            logger.info("Миграции не требуются")
-            
-    except sqlite3.Error as e:
-        logger.error(f"Ошибка при применении миграций: {e}")
-        if conn:
-            conn.rollback()
+        with engine.connect() as connection:
+            current = get_schema_version(connection)
+            connection.rollback()
+            if current >= LATEST_VERSION:
+                if current > LATEST_VERSION:
+                    logger.warning(f"Версия схемы базы {current} новее известной коду ({LATEST_VERSION})")
+                logger.info(f"Схема базы актуальна (версия {current})")
+                return applied
+
+            ops = MigrationOps(connection, dry_run=dry_run)
+            for migration in MIGRATIONS:
+                if migration.version <= current:
+                    continue
+                ops.statements = []
+                try:
+                    with connection.begin():
+                        migration.apply(ops)
+                        if not dry_run:
+                            _set_schema_version(connection, migration.version)
+                except Exception as e:
+                    logger.error(f"Ошибка при применении миграции {migration.version} ({migration.description}): {e}")
+                    raise
+                applied.append({
+                    'version': migration.version,
+                    'description': migration.description,
+                    'statements': ops.statements
+                })
+                if not dry_run:
+                    logger.info(f"Применена миграция {migration.version}: {migration.description}")
+
+            if dry_run:
+                return applied
+
+            logger.info(f"Схема базы обновлена с версии {current} до {LATEST_VERSION}")
+            if connection.dialect.name == 'sqlite':
+                for query, plan in check_query_plans(connection):
+                    logger.warning(f"Запрос не использует индекс: {query}\nПлан: {plan}")
+                connection.rollback()
     finally:
-        if conn:
-            conn.close()
+        if own_engine:
+            engine.dispose()
+    return applied
 
 if __name__ == "__main__":
     # Настройка логирования
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    
+
+    parser = argparse.ArgumentParser(description="Миграции базы данных")
+    parser.add_argument('--dry-run', action='store_true', help="показать план, ничего не меняя")
+    args = parser.parse_args()
+
     # Запуск миграций
-    run_migrations() 
\ No newline at end of file
+    result = run_migrations(dry_run=args.dry_run)
+    if args.dry_run:
+        if not result:
+            print("Миграции не требуются")
+        for migration in result:
+            print(f"-- {migration['version']}: {migration['description']}")
+            for statement in migration['statements']:
+                print(f"{statement};")
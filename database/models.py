@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Date, DateTime, Float, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, ForeignKey, Text, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import column_property, relationship
 from datetime import datetime
 
 Base = declarative_base()
@@ -21,45 +21,62 @@ class Medication(Base):
     __tablename__ = 'medications'
 
     id = Column(Integer, primary_key=True, index=True)
-    child_id = Column(Integer, ForeignKey('children.id'))
+    # active_history: старые ребенок и время нужны для пересчета суточных итогов (database/rollups.py)
+    # и после коммита, когда атрибуты уже сброшены
+    child_id = column_property(Column(Integer, ForeignKey('children.id')), active_history=True)
     medication_name = Column(String)
     dosage = Column(String)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = column_property(Column(DateTime, default=datetime.utcnow), active_history=True)
 
     child = relationship("Child", back_populates="medications")
 
+    # Записи выбираются по ребенку и сортируются по времени
+    __table_args__ = (Index('ix_medications_child_timestamp', 'child_id', 'timestamp'),)
+
 class Feeding(Base):
     __tablename__ = 'feedings'
 
     id = Column(Integer, primary_key=True, index=True)
-    child_id = Column(Integer, ForeignKey('children.id'))
+    # active_history: старые ребенок и время нужны для пересчета суточных итогов (database/rollups.py)
+    # и после коммита, когда атрибуты уже сброшены
+    child_id = column_property(Column(Integer, ForeignKey('children.id')), active_history=True)
     amount = Column(Float)
     food_type = Column(String)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = column_property(Column(DateTime, default=datetime.utcnow), active_history=True)
 
     child = relationship("Child", back_populates="feedings")
 
+    __table_args__ = (Index('ix_feedings_child_timestamp', 'child_id', 'timestamp'),)
+
 class Stool(Base):
     __tablename__ = 'stools'
 
     id = Column(Integer, primary_key=True, index=True)
-    child_id = Column(Integer, ForeignKey('children.id'))
+    # active_history: старые ребенок и время нужны для пересчета суточных итогов (database/rollups.py)
+    # и после коммита, когда атрибуты уже сброшены
+    child_id = column_property(Column(Integer, ForeignKey('children.id')), active_history=True)
     description = Column(String)
     color = Column(String, nullable=True)  # Поле color с возможностью NULL
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = column_property(Column(DateTime, default=datetime.utcnow), active_history=True)
 
     child = relationship("Child", back_populates="stools")
 
+    __table_args__ = (Index('ix_stools_child_timestamp', 'child_id', 'timestamp'),)
+
 class Weight(Base):
     __tablename__ = 'weights'
 
     id = Column(Integer, primary_key=True, index=True)
-    child_id = Column(Integer, ForeignKey('children.id'))
+    # active_history: старые ребенок и время нужны для пересчета суточных итогов (database/rollups.py)
+    # и после коммита, когда атрибуты уже сброшены
+    child_id = column_property(Column(Integer, ForeignKey('children.id')), active_history=True)
     weight = Column(Float)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = column_property(Column(DateTime, default=datetime.utcnow), active_history=True)
 
     child = relationship("Child", back_populates="weights")
 
+    __table_args__ = (Index('ix_weights_child_timestamp', 'child_id', 'timestamp'),)
+
 class Note(Base):
     __tablename__ = 'notes'
     
@@ -71,6 +88,8 @@ class Note(Base):
     
     child = relationship("Child", back_populates="notes")
 
+    __table_args__ = (Index('ix_notes_child_timestamp', 'child_id', 'timestamp'),)
+
 class ChatHistory(Base):
     __tablename__ = 'chat_history'
     
@@ -82,6 +101,8 @@ class ChatHistory(Base):
     
     child = relationship("Child", back_populates="chat_history")
 
+    __table_args__ = (Index('ix_chat_history_child_timestamp', 'child_id', 'timestamp'),)
+
 class Child(Base):
     __tablename__ = 'children'
 
@@ -142,4 +163,65 @@ class Reminder(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    child = relationship("Child", back_populates="reminders")
\ No newline at end of file
+    child = relationship("Child", back_populates="reminders")
+
+    # Планировщик каждую минуту ищет активные напоминания, время которых наступило
+    __table_args__ = (Index('ix_reminders_status_time', 'status', 'reminder_time'),)
+
+# Суточные итоги по ребенку. Ведутся автоматически при изменении записей (database/rollups.py),
+# чтобы статистика читала по строке на день (и тип), а не все записи за период
+
+class FeedingDaily(Base):
+    __tablename__ = 'feeding_daily'
+
+    child_id = Column(Integer, ForeignKey('children.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    food_type = Column(String, primary_key=True)  # '' - тип не указан
+    count = Column(Integer, nullable=False, default=0)
+    amount = Column(Float, nullable=False, default=0)  # мл
+
+class StoolDaily(Base):
+    __tablename__ = 'stool_daily'
+
+    child_id = Column(Integer, ForeignKey('children.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    color = Column(String, primary_key=True)  # '' - цвет не указан
+    consistency = Column(String, primary_key=True)  # жидкий, твердый, кашеобразный, нормальный
+    count = Column(Integer, nullable=False, default=0)
+
+class WeightDaily(Base):
+    __tablename__ = 'weight_daily'
+
+    child_id = Column(Integer, ForeignKey('children.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    min_weight = Column(Float)
+    max_weight = Column(Float)
+    first_weight = Column(Float)
+    first_time = Column(DateTime)
+    last_weight = Column(Float)
+    last_time = Column(DateTime)
+
+class MedicationDaily(Base):
+    __tablename__ = 'medication_daily'
+
+    child_id = Column(Integer, ForeignKey('children.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    medication_name = Column(String, primary_key=True)  # '' - название не указано
+    count = Column(Integer, nullable=False, default=0)
+
+# Старые диалоги с AI: один сжатый блок на ребенка и месяц (database/chat_archive.py)
+class ChatHistoryArchive(Base):
+    __tablename__ = 'chat_history_archive'
+
+    id = Column(Integer, primary_key=True)
+    child_id = Column(Integer, ForeignKey('children.id'), nullable=False)
+    month = Column(String, nullable=False)  # ГГГГ-ММ
+    codec = Column(String, nullable=False)  # zstd или zlib
+    turns = Column(Integer, nullable=False)
+    first_timestamp = Column(DateTime, nullable=False)
+    last_timestamp = Column(DateTime, nullable=False)
+    raw_size = Column(Integer, nullable=False)  # байт до сжатия
+    data = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (Index('ix_chat_history_archive_child_month', 'child_id', 'month', unique=True),)
@@ -0,0 +1,160 @@
+"""
+Последние записи ребенка по всем таблицам одним запросом
+
+Контекст консультации, сводка о развитии и экраны меню читают последние записи
+из нескольких таблиц. fetch_recent() выбирает их одним запросом: выборки из
+таблиц объединяются через UNION ALL в общий набор колонок, ROW_NUMBER() OVER
+(PARTITION BY kind ...) нумерует записи каждого вида от новых к старым, и
+внешний запрос оставляет по N первых записей каждого вида. Строки возвращаются
+легкими именованными кортежами с теми же полями, что и у моделей.
+"""
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from sqlalchemy import (
+    Date, DateTime, Float, Integer, Text, bindparam, case, func, literal, null, or_, select, type_coerce, union_all
+)
+
+from .models import Weight, Feeding, Stool, Medication, Prescription, Note, ChatHistory, Reminder
+
+# Общие колонки объединенного запроса: тип колонки -> имена колонок
+SLOTS = (
+    (DateTime, ('dt1', 'dt2')),
+    (Date, ('d1', 'd2')),
+    (Float, ('num1',)),
+    (Text, ('txt1', 'txt2', 'txt3', 'txt4', 'txt5', 'txt6')),
+)
+
+def _slot_type(column) -> type:
+    if isinstance(column.type, DateTime):
+        return DateTime
+    if isinstance(column.type, Date):
+        return Date
+    if isinstance(column.type, (Float, Integer)):
+        return Float
+    return Text
+
+class _Kind:
+    """Вид записей: таблица, порядок, условие отбора и поля кортежа"""
+
+    def __init__(self, name: str, model, order_by, fields: tuple, where=None):
+        self.name = name
+        self.model = model
+        self.order_by = order_by
+        self.where = where
+        self.columns = [getattr(model, field) for field in fields]
+        self.row = namedtuple(f"{model.__name__}Row", ('id',) + fields)
+        # Раскладываем поля по общим колонкам подходящего типа
+        free = {slot_type: list(names) for slot_type, names in SLOTS}
+        self.slots = {}
+        for field, column in zip(fields, self.columns):
+            self.slots[free[_slot_type(column)].pop(0)] = column
+
+    def select(self, limit: Optional[int], since):
+        columns = [
+            literal(self.name).label('kind'),
+            type_coerce(self.model.id, Integer).label('id'),
+            type_coerce(self.order_by, DateTime).label('sort_key')
+        ]
+        for slot_type, names in SLOTS:
+            for name in names:
+                column = self.slots.get(name)
+                value = column if column is not None else null()
+                columns.append(type_coerce(value, slot_type).label(name))
+        conditions = [self.model.child_id == bindparam('child_id')]
+        if self.where is not None:
+            conditions.append(self.where)
+        if limit is not None:
+            # Заранее отбираем ID N последних записей по индексу (child_id, timestamp):
+            # строки затем читаются по первичному ключу, и окно нумерует только их,
+            # а не всю историю ребенка
+            ids = select(self.model.id).where(*conditions).order_by(
+                self.order_by.desc(), self.model.id.desc()
+            ).limit(limit)
+            if since is not None:
+                ids = union_all(
+                    select(ids.subquery().c.id),
+                    select(self.model.id).where(*conditions, self.order_by >= since)
+                )
+            conditions = [self.model.id.in_(ids)]
+        return select(*columns).where(*conditions)
+
+    def build(self, row) -> tuple:
+        return self.row(row.id, *(getattr(row, name) for name in self.slots))
+
+# Виды записей. Активные назначения и напоминания отбираются по статусу
+KINDS = {kind.name: kind for kind in (
+    _Kind('weight', Weight, Weight.timestamp, ('weight', 'timestamp')),
+    _Kind('feeding', Feeding, Feeding.timestamp, ('amount', 'food_type', 'timestamp')),
+    _Kind('stool', Stool, Stool.timestamp, ('description', 'color', 'timestamp')),
+    _Kind('medication', Medication, Medication.timestamp, ('medication_name', 'dosage', 'timestamp')),
+    _Kind('prescription', Prescription, Prescription.start_date,
+          ('medication_name', 'dosage', 'frequency', 'full_text', 'doctor_name', 'notes', 'start_date', 'end_date'),
+          where=Prescription.is_active == 1),
+    _Kind('note', Note, Note.timestamp, ('title', 'content', 'timestamp')),
+    _Kind('chat', ChatHistory, ChatHistory.timestamp, ('user_message', 'assistant_response', 'timestamp')),
+    _Kind('reminder', Reminder, Reminder.reminder_time, ('description', 'reminder_time', 'repeat_type'),
+          where=Reminder.status == 'active'),
+)}
+
+def fetch_recent(db_session, child_id: int, limits: Dict[str, Optional[int]],
+                 since: Optional[Dict[str, datetime]] = None) -> Dict[str, List[tuple]]:
+    """
+    Последние записи ребенка нескольких видов одним запросом
+
+    Args:
+        db_session: Сессия базы данных
+        child_id: ID ребенка
+        limits: Вид записей (ключ KINDS) -> сколько последних записей вернуть (None - все)
+        since: Вид записей -> время, начиная с которого записи возвращаются
+            все, даже сверх limits
+
+    Returns:
+        Вид записей -> список кортежей от новых к старым (для каждого запрошенного вида)
+    """
+    since = since or {}
+    shape = tuple((name, limit, name in since) for name, limit in limits.items())
+    params = {'child_id': child_id}
+    params.update((f'since_{name}', value) for name, value in since.items())
+
+    result = {name: [] for name in limits}
+    for row in db_session.execute(_statement(shape), params):
+        result[row.kind].append(KINDS[row.kind].build(row))
+    return result
+
+@lru_cache(maxsize=32)
+def _statement(shape: tuple):
+    """
+    Запрос для набора видов записей
+
+    Запрос строится один раз для каждого набора (вид, лимит, есть ли since):
+    построение и вычисление ключа кэша SQLAlchemy для такого запроса заметно
+    дольше его выполнения. ID ребенка и время since передаются параметрами.
+    """
+    since = {name: bindparam(f'since_{name}', type_=DateTime) for name, _, has_since in shape if has_since}
+    union = union_all(*(
+        KINDS[name].select(limit, since.get(name)) for name, limit, _ in shape
+    )).subquery('events')
+
+    numbered = select(
+        union,
+        func.row_number().over(
+            partition_by=union.c.kind,
+            order_by=(union.c.sort_key.desc(), union.c.id.desc())
+        ).label('rn')
+    ).subquery('numbered')
+
+    conditions = []
+    for name, limit, _ in shape:
+        kept = numbered.c.kind == name
+        if limit is not None:
+            kept = kept & (numbered.c.rn <= limit)
+        if name in since:
+            kept = or_(kept, (numbered.c.kind == name) & (numbered.c.sort_key >= since[name]))
+        conditions.append(kept)
+
+    # Порядок видов - как в запросе, внутри вида - от новых к старым
+    kind_order = case({name: position for position, (name, _, _) in enumerate(shape)}, value=numbered.c.kind)
+    return select(numbered).where(or_(*conditions)).order_by(kind_order, numbered.c.rn)
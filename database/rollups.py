@@ -0,0 +1,308 @@
+"""
+Суточные итоги по кормлениям, стулу, весу и лекарствам
+
+Итоги хранятся в таблицах feeding_daily, stool_daily, weight_daily и medication_daily
+и обновляются в той же транзакции, что и записи: после flush сессии итоги затронутых
+дней пересчитываются по записям этих дней. Массовые UPDATE/DELETE через сессию
+пересчитывают итоги таблицы целиком. rebuild_rollups() строит все итоги заново.
+
+Чтение (feeding_totals, stool_distribution и т.д.) - агрегирующие запросы по итогам:
+они возвращают только нужные числа, и статистика за период не зависит от
+количества записей.
+"""
+import logging
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import delete, distinct, event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from .models import (
+    Feeding, Stool, Weight, Medication,
+    FeedingDaily, StoolDaily, WeightDaily, MedicationDaily
+)
+
+logger = logging.getLogger(__name__)
+
+def stool_consistency(description: str) -> str:
+    """Консистенция стула по описанию"""
+    desc_lower = (description or '').lower()
+    if 'жидк' in desc_lower:
+        return 'жидкий'
+    if 'тверд' in desc_lower:
+        return 'твердый'
+    if 'кашеобразн' in desc_lower:
+        return 'кашеобразный'
+    return 'нормальный'
+
+def _feeding_rows(records: Iterable) -> list:
+    totals = {}
+    for child_id, timestamp, amount, food_type in records:
+        key = (child_id, timestamp.date(), food_type or '')
+        row = totals.setdefault(key, {'count': 0, 'amount': 0.0})
+        row['count'] += 1
+        row['amount'] += amount or 0
+    return [
+        {'child_id': child_id, 'day': day, 'food_type': food_type, **row}
+        for (child_id, day, food_type), row in totals.items()
+    ]
+
+def _stool_rows(records: Iterable) -> list:
+    totals = {}
+    for child_id, timestamp, description, color in records:
+        key = (child_id, timestamp.date(), color or '', stool_consistency(description))
+        totals[key] = totals.get(key, 0) + 1
+    return [
+        {'child_id': child_id, 'day': day, 'color': color, 'consistency': consistency, 'count': count}
+        for (child_id, day, color, consistency), count in totals.items()
+    ]
+
+def _weight_rows(records: Iterable) -> list:
+    totals = {}
+    # Записи приходят отсортированными по времени
+    for child_id, timestamp, weight in records:
+        key = (child_id, timestamp.date())
+        row = totals.get(key)
+        if row is None:
+            totals[key] = {
+                'count': 1, 'min_weight': weight, 'max_weight': weight,
+                'first_weight': weight, 'first_time': timestamp,
+                'last_weight': weight, 'last_time': timestamp
+            }
+            continue
+        row['count'] += 1
+        if weight is not None:
+            row['min_weight'] = weight if row['min_weight'] is None else min(row['min_weight'], weight)
+            row['max_weight'] = weight if row['max_weight'] is None else max(row['max_weight'], weight)
+        row['last_weight'], row['last_time'] = weight, timestamp
+    return [{'child_id': child_id, 'day': day, **row} for (child_id, day), row in totals.items()]
+
+def _medication_rows(records: Iterable) -> list:
+    totals = {}
+    for child_id, timestamp, medication_name in records:
+        key = (child_id, timestamp.date(), medication_name or '')
+        totals[key] = totals.get(key, 0) + 1
+    return [
+        {'child_id': child_id, 'day': day, 'medication_name': name, 'count': count}
+        for (child_id, day, name), count in totals.items()
+    ]
+
+# Таблица записей -> (таблица итогов, колонки записей, функция подсчета)
+ROLLUPS = {
+    Feeding: (FeedingDaily, (Feeding.amount, Feeding.food_type), _feeding_rows),
+    Stool: (StoolDaily, (Stool.description, Stool.color), _stool_rows),
+    Weight: (WeightDaily, (Weight.weight,), _weight_rows),
+    Medication: (MedicationDaily, (Medication.medication_name,), _medication_rows),
+}
+
+def _recompute(connection, model, child_id: Optional[int] = None, day: Optional[date] = None):
+    """
+    Пересчитывает итоги по записям: одного дня ребенка, всех дней ребенка или всей таблицы
+
+    Args:
+        connection: Соединение SQLAlchemy (в транзакции, где изменялись записи)
+        model: Модель записей (Feeding, Stool, Weight, Medication)
+        child_id: ID ребенка (None - все дети)
+        day: День (None - все дни)
+    """
+    rollup, columns, build_rows = ROLLUPS[model]
+    query = select(model.child_id, model.timestamp, *columns).where(model.timestamp.isnot(None))
+    clear = delete(rollup)
+    if child_id is not None:
+        query = query.where(model.child_id == child_id)
+        clear = clear.where(rollup.child_id == child_id)
+    if day is not None:
+        start = datetime.combine(day, datetime.min.time())
+        query = query.where(model.timestamp >= start, model.timestamp < start + timedelta(days=1))
+        clear = clear.where(rollup.day == day)
+
+    rows = build_rows(connection.execute(query.order_by(model.timestamp)))
+    connection.execute(clear)
+    if rows:
+        connection.execute(insert(rollup), rows)
+
+def rebuild_rollups(connection, child_id: Optional[int] = None):
+    """
+    Строит все суточные итоги заново по записям
+
+    Args:
+        connection: Соединение SQLAlchemy (или session.connection())
+        child_id: Пересчитать только одного ребенка
+    """
+    for model in ROLLUPS:
+        _recompute(connection, model, child_id)
+
+def _touched_days(obj, history: bool = False) -> set:
+    """(ребенок, день) записи; с history=True - также значения до изменения"""
+    days = set()
+    if obj.child_id is not None and obj.timestamp is not None:
+        days.add((obj.child_id, obj.timestamp.date()))
+    if history:
+        state = inspect(obj)
+        old_child = state.attrs.child_id.history.deleted or [obj.child_id]
+        old_timestamp = state.attrs.timestamp.history.deleted or [obj.timestamp]
+        if old_child[0] is not None and old_timestamp[0] is not None:
+            days.add((old_child[0], old_timestamp[0].date()))
+    return days
+
+@event.listens_for(Session, "before_flush")
+def _collect_before_flush(session, flush_context, instances):
+    # Удаляемые записи и старые значения измененных нужно запомнить до flush
+    touched = session.info.setdefault('rollup_days', set())
+    for obj in session.deleted:
+        if type(obj) in ROLLUPS:
+            touched.update((type(obj), child_id, day) for child_id, day in _touched_days(obj))
+    for obj in session.dirty:
+        if type(obj) in ROLLUPS and session.is_modified(obj):
+            touched.update((type(obj), child_id, day) for child_id, day in _touched_days(obj, history=True))
+
+@event.listens_for(Session, "after_flush")
+def _update_after_flush(session, flush_context):
+    touched = session.info.pop('rollup_days', set())
+    # У новых записей время по умолчанию заполняется только при вставке
+    for obj in session.new:
+        if type(obj) in ROLLUPS:
+            touched.update((type(obj), child_id, day) for child_id, day in _touched_days(obj))
+    if not touched:
+        return
+    connection = session.connection()
+    for model, child_id, day in touched:
+        _recompute(connection, model, child_id, day)
+
+@event.listens_for(Session, "do_orm_execute")
+def _update_after_bulk(orm_execute_state):
+    # delete(Feeding).where(...) и т.п. обходят flush: пересчитываем итоги таблицы после выполнения
+    if not (orm_execute_state.is_delete or orm_execute_state.is_update):
+        return None
+    mapper = orm_execute_state.bind_mapper
+    model = mapper.class_ if mapper is not None else None
+    if model not in ROLLUPS:
+        return None
+    result = orm_execute_state.invoke_statement()
+    _recompute(orm_execute_state.session.connection(), model)
+    return result
+
+def _period(query, rollup, child_id: int, since: Optional[date], until: Optional[date]):
+    query = query.where(rollup.child_id == child_id)
+    if since is not None:
+        query = query.where(rollup.day >= since)
+    if until is not None:
+        query = query.where(rollup.day < until)
+    return query
+
+def feeding_totals(db_session, child_id: int, since: Optional[date] = None,
+                   until: Optional[date] = None) -> Dict:
+    """
+    Итоги кормлений за период одним запросом
+
+    Args:
+        db_session: Сессия базы данных (для AsyncSession - через run_sync)
+        child_id: ID ребенка
+        since: Первый день периода (включительно)
+        until: День после периода (не включается)
+
+    Returns:
+        {'days': дней с кормлениями, 'count': кормлений, 'amount': мл}
+    """
+    days, count, amount = db_session.execute(_period(select(
+        func.count(distinct(FeedingDaily.day)),
+        func.coalesce(func.sum(FeedingDaily.count), 0),
+        func.coalesce(func.sum(FeedingDaily.amount), 0)
+    ), FeedingDaily, child_id, since, until)).one()
+    return {'days': days, 'count': count, 'amount': amount}
+
+def feeding_by_day(db_session, child_id: int, since: Optional[date] = None,
+                   until: Optional[date] = None) -> "OrderedDict[date, Dict]":
+    """
+    Кормления по дням
+
+    Returns:
+        День -> {'count', 'amount'} в хронологическом порядке
+    """
+    rows = db_session.execute(_period(select(
+        FeedingDaily.day, func.sum(FeedingDaily.count), func.sum(FeedingDaily.amount)
+    ), FeedingDaily, child_id, since, until).group_by(FeedingDaily.day).order_by(FeedingDaily.day))
+    return OrderedDict((day, {'count': count, 'amount': amount}) for day, count, amount in rows)
+
+def feeding_by_type(db_session, child_id: int, since: Optional[date] = None,
+                    until: Optional[date] = None) -> Dict[Optional[str], float]:
+    """
+    Объем питания по типам за период
+
+    Returns:
+        Тип питания (None - не указан) -> мл
+    """
+    rows = db_session.execute(_period(select(
+        FeedingDaily.food_type, func.sum(FeedingDaily.amount)
+    ), FeedingDaily, child_id, since, until).group_by(FeedingDaily.food_type))
+    return {food_type or None: amount for food_type, amount in rows}
+
+def stool_totals(db_session, child_id: int, since: Optional[date] = None,
+                 until: Optional[date] = None) -> Dict:
+    """
+    Итоги стула за период
+
+    Returns:
+        {'days': дней с записями, 'count': записей}
+    """
+    days, count = db_session.execute(_period(select(
+        func.count(distinct(StoolDaily.day)), func.coalesce(func.sum(StoolDaily.count), 0)
+    ), StoolDaily, child_id, since, until)).one()
+    return {'days': days, 'count': count}
+
+def stool_distribution(db_session, child_id: int, field: str, since: Optional[date] = None,
+                       until: Optional[date] = None) -> Dict[str, int]:
+    """
+    Количество записей о стуле по цвету или консистенции
+
+    Args:
+        field: 'color' или 'consistency' (записи без цвета не учитываются)
+
+    Returns:
+        Значение -> количество записей
+    """
+    column = getattr(StoolDaily, field)
+    rows = db_session.execute(_period(
+        select(column, func.sum(StoolDaily.count)), StoolDaily, child_id, since, until
+    ).where(column != '').group_by(column))
+    return {value: count for value, count in rows}
+
+def weight_range(db_session, child_id: int, since: Optional[date] = None,
+                 until: Optional[date] = None) -> Optional[Dict]:
+    """
+    Первое и последнее измерение веса за период, количество, минимум и максимум
+
+    Returns:
+        Словарь count, min_weight, max_weight, first_weight, first_time,
+        last_weight, last_time или None, если измерений нет
+    """
+    count, min_weight, max_weight = db_session.execute(_period(select(
+        func.sum(WeightDaily.count), func.min(WeightDaily.min_weight), func.max(WeightDaily.max_weight)
+    ), WeightDaily, child_id, since, until)).one()
+    if not count:
+        return None
+    first = db_session.execute(_period(
+        select(WeightDaily.first_weight, WeightDaily.first_time), WeightDaily, child_id, since, until
+    ).order_by(WeightDaily.day).limit(1)).one()
+    last = db_session.execute(_period(
+        select(WeightDaily.last_weight, WeightDaily.last_time), WeightDaily, child_id, since, until
+    ).order_by(WeightDaily.day.desc()).limit(1)).one()
+    return {
+        'count': count,
+        'min_weight': min_weight,
+        'max_weight': max_weight,
+        'first_weight': first.first_weight,
+        'first_time': first.first_time,
+        'last_weight': last.last_weight,
+        'last_time': last.last_time
+    }
+
+if __name__ == "__main__":
+    # Пересчет всех итогов: python -m database.rollups
+    from .database import engine
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    with engine.begin() as connection:
+        rebuild_rollups(connection)
+    logger.info("Суточные итоги пересчитаны")
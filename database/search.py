@@ -0,0 +1,235 @@
+"""
+Полнотекстовый поиск по заметкам, истории диалогов и назначениям
+
+Для каждой таблицы создается виртуальная таблица FTS5 с внешним содержимым
+(content=...): индекс хранит только токены, текст берется из исходной таблицы.
+Индекс обновляют триггеры на вставку, удаление и изменение текстовых колонок,
+поэтому он синхронен с данными при любом способе записи (ORM, массовые
+операции, импорт). Таблицы и триггеры создает миграция 7.
+
+Токенизатор unicode61 приводит регистр (в том числе кириллицы) и убирает
+диакритику, но не знает морфологии, поэтому слова запроса ищутся по основе:
+у длинных слов отбрасывается окончание и ищется префикс ("железо" -> желез*,
+найдет "железа", "железом"). Сначала ищутся записи со всеми словами запроса,
+если таких нет - с любым из них; результаты сортируются по bm25.
+
+Диалоги старше CHAT_HISTORY_HOT_DAYS переносятся в сжатый архив
+(database/chat_archive.py) и из индекса удаляются. Их блоки распаковываются при
+каждом поиске и проверяются по тем же основам слов; найденные в архиве диалоги
+идут после результатов из индекса, от новых к старым.
+"""
+import json
+import re
+from collections import namedtuple
+from datetime import datetime
+from typing import List, Tuple
+
+from sqlalchemy import text
+
+from .chat_archive import get_archived_turns
+
+# Вид записи -> (таблица, таблица FTS, индексируемые колонки, заголовок, время)
+SEARCH_SOURCES = {
+    'note': ('notes', 'notes_fts', ('title', 'content'), 'title', 'timestamp'),
+    'chat': ('chat_history', 'chat_history_fts', ('user_message', 'assistant_response'),
+             'user_message', 'timestamp'),
+    'prescription': ('prescriptions', 'prescriptions_fts', ('medication_name', 'full_text', 'notes'),
+                     'medication_name', 'start_date'),
+}
+
+# Границы найденных слов во фрагменте (заменяются на разметку при выводе)
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+SNIPPET_TOKENS = 16
+
+# Служебные слова, которые не ищутся
+STOP_WORDS = {
+    'что', 'про', 'как', 'это', 'был', 'была', 'было', 'были', 'для', 'или', 'так', 'уже',
+    'все', 'его', 'она', 'они', 'мне', 'нам', 'вас', 'при', 'над', 'под', 'без', 'где',
+    'когда', 'чем', 'ли', 'не', 'на', 'по', 'из', 'за', 'от', 'до', 'со', 'во', 'об', 'о',
+    'и', 'в', 'с', 'у', 'к', 'а', 'но', 'же', 'бы',
+}
+
+SearchHit = namedtuple('SearchHit', 'kind id timestamp title snippet rank')
+
+def search_index_ddl() -> List[str]:
+    """SQL создания таблиц FTS5 и триггеров синхронизации (для миграции)"""
+    statements = []
+    for table, fts, columns, _, _ in SEARCH_SOURCES.values():
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'new.{column}' for column in columns)
+        old_values = ', '.join(f'old.{column}' for column in columns)
+        delete_old = (f"INSERT INTO {fts}({fts}, rowid, {column_list}) "
+                      f"VALUES ('delete', old.id, {old_values});")
+        insert_new = f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values});"
+        statements += [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({column_list}, "
+            f"content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN {insert_new} END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN {delete_old} END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {column_list} ON {table} "
+            f"BEGIN {delete_old} {insert_new} END",
+            # Индексируем уже накопленные записи
+            f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+        ]
+    return statements
+
+def _stem(word: str) -> str:
+    # Грубое отбрасывание окончания вместо морфологии
+    if len(word) >= 7:
+        return word[:-2]
+    if len(word) >= 5:
+        return word[:-1]
+    return word
+
+def query_terms(query: str) -> List[str]:
+    """Основы слов запроса без служебных слов и повторов"""
+    terms = []
+    for word in re.findall(r'\w+', query.lower()):
+        if word in STOP_WORDS:
+            continue
+        term = _stem(word)
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+def build_match_query(query: str, any_word: bool = False) -> str:
+    """
+    Выражение MATCH для FTS5 из текста запроса
+
+    Слова берутся в кавычки, поэтому спецсимволы синтаксиса FTS5 в запросе
+    пользователя не действуют.
+
+    Args:
+        query: Текст запроса
+        any_word: Искать записи с любым из слов (иначе - со всеми)
+
+    Returns:
+        Выражение MATCH или '', если в запросе нет слов для поиска
+    """
+    return (' OR ' if any_word else ' ').join(f'"{term}"*' for term in query_terms(query))
+
+def _search_sql() -> str:
+    parts = []
+    for kind, (table, fts, _, title, time_column) in SEARCH_SOURCES.items():
+        parts.append(
+            f"SELECT '{kind}' AS kind, {table}.id AS id, {table}.{time_column} AS ts, "
+            f"{table}.{title} AS title, bm25({fts}) AS rank "
+            # CROSS JOIN фиксирует порядок: сначала поиск по индексу FTS, затем строки
+            # по первичному ключу (иначе SQLite перебирает записи ребенка по индексу child_id
+            # и выполняет MATCH для каждой)
+            f"FROM {fts} CROSS JOIN {table} ON {table}.id = {fts}.rowid "
+            f"WHERE {fts} MATCH :match AND {table}.child_id = :child_id"
+        )
+    return (
+        "SELECT kind, id, ts, title, rank, count(*) OVER () AS total FROM ("
+        + " UNION ALL ".join(parts)
+        + ") ORDER BY rank, ts DESC LIMIT :limit OFFSET :offset"
+    )
+
+# Фрагменты текста строятся отдельным запросом только для записей страницы:
+# snippet() в общем запросе вычислялся бы для всех найденных записей до сортировки
+SEARCH_SQL = text(_search_sql())
+SNIPPET_SQL = {
+    kind: text(
+        f"SELECT rowid AS id, snippet({fts}, -1, :match_start, :match_end, '…', {SNIPPET_TOKENS}) AS snippet "
+        f"FROM {fts} WHERE {fts} MATCH :match AND rowid IN (SELECT value FROM json_each(:ids))"
+    )
+    for kind, (_, fts, _, _, _) in SEARCH_SOURCES.items()
+}
+
+def _snippets(db_session, match: str, rows) -> dict:
+    ids = {}
+    for row in rows:
+        ids.setdefault(row.kind, []).append(row.id)
+    snippets = {}
+    for kind, kind_ids in ids.items():
+        for row in db_session.execute(SNIPPET_SQL[kind], {
+            'match': match, 'ids': json.dumps(kind_ids), 'match_start': MATCH_START, 'match_end': MATCH_END
+        }):
+            snippets[(kind, row.id)] = row.snippet
+    return snippets
+
+def _matches(word: str, terms: List[str]) -> bool:
+    word = word.lower()
+    return any(word.startswith(term) for term in terms)
+
+def _archive_snippet(text_value: str, terms: List[str]) -> str:
+    """Фрагмент текста вокруг первого найденного слова с выделением, как у snippet() FTS5"""
+    words = text_value.split()
+    first = next((i for i, word in enumerate(words) if any(_matches(w, terms) for w in re.findall(r'\w+', word))), 0)
+    start = max(0, min(first - SNIPPET_TOKENS // 2, len(words) - SNIPPET_TOKENS))
+    window = words[start:start + SNIPPET_TOKENS]
+    marked = [
+        f"{MATCH_START}{word}{MATCH_END}" if any(_matches(w, terms) for w in re.findall(r'\w+', word)) else word
+        for word in window
+    ]
+    return ('…' if start > 0 else '') + ' '.join(marked) + ('…' if start + SNIPPET_TOKENS < len(words) else '')
+
+def _archive_hits(db_session, child_id: int, terms: List[str], any_word: bool) -> List[SearchHit]:
+    """Диалоги из архива, содержащие все (или любое) слова запроса, от новых к старым"""
+    hits = []
+    for turn in get_archived_turns(db_session, child_id):
+        content = f"{turn.user_message} {turn.assistant_response}"
+        words = set(re.findall(r'\w+', content.lower()))
+        found = [any(_matches(word, [term]) for word in words) for term in terms]
+        if any(found) if any_word else all(found):
+            hits.append(SearchHit('chat', turn.id, turn.timestamp, turn.user_message,
+                                  _archive_snippet(content, terms), None))
+    return hits
+
+def _parse_time(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+def search_records(db_session, child_id: int, query: str, limit: int = 5,
+                   offset: int = 0) -> Tuple[List[SearchHit], int]:
+    """
+    Ищет заметки, диалоги с AI и назначения ребенка
+
+    Args:
+        db_session: Сессия базы данных
+        child_id: ID ребенка
+        query: Текст запроса
+        limit: Записей на странице
+        offset: Сколько записей пропустить
+
+    Returns:
+        Найденные записи страницы (от наиболее релевантных) и общее количество
+    """
+    def run(match: str, page_limit: int, page_offset: int) -> list:
+        return db_session.execute(SEARCH_SQL, {
+            'match': match, 'child_id': child_id, 'limit': page_limit, 'offset': page_offset
+        }).all()
+
+    terms = query_terms(query)
+    if not terms:
+        return [], 0
+    for any_word in (False, True):
+        match = build_match_query(query, any_word)
+        rows = run(match, limit, offset)
+        if rows:
+            index_total = rows[0].total
+        elif offset:
+            # Страница за концом результатов из индекса - узнаем их количество
+            first = run(match, 1, 0)
+            index_total = first[0].total if first else 0
+        else:
+            index_total = 0
+        archived = _archive_hits(db_session, child_id, terms, any_word)
+        total = index_total + len(archived)
+        if not total:
+            # Записей со всеми словами нет - ищем записи с любым из них
+            continue
+
+        snippets = _snippets(db_session, match, rows) if rows else {}
+        hits = [
+            SearchHit(row.kind, row.id, _parse_time(row.ts), row.title, snippets.get((row.kind, row.id)), row.rank)
+            for row in rows
+        ]
+        # Страница дополняется диалогами из архива
+        archive_start = max(0, offset - index_total)
+        hits += archived[archive_start:archive_start + limit - len(hits)]
+        return hits, total
+    return [], 0
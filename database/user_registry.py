@@ -0,0 +1,152 @@
+"""
+Реестр пользователей бота в памяти процесса
+
+Данные пользователя Telegram (имя, фамилия, username) сохраняются перед каждым
+текстовым сообщением, но меняются редко. Реестр хранит сохраненные в базе
+данные пользователей, поэтому запись в таблицу users выполняется только при
+первом сообщении пользователя (после запуска бота) и при изменении его данных.
+Время последней активности (updated_at) копится в памяти и записывается одним
+пакетным UPDATE задачей планировщика раз в USER_LAST_SEEN_FLUSH_MINUTES минут
+и при остановке бота.
+
+Данные попадают в реестр только после коммита сессии, которая их записала:
+если сессия откатилась, при следующем сообщении пользователь будет прочитан из
+базы заново.
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import bindparam, event, select, update
+from sqlalchemy.orm import Session
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+# Ключ в session.info: данные пользователей, записанные сессией, но еще не зафиксированные
+_PENDING_KEY = 'user_registry_pending'
+
+class UserRegistry:
+    """Сохраненные данные пользователей по telegram_id и непереданное время активности"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiles: Dict[int, Tuple[Optional[str], Optional[str], Optional[str]]] = {}
+        self._last_seen: Dict[int, datetime] = {}
+        self.stats = {'hits': 0, 'writes': 0, 'flushed': 0}
+
+    async def atouch(self, db, telegram_id: int, username: Optional[str], first_name: Optional[str],
+                     last_name: Optional[str], now: Optional[datetime] = None) -> bool:
+        """
+        Отмечает активность пользователя и при необходимости сохраняет его данные
+
+        Изменения добавляются в сессию и фиксируются ее коммитом (в обработчиках
+        бота - в конце обработки обновления).
+
+        Args:
+            db: Асинхронная сессия базы данных
+            telegram_id: ID пользователя в Telegram
+            username: Имя пользователя в Telegram
+            first_name: Имя
+            last_name: Фамилия
+            now: Время активности (для проверки)
+
+        Returns:
+            True, если данные пользователя записываются в базу
+        """
+        now = now or datetime.now()
+        profile = (username, first_name, last_name)
+        with self._lock:
+            self._last_seen[telegram_id] = now
+            if self._profiles.get(telegram_id) == profile:
+                self.stats['hits'] += 1
+                return False
+
+        user = await db.scalar(select(User).filter_by(telegram_id=telegram_id).limit(1))
+        if user is None:
+            user = User(
+                telegram_id=telegram_id,
+                username=username,
+                first_name=first_name,
+                last_name=last_name,
+                is_active=1
+            )
+            db.add(user)
+            logger.info(f"Добавлен новый пользователь: {telegram_id} ({username})")
+        elif (user.username, user.first_name, user.last_name) != profile or user.is_active != 1:
+            user.username = username
+            user.first_name = first_name
+            user.last_name = last_name
+            user.is_active = 1
+        else:
+            # В базе уже актуальные данные (первое сообщение после запуска бота)
+            self._remember(telegram_id, profile)
+            return False
+
+        user.updated_at = now
+        db.info.setdefault(_PENDING_KEY, {})[telegram_id] = profile
+        with self._lock:
+            self.stats['writes'] += 1
+        return True
+
+    def _remember(self, telegram_id: int, profile: tuple):
+        with self._lock:
+            self._profiles[telegram_id] = profile
+
+    def flush_last_seen(self, db_session) -> int:
+        """
+        Записывает накопленное время активности пользователей одним пакетным UPDATE
+
+        Args:
+            db_session: Сессия базы данных (синхронная)
+
+        Returns:
+            Количество обновленных пользователей
+        """
+        with self._lock:
+            pending, self._last_seen = self._last_seen, {}
+        if not pending:
+            return 0
+        try:
+            db_session.connection().execute(
+                update(User.__table__)
+                .where(User.__table__.c.telegram_id == bindparam('tid'))
+                .values(updated_at=bindparam('seen')),
+                [{'tid': telegram_id, 'seen': seen} for telegram_id, seen in pending.items()]
+            )
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            # Возвращаем непереданные отметки, не затирая более новые
+            with self._lock:
+                for telegram_id, seen in pending.items():
+                    if self._last_seen.get(telegram_id, seen) <= seen:
+                        self._last_seen[telegram_id] = seen
+            raise
+        with self._lock:
+            self.stats['flushed'] += len(pending)
+        return len(pending)
+
+    def invalidate(self):
+        """Забывает сохраненные данные пользователей (время активности не сбрасывается)"""
+        with self._lock:
+            self._profiles.clear()
+
+    def get_stats(self) -> Dict:
+        """Статистика реестра: попадания, записи в базу, пользователи в памяти"""
+        with self._lock:
+            return dict(self.stats, users=len(self._profiles), pending_last_seen=len(self._last_seen))
+
+# Общий реестр процесса
+user_registry = UserRegistry()
+
+@event.listens_for(Session, "after_commit")
+def _remember_after_commit(session):
+    for telegram_id, profile in session.info.pop(_PENDING_KEY, {}).items():
+        user_registry._remember(telegram_id, profile)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -350,12 +350,13 @@ class GoogleSheetsManager:
             return False
             
         try:
-            from database.models import Child, Reminder, Medication, Feeding, Stool, Weight, Prescription
+            from database.models import Reminder, Medication, Feeding, Stool, Weight, Prescription
+            from database.child_profile import child_profiles
             
             # Получаем данные из базы
             reminders = []
             for reminder in db_session.query(Reminder).all():
-                child = db_session.query(Child).get(reminder.child_id)
+                child = child_profiles.get(db_session, reminder.child_id)
                 reminders.append({
                     'id': reminder.id,
                     'description': reminder.description,
@@ -370,7 +371,7 @@ class GoogleSheetsManager:
             
             medications = []
             for medication in db_session.query(Medication).all():
-                child = db_session.query(Child).get(medication.child_id)
+                child = child_profiles.get(db_session, medication.child_id)
                 medications.append({
                     'id': medication.id,
                     'medication_name': medication.medication_name,
@@ -381,7 +382,7 @@ class GoogleSheetsManager:
             
             feedings = []
             for feeding in db_session.query(Feeding).all():
-                child = db_session.query(Child).get(feeding.child_id)
+                child = child_profiles.get(db_session, feeding.child_id)
                 feedings.append({
                     'id': feeding.id,
                     'amount': feeding.amount,
@@ -392,7 +393,7 @@ class GoogleSheetsManager:
             
             stools = []
             for stool in db_session.query(Stool).all():
-                child = db_session.query(Child).get(stool.child_id)
+                child = child_profiles.get(db_session, stool.child_id)
                 stools.append({
                     'id': stool.id,
                     'description': stool.description,
@@ -403,7 +404,7 @@ class GoogleSheetsManager:
             
             weights = []
             for weight in db_session.query(Weight).all():
-                child = db_session.query(Child).get(weight.child_id)
+                child = child_profiles.get(db_session, weight.child_id)
                 weights.append({
                     'id': weight.id,
                     'weight': weight.weight,
@@ -413,7 +414,7 @@ class GoogleSheetsManager:
             
             prescriptions = []
             for prescription in db_session.query(Prescription).all():
-                child = db_session.query(Child).get(prescription.child_id)
+                child = child_profiles.get(db_session, prescription.child_id)
                 prescriptions.append({
                     'id': prescription.id,
                     'doctor_name': prescription.doctor_name or '',
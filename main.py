@@ -14,7 +14,8 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from bot.bot import dp
 from config import LOG_LEVEL, APP_NAME, APP_VERSION
 from database.migrations import run_migrations
-from scheduler.scheduler import start_scheduler, stop_scheduler
+from database.async_database import async_engine
+from scheduler.scheduler import start_scheduler, stop_scheduler, flush_user_activity
 
 # Настройка логирования
 logging.basicConfig(level=getattr(logging, LOG_LEVEL))
@@ -34,6 +35,14 @@ async def on_startup(dp):
     start_scheduler()
     logger.info("Планировщик задач запущен")
 
+async def on_shutdown(dp):
+    """Действия при остановке бота"""
+    # Записываем время активности пользователей, накопленное с последнего запуска задачи
+    await flush_user_activity()
+    
+    # Закрываем соединения асинхронного движка (их рабочие потоки не дают процессу завершиться)
+    await async_engine.dispose()
+
 if __name__ == '__main__':
     # Регистрируем обработчик сигналов
     signal.signal(signal.SIGINT, signal_handler)
@@ -45,6 +54,6 @@ if __name__ == '__main__':
     # Выводим информацию о запуске
     logger.info(f"Запуск {APP_NAME} v{APP_VERSION}")
     
-    # Запускаем бота с указанием функции on_startup
-    executor.start_polling(dp, skip_updates=True, on_startup=on_startup)
+    # Запускаем бота с указанием функций on_startup и on_shutdown
+    executor.start_polling(dp, skip_updates=True, on_startup=on_startup, on_shutdown=on_shutdown)
     logger.info("Бот успешно запущен и готов к работе!") 
\ No newline at end of file
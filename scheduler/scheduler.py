@@ -1,20 +1,34 @@
 """
 Модуль для работы с планировщиком задач
 """
+import asyncio
 import logging
 from datetime import datetime, timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import select
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database.database import get_db
-from database.models import Reminder, Child, Feeding, Stool, Weight, Medication
-from bot.bot import bot
+from database.database import SessionLocal, engine
+from database.async_database import session_scope
+from database.models import Reminder, Feeding, Stool, Weight, Medication
+from database.child_profile import child_profiles
+from database.fingerprint import data_fingerprint
+from database.rollups import feeding_totals, stool_totals, stool_distribution, weight_range
+from database.chat_archive import archive_chat_history, free_page_share, vacuum
+from database.backup import create_backup
+from database.user_registry import user_registry
+from bot.bot import bot, ai_assistant, run_with_session
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ParseMode
-from config import LOG_LEVEL, GOOGLE_SHEETS_ENABLED
+from config import (
+    LOG_LEVEL, GOOGLE_SHEETS_ENABLED, CHAT_HISTORY_ARCHIVE_VACUUM, CHAT_HISTORY_VACUUM_MIN_FREE_SHARE,
+    BACKUP_ENABLED, BACKUP_HOUR,
+    USER_LAST_SEEN_FLUSH_MINUTES,
+    SUMMARY_PREWARM_INTERVAL_MINUTES, SUMMARY_PREWARM_SETTLE_MINUTES
+)
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=getattr(logging, LOG_LEVEL))
@@ -25,215 +39,246 @@ scheduler = AsyncIOScheduler()
 async def check_reminders():
     """Проверка напоминаний и отправка уведомлений"""
     try:
-        db = next(get_db())
+        async with session_scope('check_reminders') as db:
         
-        # Получаем текущее время
-        now = datetime.now()
+            # Получаем текущее время
+            now = datetime.now()
         
-        # Находим все активные напоминания, время которых наступило
-        # но не старше 1 минуты (чтобы не отправлять старые напоминания)
-        one_minute_ago = now - timedelta(minutes=1)
-        reminders = db.query(Reminder).filter(
-            Reminder.status == 'active',
-            Reminder.reminder_time <= now,
-            Reminder.reminder_time > one_minute_ago
-        ).all()
+            # Находим все активные напоминания, время которых наступило
+            # но не старше 1 минуты (чтобы не отправлять старые напоминания)
+            one_minute_ago = now - timedelta(minutes=1)
+            reminders = (await db.scalars(select(Reminder).filter(
+                Reminder.status == 'active',
+                Reminder.reminder_time <= now,
+                Reminder.reminder_time > one_minute_ago
+            ))).all()
         
-        if not reminders:
-            return
+            if not reminders:
+                return
             
-        logger.info(f"Найдено {len(reminders)} напоминаний для отправки")
+            logger.info(f"Найдено {len(reminders)} напоминаний для отправки")
         
-        # Получаем всех активных пользователей из базы данных
-        from database.models import User
-        users = db.query(User).filter(User.is_active == 1).all()
+            # Получаем всех активных пользователей из базы данных
+            from database.models import User
+            users = (await db.scalars(select(User).filter(User.is_active == 1))).all()
         
-        if not users:
-            logger.warning("Не удалось найти пользователей для отправки напоминаний")
-            return
+            if not users:
+                logger.warning("Не удалось найти пользователей для отправки напоминаний")
+                return
             
-        logger.info(f"Найдено {len(users)} активных пользователей для отправки напоминаний")
+            logger.info(f"Найдено {len(users)} активных пользователей для отправки напоминаний")
         
-        # Обрабатываем каждое напоминание
-        for reminder in reminders:
-            try:
-                # Получаем информацию о ребенке
-                child = db.query(Child).get(reminder.child_id)
-                if not child:
-                    logger.warning(f"Ребенок с ID {reminder.child_id} не найден для напоминания {reminder.id}")
-                    continue
+            # Обрабатываем каждое напоминание
+            for reminder in reminders:
+                try:
+                    # Получаем информацию о ребенке
+                    child = await child_profiles.aget(db, reminder.child_id)
+                    if not child:
+                        logger.warning(f"Ребенок с ID {reminder.child_id} не найден для напоминания {reminder.id}")
+                        continue
                 
-                # Формируем сообщение
-                message = f"⏰ *Напоминание для {child.name}*\n\n{reminder.description}"
+                    # Формируем сообщение
+                    message = f"⏰ *Напоминание для {child.name}*\n\n{reminder.description}"
                 
-                # Создаем клавиатуру с кнопками
-                keyboard = InlineKeyboardMarkup()
-                keyboard.row(
-                    InlineKeyboardButton("✅ Выполнено", callback_data=f"reminder_complete_{reminder.id}"),
-                    InlineKeyboardButton("⏭️ Пропустить", callback_data=f"reminder_skip_{reminder.id}")
-                )
+                    # Создаем клавиатуру с кнопками
+                    keyboard = InlineKeyboardMarkup()
+                    keyboard.row(
+                        InlineKeyboardButton("✅ Выполнено", callback_data=f"reminder_complete_{reminder.id}"),
+                        InlineKeyboardButton("⏭️ Пропустить", callback_data=f"reminder_skip_{reminder.id}")
+                    )
                 
-                # Отправляем напоминание всем активным пользователям
-                for user in users:
-                    try:
-                        await bot.send_message(
-                            chat_id=user.telegram_id,
-                            text=message,
-                            reply_markup=keyboard,
-                            parse_mode='Markdown'
-                        )
-                        logger.info(f"Отправлено напоминание пользователю {user.telegram_id} ({user.username}): {reminder.description}")
-                    except Exception as send_error:
-                        logger.error(f"Ошибка при отправке напоминания пользователю {user.telegram_id}: {send_error}")
+                    # Отправляем напоминание всем активным пользователям
+                    for user in users:
+                        try:
+                            await bot.send_message(
+                                chat_id=user.telegram_id,
+                                text=message,
+                                reply_markup=keyboard,
+                                parse_mode='Markdown'
+                            )
+                            logger.info(f"Отправлено напоминание пользователю {user.telegram_id} ({user.username}): {reminder.description}")
+                        except Exception as send_error:
+                            logger.error(f"Ошибка при отправке напоминания пользователю {user.telegram_id}: {send_error}")
                 
-                # Если это однократное напоминание, помечаем его как отправленное
-                if reminder.repeat_type == 'once':
-                    reminder.status = 'sent'
-                    db.commit()
+                    # Если это однократное напоминание, помечаем его как отправленное
+                    if reminder.repeat_type == 'once':
+                        reminder.status = 'sent'
+                        await db.commit()
                     
-                # Если это повторяющееся напоминание, создаем следующее
-                else:
-                    next_time = None
+                    # Если это повторяющееся напоминание, создаем следующее
+                    else:
+                        next_time = None
                     
-                    if reminder.repeat_type == 'daily':
-                        next_time = reminder.reminder_time + timedelta(days=reminder.repeat_interval)
-                    elif reminder.repeat_type == 'weekly':
-                        next_time = reminder.reminder_time + timedelta(weeks=reminder.repeat_interval)
-                    elif reminder.repeat_type == 'monthly':
-                        # Простая реализация для месяцев (не учитывает разное количество дней)
-                        next_month = reminder.reminder_time.month + reminder.repeat_interval
-                        next_year = reminder.reminder_time.year + (next_month - 1) // 12
-                        next_month = ((next_month - 1) % 12) + 1
+                        if reminder.repeat_type == 'daily':
+                            next_time = reminder.reminder_time + timedelta(days=reminder.repeat_interval)
+                        elif reminder.repeat_type == 'weekly':
+                            next_time = reminder.reminder_time + timedelta(weeks=reminder.repeat_interval)
+                        elif reminder.repeat_type == 'monthly':
+                            # Простая реализация для месяцев (не учитывает разное количество дней)
+                            next_month = reminder.reminder_time.month + reminder.repeat_interval
+                            next_year = reminder.reminder_time.year + (next_month - 1) // 12
+                            next_month = ((next_month - 1) % 12) + 1
                         
-                        # Создаем дату следующего месяца
-                        next_time = reminder.reminder_time.replace(year=next_year, month=next_month)
-                    elif reminder.repeat_type == 'hourly':
-                        # Для почасовых напоминаний
-                        next_time = reminder.reminder_time + timedelta(hours=reminder.repeat_interval)
+                            # Создаем дату следующего месяца
+                            next_time = reminder.reminder_time.replace(year=next_year, month=next_month)
+                        elif reminder.repeat_type == 'hourly':
+                            # Для почасовых напоминаний
+                            next_time = reminder.reminder_time + timedelta(hours=reminder.repeat_interval)
                     
-                    if next_time:
-                        # Создаем новое напоминание
-                        new_reminder = Reminder(
-                            child_id=reminder.child_id,
-                            description=reminder.description,
-                            reminder_time=next_time,
-                            status='active',
-                            repeat_type=reminder.repeat_type,
-                            repeat_interval=reminder.repeat_interval
-                        )
-                        db.add(new_reminder)
+                        if next_time:
+                            # Создаем новое напоминание
+                            new_reminder = Reminder(
+                                child_id=reminder.child_id,
+                                description=reminder.description,
+                                reminder_time=next_time,
+                                status='active',
+                                repeat_type=reminder.repeat_type,
+                                repeat_interval=reminder.repeat_interval
+                            )
+                            db.add(new_reminder)
                         
-                        # Помечаем текущее напоминание как отправленное
-                        reminder.status = 'sent'
+                            # Помечаем текущее напоминание как отправленное
+                            reminder.status = 'sent'
                         
-                        db.commit()
+                            await db.commit()
                 
-            except Exception as e:
-                logger.error(f"Ошибка при обработке напоминания {reminder.id}: {e}")
+                except Exception as e:
+                    logger.error(f"Ошибка при обработке напоминания {reminder.id}: {e}")
                 
     except Exception as e:
         logger.error(f"Ошибка при проверке напоминаний: {e}")
-    finally:
-        db.close()
 
 async def check_feeding_intervals():
     """Проверка интервалов между кормлениями"""
     try:
-        db = next(get_db())
+        async with session_scope('check_feeding_intervals') as db:
         
-        # Получаем текущее время
-        now = datetime.now()
+            # Получаем текущее время
+            now = datetime.now()
         
-        # Получаем последнее кормление
-        last_feeding = db.query(Feeding).order_by(Feeding.timestamp.desc()).first()
+            # Получаем последнее кормление
+            last_feeding = await db.scalar(select(Feeding).order_by(Feeding.timestamp.desc()).limit(1))
         
-        if last_feeding:
-            # Проверяем, прошло ли более 3 часов с последнего кормления
-            time_since_last_feeding = now - last_feeding.timestamp
+            if last_feeding:
+                # Проверяем, прошло ли более 3 часов с последнего кормления
+                time_since_last_feeding = now - last_feeding.timestamp
             
-            if time_since_last_feeding > timedelta(hours=3):
-                # Получаем информацию о ребенке
-                child = db.query(Child).get(last_feeding.child_id)
+                if time_since_last_feeding > timedelta(hours=3):
+                    # Получаем информацию о ребенке
+                    child = await child_profiles.aget(db, last_feeding.child_id)
                 
-                # Получаем ID пользователя для отправки уведомления
-                from aiogram.types import User
-                users = await bot.get_updates(limit=1, offset=-1)
+                    # Получаем ID пользователя для отправки уведомления
+                    from aiogram.types import User
+                    users = await bot.get_updates(limit=1, offset=-1)
                 
-                if users and users[0].message and users[0].message.from_user:
-                    user_id = users[0].message.from_user.id
+                    if users and users[0].message and users[0].message.from_user:
+                        user_id = users[0].message.from_user.id
                     
-                    # Отправляем напоминание о кормлении
-                    await bot.send_message(
-                        chat_id=user_id,
-                        text=f"⚠️ *Напоминание о кормлении*\n\n"
-                             f"Прошло более 3 часов с последнего кормления {child.name if child else ''}.\n"
-                             f"Последнее кормление было в {last_feeding.timestamp.strftime('%H:%M')}.",
-                        parse_mode='Markdown'
-                    )
+                        # Отправляем напоминание о кормлении
+                        await bot.send_message(
+                            chat_id=user_id,
+                            text=f"⚠️ *Напоминание о кормлении*\n\n"
+                                 f"Прошло более 3 часов с последнего кормления {child.name if child else ''}.\n"
+                                 f"Последнее кормление было в {last_feeding.timestamp.strftime('%H:%M')}.",
+                            parse_mode='Markdown'
+                        )
                     
-                    logger.info(f"Отправлено напоминание о кормлении")
-                else:
-                    logger.warning("Не удалось определить пользователя для отправки напоминания о кормлении")
+                        logger.info(f"Отправлено напоминание о кормлении")
+                    else:
+                        logger.warning("Не удалось определить пользователя для отправки напоминания о кормлении")
         
     except Exception as e:
         logger.error(f"Ошибка при проверке интервалов кормления: {e}")
-    finally:
-        db.close()
+
+def build_daily_report(db) -> str:
+    """
+    Формирует текст отчета за вчерашний день
+    
+    Args:
+        db: Сессия базы данных
+        
+    Returns:
+        Текст отчета в формате Markdown
+    """
+    # Получаем текущую дату
+    today = datetime.now().date()
+    yesterday = today - timedelta(days=1)
+    
+    # Итоги за вчерашний день
+    child = child_profiles.get(db)
+    feedings = {'count': 0, 'amount': 0}
+    stools = {'count': 0}
+    weights = None
+    if child:
+        period = {'since': yesterday, 'until': today}
+        feedings = feeding_totals(db, child.id, **period)
+        stools = stool_totals(db, child.id, **period)
+        if stools['count']:
+            stools['consistencies'] = stool_distribution(db, child.id, 'consistency', **period)
+            stools['colors'] = stool_distribution(db, child.id, 'color', **period)
+        weights = weight_range(db, child.id, **period)
+    
+    # Формируем отчет
+    report = f"📊 *Отчет за {yesterday.strftime('%d.%m.%Y')}*\n\n"
+    
+    # Кормления
+    report += f"🍼 *Кормления:* {feedings['count']}\n"
+    if feedings['count']:
+        total_amount = feedings['amount']
+        report += f"Всего: {total_amount} мл\n"
+        report += f"Среднее: {total_amount / feedings['count']:.1f} мл\n\n"
+    else:
+        report += "Нет данных\n\n"
+    
+    # Стул
+    report += f"💩 *Стул:* {stools['count']}\n"
+    if stools['count']:
+        for name, counts in (("Консистенция", stools['consistencies']), ("Цвет", stools['colors'])):
+            if counts:
+                items = sorted(counts.items(), key=lambda item: -item[1])
+                report += f"- {name}: " + ", ".join(f"{value} {count}" for value, count in items) + "\n"
+        report += "\n"
+    else:
+        report += "Нет данных\n\n"
+    
+    # Вес
+    report += f"⚖️ *Вес:*\n"
+    if weights:
+        report += f"- {weights['last_time'].strftime('%H:%M')}: {weights['last_weight']} кг\n"
+        if weights['count'] > 1:
+            report += f"- За день измерений: {weights['count']}, от {weights['min_weight']} до {weights['max_weight']} кг\n"
+        report += "\n"
+    else:
+        report += "Нет данных\n\n"
+    
+    return report
+
+def _daily_report_cache_key(db):
+    """Возвращает ID ребенка и отпечаток данных, на которых строится ежедневный отчет"""
+    child = child_profiles.get(db)
+    if not child:
+        return None, None
+    return child.id, data_fingerprint(db, child.id, (Feeding, Stool, Weight))
+
+def get_daily_report(db) -> str:
+    """Возвращает подготовленный ежедневный отчет или формирует его заново"""
+    child_id, fingerprint = _daily_report_cache_key(db)
+    if child_id is None:
+        return build_daily_report(db)
+    
+    entry = ai_assistant.summary_cache.get(child_id, 'daily_report', fingerprint)
+    if entry:
+        return entry['text']
+    
+    report = build_daily_report(db)
+    ai_assistant.summary_cache.put(child_id, 'daily_report', report, fingerprint)
+    return report
 
 async def generate_daily_report():
     """Генерация ежедневного отчета"""
     try:
-        db = next(get_db())
-        
-        # Получаем текущую дату
-        today = datetime.now().date()
-        yesterday = today - timedelta(days=1)
-        
-        # Получаем данные за вчерашний день
-        feedings = db.query(Feeding).filter(
-            Feeding.timestamp >= datetime.combine(yesterday, datetime.min.time()),
-            Feeding.timestamp < datetime.combine(today, datetime.min.time())
-        ).all()
-        
-        stools = db.query(Stool).filter(
-            Stool.timestamp >= datetime.combine(yesterday, datetime.min.time()),
-            Stool.timestamp < datetime.combine(today, datetime.min.time())
-        ).all()
-        
-        weights = db.query(Weight).filter(
-            Weight.timestamp >= datetime.combine(yesterday, datetime.min.time()),
-            Weight.timestamp < datetime.combine(today, datetime.min.time())
-        ).all()
-        
-        # Формируем отчет
-        report = f"📊 *Отчет за {yesterday.strftime('%d.%m.%Y')}*\n\n"
-        
-        # Кормления
-        report += f"🍼 *Кормления:* {len(feedings)}\n"
-        if feedings:
-            total_amount = sum(f.amount for f in feedings)
-            report += f"Всего: {total_amount} мл\n"
-            report += f"Среднее: {total_amount / len(feedings):.1f} мл\n\n"
-        else:
-            report += "Нет данных\n\n"
-        
-        # Стул
-        report += f"💩 *Стул:* {len(stools)}\n"
-        if stools:
-            for stool in stools:
-                report += f"- {stool.timestamp.strftime('%H:%M')}: {stool.description}\n"
-            report += "\n"
-        else:
-            report += "Нет данных\n\n"
-        
-        # Вес
-        report += f"⚖️ *Вес:*\n"
-        if weights:
-            for weight in weights:
-                report += f"- {weight.timestamp.strftime('%H:%M')}: {weight.weight} кг\n"
-            report += "\n"
-        else:
-            report += "Нет данных\n\n"
+        # Формируем отчет (или берем подготовленный заранее)
+        report = await run_with_session(get_daily_report)
         
         # Получаем ID пользователя для отправки отчета
         from aiogram.types import User
@@ -255,28 +300,99 @@ async def generate_daily_report():
         
     except Exception as e:
         logger.error(f"Ошибка при генерации ежедневного отчета: {e}")
+
+def _prewarm_summaries_sync() -> int:
+    """Подготавливает сводки и ежедневный отчет в отдельной сессии"""
+    db = SessionLocal()
+    try:
+        generated = ai_assistant.prewarm_summaries(db, SUMMARY_PREWARM_SETTLE_MINUTES)
+        get_daily_report(db)
+        return generated
     finally:
         db.close()
 
+async def prewarm_summaries():
+    """Фоновая подготовка сводок о развитии, кормлениях, весе и стуле"""
+    try:
+        # Генерация обращается к LLM, поэтому выполняется вне цикла событий
+        loop = asyncio.get_event_loop()
+        generated = await loop.run_in_executor(None, _prewarm_summaries_sync)
+        
+        if generated:
+            logger.info(
+                f"Подготовлено сводок: {generated}, "
+                f"осталось LLM-запросов на сегодня: {ai_assistant.summary_cache.budget_left()}"
+            )
+    except Exception as e:
+        logger.error(f"Ошибка при подготовке сводок: {e}")
+
+async def evict_idle_conversations():
+    """Удаление из памяти истории диалогов неактивных чатов"""
+    try:
+        evicted = ai_assistant.conversation_memory.evict_idle()
+        if evicted:
+            stats = ai_assistant.conversation_memory.get_stats()
+            logger.info(
+                f"Удалена история неактивных чатов: {evicted}, "
+                f"в памяти чатов: {stats['chats']}, сообщений: {stats['messages']}"
+            )
+    except Exception as e:
+        logger.error(f"Ошибка при очистке истории диалогов: {e}")
+
+async def archive_old_chat_history():
+    """Перенос старых диалогов с AI в сжатый архив"""
+    try:
+        stats = await run_with_session(archive_chat_history)
+        if not stats['turns']:
+            return
+        logger.info(
+            f"Перенесено в архив диалогов: {stats['turns']}, блоков: {stats['blocks']}, "
+            f"{stats['raw_bytes']} → {stats['compressed_bytes']} байт"
+        )
+        if not CHAT_HISTORY_ARCHIVE_VACUUM:
+            return
+        loop = asyncio.get_event_loop()
+        # Освободившиеся страницы SQLite переиспользует и без VACUUM; файл сжимаем,
+        # только если свободна заметная его часть
+        free_share = await loop.run_in_executor(None, free_page_share, engine)
+        if free_share >= CHAT_HISTORY_VACUUM_MIN_FREE_SHARE:
+            logger.info(f"Свободно {free_share:.0%} страниц базы, выполняется VACUUM")
+            await loop.run_in_executor(None, vacuum, engine)
+    except Exception as e:
+        logger.error(f"Ошибка при переносе диалогов в архив: {e}")
+
+async def backup_database():
+    """Резервная копия базы (копирование идет в пуле потоков и не блокирует базу)"""
+    try:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, create_backup)
+    except Exception as e:
+        logger.error(f"Ошибка при создании резервной копии базы: {e}")
+
+async def flush_user_activity():
+    """Запись накопленного времени активности пользователей одним пакетом"""
+    try:
+        flushed = await run_with_session(user_registry.flush_last_seen)
+        if flushed:
+            logger.debug(f"Записано время активности пользователей: {flushed}")
+    except Exception as e:
+        logger.error(f"Ошибка при записи времени активности пользователей: {e}")
+
 async def sync_google_sheets():
     """Синхронизация данных с Google Sheets"""
     if not GOOGLE_SHEETS_ENABLED:
         return
         
     try:
-        db = next(get_db())
-        
         # Импортируем менеджер Google Sheets
         from google_sheets.sheets import sheets_manager
         
-        # Синхронизируем все данные
-        sheets_manager.sync_all_data(db)
+        # Синхронизируем все данные (в пуле потоков, чтобы не останавливать бота)
+        await run_with_session(sheets_manager.sync_all_data)
         
         logger.info("Выполнена плановая синхронизация с Google Sheets")
     except Exception as e:
         logger.error(f"Ошибка при синхронизации с Google Sheets: {e}")
-    finally:
-        db.close()
 
 def start_scheduler():
     """Запуск планировщика задач"""
@@ -289,6 +405,22 @@ def start_scheduler():
     # Генерация ежедневного отчета в 9:00
     scheduler.add_job(generate_daily_report, CronTrigger(hour=9, minute=0))
     
+    # Фоновая подготовка сводок после того, как данные перестали меняться
+    scheduler.add_job(prewarm_summaries, IntervalTrigger(minutes=SUMMARY_PREWARM_INTERVAL_MINUTES))
+    
+    # Очистка истории диалогов неактивных чатов каждые 30 минут
+    scheduler.add_job(evict_idle_conversations, IntervalTrigger(minutes=30))
+    
+    # Пакетная запись времени активности пользователей
+    scheduler.add_job(flush_user_activity, IntervalTrigger(minutes=USER_LAST_SEEN_FLUSH_MINUTES))
+    
+    # Перенос старых диалогов в архив ночью, когда бот почти не используется
+    scheduler.add_job(archive_old_chat_history, CronTrigger(hour=3, minute=30))
+    
+    # Ежедневная резервная копия базы
+    if BACKUP_ENABLED:
+        scheduler.add_job(backup_database, CronTrigger(hour=BACKUP_HOUR, minute=0))
+    
     # Синхронизация с Google Sheets каждый час
     if GOOGLE_SHEETS_ENABLED:
         scheduler.add_job(sync_google_sheets, IntervalTrigger(hours=1))